@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+=== БЫСТРОЕ ОПРЕДЕЛЕНИЕ ПАРАМЕТРОВ АУДИО ===
+Длительность, число каналов и частота дискретизации OGG/WAV по заголовкам,
+без декодирования звука:
+- OGG (Vorbis/Opus): заголовок идентификации в первой странице +
+  granule position последней страницы потока
+- WAV: чанки fmt и data заголовка RIFF
+
+Работает как с файлами на диске, так и напрямую с файлами .miz архива
+(поток ZipFile.open) — без извлечения во временную папку. Результаты для
+файлов архива кэшируются на диске по CRC32/размеру (parse_cache).
+"""
+
+import os
+import struct
+from collections import namedtuple
+
+from parse_cache import get_parse_cache
+
+# Версия разбора — часть ключа дискового кэша (parse_cache)
+AUDIO_PROBE_VERSION = 1
+
+AudioInfo = namedtuple('AudioInfo', ('duration', 'channels', 'sample_rate'))
+
+# Сколько байт начала файла нужно для заголовков OGG
+_OGG_HEAD_SIZE = 4096
+# Максимальный размер страницы OGG (27 + 255 сегментов + 255*255 байт данных)
+_OGG_MAX_PAGE = 27 + 255 + 255 * 255
+# Частота granule position у Opus всегда 48 кГц
+_OPUS_GRANULE_RATE = 48000
+
+
+def _probe_ogg(f, size):
+    head = f.read(_OGG_HEAD_SIZE)
+    if not head.startswith(b'OggS'):
+        return None
+
+    idx = head.find(b'\x01vorbis')
+    if idx != -1 and len(head) >= idx + 16:
+        channels = head[idx + 11]
+        sample_rate = struct.unpack_from('<I', head, idx + 12)[0]
+        granule_rate = sample_rate
+        pre_skip = 0
+    else:
+        idx = head.find(b'OpusHead')
+        if idx == -1 or len(head) < idx + 16:
+            return None
+        channels = head[idx + 9]
+        pre_skip = struct.unpack_from('<H', head, idx + 10)[0]
+        sample_rate = struct.unpack_from('<I', head, idx + 12)[0] or _OPUS_GRANULE_RATE
+        granule_rate = _OPUS_GRANULE_RATE
+    if granule_rate <= 0:
+        return None
+
+    # Последняя страница потока целиком помещается в последние _OGG_MAX_PAGE байт
+    tail_start = max(0, size - _OGG_MAX_PAGE)
+    f.seek(tail_start)
+    tail = f.read()
+
+    pos = len(tail)
+    while True:
+        pos = tail.rfind(b'OggS', 0, pos)
+        if pos == -1:
+            return None
+        # Версия формата страницы — всегда 0 (отсекает случайные 'OggS' в данных)
+        if pos + 14 <= len(tail) and tail[pos + 4] == 0:
+            granule = struct.unpack_from('<q', tail, pos + 6)[0]
+            if granule > 0:
+                return AudioInfo(max(0, granule - pre_skip) / granule_rate, channels, sample_rate)
+
+
+def _probe_wav(f, size):
+    head = f.read(12)
+    if len(head) < 12 or head[:4] not in (b'RIFF', b'RF64') or head[8:12] != b'WAVE':
+        return None
+
+    channels = sample_rate = byte_rate = None
+    pos = 12
+    while pos + 8 <= size:
+        f.seek(pos)
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            break
+        chunk_id, chunk_size = chunk[:4], struct.unpack('<I', chunk[4:])[0]
+        if chunk_id == b'fmt ':
+            fmt = f.read(16)
+            if len(fmt) < 16:
+                return None
+            _, channels, sample_rate, byte_rate = struct.unpack('<HHII', fmt[:12])
+        elif chunk_id == b'data':
+            if not byte_rate:
+                return None
+            # Размер data может быть неверным у недописанных файлов — ограничиваем файлом
+            data_size = min(chunk_size, size - pos - 8)
+            return AudioInfo(data_size / byte_rate, channels, sample_rate)
+        # Чанки выровнены по 2 байта
+        pos += 8 + chunk_size + (chunk_size & 1)
+    return None
+
+
+def probe_stream(f, size, name):
+    """Параметры аудио из открытого бинарного потока с поддержкой seek.
+
+    Args:
+        f:    поток (файл или ZipFile.open)
+        size: размер несжатых данных
+        name: имя файла (расширение определяет формат)
+
+    Returns:
+        AudioInfo или None, если формат не распознан
+    """
+    ext = os.path.splitext(name)[1].lower()
+    try:
+        if ext == '.ogg':
+            return _probe_ogg(f, size)
+        if ext == '.wav':
+            return _probe_wav(f, size)
+    except (OSError, struct.error, IndexError, ValueError):
+        return None
+    return None
+
+
+def probe_member(zf, info):
+    """Параметры аудио файла архива без извлечения (с дисковым кэшем)"""
+    cache = get_parse_cache()
+    cached = cache.get('audio_info', info, AUDIO_PROBE_VERSION)
+    if cached is not None:
+        return AudioInfo(*cached)
+    with zf.open(info) as f:
+        result = probe_stream(f, info.file_size, info.filename)
+    if result is not None:
+        cache.put('audio_info', info, AUDIO_PROBE_VERSION, tuple(result))
+    return result
+
+
+def probe_file(path):
+    """Параметры аудио файла на диске.
+
+    Для форматов, которые не разбираются по заголовку (mp3, повреждённые
+    файлы), используется mutagen (если установлен) или pygame.
+    """
+    try:
+        with open(path, 'rb') as f:
+            result = probe_stream(f, os.path.getsize(path), path)
+    except OSError:
+        return None
+    if result is not None:
+        return result
+
+    try:
+        from mutagen import File as MutagenFile
+        audio_meta = MutagenFile(path)
+        if audio_meta and audio_meta.info:
+            return AudioInfo(audio_meta.info.length,
+                             getattr(audio_meta.info, 'channels', 0),
+                             getattr(audio_meta.info, 'sample_rate', 0))
+    except ImportError:
+        pass
+    except Exception:
+        return None
+
+    try:
+        import pygame
+        if not pygame.mixer.get_init():
+            pygame.mixer.init()
+        sound = pygame.mixer.Sound(path)
+        duration = sound.get_length()
+        del sound
+        return AudioInfo(duration, 0, 0)
+    except Exception:
+        return None
+
+
+def get_duration(path):
+    """Длительность файла на диске в секундах (0 — не удалось определить)"""
+    result = probe_file(path)
+    return result.duration if result is not None else 0
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк и проверка паритета mission_parser.
+
+Сравнивает линейный парсер таблиц (MissionLinkGraph) с прежними регулярными
+выражениями стадий 1–3 MizResourceManager.parse_mission_audio_links и
+parse_mission_image_links на синтетических файлах mission.
+
+Запуск:
+    python bench_mission_parser.py [кол-во_триггеров ...]
+"""
+import random
+import re
+import sys
+import time
+
+from mission_parser import MissionLinkGraph
+
+
+def regex_reference_links(text, is_audio_res):
+    """Прежний разбор регулярными выражениями — эталон для проверки паритета"""
+    links = {}
+
+    block_pattern = r'\["id"\]\s*=\s*"TransmitMessage".*?\["params"\]\s*=\s*\{(.*?)\},\s*--\s*end of \["params"\]'
+    for block in re.findall(block_pattern, text, re.DOTALL):
+        file_m = re.search(r'\["file"\]\s*=\s*"(ResKey_[^"]+)"', block)
+        sub_m = re.search(r'\["subtitle"\]\s*=\s*"(DictKey_[^"]+)"', block)
+        if file_m and sub_m:
+            links[sub_m.group(1)] = file_m.group(1)
+
+    func_pattern = r'\[\d+\]\s*=\s*"((?:[^"\\]|\\.)*)"\s*,'
+    for script in re.findall(func_pattern, text):
+        clean = script.replace('\\"', '"')
+        d_keys = re.findall(r'a_out_text_delay\(getValueDictByKey\("(DictKey_[^"]+)"\)', clean)
+        s_keys = re.findall(r'a_out_sound\(getValueResourceByKey\("(ResKey_[^"]+)"\)', clean)
+        s_keys = [rk for rk in s_keys if is_audio_res(rk)]
+        if d_keys and s_keys:
+            for dk in d_keys:
+                if dk not in links:
+                    links[dk] = s_keys[0]
+
+    action_pattern = r'\["actions"\]\s*=\s*\{(.*?)\},\s*--\s*end of \["actions"\]'
+    for block in re.findall(action_pattern, text, re.DOTALL):
+        items = re.findall(r'\[\d+\]\s*=\s*\{(.*?)\},?\s*--\s*end of \[\d+\]', block, re.DOTALL)
+        texts = []
+        sounds = []
+        for item in items:
+            pred = re.search(r'\["predicate"\]\s*=\s*"([^"]+)"', item)
+            if not pred:
+                continue
+            if pred.group(1) == "a_out_text_delay":
+                tk = re.search(r'\["text"\]\s*=\s*"(DictKey_[^"]+)"', item)
+                if tk:
+                    texts.append(tk.group(1))
+            elif pred.group(1) == "a_out_sound":
+                fk = re.search(r'\["file"\]\s*=\s*"(ResKey_[^"]+)"', item)
+                if fk and is_audio_res(fk.group(1)):
+                    sounds.append(fk.group(1))
+        if texts and sounds:
+            for dk in texts:
+                if dk not in links:
+                    links[dk] = sounds[0]
+
+    images = {}
+    for suffix in 'BRN':
+        match = re.search(rf'\["pictureFileName{suffix}"\]\s*=\s*\{{(.*?)\}}', text, re.DOTALL)
+        if match:
+            keys = {int(i): rk for i, rk in re.findall(r'\[(\d+)\]\s*=\s*"(ResKey_[^"]+)"', match.group(1))}
+            if keys:
+                images[suffix] = [keys[i] for i in range(1, max(keys) + 1) if i in keys]
+    return links, images
+
+
+def _serialize(value, indent, key_repr):
+    """Сериализация в формате DCS (с комментариями -- end of ...)"""
+    pad = '    ' * indent
+    if isinstance(value, dict):
+        out = [f'{pad}{key_repr} = \n{pad}{{\n']
+        for k, v in value.items():
+            out.append(_serialize(v, indent + 1, f'[{k}]' if isinstance(k, int) else f'["{k}"]'))
+        out.append(f'{pad}}}, -- end of {key_repr}\n')
+        return ''.join(out)
+    if isinstance(value, bool):
+        return f'{pad}{key_repr} = {"true" if value else "false"},\n'
+    if isinstance(value, str):
+        escaped = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\\n')
+        return f'{pad}{key_repr} = "{escaped}",\n'
+    return f'{pad}{key_repr} = {value},\n'
+
+
+def generate_mission(seed, triggers_count):
+    """Синтетический mission: trig, trigrules, TransmitMessage в задачах групп, картинки брифинга"""
+    rnd = random.Random(seed)
+    id_range = triggers_count * 3
+
+    def dict_key():
+        return f'DictKey_{rnd.choice(["ActionText", "subtitle", "ActionRadioText"])}_{rnd.randint(1, id_range)}'
+
+    def res_key():
+        return f'ResKey_{rnd.choice(["Action", "advancedFile"])}_{rnd.randint(1, id_range)}'
+
+    trig_actions = {}
+    trig_funcs = {}
+    trigrules = {}
+    for i in range(1, triggers_count + 1):
+        parts = [f'a_out_text_delay(getValueDictByKey("{dict_key()}"), 10, false, 0);'
+                 for _ in range(rnd.randint(0, 3))]
+        parts += [f'a_out_sound(getValueResourceByKey("{res_key()}"), 0);'
+                  for _ in range(rnd.randint(0, 2))]
+        if rnd.random() < 0.2:
+            # Строка скрипта, похожая на таблицу — не должна сбивать разбор
+            parts.append('a_do_script("local t = {[1] = \\"x\\"} -- end of [1]");')
+        rnd.shuffle(parts)
+        trig_actions[i] = ''.join(parts)
+        trig_funcs[i] = f'if mission.trig.conditions[{i}]() then mission.trig.actions[{i}]() end'
+
+        actions = {}
+        for j in range(1, rnd.randint(1, 5) + 1):
+            kind = rnd.random()
+            if kind < 0.4:
+                action = {"text": dict_key(), "predicate": "a_out_text_delay", "seconds": 10, "clearview": False}
+            elif kind < 0.7:
+                action = {"file": res_key(), "predicate": "a_out_sound", "start_delay": 0}
+            else:
+                action = {"predicate": "a_set_flag", "flag": str(j),
+                          "zone": {1: "x"} if rnd.random() < 0.1 else "x"}
+            fields = list(action.items())
+            rnd.shuffle(fields)
+            actions[j] = dict(fields)
+        trigrules[i] = {
+            "rules": {1: {"flag": "1", "predicate": "c_flag_is_true"}},
+            "comment": 'Trigger with text [1] = "x"',
+            "eventlist": "",
+            "actions": actions,
+            "predicate": "triggerOnce",
+        }
+
+    groups = {}
+    for g in range(1, triggers_count // 2 + 1):
+        tasks = {}
+        for t in range(1, rnd.randint(1, 4) + 1):
+            if rnd.random() < 0.6:
+                params = {"loop": False, "subtitle": dict_key(), "duration": 5, "file": res_key()}
+                if rnd.random() < 0.1:
+                    params.pop("file")
+                tasks[t] = {"enabled": True, "auto": False, "id": "WrappedAction", "number": t,
+                            "params": {"action": {"id": "TransmitMessage", "params": params}}}
+            else:
+                tasks[t] = {"enabled": True, "id": "Orbit", "number": t,
+                            "params": {"altitude": 2000, "pattern": "Circle"}}
+        groups[g] = {"name": f"Group {g}",
+                     "route": {"points": {1: {"task": {"id": "ComboTask", "params": {"tasks": tasks}}}}}}
+
+    mission = {
+        "trig": {"actions": trig_actions, "func": trig_funcs,
+                 "flag": {i: True for i in range(1, triggers_count + 1)}},
+        "trigrules": trigrules,
+        "pictureFileNameB": {i: res_key() for i in range(1, rnd.randint(0, 4) + 1)},
+        "pictureFileNameR": {2: res_key(), 1: res_key()},
+        "coalition": {"blue": {"country": {1: {"plane": {"group": groups}}}}},
+        "descriptionText": "DictKey_descriptionText_1",
+    }
+    body = _serialize(mission, 0, 'mission').split('\n', 1)[1]
+    return 'mission = \n' + body.replace('}, -- end of mission', '} -- end of mission')
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def run(sizes, parity_runs=40):
+    ok = True
+    for seed in range(parity_runs):
+        text = generate_mission(seed, 60)
+        rnd = random.Random(seed)
+        audio = {f'ResKey_{kind}_{i}' for kind in ("Action", "advancedFile")
+                 for i in range(500) if rnd.random() < 0.7}
+
+        reference, reference_images = regex_reference_links(text, audio.__contains__)
+        graph = MissionLinkGraph.from_text(text)
+        current = graph.resolve(audio.__contains__)
+        current_images = {k: v for k, v in graph.briefing_images.items() if v}
+
+        if list(reference.items()) != list(current.items()) or reference_images != current_images:
+            ok = False
+            print(f"seed {seed}: MISMATCH")
+    print(f"parity on {parity_runs} missions: {'OK' if ok else 'MISMATCH'}")
+
+    for size in sizes:
+        text = generate_mission(1, size)
+        _, t_ref = _timed(regex_reference_links, text, lambda rk: True)
+        _, t_new = _timed(lambda: MissionLinkGraph.from_text(text).resolve(lambda rk: True))
+        print(f"{size:>7} triggers ({len(text) / 1e6:6.1f} MB): "
+              f"regex {t_ref:6.2f} s | parser {t_new:6.2f} s")
+    return ok
+
+
+if __name__ == '__main__':
+    requested = [int(arg) for arg in sys.argv[1:]] or [1000, 5000]
+    sys.exit(0 if run(requested) else 1)
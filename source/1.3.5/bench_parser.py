@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк и проверка паритета LuaDictionaryParser.
+
+Сравнивает однопроходный парсер (parser.LuaDictionaryParser) с прежним
+построчным алгоритмом на синтетических dictionary из 1k/10k/100k ключей.
+
+Запуск:
+    python bench_parser.py [кол-во_ключей ...]
+"""
+import io
+import random
+import re
+import sys
+import time
+
+from parser import LuaDictionaryParser
+
+
+class LineByLineReferenceParser:
+    """Прежний построчный парсер dictionary — эталон для проверки паритета"""
+
+    def __init__(self):
+        self.current_key = None
+        self.current_raw_parts = []
+        self.current_file_lines = []
+        self.entries = {}
+        self.total_lines_count = 0
+        self.current_entry_start_line = 0
+
+    def parse_string(self, content):
+        self.total_lines_count = 0
+        self.entries = {}
+        for line in io.StringIO(content, newline=None):
+            self._process_line(line.rstrip('\n'))
+            self.total_lines_count += 1
+        if self.current_key:
+            self._save_current_entry()
+        return self.entries
+
+    def _process_line(self, line):
+        if self._is_ignored_line(line):
+            return
+
+        match = re.match(r'^[ \t]*\["([^"]+)"\][ \t]*=[ \t]*"', line)
+        key = match.group(1) if match else None
+        if key:
+            if self.current_key:
+                self._save_current_entry()
+
+            self.current_key = key
+            self.current_raw_parts = []
+            self.current_file_lines = [line]
+            self.current_entry_start_line = self.total_lines_count
+
+            value_start = self._find_value_start(line)
+            if value_start == -1:
+                return
+
+            if line.endswith('\\'):
+                self.current_raw_parts.append(line[value_start:-1])
+            elif line.endswith('",'):
+                self.current_raw_parts.append(line[value_start:-2])
+                self._save_current_entry()
+                self.current_key = None
+
+        elif self.current_key:
+            self.current_file_lines.append(line)
+
+            if line.endswith('\\'):
+                self.current_raw_parts.append(line[:-1])
+            elif line.endswith('",'):
+                self.current_raw_parts.append(line[:-2])
+                self._save_current_entry()
+                self.current_key = None
+
+    def _is_ignored_line(self, line):
+        line_stripped = line.strip()
+        if not line_stripped:
+            return True
+        ignore_patterns = ['dictionary =', '} -- end of dictionary', '}']
+        return any(line_stripped.startswith(patt) for patt in ignore_patterns)
+
+    def _find_value_start(self, line):
+        pos = line.find('= "')
+        if pos != -1:
+            return pos + 3
+        pos = line.find('="')
+        if pos != -1:
+            return pos + 2
+        return -1
+
+    def _save_current_entry(self):
+        if not self.current_key or not self.current_raw_parts:
+            return
+        decoded_parts = [part.replace('\\"', '"').replace('\\\\', '\\') for part in self.current_raw_parts]
+        self.entries[self.current_key] = (
+            decoded_parts,
+            self.current_file_lines.copy(),
+            self.current_entry_start_line
+        )
+        self.current_raw_parts.clear()
+        self.current_file_lines.clear()
+
+
+def generate_dictionary(keys_count, seed=42):
+    """Генерирует синтетический dictionary с однострочными, многострочными,
+    пустыми значениями, экранированием и служебными строками внутри значений"""
+    rnd = random.Random(seed)
+    words = ['Colt', 'one-one', 'push', 'button', '7', 'Tally', 'target', '\\"Objective\\"',
+             'C:\\\\Temp', 'Roger', 'Winchester', 'Kobuleti', 'РЛС', 'цель', 'захвачена']
+    lines = ['dictionary = ', '{']
+    for i in range(keys_count):
+        kind = rnd.random()
+        key = f'DictKey_ActionText_{i}' if i % 3 else f'DictKey_descriptionText_{i}'
+        if kind < 0.6:
+            text = ' '.join(rnd.choice(words) for _ in range(rnd.randint(1, 12)))
+            lines.append(f'    ["{key}"] = "{text}",')
+        elif kind < 0.7:
+            lines.append(f'    ["{key}"] = "",')
+        elif kind < 0.95:
+            parts = [' '.join(rnd.choice(words) for _ in range(rnd.randint(0, 8)))
+                     for _ in range(rnd.randint(2, 6))]
+            lines.append(f'    ["{key}"] = "{parts[0]}\\')
+            for part in parts[1:-1]:
+                lines.append(f'{part}\\')
+                if rnd.random() < 0.05:
+                    lines.append('')
+            lines.append(f'{parts[-1]}",')
+        else:
+            # Нестандартные случаи: нет запятой, странные пробелы, "}" внутри значения
+            variant = rnd.randint(0, 2)
+            if variant == 0:
+                lines.append(f'    ["{key}"]="tight spacing",')
+            elif variant == 1:
+                lines.append(f'    ["{key}"] = "no comma"')
+            else:
+                lines.append(f'    ["{key}"] = "brace\\')
+                lines.append('} not a dictionary end\\')
+                lines.append('tail",')
+    lines.append('} -- end of dictionary')
+    return '\n'.join(lines) + '\n'
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def run(sizes):
+    ok = True
+    for size in sizes:
+        content = generate_dictionary(size)
+        reference, t_ref = _timed(LineByLineReferenceParser().parse_string, content)
+        current, t_new = _timed(LuaDictionaryParser().parse_string, content)
+
+        same = reference == current and list(reference) == list(current)
+        ok = ok and same
+        print(f"{size:>7} keys: line-by-line {t_ref * 1000:8.1f} ms | "
+              f"single-pass {t_new * 1000:8.1f} ms | x{t_ref / max(t_new, 1e-9):5.1f} | "
+              f"parity {'OK' if same else 'MISMATCH'}")
+    return ok
+
+
+if __name__ == '__main__':
+    requested = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    sys.exit(0 if run(requested) else 1)
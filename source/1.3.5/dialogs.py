@@ -9,6 +9,8 @@ from localization import get_translation
 from widgets import ToggleSwitch, ZoomablePreviewArea, JumpSlider, ClickableLabel, CustomSplitter, SearchCheckBox, NumberedTextEdit, CustomScrollBar
 from version import VersionInfo
 from Context import AI_CONTEXTS
+from audio_probe import probe_file, get_duration
+from resource_workers import pause_all_pools, resume_all_pools
 import sys
 
 def resource_path(relative_path):
@@ -1430,10 +1432,8 @@ class AudioPlayerDialog(CustomDialog):
         """Вспомогательный метод для загрузки файла в миксер"""
         try:
             if audio_path and os.path.exists(audio_path):
-                # Сначала Sound для длительности
-                sound = pygame.mixer.Sound(audio_path)
-                self.duration_sec = sound.get_length()
-                del sound
+                # Длительность — по заголовку файла (без полного декодирования)
+                self.duration_sec = get_duration(audio_path)
                 
                 # Потом music для стриминга
                 pygame.mixer.music.load(audio_path)
@@ -1857,11 +1857,15 @@ class AudioPlayerDialog(CustomDialog):
     def done(self, r):
         self.save_settings()  # Сохраняем ДО закрытия, пока окно ещё видимо
         self._stop_all_audio()
+        if hasattr(self, 'playlist_widget'):
+            self.playlist_widget.stop_background_tasks()
         super().done(r)
 
     def closeEvent(self, event):
         self.save_settings()  # Сохраняем ДО закрытия, пока окно ещё видимо
         self._stop_all_audio()
+        if hasattr(self, 'playlist_widget'):
+            self.playlist_widget.stop_background_tasks()
         super().closeEvent(event)
 
     def _stop_all_audio(self):
@@ -2829,10 +2833,14 @@ class FilesWindow(CustomDialog):
 
     def done(self, r):
         self._stop_all_audio()
+        if hasattr(self, 'file_manager_widget'):
+            self.file_manager_widget.stop_background_tasks()
         super().done(r)
 
     def closeEvent(self, event):
         self._stop_all_audio()
+        if hasattr(self, 'file_manager_widget'):
+            self.file_manager_widget.stop_background_tasks()
         super().closeEvent(event)
 
     def _stop_all_audio(self):
@@ -7590,10 +7598,10 @@ class TTSPreviewDialog(CustomDialog):
         if hasattr(self, 'tts_playlist_widget'):
             # Узнаем длительность и обновляем UI плейлиста
             try:
-                import pygame
-                sound = pygame.mixer.Sound(path)
-                duration = sound.get_length()
-                del sound
+                probe = probe_file(path)
+                if probe is None:
+                    raise ValueError(f"Unknown audio format: {path}")
+                duration = probe.duration
                 # Показываем длительность сгенерированного аудио в колонке 🧠, а не ⏳
                 self.tts_playlist_widget.update_generated_indicator(res_key, True, duration_sec=duration)
                 
@@ -7738,10 +7746,10 @@ class TTSPreviewDialog(CustomDialog):
             if hasattr(self, 'tts_playlist_widget'):
                 # Узнаем длительность и обновляем UI плейлиста
                 try:
-                    import pygame
-                    sound = pygame.mixer.Sound(path)
-                    duration = sound.get_length()
-                    del sound
+                    probe = probe_file(path)
+                    if probe is None:
+                        raise ValueError(f"Unknown audio format: {path}")
+                    duration = probe.duration
                     # Показываем длительность сгенерированного аудио в колонке 🧠, а не ⏳
                     self.tts_playlist_widget.update_generated_indicator(current_res_key, True, duration_sec=duration)
                     self.duration_sec = duration
@@ -7849,9 +7857,7 @@ class TTSPreviewDialog(CustomDialog):
         try:
             if audio_path and os.path.exists(audio_path):
                 import pygame
-                sound = pygame.mixer.Sound(audio_path)
-                self.duration_sec = sound.get_length()
-                del sound
+                self.duration_sec = get_duration(audio_path)
                 
                 pygame.mixer.music.load(audio_path)
                 self.audio_loaded = True
@@ -8201,6 +8207,8 @@ class TTSPreviewDialog(CustomDialog):
             self.settings.setValue("tts_window_geometry", self.saveGeometry())
             self.settings.setValue("tts_splitter_state", self.tts_splitter.saveState())
         self._stop_playback_safely()
+        if hasattr(self, 'tts_playlist_widget'):
+            self.tts_playlist_widget.stop_background_tasks()
         # Останавливаем фоновый сервер XTTS для освобождения VRAM
         if hasattr(self, 'engine'):
             self.engine.cancel_download = True
@@ -8218,6 +8226,8 @@ class TTSPreviewDialog(CustomDialog):
             self.settings.setValue("tts_window_geometry", self.saveGeometry())
             self.settings.setValue("tts_splitter_state", self.tts_splitter.saveState())
         self._stop_playback_safely()
+        if hasattr(self, 'tts_playlist_widget'):
+            self.tts_playlist_widget.stop_background_tasks()
         # Останавливаем фоновый сервер XTTS для освобождения VRAM
         if hasattr(self, 'engine'):
             self.engine.cancel_download = True
@@ -9130,9 +9140,14 @@ class LuaTranslationWindow(CustomDialog):
         
         # 3. Выполняем перезапись
         try:
-            files_modified, strings_replaced = self._parser.rewrite_miz(
-                self.miz_path, translations, self.entries_by_file, self.lua_files
-            )
+            # Фоновая загрузка ресурсов не читает архив, пока он заменяется
+            pause_all_pools()
+            try:
+                files_modified, strings_replaced = self._parser.rewrite_miz(
+                    self.miz_path, translations, self.entries_by_file, self.lua_files
+                )
+            finally:
+                resume_all_pools()
             
             success_msg = get_translation(
                 lang, 'lua_rewrite_success',
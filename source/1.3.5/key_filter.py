@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+=== ФИЛЬТР КЛЮЧЕЙ СЛОВАРЯ ===
+KeyFilter — скомпилированный набор активных фильтров ключей
+(ActionText, ActionRadioText, description, subtitle, sortie, name + произвольные).
+
+Все активные подстроки объединяются в одно регулярное выражение,
+а результат проверки кэшируется для каждого ключа. Экземпляр неизменяем:
+при изменении настроек фильтров создаётся новый (см. KeyFilter.signature).
+"""
+
+import re
+
+# Встроенные фильтры: (имя атрибута тоггла в главном окне, подстрока ключа)
+BUILTIN_KEY_FILTERS = (
+    ('filter_action_text', 'ActionText'),
+    ('filter_action_radio', 'ActionRadioText'),
+    ('filter_description', 'description'),
+    ('filter_subtitle', 'subtitle'),
+    ('filter_sortie', 'sortie'),
+    ('filter_name', 'name'),
+)
+
+
+class KeyFilter:
+    """Скомпилированный фильтр ключей с кэшем результатов по ключу"""
+
+    __slots__ = ('signature', '_pattern', '_cache')
+
+    def __init__(self, signature):
+        self.signature = signature
+        show_all, substrings = signature
+        if show_all or not substrings:
+            self._pattern = None
+        else:
+            # Длинные подстроки первыми — порядок не влияет на результат, но сокращает перебор
+            alternatives = sorted(set(substrings), key=len, reverse=True)
+            self._pattern = re.compile('|'.join(re.escape(s) for s in alternatives))
+        self._cache = {}
+
+    @staticmethod
+    def signature_from_window(window):
+        """Снимает текущее состояние фильтров с главного окна.
+
+        Returns:
+            (show_all, tuple_активных_подстрок) — хэшируемый ключ конфигурации
+        """
+        show_all_cb = getattr(window, 'show_all_keys_cb', None)
+        show_all = bool(show_all_cb is not None and show_all_cb.isChecked())
+
+        substrings = []
+        for attr_name, substring in BUILTIN_KEY_FILTERS:
+            toggle = getattr(window, attr_name, None)
+            if toggle is not None and toggle.isChecked():
+                substrings.append(substring)
+
+        for custom_filter in getattr(window, 'custom_filters', []):
+            if custom_filter['checkbox'].isChecked():
+                filter_text = custom_filter['line_edit'].text().strip()
+                if filter_text:
+                    substrings.append(filter_text)
+
+        return show_all, tuple(substrings)
+
+    def matches(self, key):
+        """Нужно ли переводить ключ по активным фильтрам"""
+        if self.signature[0]:
+            return True
+        cached = self._cache.get(key)
+        if cached is None:
+            cached = self._pattern is not None and self._pattern.search(key) is not None
+            self._cache[key] = cached
+        return cached
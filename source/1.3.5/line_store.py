@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+=== КОМПАКТНОЕ ХРАНЕНИЕ СТРОК СЛОВАРЯ ===
+LineRecord — запись строки для all_lines_data / original_lines.
+
+Раньше каждая часть ключа хранилась в отдельном dict на ~18 полей.
+LineRecord хранит те же поля в __slots__ (без словаря экземпляра),
+но остаётся совместимым с dict-интерфейсом: line['key'], line.get(...),
+'field' in line, line.copy(), copy.deepcopy(line).
+Поля, которых нет в списке FIELDS, складываются в небольшой дополнительный dict.
+"""
+
+import copy
+from collections.abc import MutableMapping
+
+# Неизменяемые типы значений — их не нужно копировать при deepcopy
+_IMMUTABLE_TYPES = (str, int, float, bool, type(None))
+
+
+class LineRecord(MutableMapping):
+    """Слотовая запись строки словаря с интерфейсом dict"""
+
+    FIELDS = (
+        'key',
+        'original_text',
+        'display_text',
+        'translated_text',
+        'original_translated_text',
+        'full_match',
+        'indent',
+        'start_pos',
+        'end_pos',
+        'file_line_index',
+        'should_translate',
+        'is_empty',
+        'key_all_empty',
+        'ends_with_backslash',
+        'is_multiline',
+        'display_line_index',
+        'total_display_lines',
+        'part_index',
+        'session_modified',
+        'file_index',
+        'entry_start_line',
+    )
+    __slots__ = FIELDS + ('_extra',)
+
+    _FIELD_SET = frozenset(FIELDS)
+
+    def __init__(self, data=None, **fields):
+        self._extra = None
+        if data:
+            for name, value in (data.items() if hasattr(data, 'items') else data):
+                self[name] = value
+        for name, value in fields.items():
+            self[name] = value
+
+    # --- dict-интерфейс ---
+
+    def __getitem__(self, name):
+        if name in self._FIELD_SET:
+            try:
+                return getattr(self, name)
+            except AttributeError:
+                raise KeyError(name) from None
+        extra = self._extra
+        if extra is not None and name in extra:
+            return extra[name]
+        raise KeyError(name)
+
+    def get(self, name, default=None):
+        if name in self._FIELD_SET:
+            return getattr(self, name, default)
+        extra = self._extra
+        if extra is not None:
+            return extra.get(name, default)
+        return default
+
+    def __setitem__(self, name, value):
+        if name in self._FIELD_SET:
+            setattr(self, name, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[name] = value
+
+    def __delitem__(self, name):
+        if name in self._FIELD_SET:
+            try:
+                delattr(self, name)
+            except AttributeError:
+                raise KeyError(name) from None
+            return
+        extra = self._extra
+        if extra is None or name not in extra:
+            raise KeyError(name)
+        del extra[name]
+
+    def __contains__(self, name):
+        if name in self._FIELD_SET:
+            return hasattr(self, name)
+        extra = self._extra
+        return extra is not None and name in extra
+
+    def __iter__(self):
+        for name in self.FIELDS:
+            if hasattr(self, name):
+                yield name
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        count = sum(1 for name in self.FIELDS if hasattr(self, name))
+        return count + (len(self._extra) if self._extra else 0)
+
+    def __repr__(self):
+        return f"LineRecord({dict(self)!r})"
+
+    # --- копирование ---
+
+    def copy(self):
+        """Поверхностная копия (аналог dict.copy)"""
+        clone = LineRecord.__new__(LineRecord)
+        for name in self.FIELDS:
+            try:
+                setattr(clone, name, getattr(self, name))
+            except AttributeError:
+                pass
+        clone._extra = dict(self._extra) if self._extra else None
+        return clone
+
+    __copy__ = copy
+
+    def __deepcopy__(self, memo):
+        clone = LineRecord.__new__(LineRecord)
+        memo[id(self)] = clone
+        for name in self.FIELDS:
+            try:
+                value = getattr(self, name)
+            except AttributeError:
+                continue
+            if not isinstance(value, _IMMUTABLE_TYPES):
+                value = copy.deepcopy(value, memo)
+            setattr(clone, name, value)
+        clone._extra = copy.deepcopy(self._extra, memo) if self._extra else None
+        return clone
+
+    def __reduce__(self):
+        return (LineRecord, (dict(self),))
+
+
+def fork_locale_lines(all_lines_data, original_lines):
+    """Создаёт независимые записи строк для новой локали.
+
+    Каждая запись копируется один раз (поверхностно — значения неизменяемые),
+    а original_lines ссылается на те же копии, что и all_lines_data,
+    как и после обычного парсинга.
+
+    Returns:
+        (new_all_lines_data, new_original_lines)
+    """
+    clones = {}
+    new_all_lines = []
+    for line in all_lines_data:
+        clone = line.copy()
+        clones[id(line)] = clone
+        new_all_lines.append(clone)
+
+    new_original_lines = []
+    for line in original_lines:
+        clone = clones.get(id(line))
+        if clone is None:
+            clone = line.copy()
+        new_original_lines.append(clone)
+    return new_all_lines, new_original_lines
+
+
+class KeyIndex:
+    """Агрегаты по ключам словаря для одного прохода фильтрации.
+
+    Строится за один линейный проход по all_lines_data и заменяет
+    повторные сканирования всего словаря для каждой строки:
+    ключ -> список частей, есть ли в ключе текст, есть ли у ключа аудио.
+    """
+
+    __slots__ = ('parts', '_has_content', '_has_audio')
+
+    def __init__(self, lines=()):
+        self.parts = {}
+        self._has_content = {}
+        self._has_audio = {}
+        for line in lines:
+            self.add(line)
+
+    def add(self, line):
+        """Добавляет строку в индекс"""
+        key = line.get('key')
+        key_parts = self.parts.get(key)
+        if key_parts is None:
+            self.parts[key] = [line]
+            self._has_content[key] = _line_has_content(line)
+        else:
+            key_parts.append(line)
+            if not self._has_content[key]:
+                self._has_content[key] = _line_has_content(line)
+
+    def has_content(self, key):
+        """Есть ли хотя бы в одной части ключа текст (оригинал или перевод)"""
+        return self._has_content.get(key, False)
+
+    def has_audio(self, key, resolver):
+        """Есть ли у ключа аудио; resolver(key) вызывается один раз на ключ"""
+        cached = self._has_audio.get(key)
+        if cached is None:
+            cached = bool(resolver(key))
+            self._has_audio[key] = cached
+        return cached
+
+
+def _line_has_content(line):
+    return bool((line.get('original_text') or '').strip() or (line.get('translated_text') or '').strip())
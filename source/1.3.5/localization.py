@@ -95,6 +95,8 @@ TRANSLATIONS = {
         'overwrite_btn': '💾 Перезаписать файл…',
         'overwrite_cmp_btn': '💾 Перезаписать файл',
         'miz_backup_label': 'Создать резервную копию',
+        'miz_incremental_label': 'Быстрое сохранение (дозапись)',
+        'miz_incremental_tooltip': 'Дописывать в конец архива только изменённые файлы.\nПри накоплении старых данных архив будет перезаписан целиком.',
         'save_as_btn': '💾 Сохранить как…',
         'save_btn': '💾 Сохранить',
         'save_txt_separately_btn': '💾 Сохранить отдельно в .txt…',
@@ -948,6 +950,8 @@ XTTS работает через Python и требует тяжелых биб
         'overwrite_btn': '💾 Overwrite file…',
         'overwrite_cmp_btn': '💾 Overwrite file',
         'miz_backup_label': 'Create backup',
+        'miz_incremental_label': 'Fast save (append changes)',
+        'miz_incremental_tooltip': 'Append only changed files to the end of the archive.\nOnce enough stale data accumulates, the archive is fully rewritten.',
         'save_as_btn': '💾 Save as…',
         'save_btn': '💾 Save',
         'save_txt_separately_btn': '💾 Save separately to .txt…',
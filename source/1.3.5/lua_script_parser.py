@@ -13,6 +13,14 @@ import os
 import zipfile
 import tempfile
 
+from miz_archive import copy_member_raw
+from miz_index import get_archive_index, invalidate_archive
+from parse_cache import get_parse_cache, member_key
+
+# Версия разбора — часть ключа дискового кэша (parse_cache); менять при изменении
+# _has_translatable / _extract_from_content
+LUA_PARSER_VERSION = 1
+
 
 class LuaScriptParser:
     """Парсер Lua скриптов для извлечения переводимого текста из DCS миссий"""
@@ -50,20 +58,33 @@ class LuaScriptParser:
         """
         try:
             with zipfile.ZipFile(miz_path, 'r') as zf:
-                for info in zf.infolist():
-                    name = self._fix_filename(info.filename)
-                    if not name.lower().endswith('.lua'):
-                        continue
-                    try:
-                        content = zf.read(info.filename).decode('utf-8')
-                    except Exception:
-                        continue
-                    if self._has_translatable(content):
+                for info in get_archive_index(miz_path, zf).lua_members:
+                    if self._is_translatable_member(zf, info):
                         return True
         except Exception as e:
             print(f"WARNING: Lua quick_scan failed: {e}")
         return False
 
+    def _is_translatable_member(self, zf, info, content=None):
+        """_has_translatable для файла архива с дисковым кэшем по CRC32/размеру.
+        content — уже прочитанное содержимое (чтобы не распаковывать файл повторно).
+
+        Returns:
+            bool или None, если файл не удалось прочитать
+        """
+        cache = get_parse_cache()
+        cached = cache.get('lua_translatable', info, LUA_PARSER_VERSION)
+        if cached is not None:
+            return cached
+        if content is None:
+            try:
+                content = zf.read(info.filename).decode('utf-8')
+            except Exception:
+                return None
+        result = self._has_translatable(content)
+        cache.put('lua_translatable', info, LUA_PARSER_VERSION, result)
+        return result
+
     # ──────────────────────────────────────────────
     #  Полное сканирование
     # ──────────────────────────────────────────────
@@ -72,25 +93,29 @@ class LuaScriptParser:
         """Сканирует .miz архив и возвращает все Lua файлы с переводимым текстом.
 
         Returns:
-            dict: {display_path: {'content': str, 'archive_name': str}}
+            dict: {display_path: {'content': str, 'archive_name': str, 'member': tuple}}
                   display_path  — исправленный путь для отображения
                   archive_name  — оригинальное имя в архиве (для zipfile.read)
+                  member        — (имя, CRC32, размер) для кэша разбора
         """
         lua_files = {}
         try:
             with zipfile.ZipFile(miz_path, 'r') as zf:
-                for info in zf.infolist():
-                    display_name = self._fix_filename(info.filename)
-                    if not display_name.lower().endswith('.lua'):
+                cache = get_parse_cache()
+                for info in get_archive_index(miz_path, zf).lua_members:
+                    # Файлы без переводимого текста по кэшу даже не распаковываются
+                    if cache.get('lua_translatable', info, LUA_PARSER_VERSION) is False:
                         continue
+                    display_name = self._fix_filename(info.filename)
                     try:
                         content = zf.read(info.filename).decode('utf-8')
                     except Exception:
                         continue
-                    if self._has_translatable(content):
+                    if self._is_translatable_member(zf, info, content):
                         lua_files[display_name] = {
                             'content': content,
                             'archive_name': info.filename,
+                            'member': member_key(info),
                         }
         except Exception as e:
             print(f"ERROR: Failed to scan miz for Lua: {e}")
@@ -117,9 +142,15 @@ class LuaScriptParser:
         marker_map = {}
         marker_counter = 0
 
+        cache = get_parse_cache()
         for file_path in sorted(lua_files.keys()):
             content = lua_files[file_path]['content']
-            entries = self._extract_from_content(content)
+            member = lua_files[file_path].get('member')
+            entries = cache.get('lua_entries', member, LUA_PARSER_VERSION) if member else None
+            if entries is None:
+                entries = self._extract_from_content(content)
+                if member:
+                    cache.put('lua_entries', member, LUA_PARSER_VERSION, entries)
 
             if not entries:
                 continue
@@ -217,10 +248,12 @@ class LuaScriptParser:
                                 item.flag_bits |= 0x800
                             except (UnicodeEncodeError, UnicodeDecodeError):
                                 pass
-                            zout.writestr(item, zin.read(original_name))
+                            copy_member_raw(zin, zout, item, original_name)
 
             # Atomic replace
+            invalidate_archive(miz_path)
             os.replace(temp_miz, miz_path)
+            invalidate_archive(miz_path)
             print(f"✅ Lua rewrite: {files_modified} files, {strings_replaced} strings")
 
         except Exception as e:
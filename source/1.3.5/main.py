@@ -11,7 +11,6 @@ import logging
 import zipfile
 import shutil
 import tempfile
-import copy
 import pygame
 from datetime import datetime
 
@@ -103,20 +102,20 @@ def resource_path(relative_path):
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QTextEdit, QPushButton, QFileDialog,
                              QLabel, QMessageBox, QSplitter, QGroupBox, QMenu,
-                             QScrollArea, QFrame, QPlainTextEdit, QLineEdit,
+                             QFrame, QPlainTextEdit, QLineEdit,
                              QSizePolicy, QDialog, QToolTip, QGridLayout, QComboBox, QProgressBar, QTextBrowser, QShortcut, QToolButton, QWidgetAction)
 
 # QScrollBar будет импортирован из widgets
 
 # Импорты для локализации
 from localization import get_translation
-from PyQt5.QtCore import Qt, pyqtSignal, QTimer, QPropertyAnimation, QRect, QEasingCurve, QPoint, pyqtProperty, QEvent, QUrl, QSize
+from PyQt5.QtCore import Qt, pyqtSignal, QTimer, QPropertyAnimation, QAbstractAnimation, QRect, QEasingCurve, QPoint, pyqtProperty, QEvent, QUrl, QSize
 from PyQt5.QtGui import QFont, QTextCursor, QColor, QPalette, QPainter, QBrush, QPixmap, QPen, QMovie, QPainterPath, QRegion, QDesktopServices, QFontInfo, QFontMetrics, QIcon, QTextCharFormat, QTextFormat, QKeySequence
 from PyQt5.QtCore import QRectF
 from PyQt5.QtNetwork import QLocalServer, QLocalSocket
 
 # Импорты модулей
-from widgets import (LineNumberArea, NumberedTextEdit, CustomScrollBar,
+from widgets import (LineNumberArea, NumberedTextEdit, CustomScrollBar, VirtualScrollArea,
                     ToggleSwitch, LanguageToggleSwitch, CustomToolTip, ClickableLine, ClickableLabel, CustomImageButton, PreviewTextEdit, CustomSplitter, SearchPopup)
 from dialogs import (CustomDialog, MizFolderDialog,
                     MizProgressDialog, AboutWindow, InstructionsWindow, AIContextWindow, DeleteConfirmDialog, AudioPlayerDialog, FilesWindow, BriefingWindow,
@@ -124,10 +123,22 @@ from dialogs import (CustomDialog, MizFolderDialog,
 from tts_engine import TTSEngine, TTSInitWorker, TTSAudioCache
 from error_logger import ErrorLogger
 from version import VersionInfo
-from parser import LuaDictionaryParser
+from parser import LuaDictionaryParser, DICTIONARY_PARSER_VERSION, escape_lua_string, iter_dictionary_chunks, write_dictionary_stream
+from parse_cache import get_parse_cache
+from scratch_area import get_scratch_area
+from line_store import LineRecord, KeyIndex, fork_locale_lines
+from key_filter import KeyFilter
+from search_index import SearchIndex, SEARCH_DEBOUNCE_MS, SEARCH_DEBOUNCE_MIN_LINES
+from preview_model import (PreviewRowModel, group_line_indices, paragraph_lengths, estimate_lengths_height,
+                           MIN_ROW_HEIGHT, META_HEADER_HEIGHT, META_AUDIO_HEIGHT, ROW_HORIZONTAL_MARGINS,
+                           DEFAULT_COLUMN_WIDTH, PREVIEW_OVERSCAN_PX, PREVIEW_JUMP_MARGIN_PX, PREVIEW_SPACER_MAX_PX,
+                           PREVIEW_ESTIMATE_DELAY_MS)
 from parserCMP import CampaignParser
 from Context import AI_CONTEXTS
 from miz_resources import MizResourceManager
+from miz_archive import copy_member_raw, content_matches_member, check_append_update, append_update_archive
+from miz_index import get_archive_index, invalidate_archive, pooled_archive
+from resource_workers import pause_all_pools, resume_all_pools
 
 class LineWidget(QWidget):
     """Виджет для рисования тонкой оранжевой линии"""
@@ -243,6 +254,7 @@ QPushButton:hover {{
         self.search_match_types = [] # Типы совпадений: 'text' или 'audio'
         self.current_match_index = -1 # Текущий индекс в search_matches
         self.highlighted_audio_key = None  # Ключ файла, выделенного в поиске
+        self.search_index = SearchIndex()  # Тексты строк по областям поиска (casefold)
         self.STANDARD_LOCALES = ["DEFAULT", "RU", "EN", "FR", "DE", "CN", "CS", "ES", "JP", "KO"]
         self.current_bookmark_nav_index = -1 # Индекс текущей закладки в навигации
         self.original_lines = []
@@ -367,6 +379,11 @@ QPushButton:hover {{
         self.reference_data = {}  # key -> [parts...]
         self.cmp_reference_data = {}  # key -> [parts...] frozen at load time for .cmp
         self.is_dictionary_mode = False # Флаг режима открытия одиночного словаря
+
+        # Папки извлечённых ресурсов от прошлых (в т.ч. аварийно завершённых) запусков
+        removed_sessions = get_scratch_area().cleanup_stale_sessions()
+        if removed_sessions:
+            print(f"Scratch: removed {removed_sessions} stale session folder(s)")
         
         # Флаг для защиты только что вставленных пустых строк от удаления фильтром
         self.suppress_empty_filter_for_indices = set()
@@ -409,6 +426,9 @@ QPushButton:hover {{
         if getattr(self, 'is_initializing', False) and state:
             return  # Игнорируем изменения во время инициализации
             
+        if state:
+            # Строки могли измениться — индекс поиска сверит переводы при следующем запросе
+            self.search_index.mark_stale()
         if self.has_unsaved_changes != state:
             self.has_unsaved_changes = state
             # Обновляем заголовок или статусную строку если нужно
@@ -471,12 +491,29 @@ QPushButton:hover {{
         # [SMART PASTE] Перехват Ctrl+V для вставки маркеров 🔹
         self.translated_text_all.installEventFilter(self)
 
-        # Батчевая отрисовка предпросмотра для производительности
-        self.preview_groups_queue = []
-        # Маппинг key -> group_widget для селективного апдейта превью
+        # Виртуализированный предпросмотр: виджеты только для видимых групп
+        # (модель групп и высот — PreviewRowModel, окно созданных групп — _preview_window)
+        self.preview_row_model = None
+        self._preview_window = (0, 0)
+        self._preview_spacers = None
+        self._preview_anchor = None
+        self._is_refreshing_preview_window = False
+        self._is_syncing_preview_document_bar = False
+        self._preview_key_indices_cache = None
+        # Маппинг key -> group_widget для селективного апдейта превью (только созданные группы)
         self.preview_key_to_group_widget = {}
-        self.preview_batch_timer = QTimer(self)
-        self.preview_batch_timer.timeout.connect(self.render_preview_batch)
+        # key -> (редакторы референса, редакторы перевода) созданных групп:
+        # sync_preview_incremental работает по ним, без обхода дочерних виджетов
+        self.preview_group_editors = {}
+        self.preview_window_timer = QTimer(self)
+        self.preview_window_timer.setSingleShot(True)
+        self.preview_window_timer.timeout.connect(self.refresh_preview_window)
+        # Пересчёт оценок высот после изменения ширин колонок (один раз, когда перетаскивание затихло)
+        self.preview_estimate_timer = QTimer(self)
+        self.preview_estimate_timer.setSingleShot(True)
+        self.preview_estimate_timer.timeout.connect(self._on_preview_estimate_timer)
+        # текст -> длины абзацев (paragraph_lengths) для оценки высот групп
+        self._preview_text_lengths = {}
         
         # Debounce для предпросмотра (иначе тяжело перерисовывать на каждый символ)
         self.preview_update_timer = QTimer(self)
@@ -494,6 +531,12 @@ QPushButton:hover {{
         # При авто-фильтрации по таймеру используем инкрементальное обновление
         self.filter_debounce_timer.timeout.connect(lambda: self.apply_filters(full_rebuild=False))
         
+        # Debounce для поля поиска на больших словарях (см. schedule_search)
+        self.search_debounce_timer = QTimer(self)
+        self.search_debounce_timer.setSingleShot(True)
+        self.search_debounce_timer.timeout.connect(
+            lambda: self.on_search_text_changed(self.search_input.text(), narrow=True))
+        
         # Статусная строка с цветом #3d4256
         self.statusBar().setStyleSheet('''
             QStatusBar {
@@ -649,6 +692,9 @@ QPushButton:hover {{
             self.translated_text_all.update()
             self.preview_content.update()
             
+            # Высоты полей предпросмотра, отложенные на время изменения размера, — одним проходом
+            PreviewTextEdit.run_height_pass()
+            
             # Обновляем стили рамок после изменения размера
             self.update_border_styles()
             
@@ -743,13 +789,14 @@ QPushButton:hover {{
         '''
         self.translated_text_all.setStyleSheet(translated_style)
         
-        # Предпросмотр
+        # Предпросмотр (повторная установка той же таблицы заново полирует все поля)
         preview_style = '''
             background-color: #505050; 
             border: 1px solid #777; 
             border-radius: 6px;
         '''
-        self.preview_content.setStyleSheet(preview_style)
+        if self.preview_content.styleSheet() != preview_style:
+            self.preview_content.setStyleSheet(preview_style)
     
     def changeEvent(self, event):
         """Отслеживает изменение состояния окна (фокус/активность) для смены цвета рамки"""
@@ -843,8 +890,8 @@ QPushButton:hover {{
         # Если высота превью (второй элемент) стала равна 0
         if sizes and len(sizes) > 1 and sizes[1] == 0:
             self.preview_collapsed = True
-            if hasattr(self, 'preview_batch_timer'):
-                self.preview_batch_timer.stop()
+            if hasattr(self, 'preview_window_timer'):
+                self.preview_window_timer.stop()
         else:
             was_collapsed = getattr(self, 'preview_collapsed', False)
             self.preview_collapsed = False
@@ -871,8 +918,8 @@ QPushButton:hover {{
             
             # Очищаем память
             self.preview_collapsed = True
-            if hasattr(self, 'preview_batch_timer'):
-                self.preview_batch_timer.stop()
+            if hasattr(self, 'preview_window_timer'):
+                self.preview_window_timer.stop()
             self.clear_preview_widgets()
             self.preview_info.setText("")
         else:
@@ -1266,6 +1313,8 @@ QPushButton:hover {{
                         self.original_lines.pop(preview_idx)
 
         if changed:
+            # Состав original_lines мог измениться (добавленные/удалённые части)
+            self._preview_key_indices_cache = None
             self.set_modified(True)
             
             # Точечно обновляем виджеты для каждого ключа
@@ -1354,6 +1403,7 @@ QPushButton:hover {{
         
         # 4. Прокручиваем предпросмотр
         if hasattr(self, 'preview_key_to_group_widget'):
+            self.ensure_preview_key_rendered(found_key)
             widgets = self.preview_key_to_group_widget.get(found_key)
             if widgets:
                 # Берем первый виджет (meta_row) для прокрутки к нему
@@ -1421,15 +1471,13 @@ QPushButton:hover {{
                     edit.on_content_changed()
                 # Обновляем цвет виджета в соответствии с текущим состоянием
                 is_mod = new_text != l_data.get('original_translated_text', '')
-                color = self._get_translation_color(is_mod, l_data)
-                style = f"color: {color}; background-color: transparent; border: none; border-radius: 0px;"
-                edit.setStyleSheet(style)
-                edit._original_style = style
+                edit.set_preview_state(self._get_translation_state(is_mod, l_data))
             
             # b) Удаляем лишние виджеты
             if len(edits) > len(key_preview_indices):
                 for i in range(len(key_preview_indices), len(edits)):
                     edit = edits[i]
+                    self._unregister_preview_editor(key, edit)
                     trl.removeWidget(edit)
                     edit.deleteLater()
             
@@ -1452,10 +1500,7 @@ QPushButton:hover {{
                     
                     # Стиль (упрощенно как в update_preview)
                     is_mod = t_text != l_data.get('original_translated_text', '')
-                    color = self._get_translation_color(is_mod, l_data)
-                    style = f"color: {color}; background-color: transparent; border: none; border-radius: 0px;"
-                    new_edit.setStyleSheet(style)
-                    new_edit._original_style = style
+                    new_edit.set_preview_state(self._get_translation_state(is_mod, l_data))
                     
                     # Подключаем сигналы
                     new_edit.text_changed.connect(
@@ -1474,6 +1519,7 @@ QPushButton:hover {{
                     # В нашей структуре stretch обычно в конце
                     insert_pos = trl.count() - 1 # Перед stretch
                     trl.insertWidget(insert_pos, new_edit, 0, Qt.AlignTop)
+                    self._register_preview_editor(key, new_edit)
             
             # 4. После изменений во ВСЕХ группах, нужно обновить индексы у ВСЕХ виджетов ниже
             # Но _apply_briefing_result вызывает это последовательно.
@@ -1547,10 +1593,7 @@ QPushButton:hover {{
                         updated_any = True
                     # Обновляем цвет виджета
                     is_mod = new_text != l_data.get('original_translated_text', '')
-                    color = self._get_translation_color(is_mod, l_data)
-                    style = f"color: {color}; background-color: transparent; border: none; border-radius: 0px;"
-                    edit.setStyleSheet(style)
-                    edit._original_style = style
+                    edit.set_preview_state(self._get_translation_state(is_mod, l_data))
             
             return True
         except Exception:
@@ -3775,7 +3818,8 @@ QPushButton:hover {{
         preview_layout.addWidget(headers_container)
         
         # Поле предпросмотра с прокруткой
-        self.preview_scroll = QScrollArea()
+        # Содержимое — только видимые группы, полоса прокрутки — по модели высот
+        self.preview_scroll = VirtualScrollArea()
         self.preview_scroll.setFrameShape(QFrame.NoFrame)
         self.preview_scroll.setVerticalScrollBar(CustomScrollBar())
         self.preview_scroll.setHorizontalScrollBar(CustomScrollBar())
@@ -3803,11 +3847,11 @@ QPushButton:hover {{
         # Создаём три невидимые колонки с QSplitter внутри preview_content
         self.preview_splitter = CustomSplitter(Qt.Horizontal)
         self.preview_splitter.setHandleWidth(1)  # Тонкий разделитель в 1 пиксель
-        self.preview_splitter.setStyleSheet("background-color: transparent; border: none;")
+        # Прозрачный фон колонок и цвета полей PreviewTextEdit — одна таблица стилей
+        self._apply_preview_stylesheet()
 
         # Колонка 1: метаданные и ключи
         meta_col = QWidget()
-        meta_col.setStyleSheet('background-color: transparent; border: none;')
         self.preview_meta_layout = QVBoxLayout(meta_col)
         self.preview_meta_layout.setSpacing(0)
         self.preview_meta_layout.setContentsMargins(0, 0, 0, 0)
@@ -3816,7 +3860,6 @@ QPushButton:hover {{
 
         # Колонка 2: оригинальный текст
         orig_col = QWidget()
-        orig_col.setStyleSheet('background-color: transparent; border: none;')
         self.preview_orig_layout = QVBoxLayout(orig_col)
         self.preview_orig_layout.setSpacing(0)
         self.preview_orig_layout.setContentsMargins(0, 0, 0, 0)
@@ -3825,7 +3868,6 @@ QPushButton:hover {{
 
         # Колонка 3: переведённый текст
         trans_col = QWidget()
-        trans_col.setStyleSheet('background-color: transparent; border: none;')
         self.preview_trans_layout = QVBoxLayout(trans_col)
         self.preview_trans_layout.setSpacing(0)
         self.preview_trans_layout.setContentsMargins(0, 0, 0, 0)
@@ -3867,6 +3909,11 @@ QPushButton:hover {{
         try:
             self.preview_splitter.splitterMoved.connect(lambda pos, index: self.sync_preview_header_widths())
             self.preview_scroll.horizontalScrollBar().valueChanged.connect(lambda v: self.header_inner.move(-v, 0))
+            # Виртуализация: виджеты групп создаются при прокрутке и изменении размеров
+            self.preview_scroll.verticalScrollBar().valueChanged.connect(self._on_preview_scrolled)
+            self.preview_scroll.verticalScrollBar().rangeChanged.connect(lambda *_: self._on_preview_scroll_range_changed())
+            self.preview_scroll.document_bar.valueChanged.connect(self._on_preview_document_scrolled)
+            self.preview_splitter.splitterMoved.connect(lambda pos, index: self.schedule_preview_window_refresh())
             QTimer.singleShot(150, self.sync_preview_header_widths)
         except Exception:
             pass
@@ -4026,7 +4073,7 @@ QPushButton:hover {{
                 color: #808080;
             }
         """)
-        self.search_input.textChanged.connect(self.on_search_text_changed)
+        self.search_input.textChanged.connect(self.schedule_search)
         self.search_input.returnPressed.connect(self.search_next)
         
         # Добавляем функции удобства: выделение при фокусе и очистка по Esc
@@ -4222,6 +4269,7 @@ QPushButton:hover {{
                 
                 # Загружаем новые настройки
                 self.create_backup = settings.get('create_backup', False)
+                self.miz_incremental_save = settings.get('miz_incremental_save', False)
                 self.show_all_keys = settings.get('show_all_keys', False)
                 self.skip_locale_dialog = settings.get('skip_locale_dialog', False)
                 self.smart_paste_enabled = settings.get('smart_paste_enabled', True)
@@ -4418,6 +4466,7 @@ QPushButton:hover {{
                     'highlight_empty_color': getattr(self, 'highlight_empty_color', '#434343'),
                     'debug_logs_enabled': getattr(self, 'debug_logs_enabled', False),
                 'create_backup': getattr(self, 'create_backup', False),
+                'miz_incremental_save': getattr(self, 'miz_incremental_save', False),
                 'show_all_keys': getattr(self, 'show_all_keys', False),
                 'last_open_folder': getattr(self, 'last_open_folder', ''),
                 'last_save_folder': getattr(self, 'last_save_folder', ''),
@@ -5300,6 +5349,8 @@ QPushButton:hover {{
                     # Также форсируем обновление высоты если нужно
                     if hasattr(child, 'on_content_changed'):
                         child.on_content_changed()
+        # Оценки высот ещё не созданных групп зависят от шрифта
+        self.schedule_preview_window_refresh()
         
 
 
@@ -5559,90 +5610,96 @@ QPushButton:hover {{
             ErrorLogger.log_error("FILE_OPEN", error_msg)
             self.show_custom_dialog("Ошибка", error_msg, "error")
     
-    def parse_dictionary_file(self, content, progress=None):
-        """Парсит dictionary используя новый парсер LuaDictionaryParser"""
-        import tempfile
-
-        # Создаем временный файл для парсера
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.lua', delete=False, encoding='utf-8') as f:
-            f.write(content)
-            temp_file = f.name
-
-        try:
-            # Используем новый парсер
-            self.dictionary_parser = LuaDictionaryParser()
-            entries = self.dictionary_parser.parse_file(temp_file)
-
-            if progress: progress.set_value(75)
-
-            # Подготавливаем данные для редактирования
-            editing_dict = self.dictionary_parser.prepare_for_editing()
+    def parse_dictionary_file(self, content, progress=None, source_info=None):
+        """Парсит dictionary используя новый парсер LuaDictionaryParser
 
-            # Формируем all_lines_data (сохраняя совместимость с остальным кодом)
-            self.all_lines_data = []
-            self.original_lines = []
+        source_info — ZipInfo файла dictionary в .miz: по его CRC32 и размеру
+        результат разбора берётся из дискового кэша (parse_cache).
+        """
+        # Парсим прямо из памяти — без временного файла
+        self.dictionary_parser = LuaDictionaryParser()
+        entries = None
+        if source_info is not None:
+            cached = get_parse_cache().get('dictionary', source_info, DICTIONARY_PARSER_VERSION)
+            if cached is not None:
+                entries, self.dictionary_parser.total_lines_count = cached
+                self.dictionary_parser.entries = entries
+        if entries is None:
+            entries = self.dictionary_parser.parse_string(content)
+            if source_info is not None:
+                get_parse_cache().put('dictionary', source_info, DICTIONARY_PARSER_VERSION,
+                                      (entries, self.dictionary_parser.total_lines_count))
+
+        if progress: progress.set_value(75)
+
+        # Подготавливаем данные для редактирования
+        editing_dict = self.dictionary_parser.prepare_for_editing()
+
+        # Формируем all_lines_data (сохраняя совместимость с остальным кодом)
+        self.all_lines_data = []
+        self.original_lines = []
 
-            
+        
 
-            total_items = len(entries)
-            line_number = 0
-            for i, (key, (text_parts, file_lines, absolute_start_line)) in enumerate(entries.items()):
-                if progress and total_items > 0 and i % max(1, total_items // 10) == 0:
-                    prog_val = 75 + int((i / total_items) * 10)
-                    progress.set_value(prog_val)
-                    
-                # Вычисляем, весь ли ключ пустой (все части пустые)
-                key_all_empty = all(not (p and p.strip()) for p in text_parts)
-
-                for part_index, part in enumerate(text_parts):
-                    # Проверяем нужно ли переводить эту строку
-                    should_translate = self._should_translate_key(key)
-
-                    # Проверяем, пустая ли строка
-                    is_empty = not part.strip()
-
-                    line_data = {
-                        'key': key,
-                        'original_text': part,
-                        'display_text': part,
-                        'translated_text': part,
-                        'full_match': file_lines[part_index] if part_index < len(file_lines) else '',
-                        'indent': '',
-                        'start_pos': line_number if should_translate else absolute_start_line + part_index,
-                        'end_pos': (line_number + 1) if should_translate else (absolute_start_line + part_index + 1),
-                        'file_line_index': absolute_start_line + part_index, # Абсолютный индекс для системы
-                        'should_translate': should_translate,
-                        'is_empty': is_empty,
-                        'key_all_empty': key_all_empty,
-                        'ends_with_backslash': part.endswith('\\') if part else False,
-                        'is_multiline': False,
-                        'display_line_index': 0,
-                        'total_display_lines': 1,
-                        'original_translated_text': '', # Будет заполнено при загрузке локали
-                        'part_index': part_index  # Оригинальная позиция внутри ключа
-                    }
+        total_items = len(entries)
+        line_number = 0
+        key_filter = self._get_key_filter()
+        for i, (key, (text_parts, file_lines, absolute_start_line)) in enumerate(entries.items()):
+            if progress and total_items > 0 and i % max(1, total_items // 10) == 0:
+                prog_val = 75 + int((i / total_items) * 10)
+                progress.set_value(prog_val)
 
-                    self.all_lines_data.append(line_data)
+            # Один объект строки ключа на все части и все локали
+            key = sys.intern(key)
+                
+            # Вычисляем, весь ли ключ пустой (все части пустые)
+            key_all_empty = all(not (p and p.strip()) for p in text_parts)
+
+            for part_index, part in enumerate(text_parts):
+                # Проверяем нужно ли переводить эту строку
+                should_translate = key_filter.matches(key)
+
+                # Проверяем, пустая ли строка
+                is_empty = not part.strip()
+
+                line_data = LineRecord(
+                    key=key,
+                    original_text=part,
+                    display_text=part,
+                    translated_text=part,
+                    full_match=file_lines[part_index] if part_index < len(file_lines) else '',
+                    indent='',
+                    start_pos=line_number if should_translate else absolute_start_line + part_index,
+                    end_pos=(line_number + 1) if should_translate else (absolute_start_line + part_index + 1),
+                    file_line_index=absolute_start_line + part_index, # Абсолютный индекс для системы
+                    should_translate=should_translate,
+                    is_empty=is_empty,
+                    key_all_empty=key_all_empty,
+                    ends_with_backslash=part.endswith('\\') if part else False,
+                    is_multiline=False,
+                    display_line_index=0,
+                    total_display_lines=1,
+                    original_translated_text='', # Будет заполнено при загрузке локали
+                    part_index=part_index  # Оригинальная позиция внутри ключа
+                )
 
-                    # Если строка пустая - фильтруем (если включен фильтр)
-                    should_filter = is_empty and self.filter_empty
-                    include_in_original = should_translate and not should_filter
-                    
-                    # Если ключ полностью пустой и включен фильтр пропуска пустых ключей, не добавляем
-                    if key_all_empty and getattr(self, 'filter_empty_keys', True):
-                        include_in_original = False
+                self.all_lines_data.append(line_data)
 
-                    if include_in_original:
-                        self.original_lines.append(line_data)
-                        line_number += 1
+                # Если строка пустая - фильтруем (если включен фильтр)
+                should_filter = is_empty and self.filter_empty
+                include_in_original = should_translate and not should_filter
+                
+                # Если ключ полностью пустой и включен фильтр пропуска пустых ключей, не добавляем
+                if key_all_empty and getattr(self, 'filter_empty_keys', True):
+                    include_in_original = False
 
-            print(f"[STAT] Found lines in file: {len(self.all_lines_data)}")
-            print(f"[STAT] Lines for translation: {len(self.original_lines)}")
+                if include_in_original:
+                    self.original_lines.append(line_data)
+                    line_number += 1
 
-        finally:
-            # Удаляем временный файл
-            if os.path.exists(temp_file):
-                os.unlink(temp_file)
+        self._preview_key_indices_cache = None
+        print(f"[STAT] Found lines in file: {len(self.all_lines_data)}")
+        print(f"[STAT] Lines for translation: {len(self.original_lines)}")
 
 
     def save_cmp_file(self, target_path):
@@ -5659,11 +5716,7 @@ QPushButton:hover {{
             
             # Сохраняем текущее состояние в память перед сохранением всего файла
             if self.current_miz_folder:
-                self.miz_trans_memory[self.current_miz_folder] = {
-                    'original_lines': copy.deepcopy(self.original_lines),
-                    'all_lines_data': copy.deepcopy(self.all_lines_data),
-                    'original_content': self.original_content
-                }
+                self._store_current_locale_in_memory()
 
             # Собираем ВСЕ переводы из ВСЕХ локалей в памяти
             # Ключи в памяти могут быть в формате DEFAULT (name, description),
@@ -6004,59 +6057,39 @@ QPushButton:hover {{
         finally:
             self._suppress_preview_update = False
 
+    def _get_key_filter(self):
+        """Возвращает скомпилированный фильтр ключей (KeyFilter).
+        Состояние тогглов читается один раз; фильтр и его кэш по ключам
+        пересоздаются только при изменении настроек фильтров."""
+        signature = KeyFilter.signature_from_window(self)
+        key_filter = getattr(self, '_key_filter', None)
+        if key_filter is None or key_filter.signature != signature:
+            key_filter = KeyFilter(signature)
+            self._key_filter = key_filter
+        return key_filter
+
     def _should_translate_key(self, key):
         """Проверяет нужно ли переводить ключ по фильтрам"""
-        if hasattr(self, 'show_all_keys_cb') and self.show_all_keys_cb.isChecked():
-            return True
-
-        if hasattr(self, 'filter_action_text') and self.filter_action_text.isChecked() and 'ActionText' in key:
-            return True
-        elif hasattr(self, 'filter_action_radio') and self.filter_action_radio.isChecked() and 'ActionRadioText' in key:
-            return True
-        elif hasattr(self, 'filter_description') and self.filter_description.isChecked() and 'description' in key:
-            return True
-        elif hasattr(self, 'filter_subtitle') and self.filter_subtitle.isChecked() and 'subtitle' in key:
-            return True
-        elif hasattr(self, 'filter_sortie') and self.filter_sortie.isChecked() and 'sortie' in key:
-            return True
-        elif hasattr(self, 'filter_name') and self.filter_name.isChecked() and 'name' in key:
-            return True
-        else:
-            for custom_filter in self.custom_filters:
-                if custom_filter['checkbox'].isChecked():
-                    filter_text = custom_filter['line_edit'].text().strip()
-                    if filter_text and filter_text in key:
-                        return True
-            return False
+        return self._get_key_filter().matches(key)
 
     def parse_lua_file(self, content):
         """Парсит Lua файл с dictionary (использует новый парсер)"""
         self.parse_dictionary_file(content)
-    def load_miz_dictionary_data(self, miz_path, folder_name):
-        """Helper to load dictionary file from specific l10n folder in miz"""
+    def load_miz_dictionary_data(self, miz_path, folder_name, with_info=False):
+        """Helper to load dictionary file from specific l10n folder in miz
+
+        with_info=True — возвращает (содержимое, ZipInfo) для кэша разбора.
+        """
         try:
             with zipfile.ZipFile(miz_path, 'r') as miz_archive:
-                dict_path = f'l10n/{folder_name}/dictionary'
-                
-                # Проверяем прямой путь
-                if dict_path in miz_archive.namelist():
-                     with miz_archive.open(dict_path, 'r') as dict_file:
-                        return dict_file.read().decode('utf-8')
-
-                # Поиск с учетом регистра (как в open_miz_file)
-                dict_filename = 'dictionary'
-                folder_prefix = f'l10n/{folder_name.lower()}/'
-                
-                for item in miz_archive.infolist():
-                    name = item.filename
-                    try:
-                        name = name.encode('cp437').decode('utf-8')
-                    except (UnicodeEncodeError, UnicodeDecodeError):
-                        pass
-                        
-                    if name.lower().startswith(folder_prefix) and name.lower().endswith(dict_filename):
-                        with miz_archive.open(item.filename, 'r') as dict_file:
-                            return dict_file.read().decode('utf-8')
+                # Поиск без учета регистра по общему индексу архива (как в open_miz_file)
+                dict_path = get_archive_index(miz_path, miz_archive).find_dictionary(folder_name)
+                if dict_path is not None:
+                    with miz_archive.open(dict_path, 'r') as dict_file:
+                        content = dict_file.read().decode('utf-8')
+                    if with_info:
+                        return content, miz_archive.getinfo(dict_path)
+                    return content
                 
                 raise FileNotFoundError(f"Dictionary not found in {folder_name}")
         except Exception as e:
@@ -6104,11 +6137,7 @@ QPushButton:hover {{
                 
                 # 1. Сначала сохраняем текущее состояние если есть
                 if self.current_miz_folder:
-                     self.miz_trans_memory[self.current_miz_folder] = {
-                        'original_lines': copy.deepcopy(self.original_lines),
-                        'all_lines_data': copy.deepcopy(self.all_lines_data),
-                        'original_content': self.original_content
-                    }
+                     self._store_current_locale_in_memory()
                 
                 # 2. Берем данные из DEFAULT
                 default_data = None
@@ -6119,29 +6148,37 @@ QPushButton:hover {{
                 # Или загружаем из файла
                 else:
                     try:
-                        content = self.load_miz_dictionary_data(self.current_miz_path, "DEFAULT")
-                        self.parse_dictionary_file(content) # Парсим чтобы получить структуры
+                        content, dict_info = self.load_miz_dictionary_data(self.current_miz_path, "DEFAULT", with_info=True)
+                        self.parse_dictionary_file(content, source_info=dict_info) # Парсим чтобы получить структуры
+                        # Свежеразобранные строки ни с кем не разделены — копировать не нужно
                         default_data = {
-                            'original_lines': copy.deepcopy(self.original_lines),
-                            'all_lines_data': copy.deepcopy(self.all_lines_data),
-                            'original_content': content
+                            'original_lines': self.original_lines,
+                            'all_lines_data': self.all_lines_data,
+                            'original_content': content,
+                            'shared': False
                         }
                     except Exception as e:
                         # Если DEFAULT нет (странно), берем текущее
                         print(f"WARNING: DEFAULT locale not found, copying current. Error: {e}")
-                        default_data = {
-                            'original_lines': copy.deepcopy(self.original_lines),
-                            'all_lines_data': copy.deepcopy(self.all_lines_data),
+                        default_data = self.miz_trans_memory.get(self.current_miz_folder) or {
+                            'original_lines': self.original_lines,
+                            'all_lines_data': self.all_lines_data,
                             'original_content': self.original_content
                         }
 
                 # 3. Применяем данные к новой локали
-                self.original_lines = copy.deepcopy(default_data['original_lines'])
-                self.all_lines_data = copy.deepcopy(default_data['all_lines_data'])
+                # Строки из памяти принадлежат другой локали: копируем каждую запись один раз
+                # (вместо трёх deepcopy всего словаря)
+                if default_data.get('shared', True):
+                    self.all_lines_data, self.original_lines = fork_locale_lines(
+                        default_data['all_lines_data'], default_data['original_lines'])
+                else:
+                    self.all_lines_data = default_data['all_lines_data']
+                    self.original_lines = default_data['original_lines']
                 self.original_content = default_data['original_content']
                 try:
                     for ln in self.original_lines:
-                        if isinstance(ln, dict):
+                        if isinstance(ln, (dict, LineRecord)):
                             # Заполняем перевод оригинальным текстом из DEFAULT
                             ln['translated_text'] = ln.get('original_text', '')
                             ln['original_translated_text'] = ''
@@ -6151,7 +6188,7 @@ QPushButton:hover {{
                     pass
                 try:
                     for ln in self.all_lines_data:
-                        if isinstance(ln, dict):
+                        if isinstance(ln, (dict, LineRecord)):
                             ln['translated_text'] = ln.get('original_text', '')
                             ln['original_translated_text'] = ''
                             ln['display_text'] = ln.get('original_text', '')
@@ -6168,7 +6205,7 @@ QPushButton:hover {{
                 
                 # 4.1 Обновляем ресурсы для новой локали (синхронизация подсветки)
                 try:
-                    with zipfile.ZipFile(self.current_miz_path, 'r') as miz_archive:
+                    with pooled_archive(self.current_miz_path) as miz_archive:
                         self.miz_resource_manager.update_locale(miz_archive, target_locale)
                 except Exception as e:
                     print(f"WARNING: Ошибка обновления ресурсов при создании локали: {e}")
@@ -6195,11 +6232,7 @@ QPushButton:hover {{
             # Стандартное переключение
             # 1. Save current state to memory
             if self.current_miz_folder:
-                self.miz_trans_memory[self.current_miz_folder] = {
-                    'original_lines': copy.deepcopy(self.original_lines),
-                    'all_lines_data': copy.deepcopy(self.all_lines_data),
-                    'original_content': self.original_content
-                }
+                self._store_current_locale_in_memory()
             
             # 2. Load new state
             if new_folder in self.miz_trans_memory:
@@ -6210,9 +6243,9 @@ QPushButton:hover {{
                 print(f"DEBUG: Loaded {new_folder} from memory")
             else:
                 # Load from file
-                content = self.load_miz_dictionary_data(self.current_miz_path, new_folder)
+                content, dict_info = self.load_miz_dictionary_data(self.current_miz_path, new_folder, with_info=True)
                 self.original_content = content
-                self.parse_dictionary_file(content)
+                self.parse_dictionary_file(content, source_info=dict_info)
                 print(f"DEBUG: Loaded {new_folder} from file")
                 # Initialize original_translated_text for change tracking (file-load only)
                 for line in self.all_lines_data:
@@ -6224,7 +6257,7 @@ QPushButton:hover {{
             # 3.1 Обновляем mapResource для новой локали
             if self.current_miz_path:
                 try:
-                    with zipfile.ZipFile(self.current_miz_path, 'r') as miz_archive:
+                    with pooled_archive(self.current_miz_path) as miz_archive:
                         self.miz_resource_manager.update_locale(miz_archive, new_folder)
                 except Exception as e:
                     print(f"WARNING: Ошибка обновления ресурсов при смене локали: {e}")
@@ -6258,6 +6291,21 @@ QPushButton:hover {{
             self.is_switching_locale = False
             self.update_delete_button_visibility()
 
+    def _store_current_locale_in_memory(self):
+        """Сохраняет состояние текущей локали в miz_trans_memory без копирования.
+
+        Списки строк передаются по ссылке: после переключения локали они больше
+        не редактируются, а при возврате к локали снова становятся рабочими.
+        Копии записей создаются только при создании новой локали (fork_locale_lines).
+        """
+        if not self.current_miz_folder:
+            return
+        self.miz_trans_memory[self.current_miz_folder] = {
+            'original_lines': self.original_lines,
+            'all_lines_data': self.all_lines_data,
+            'original_content': self.original_content
+        }
+
     def update_delete_button_visibility(self):
         """Обновляет видимость кнопки удаления в зависимости от выбранной локали"""
         # Для .miz (Row 2)
@@ -6348,7 +6396,7 @@ QPushButton:hover {{
             # Удаляем pending_files с путями удалённой локали
             keys_to_remove = [k for k in self.miz_resource_manager.pending_files if k.startswith(prefix)]
             for k in keys_to_remove:
-                del self.miz_resource_manager.pending_files[k]
+                self.miz_resource_manager.discard_pending_file(k)
             # Удаляем файлы, помеченные на удаление из этой локали
             self.miz_resource_manager.files_to_delete = {
                 p for p in self.miz_resource_manager.files_to_delete if not p.startswith(prefix)
@@ -6465,6 +6513,10 @@ QPushButton:hover {{
             print(f"ОТКРЫТИЕ .MIZ ФАЙЛА: {os.path.basename(file_path)}")
             print(f"{'='*50}")
             
+            # Закрываем дескрипторы предыдущего архива
+            if getattr(self, 'current_miz_path', None):
+                invalidate_archive(self.current_miz_path)
+
             # Сохраняем путь к .miz файлу
             self.current_miz_path = file_path
             self.add_to_recent(file_path)
@@ -6481,6 +6533,9 @@ QPushButton:hover {{
             try:
                 # Открываем .miz файл как ZIP-архив
                 with zipfile.ZipFile(file_path, 'r') as miz_archive:
+                    # Индекс имён строится один раз и используется всеми загрузчиками
+                    invalidate_archive(file_path)
+                    archive_index = get_archive_index(file_path, miz_archive)
                     progress.set_value(20)
                     
                     # Парсим ресурсы миссии (связи audio↔subtitle, mapResource)
@@ -6499,20 +6554,7 @@ QPushButton:hover {{
                     progress.set_value(30)
                     
                     # Сканируем доступные папки локализации в l10n/
-                    l10n_folders = set()
-                    for item in miz_archive.infolist():
-                        # Исправляем кодировку имени файла (CP437 -> UTF-8), если нужно
-                        name = item.filename
-                        try:
-                            name = name.encode('cp437').decode('utf-8')
-                        except (UnicodeEncodeError, UnicodeDecodeError):
-                            pass
-                            
-                        if name.startswith('l10n/') and '/' in name[5:]:
-                            folder_name = name[5:].split('/')[0]
-                            l10n_folders.add(folder_name)
-                    
-                    l10n_folders = sorted(list(l10n_folders))
+                    l10n_folders = list(archive_index.locale_folders)
                     print(f"DEBUG: Found l10n folders: {l10n_folders}")
                     progress.set_value(40)
                     
@@ -6560,33 +6602,19 @@ QPushButton:hover {{
                     progress.set_value(50)
                     
                     # Проверяем наличие файла dictionary по выбранному пути
-                    if dict_path not in miz_archive.namelist():
-                        # Ищем альтернативные пути (на случай разных регистров)
-                        found = False
-                        dict_filename = os.path.basename(dict_path).lower()
-                        folder_prefix = os.path.dirname(dict_path).lower() + '/'
-                        
-                        for item in miz_archive.infolist():
-                            # Исправляем кодировку
-                            name = item.filename
-                            try:
-                                name = name.encode('cp437').decode('utf-8')
-                            except (UnicodeEncodeError, UnicodeDecodeError):
-                                pass
-
-                            if name.lower().startswith(folder_prefix) and name.lower().endswith(dict_filename):
-                                dict_path = item.filename # Используем оригинальное имя из архива
-                                print(f"⚠ Найден dictionary по альтернативному пути: {dict_path}")
-                                found = True
-                                break
-                        
-                        if not found:
-                            raise FileNotFoundError(f"Файл dictionary не найден по пути {dict_path}")
+                    # (без учета регистра, с альтернативными именами — по индексу)
+                    found_dict_path = archive_index.find_dictionary(self.current_miz_folder)
+                    if found_dict_path is None:
+                        raise FileNotFoundError(f"Файл dictionary не найден по пути {dict_path}")
+                    if found_dict_path != dict_path:
+                        print(f"⚠ Найден dictionary по альтернативному пути: {found_dict_path}")
+                    dict_path = found_dict_path  # Используем оригинальное имя из архива
                     progress.set_value(60)
                     
                     # Читаем содержимое dictionary
                     with miz_archive.open(dict_path, 'r') as dict_file:
                         self.original_content = dict_file.read().decode('utf-8')
+                    dict_info = miz_archive.getinfo(dict_path)
                     
                     print(f"✅ Файл dictionary успешно извлечен из {dict_path}")
                     print(f"📏 Размер файла: {len(self.original_content)} байт")
@@ -6626,7 +6654,6 @@ QPushButton:hover {{
             # Загружаем reference данные из .miz (с диска, read-only)
             # ВАЖНО: делаем это ДО parse_dictionary_file, чтобы фильтрация пустых строк знала о референсе
             try:
-                self.reference_loader.clear_cache()
                 self.reference_data = self.reference_loader.load_locale_from_miz(
                     file_path, target_ref_locale
                 )
@@ -6635,7 +6662,7 @@ QPushButton:hover {{
                 self.reference_data = {}
 
             # Теперь парсим основной словарь
-            self.parse_dictionary_file(self.original_content, progress=progress)
+            self.parse_dictionary_file(self.original_content, progress=progress, source_info=dict_info)
             
             if self.all_lines_data:
                 self.apply_filters(progress=progress)
@@ -6717,7 +6744,6 @@ QPushButton:hover {{
         """Парсит файл кампании (.cmp) используя CampaignParser"""
         try:
             from parserCMP import CampaignParser
-            import copy
             parser = CampaignParser()
             
             # Получаем все данные из файла
@@ -6740,7 +6766,7 @@ QPushButton:hover {{
                 if lang not in locales_data:
                     locales_data[lang] = []
                 
-                locales_data[lang].append(copy.deepcopy(line_data))
+                locales_data[lang].append(line_data)
             
             # Замораживаем референсные данные ПЕРЕД тем, как они начнут меняться при редактировании
             # Это аналог reference_data для .miz
@@ -6766,8 +6792,8 @@ QPushButton:hover {{
                     line['original_translated_text'] = line.get('translated_text', '')
                 
                 self.miz_trans_memory[lang] = {
-                    'original_lines': copy.deepcopy(lines),
-                    'all_lines_data': copy.deepcopy(lines),
+                    'original_lines': list(lines),
+                    'all_lines_data': lines,
                     'original_content': content # Весь файл для базы
                 }
             
@@ -6806,26 +6832,27 @@ QPushButton:hover {{
         for i, line in enumerate(lines):
             line = line.strip()
             if line:
-                line_data = {
-                    'key': f'Line_{i+1:04d}',
-                    'original_text': line,
-                    'display_text': line,
-                    'translated_text': line,
-                    'full_match': line,
-                    'indent': '',
-                    'start_pos': 0,
-                    'end_pos': len(line),
-                    'should_translate': True,
-                    'is_empty': False,
-                    'ends_with_backslash': False,
-                    'is_multiline': False,
-                    'display_line_index': i,
-                    'total_display_lines': 1,
-                    'part_index': i
-                }
+                line_data = LineRecord(
+                    key=f'Line_{i+1:04d}',
+                    original_text=line,
+                    display_text=line,
+                    translated_text=line,
+                    full_match=line,
+                    indent='',
+                    start_pos=0,
+                    end_pos=len(line),
+                    should_translate=True,
+                    is_empty=False,
+                    ends_with_backslash=False,
+                    is_multiline=False,
+                    display_line_index=i,
+                    total_display_lines=1,
+                    part_index=i
+                )
                 
                 self.all_lines_data.append(line_data)
                 self.original_lines.append(line_data)
+        self._preview_key_indices_cache = None
     
     def apply_filters(self, full_rebuild=True, progress=None):
         """Применяет выбранные фильтры к данным"""
@@ -6852,6 +6879,14 @@ QPushButton:hover {{
         # Флаг для приоритета аудио
         audio_filter_active = getattr(self, 'filter_audio_keys_cb', None) and self.filter_audio_keys_cb.isChecked()
         
+        # Агрегаты по ключам (части / есть ли текст / есть ли аудио) — один линейный проход
+        # вместо повторного сканирования всего словаря для каждой строки
+        key_index = KeyIndex(self.all_lines_data)
+        audio_resolver = self.miz_resource_manager.get_audio_for_key if self.miz_resource_manager else (lambda key: None)
+        # Ключи, уже попавшие в original_lines на этом проходе
+        added_keys = set()
+        key_filter = self._get_key_filter()
+        
         total_lines = len(self.all_lines_data)
         for idx, line_data in enumerate(self.all_lines_data):
             if progress and total_lines > 0 and idx % max(1, total_lines // 15) == 0:
@@ -6863,33 +6898,16 @@ QPushButton:hover {{
             
             # Проверяем наличие аудио для этого ключа (чтобы использовать в приоритетной логике)
             if audio_filter_active:
-                if self.miz_resource_manager and self.miz_resource_manager.get_audio_for_key(line_data.get('key', '')):
+                if key_index.has_audio(line_data.get('key', ''), audio_resolver):
                     has_audio = True
             
             if show_all:
                 should_translate = True
             elif audio_filter_active and has_audio:
                 should_translate = True
-            elif self.filter_action_text.isChecked() and 'ActionText' in line_data['key']:
-                should_translate = True
-            elif self.filter_action_radio.isChecked() and 'ActionRadioText' in line_data['key']:
-                should_translate = True
-            elif self.filter_description.isChecked() and 'description' in line_data['key']:
-                should_translate = True
-            elif self.filter_subtitle.isChecked() and 'subtitle' in line_data['key']:
-                should_translate = True
-            elif self.filter_sortie.isChecked() and 'sortie' in line_data['key']:
+            elif key_filter.matches(line_data['key']):
+                # Стандартные и произвольные фильтры (результат кэшируется по ключу)
                 should_translate = True
-            elif self.filter_name.isChecked() and 'name' in line_data['key']:
-                should_translate = True
-            else:
-                # Проверяем произвольные фильтры
-                for custom_filter in self.custom_filters:
-                    if custom_filter['checkbox'].isChecked():
-                        filter_text = custom_filter['line_edit'].text().strip()
-                        if filter_text and filter_text in line_data['key']:
-                            should_translate = True
-                            break
             
             # === Фильтр пустых строк ===
             exclude_reason = None
@@ -6909,14 +6927,7 @@ QPushButton:hover {{
                 if getattr(self, 'filter_empty_keys', True) and should_translate:
                     # Находим все строки для этого ключа, чтобы убедиться, что ни в одной нет текста (оригинала ИЛИ перевода)
                     key = line_data.get('key')
-                    has_any_content = False
-                    for ld in self.all_lines_data:
-                        if ld.get('key') == key:
-                            orig_text = ld.get('original_text', '').strip()
-                            trans_text = ld.get('translated_text', '').strip()
-                            if orig_text or trans_text:
-                                has_any_content = True
-                                break
+                    has_any_content = key_index.has_content(key)
                                 
                     is_truly_empty_key = not has_any_content
                     # has_audio уже вычислен в начале цикла с учетом аудио-фильтра
@@ -6936,16 +6947,12 @@ QPushButton:hover {{
             # НО ТОЛЬКО ЕСЛИ ВКЛЮЧЕН ФИЛЬТР АУДИО
             if not show_all and not should_translate and audio_filter_active:
                 key = line_data.get('key')
-                has_audio = bool(self.miz_resource_manager.get_audio_for_key(key))
+                has_audio = key_index.has_audio(key, audio_resolver)
                 if has_audio:
                     # Если это первая часть ключа (part_index == 0)
                     if line_data.get('part_index') == 0:
                         # Проверяем, не был ли этот ключ уже добавлен (через другие части)
-                        already_added = False
-                        for added in self.original_lines:
-                            if added.get('key') == key:
-                                already_added = True
-                                break
+                        already_added = key in added_keys
                         
                         if not already_added:
                             # Принудительно оставляем, но помечаем что ввод нужно скрыть
@@ -6955,6 +6962,7 @@ QPushButton:hover {{
             
             if should_translate:
                 self.original_lines.append(line_data)
+                added_keys.add(line_data.get('key'))
             else:
                 # Log diagnostic info for excluded lines when filtering is active
                 try:
@@ -6973,6 +6981,7 @@ QPushButton:hover {{
         
         # Очищаем флаг защиты после применения фильтра
         self.suppress_empty_filter_for_indices = set()
+        self._preview_key_indices_cache = None
         
         lines_after = len(self.original_lines)
         log_msg = f"[APPLY_FILTERS] before={lines_before} after={lines_after} filter_empty={self.filter_empty} suppressed={len(suppress_indices)}"
@@ -7330,68 +7339,26 @@ QPushButton:hover {{
         """Generates lua dictionary content from specific lines data (for multi-locale save)
         Correctly handles multi-line entries by grouping them by key.
         """
-        # Группируем строки по ключу
-        translations = {}
-        for item in lines_data:
-            key = item['key']
-            if key not in translations:
-                translations[key] = []
-            
-            # Используем перевод, даже если он пустой ('')
-            # Падаем на оригинал только если данных о переводе вообще нет (None)
-            val = item.get('translated_text')
-            if val is None:
-                val = item.get('original_text', '')
-            
-            translations[key].append(val)
-            
-        content = "dictionary = \n{\n"
-        
-        for key, lines in translations.items():
-            if not lines:
-                continue
-                
-            if len(lines) == 1:
-                # Обычная строка
-                value = self.escape_string(lines[0])
-                content += f'    ["{key}"] = "{value}",\n'
-            else:
-                # Многострочная запись
-                # Первая строка
-                val0 = self.escape_string(lines[0])
-                content += f'    ["{key}"] = "{val0}\\\n'
-                
-                # Средние строки
-                for i in range(1, len(lines) - 1):
-                    val_i = self.escape_string(lines[i])
-                    content += f'{val_i}\\\n'
-                
-                # Последняя строка
-                val_last = self.escape_string(lines[-1])
-                content += f'{val_last}",\n'
-                
-        content += "} -- end of dictionary\n"
-        return content
+        return ''.join(iter_dictionary_chunks(lines_data))
+
+    def _write_dictionary_to_zip(self, zout, target, lines_data):
+        """Потоково записывает dictionary локали прямо в запись архива.
+
+        target — ZipInfo заменяемого файла или путь нового файла внутри архива.
+        Содержимое побайтно совпадает с generate_content_from_data, но не
+        собирается в памяти целиком.
+        """
+        if isinstance(target, str):
+            # Те же атрибуты, что выставляет ZipFile.writestr для нового файла
+            target = zipfile.ZipInfo(target, date_time=time.localtime(time.time())[:6])
+            target.compress_type = zout.compression
+            target.external_attr = 0o600 << 16
+        with zout.open(target, 'w') as dst:
+            write_dictionary_stream(dst, lines_data)
 
     def escape_string(self, text):
         """Кодирует специальные символы для сохранения в файл"""
-        if not text:
-            return ""
-        
-        result = text
-        
-        # ВАЖНО: сначала экранируем обратные слеши
-        result = result.replace('\\', '\\\\')
-        
-        # Затем экранируем кавычки
-        result = result.replace('"', '\\"')
-        
-        # Затем другие управляющие символы
-        result = result.replace('\n', '\\n')
-        result = result.replace('\t', '\\t')
-        result = result.replace('\r', '\\r')
-        
-        return result
+        return escape_lua_string(text)
     
     def copy_all_english(self):
         """Копирует весь английский текст в буфер обмена"""
@@ -7797,9 +7764,8 @@ QPushButton:hover {{
             self.translated_text_all.clear()
         
         # СТОП отрисовки предпросмотра
-        if hasattr(self, 'preview_batch_timer'):
-            self.preview_batch_timer.stop()
-        self.preview_groups_queue = []
+        if hasattr(self, 'preview_window_timer'):
+            self.preview_window_timer.stop()
         
         self.clear_preview_widgets()
         
@@ -8796,8 +8762,10 @@ QPushButton:hover {{
             
         try:
             # Сначала останавливаем таймеры, которые могут создавать новые виджеты
-            if hasattr(self, 'preview_batch_timer'):
-                self.preview_batch_timer.stop()
+            if hasattr(self, 'preview_window_timer'):
+                self.preview_window_timer.stop()
+            if hasattr(self, 'preview_estimate_timer'):
+                self.preview_estimate_timer.stop()
             
             # Очищаем три колонки
             layouts = [
@@ -8848,7 +8816,7 @@ QPushButton:hover {{
                             pass
                 except Exception:
                     pass
-            for attr in ['preview_key_to_group_widget', 'warning_icons_map', 
+            for attr in ['preview_key_to_group_widget', 'preview_group_editors', 'warning_icons_map', 
                          'audio_labels_map', 'quick_audio_buttons', 'bookmark_labels_map']:
                 if hasattr(self, attr):
                     try:
@@ -8861,6 +8829,12 @@ QPushButton:hover {{
             # Сбрасываем текущее выделение аудио при полной очистке виджетов
             self.highlighted_audio_key = None
 
+            # Модель виртуализированного предпросмотра (распорки удалены вместе с виджетами колонок)
+            self.preview_row_model = None
+            self._preview_window = (0, 0)
+            self._preview_spacers = None
+            self._preview_anchor = None
+
         except Exception as e:
             ErrorLogger.log_error("CLEAR_PREVIEW", f"Error clearing preview: {e}")
         finally:
@@ -8892,6 +8866,44 @@ QPushButton:hover {{
             elif item.layout():
                 self.clear_layout(item.layout())
 
+    def _build_preview_stylesheet(self):
+        """Общая таблица стилей колонок предпросмотра.
+
+        Цвета полей PreviewTextEdit выбираются по динамическим свойствам
+        previewState и previewHover (см. PreviewTextEdit.set_preview_state):
+        смена темы — одна установка таблицы для всех полей, а смена
+        состояния поля не требует разбора отдельной таблицы стилей.
+        """
+        modified = getattr(self, 'theme_text_modified', '#ff6666')
+        session = getattr(self, 'theme_text_session', '#bbf324')
+        saved = getattr(self, 'theme_text_saved', '#2ecc71')
+        hover = getattr(self, 'highlight_empty_color', '#434343')
+        return f'''
+            * {{
+                background-color: transparent;
+                border: none;
+            }}
+            PreviewTextEdit {{
+                color: #ffffff;
+                background-color: transparent;
+                border: none;
+                border-radius: 0px;
+            }}
+            PreviewTextEdit[previewState="no_reference"] {{ color: #ff6666; background-color: rgba(255, 0, 0, 30); }}
+            PreviewTextEdit[previewState="virtual"] {{ color: #999999; background-color: rgba(255, 165, 0, 20); }}
+            PreviewTextEdit[previewState="modified"] {{ color: {modified}; }}
+            PreviewTextEdit[previewState="session"] {{ color: {session}; }}
+            PreviewTextEdit[previewState="saved"] {{ color: {saved}; }}
+            PreviewTextEdit[previewHover="true"] {{ background-color: {hover}; }}
+        '''
+
+    def _apply_preview_stylesheet(self):
+        """Ставит общую таблицу стилей предпросмотра, если цвета темы изменились"""
+        stylesheet = self._build_preview_stylesheet()
+        if stylesheet != getattr(self, '_preview_stylesheet', None):
+            self._preview_stylesheet = stylesheet
+            self.preview_splitter.setStyleSheet(stylesheet)
+
     def update_preview_theme_colors(self):
         """Обновляет цвета темы в предпросмотре без перерисовки виджетов"""
         if not hasattr(self, 'preview_meta_layout') or not self.preview_meta_layout:
@@ -8899,6 +8911,8 @@ QPushButton:hover {{
             
         self.preview_content.setUpdatesEnabled(False)
         try:
+            # Цвета полей (тема, подсветка) — одной таблицей стилей на все поля
+            self._apply_preview_stylesheet()
             from widgets import PreviewTextEdit, ClickableLabel
             # Итерируемся по всем строкам в превью (используем meta_layout как эталон количества)
             for i in range(self.preview_meta_layout.count()):
@@ -8934,9 +8948,9 @@ QPushButton:hover {{
                         border-radius: 0px;
                     }}
                 '''
-                w_meta.setStyleSheet(container_style)
-                w_orig.setStyleSheet(container_style)
-                w_trans.setStyleSheet(container_style)
+                for container in (w_meta, w_orig, w_trans):
+                    if container.styleSheet() != container_style:
+                        container.setStyleSheet(container_style)
 
                 # --- ОБНОВЛЕНИЕ ВНУТРЕННИХ ВИДЖЕТОВ ---
                 
@@ -8983,11 +8997,6 @@ QPushButton:hover {{
                 for container in (w_orig, w_trans):
                     for edit in container.findChildren(PreviewTextEdit):
                         if getattr(edit, 'is_reference', False):
-                            # Референс обычно всегда белый
-                            ref_style = "color: #ffffff; background-color: transparent; border: none; border-radius: 0px;"
-                            edit.setStyleSheet(ref_style)
-                            edit._original_style = ref_style
-                            
                             # Синхронизируем текст референса с актуальными данными (после сохранения)
                             ref_data = getattr(self, 'reference_data', {})
                             ref_key = getattr(edit, 'key', None)
@@ -9026,15 +9035,8 @@ QPushButton:hover {{
                                 if 'original_translated_text' in l_data:
                                     is_modified = l_data['translated_text'] != l_data['original_translated_text']
                                 
-                                text_color = self._get_translation_color(is_modified, l_data)
-                                new_style = f"color: {text_color}; background-color: transparent; border: none; border-radius: 0px;"
-                                
-                                # ВАЖНО: обновляем _original_style, чтобы он не сбрасывался на старый при leaveEvent
-                                edit._original_style = new_style
-                                
-                                # Если виджет сейчас не подсвечен (нет запущенного таймера или флага), применяем стиль
-                                # На практике проще применить всегда, так как highlight в CSS/StyleSheet перекрывается
-                                edit.setStyleSheet(new_style)
+                                # Перерисовываются только поля, у которых состояние изменилось
+                                edit.set_preview_state(self._get_translation_state(is_modified, l_data))
 
         except Exception as e:
             print(f"Error updating preview colors: {e}")
@@ -9042,7 +9044,7 @@ QPushButton:hover {{
             self.preview_content.setUpdatesEnabled(True)
 
     def update_preview(self):
-        """Обновляет предварительный просмотр всех строк (версия с батчевой отрисовкой)"""
+        """Обновляет предварительный просмотр всех строк (виджеты — только для видимой области)"""
         # Если установлен флаг подавления — не перерисовываем предпросмотр
         if getattr(self, '_suppress_preview_update', False):
             return
@@ -9093,18 +9095,19 @@ QPushButton:hover {{
             
         self.is_preview_updating = True
         try:
-            # Останавливаем предыдущую отрисовку (если таймер инициализирован)
-            if hasattr(self, 'preview_batch_timer'):
-                self.preview_batch_timer.stop()
-            self.preview_groups_queue = []
-            
+            # Останавливаем пересчёт окна видимых групп
+            if hasattr(self, 'preview_window_timer'):
+                self.preview_window_timer.stop()
+
+            # Запоминаем группу у верхнего края области просмотра, чтобы сохранить позицию
+            anchor = self._get_preview_scroll_anchor()
+
             # Очищаем предыдущий предпросмотр
             self.clear_preview_widgets()
             
             if not self.original_lines:
                 self.preview_info.setText(get_translation(self.current_language, 'preview_info', count=0))
                 self.total_preview_groups = 0
-                self.rendered_preview_groups = 0
                 
                 # Показываем заглушку всегда, если список пуст
                 if hasattr(self, 'preview_empty_label'):
@@ -9122,48 +9125,43 @@ QPushButton:hover {{
                 self.preview_empty_label.hide()
                 self.preview_splitter.show()
 
-            # Группировка строк по ключу
-            groups = []
-            editor_keys = set()
-            if self.original_lines:
-                current_group = [0]
-                editor_keys.add(self.original_lines[0]['key'])
-                for i in range(1, len(self.original_lines)):
-                    editor_keys.add(self.original_lines[i]['key'])
-                    if self.original_lines[i]['key'] == self.original_lines[i-1]['key']:
-                        current_group.append(i)
-                    else:
-                        groups.append(current_group)
-                        current_group = [i]
-                groups.append(current_group)
+            # Группировка строк по ключу (группа — все видимые части ключа)
+            self._preview_key_indices_cache = None
+            editor_keys, key_indices = self._get_preview_key_indices()
 
-            # 2a. Виртуальные группы: ключи из референса, которых НЕТ в редакторе
+            # Виртуальные группы: ключи из референса, которых НЕТ в редакторе
+            virtual_keys = []
             ref_data = getattr(self, 'reference_data', {})
             miz_path = getattr(self, 'current_miz_path', '') or ''
             is_cmp = miz_path.lower().endswith('.cmp') or (getattr(self, 'current_file_path', '') or '').lower().endswith('.cmp')
             skip_empty_keys = getattr(self, 'filter_empty_keys', True)
             if ref_data and not is_cmp:
+                key_filter = self._get_key_filter()
                 for ref_key, ref_parts in ref_data.items():
-                    if ref_key not in editor_keys and ref_parts and self._should_translate_key(ref_key):
+                    if ref_key not in key_indices and ref_parts and key_filter.matches(ref_key):
                         # Если фильтр «пропускать пустые ключи» включён — пропускаем ключи,
                         # у которых все части в референсе пустые (нечего переводить)
                         if skip_empty_keys and all(not (p and p.strip()) for p in ref_parts):
                             continue
-                        groups.append({'virtual': True, 'key': ref_key, 'ref_parts': ref_parts})
-
-            # 2b. Подготавливаем очередь
-            self.preview_groups_queue = groups
-            self.total_preview_groups = len(groups)
-            self.rendered_preview_groups = 0
+                        virtual_keys.append(ref_key)
+
+            # Модель групп: высоты оцениваются по тексту, виджеты создаются только для видимых
+            keys = editor_keys + virtual_keys
+            self._apply_preview_stylesheet()  # Цвета темы могли измениться в настройках
+            self.preview_row_model = PreviewRowModel(keys, [MIN_ROW_HEIGHT] * len(keys), virtual_keys)
+            self._preview_text_lengths = {}
+            self._estimate_preview_heights(self.preview_row_model)
+            self.total_preview_groups = len(keys)
             self.audio_labels_map = {}
-            
-            # Обновляем информацию (прогресс: 0 из Х)
-            self.preview_info.setText(get_translation(self.current_language, 'preview_info_progress', 
-                                                       current=0, total=self.total_preview_groups))
-            
-            # Запускаем батчевую отрисовку (увеличили интервал до 20мс для меньшей нагрузки)
-            if hasattr(self, 'preview_batch_timer'):
-                self.preview_batch_timer.start(20)
+            self._create_preview_spacers()
+
+            self.preview_info.setText(get_translation(self.current_language, 'preview_info', count=self.total_preview_groups))
+
+            # Возвращаемся к той же группе и создаём виджеты видимой области
+            self._restore_preview_scroll_anchor(anchor)
+            self.refresh_preview_window()
+            self.last_focused_preview_info = None  # Сбрасываем, если группа с фокусом не видна
+            self.sync_preview_header_widths()
             
         except Exception as e:
             error_msg = f"Ошибка обновления предпросмотра: {str(e)}"
@@ -9177,7 +9175,7 @@ QPushButton:hover {{
         """Эффективное обновление: скрывает/показывает имеющиеся виджеты без пересоздания.
         Используется для авто-обновлений (фильтров) во время ввода, чтобы избежать тормозов.
         """
-        if not hasattr(self, 'preview_key_to_group_widget') or not self.preview_key_to_group_widget:
+        if not self.preview_key_to_group_widget and self.preview_row_model is None:
             return
 
         # Если список для отображения пуст
@@ -9202,65 +9200,62 @@ QPushButton:hover {{
         if hasattr(self, 'preview_empty_label'):
             self.preview_empty_label.hide()
             self.preview_splitter.show()
+
+        # Изменился состав ключей — пересобираем модель групп (виджеты создаются
+        # только для видимой области, поэтому это дёшево)
+        self._preview_key_indices_cache = None
+        editor_keys, _ = self._get_preview_key_indices()
+        model = self.preview_row_model
+        if model is None or [k for k in model.keys if k not in model.virtual_keys] != editor_keys:
+            self.update_preview()
+            return
         
-        # Создаем маппинг (key, part_index) -> new_index для быстрого поиска
-        visible_map = {}
-        for i, line in enumerate(self.original_lines):
-            # В original_lines у нас есть полные данные строки
-            visible_map[(line['key'], line.get('part_index', 0))] = i
-            
-        # Отключаем обновления для ускорения
+        # Меняем видимость только тех редакторов, у которых она действительно изменилась
+        _, key_indices = self._get_preview_key_indices()
+        to_show, to_hide, groups_to_rebuild = [], [], []
+        for key, (orig_edits, trans_edits) in self.preview_group_editors.items():
+            # Видимые части группы: part_index -> индекс строки в original_lines
+            visible_parts = {}
+            for i in key_indices.get(key, ()):
+                line = self.original_lines[i]
+                if not line.get('hide_input'):
+                    visible_parts[line.get('part_index', 0)] = i
+
+            group_has_visible = bool(orig_edits)  # Референс не зависит от фильтров текущей локали
+            shown_parts = set()
+            for edit in trans_edits:
+                part_index = getattr(edit, 'part_index', 0)
+                index = visible_parts.get(part_index)
+                if index is None:
+                    if not edit.isHidden():
+                        to_hide.append(edit)
+                    continue
+                # Индекс строки сдвигается при фильтрации — нужен для sync_pending_edits
+                edit.index = index
+                shown_parts.add(part_index)
+                group_has_visible = True
+                if edit.isHidden():
+                    to_show.append(edit)
+            # Части, для которых редактор не создавался (были отфильтрованы при создании группы)
+            if len(shown_parts) < len(visible_parts):
+                groups_to_rebuild.append(key)
+            group_widgets = self.preview_key_to_group_widget.get(key)
+            if group_widgets and group_widgets[0].isHidden() == group_has_visible:
+                (to_show if group_has_visible else to_hide).extend(group_widgets)
+
+        if not (to_show or to_hide or groups_to_rebuild):
+            return
+
         self.preview_content.setUpdatesEnabled(False)
         try:
-            from widgets import PreviewTextEdit
-            # Проходим по всем группам (mw - meta, ow - orig, tw - trans)
-            for key, (mw, ow, tw) in self.preview_key_to_group_widget.items():
-                group_has_visible = False
-                
-                # Внутри каждой колонки группы (orig, trans)
-                # Нам нужно проверить все PreviewTextEdit
-                for col_w in (ow, tw):
-                    edits = col_w.findChildren(PreviewTextEdit)
-                    for edit in edits:
-                        # Референсные виджеты (DEFAULT) не скрываем —
-                        # они отображают данные другой локали и не зависят от фильтрации текущей.
-                        if getattr(edit, 'is_reference', False):
-                            group_has_visible = True
-                            continue
-                        
-                        # part_index мы добавили ранее в render_preview_batch
-                        match_key = (key, getattr(edit, 'part_index', 0))
-                        
-                        if match_key in visible_map:
-                            edit.setVisible(True)
-                            try:
-                                self._log_to_file(f"[PREVIEW_SHOW] key={key} part={getattr(edit, 'part_index', 0)} index={getattr(edit, 'index', None)}")
-                            except Exception:
-                                pass
-                            # Обновляем индекс для синхронизации, чтобы sync_pending_edits работал корректно
-                            edit.index = visible_map[match_key]
-                            group_has_visible = True
-                        else:
-                            edit.setVisible(False)
-                            try:
-                                self._log_to_file(f"[PREVIEW_HIDE] key={key} part={getattr(edit, 'part_index', 0)} reason=not_in_visible_map")
-                            except Exception:
-                                pass
-                
-                # Если в ключе не осталось ни одной видимой строки - скрываем всю группу
-                # (метаданные и контейнеры колонок)
-                mw.setVisible(group_has_visible)
-                ow.setVisible(group_has_visible)
-                tw.setVisible(group_has_visible)
-                try:
-                    self._log_to_file(f"[PREVIEW_GROUP_VIS] key={key} visible={group_has_visible}")
-                except Exception:
-                    pass
-                
-            # Обновляем счетчик
-            unique_blocks = len(set(line['key'] for line in self.original_lines)) if self.original_lines else 0
-            self.preview_info.setText(get_translation(self.current_language, 'preview_info', count=unique_blocks))
-            
+            for widget in to_hide:
+                widget.setVisible(False)
+            for widget in to_show:
+                widget.setVisible(True)
+            for key in groups_to_rebuild:
+                self._rebuild_preview_group(key)
+            # Скрытые части меняют высоту групп — пересчитываем окно по модели
+            self.schedule_preview_window_refresh()
         except Exception as e:
             print(f"Error in sync_preview_incremental: {e}")
             # В случае ошибки fallback на полную перерисовку
@@ -9269,478 +9264,803 @@ QPushButton:hover {{
             self.preview_content.setUpdatesEnabled(True)
 
     def render_preview_until_index(self, target_index):
-        """Синхронно отрисовывает группы предпросмотра из очереди до указанного индекса.
-        Используется для мгновенного перехода к результату поиска, который еще не отрендерен.
+        """Создаёт виджеты группы, содержащей строку target_index.
+        Используется для мгновенного перехода к результату поиска или закладке,
+        группа которых сейчас вне видимой области предпросмотра.
         """
-        if not hasattr(self, 'preview_groups_queue') or not self.preview_groups_queue:
+        if not (0 <= target_index < len(self.original_lines)):
             return
-            
-        # Отключаем обновления
-        self.preview_content.setUpdatesEnabled(False)
+        self.ensure_preview_key_rendered(self.original_lines[target_index].get('key'))
+
+    def ensure_preview_key_rendered(self, key):
+        """Прокручивает предпросмотр к группе ключа (по модели высот) и создаёт её виджеты.
+
+        Returns:
+            bool: группа есть в preview_key_to_group_widget
+        """
+        if key in self.preview_key_to_group_widget:
+            return True
+        model = self.preview_row_model
+        if model is None:
+            return False
+        row = model.row_of(key)
+        if row < 0:
+            return False
+
+        # Плавная прокрутка к прежней цели больше не нужна
+        animation = getattr(self, '_scroll_animation', None)
+        if animation is not None:
+            animation.stop()
+
+        self._measure_preview_window()
+        top = max(0, model.offset(row) - PREVIEW_JUMP_MARGIN_PX)
+        anchor_row = model.row_at(top)
+        self._preview_anchor = (anchor_row, top - model.offset(anchor_row), None)
+        self.refresh_preview_window()
+        return key in self.preview_key_to_group_widget
+
+    def schedule_preview_window_refresh(self, delay_ms=15):
+        """Планирует пересчёт окна видимых групп (изменение размеров, сплиттер)"""
+        if self.preview_row_model is not None and not self._is_refreshing_preview_window:
+            self.preview_window_timer.start(delay_ms)
+
+    def _on_preview_scrolled(self, value):
+        """Прокрутка предпросмотра: сразу создаём виджеты групп, вошедших в область"""
+        if not self._is_refreshing_preview_window:
+            self._sync_preview_document_bar()
+            self.refresh_preview_window()
+
+    def _on_preview_scroll_range_changed(self):
+        self._sync_preview_document_bar()
+        self.schedule_preview_window_refresh()
+
+    def _on_preview_document_scrolled(self, value):
+        """Полоса прокрутки документа: переходим к позиции в модели высот"""
+        model = self.preview_row_model
+        if self._is_syncing_preview_document_bar or self._is_refreshing_preview_window:
+            return
+        if model is None or self._preview_spacers is None:
+            self.preview_scroll.verticalScrollBar().setValue(value)
+            return
+        row = model.row_at(value)
+        self._preview_anchor = (row, value - model.offset(row), None)
+        self.refresh_preview_window()
+
+    def _preview_content_offset(self):
+        """Позиция верха содержимого области прокрутки в координатах модели"""
+        model = self.preview_row_model
+        if model is None or self._preview_spacers is None:
+            return 0
+        return model.offset(self._preview_window[0]) - self._preview_spacers[0][0].minimumHeight()
+
+    def _preview_scroll_position(self):
+        """Позиция верхнего края области просмотра в координатах модели"""
+        return self._preview_content_offset() + self.preview_scroll.verticalScrollBar().value()
+
+    def _sync_preview_document_bar(self):
+        """Переносит диапазон и позицию прокрутки окна на полосу всего документа"""
+        scrollbar = self.preview_scroll.verticalScrollBar()
+        document_bar = self.preview_scroll.document_bar
+        above = below = 0
+        model = self.preview_row_model
+        if model is not None and self._preview_spacers is not None:
+            above = self._preview_content_offset()
+            below = (model.total_height() - model.offset(self._preview_window[1])
+                     - self._preview_spacers[1][0].minimumHeight())
+        self._is_syncing_preview_document_bar = True
         try:
-            while self.preview_groups_queue:
-                # Проверяем, есть ли target_index в следующей группе
-                next_group = self.preview_groups_queue[0]
-                self.render_preview_batch() # Отрисовываем одну пачку (10 групп)
-                
-                # Если мы уже прошли нужный индекс или он был в этой пачке — выходим
-                # (render_preview_batch удаляет отрендеренные группы из очереди)
-                if any(idx >= target_index for idx in next_group):
-                    break
-                
-                # Защита от бесконечного цикла
-                if not self.preview_groups_queue:
-                    break
+            document_bar.setRange(0, max(0, above + scrollbar.maximum() + below))
+            document_bar.setPageStep(scrollbar.pageStep())
+            document_bar.setSingleStep(scrollbar.singleStep())
+            document_bar.setValue(above + scrollbar.value())
         finally:
-            self.preview_content.setUpdatesEnabled(True)
+            self._is_syncing_preview_document_bar = False
 
-    def render_preview_batch(self):
-        """Отрисовывает одну пачку групп в предпросмотре для плавности"""
-        if not self.preview_groups_queue or not self.original_lines:
-            self.preview_batch_timer.stop()
-            self.preview_layout.addStretch()
-            self.last_focused_preview_info = None  # Сбрасываем, если так и не нашли
-            # Финальная надпись (уже без "из")
-            self.preview_info.setText(get_translation(self.current_language, 'preview_info', count=self.total_preview_groups))
-            self.sync_preview_header_widths()
+    def refresh_preview_window(self):
+        """Создаёт виджеты групп в видимой области (с запасом) и удаляет ушедшие из неё.
+
+        Позиция прокрутки привязана к группе у верхнего края: если высота групп
+        над ней изменилась (оценка заменена измеренной), содержимое не сдвигается.
+        """
+        model = self.preview_row_model
+        if model is None or self._preview_spacers is None or self._is_refreshing_preview_window:
             return
-            
-        # Пачка по 10 групп за раз (было 15, уменьшили для плавности)
-        batch_size = 10
-        batch = self.preview_groups_queue[:batch_size]
-        self.preview_groups_queue = self.preview_groups_queue[batch_size:]
-        self.rendered_preview_groups += len(batch)
-        
-        # Обновляем прогресс в той же строке
-        self.preview_info.setText(get_translation(self.current_language, 'preview_info_progress', 
-                                                   current=self.rendered_preview_groups, total=self.total_preview_groups))
-        
-        # Отключаем обновления на время массового добавления
+        animation = getattr(self, '_scroll_animation', None)
+        if animation is not None and animation.state() == QAbstractAnimation.Running:
+            # Окно пересчитаем после завершения плавной прокрутки
+            self.preview_window_timer.start(animation.duration())
+            return
+
+        self._is_refreshing_preview_window = True
+        updates_enabled = self.preview_content.updatesEnabled()
         self.preview_content.setUpdatesEnabled(False)
         try:
-            for group_indices in batch:
-                # --- ВИРТУАЛЬНАЯ ГРУППА (ключ есть в референсе, но НЕТ в переводе) ---
-                if isinstance(group_indices, dict) and group_indices.get('virtual'):
-                    self._render_virtual_preview_group(group_indices)
-                    continue
-                    
-                if not group_indices: continue
-                first_idx = group_indices[0]
-                
-                # ПРОВЕРКА ГРАНИЦ (Защита от IndexError при быстрой смене файлов)
-                if first_idx >= len(self.original_lines):
-                    continue
-                    
-                line_data = self.original_lines[first_idx]
-                current_key = line_data['key']
+            scrollbar = self.preview_scroll.verticalScrollBar()
+            self._check_preview_column_widths(model)
+            self._measure_preview_window()
+
+            # Привязка: (группа, смещение внутри группы, значение прокрутки при записи)
+            anchor = self._preview_anchor
+            if (anchor is None or anchor[0] >= len(model)
+                    or (anchor[2] is not None and anchor[2] != scrollbar.value())):
+                y = self._preview_scroll_position()
+                row = model.row_at(y)
+                anchor = (row, y - model.offset(row), None)
+            row = anchor[0]
+            row_offset = min(anchor[1], max(0, model.height(row) - 1)) if len(model) else 0
+
+            top = model.offset(row) + row_offset if len(model) else 0
+            view_height = self.preview_scroll.viewport().height()
+            if len(model):
+                start = model.row_at(max(0, top - PREVIEW_OVERSCAN_PX))
+                end = model.row_at(top + view_height + PREVIEW_OVERSCAN_PX) + 1
+            else:
+                start = end = 0
+            self._set_preview_window(start, end)
+            self._measure_preview_window()
+            self._update_preview_spacers()
+            self._activate_preview_layouts()
+
+            if len(model):
+                scrollbar.setValue(model.offset(row) + row_offset - self._preview_content_offset())
+            self._preview_anchor = (row, row_offset, scrollbar.value())
+            self._sync_preview_document_bar()
+        except Exception as e:
+            ErrorLogger.log_error("PREVIEW_ERROR", f"Error refreshing preview window: {e}")
+        finally:
+            self.preview_content.setUpdatesEnabled(updates_enabled)
+            self._is_refreshing_preview_window = False
+
+    def _preview_column_layouts(self):
+        return (self.preview_meta_layout, self.preview_orig_layout, self.preview_trans_layout)
+
+    def _get_preview_key_indices(self):
+        """Ключи строк редактора в порядке появления и их индексы в original_lines (с кэшем)"""
+        lines = self.original_lines
+        signature = (id(lines), len(lines))
+        cache = self._preview_key_indices_cache
+        if cache is None or cache[0] != signature:
+            cache = (signature,) + group_line_indices(lines)
+            self._preview_key_indices_cache = cache
+        return cache[1], cache[2]
+
+    def _preview_width_signature(self):
+        return (tuple(self.preview_splitter.sizes()), self.preview_font_family, self.preview_font_size)
+
+    def _check_preview_column_widths(self, model):
+        """Планирует пересчёт оценок высот, если изменились ширины колонок или шрифт.
+
+        Пока тянут сплиттер или окно, остаются прежние оценки (группы в видимой
+        области всё равно измеряются): все группы пересчитываются один раз,
+        через PREVIEW_ESTIMATE_DELAY_MS после последнего изменения.
+        """
+        if model.width_signature != self._preview_width_signature():
+            self.preview_estimate_timer.start(PREVIEW_ESTIMATE_DELAY_MS)
 
-                # part_index уже сохранён в line_data при парсинге — НЕ перезаписываем
-                
-                # Рассчитываем цвет зебры: чередуем по чётности
-                current_count = self.preview_meta_layout.count()
-                bg_color = self.theme_bg_even if current_count % 2 == 0 else self.theme_bg_odd
-                
-                # Создаём три строки (по одной для каждой колонки)
-                is_bookmarked = current_key in self.bookmarks_data
-                if is_bookmarked:
-                    _, _, meta_bg = self._get_bookmark_visual(current_key)
-                else:
-                    meta_bg = bg_color
-                
-                meta_row_widget = QWidget()
-                meta_row_widget.setObjectName("preview_line_group")
-                meta_row_widget.current_key = current_key  # СОХРАНЯЕМ КЛЮЧ
-                meta_row_widget._zebra_index = current_count  # Для восстановления цвета зебры
-                meta_row_widget.setStyleSheet(f'''
-                    QWidget#preview_line_group {{
-                        background-color: {meta_bg};
-                        border-bottom: 1px solid #333;
-                        border-radius: 0px;
-                    }}
-                ''')
-                meta_row_layout = QVBoxLayout(meta_row_widget)
-                meta_row_layout.setContentsMargins(4, 0, 4, 0)
-                meta_row_layout.setSpacing(0)
-                
-                # --- Закладка (значок) + Номер + Ключ ---
-                bookmark_header_layout = QHBoxLayout()
-                bookmark_header_layout.setContentsMargins(0, 0, 0, 0)
-                bookmark_header_layout.setSpacing(4)
-                
-                star_text, star_color, _ = self._get_bookmark_visual(current_key)
-                star_style = f"color: {star_color}; font-size: 14px; background: transparent; border: none; padding: 0px;"
-                if is_bookmarked:
-                    star_style = f"color: {star_color}; font-size: 14px; font-weight: bold; background: transparent; border: none; padding: 0px;"
-                bookmark_label = QLabel(star_text)
-                bookmark_label.setStyleSheet(star_style)
-                bookmark_label.setCursor(Qt.PointingHandCursor)
-                bookmark_label.setFixedWidth(16)
-                # ЛКМ = toggle звезды, ПКМ = контекстное меню
-                def _bm_mouse_press(e, k=current_key, bl=bookmark_label, mw=meta_row_widget):
-                    if e.button() == Qt.LeftButton:
-                        # Сохраняем состояние ДО переключения для логики двойного клика
-                        mw._prev_bm_type = self.bookmarks_data.get(k, {}).get('type') if k in self.bookmarks_data else None
-                        self.toggle_bookmark(k, bl, mw)
-                    elif e.button() == Qt.RightButton:
-                        self.show_bookmark_context_menu(k, bl, mw, e.globalPos())
-                
-                def _bm_double_click(e, k=current_key, bl=bookmark_label, mw=meta_row_widget):
-                    if e.button() == Qt.LeftButton:
-                        self.cycle_bookmark_type(k, bl, mw)
-                
-                bookmark_label.mousePressEvent = _bm_mouse_press
-                bookmark_label.mouseDoubleClickEvent = _bm_double_click
-                # Тултип с комментарием при наведении
-                bookmark_label.enterEvent = lambda e, k=current_key, bl=bookmark_label: self._on_bookmark_enter(k, bl, e)
-                bookmark_label.leaveEvent = lambda e, k=current_key, bl=bookmark_label: self._on_bookmark_leave(k, bl, e)
-                self.bookmark_labels_map[current_key] = bookmark_label
-                
-                idx_label = f"#{first_idx+1}" if len(group_indices) == 1 else f"#{first_idx+1}-{group_indices[-1]+1}"
-                header_line = QLabel(f"<span style='color: #cccccc; font-weight: bold;'>{idx_label}</span> <span style='color: #8f8f8f; font-size: 12px;'>{current_key}</span>")
-                header_line.setStyleSheet('border: none; background: transparent;')
-                header_line.setWordWrap(True)
-                
-                bookmark_header_layout.addWidget(header_line, 1, Qt.AlignTop)
-                bookmark_header_layout.addWidget(bookmark_label, 0, Qt.AlignTop | Qt.AlignRight)
-                
-                meta_row_layout.addLayout(bookmark_header_layout)
-
-                orig_row_widget = QWidget()
-                orig_row_widget.setObjectName("preview_line_group")
-                orig_row_widget.setStyleSheet(f'''
-                    QWidget#preview_line_group {{
-                        background-color: {meta_bg};
-                        border-bottom: 1px solid #333;
-                        border-radius: 0px;
-                    }}
-                ''')
-                orig_row_layout = QVBoxLayout(orig_row_widget)
-                orig_row_layout.setContentsMargins(4, 0, 4, 0)
-                orig_row_layout.setSpacing(0)
+    def _on_preview_estimate_timer(self):
+        model = self.preview_row_model
+        if model is None or model.width_signature == self._preview_width_signature():
+            return
+        self._estimate_preview_heights(model)
+        self.refresh_preview_window()
+
+    def _estimate_preview_heights(self, model):
+        """Оценивает высоты всех групп модели по тексту и ширинам колонок"""
+        metrics = QFontMetrics(QFont(self.preview_font_family, self.preview_font_size))
+        line_height = metrics.lineSpacing()
+        char_width = metrics.averageCharWidth()
+        sizes = self.preview_splitter.sizes()
+        orig_width = (sizes[1] if len(sizes) > 1 and sizes[1] > 0 else DEFAULT_COLUMN_WIDTH) - ROW_HORIZONTAL_MARGINS
+        trans_width = (sizes[2] if len(sizes) > 2 and sizes[2] > 0 else DEFAULT_COLUMN_WIDTH) - ROW_HORIZONTAL_MARGINS
+
+        _, key_indices = self._get_preview_key_indices()
+        ref_data = getattr(self, 'reference_data', None) or {}
+        resource_manager = getattr(self, 'miz_resource_manager', None)
+        text_lengths = self._preview_text_lengths
+
+        def text_height(text, width):
+            lengths = text_lengths.get(text)
+            if lengths is None:
+                lengths = text_lengths[text] = paragraph_lengths(text)
+            return estimate_lengths_height(lengths, width, line_height, char_width)
 
-                trans_row_widget = QWidget()
-                trans_row_widget.setObjectName("preview_line_group")
-                trans_row_widget.setStyleSheet(f'''
-                    QWidget#preview_line_group {{
-                        background-color: {meta_bg};
-                        border-bottom: 1px solid #333;
-                        border-radius: 0px;
-                    }}
-                ''')
-                trans_row_layout = QVBoxLayout(trans_row_widget)
-                trans_row_layout.setContentsMargins(4, 0, 4, 0)
-                trans_row_layout.setSpacing(0)
+        heights = []
+        for key in model.keys:
+            indices = key_indices.get(key)
+            if indices:
+                group_lines = [self.original_lines[i] for i in indices if not self.original_lines[i].get('hide_input')]
+                ref_parts = (ref_data.get(key) or [line.get('display_text', '') for line in group_lines]) if group_lines else []
+                trans_parts = [line.get('translated_text') or '' for line in group_lines]
+            else:
+                ref_parts = ref_data.get(key, [])
+                trans_parts = [''] * len(ref_parts)
+
+            meta_height = META_HEADER_HEIGHT
+            if resource_manager is not None and resource_manager.get_audio_for_key(key):
+                meta_height += META_AUDIO_HEIGHT
+            orig_height = sum(text_height(text, orig_width) for text in ref_parts)
+            trans_height = sum(text_height(text, trans_width) for text in trans_parts)
+            heights.append(max(MIN_ROW_HEIGHT, meta_height, orig_height, trans_height))
+
+        model.reset_heights(heights)
+        model.width_signature = self._preview_width_signature()
+
+    def _measure_preview_window(self):
+        """Записывает в модель фактические высоты созданных групп"""
+        model = self.preview_row_model
+        if model is None:
+            return
+        start, end = self._preview_window
+        for row in range(start, min(end, len(model))):
+            widgets = self.preview_key_to_group_widget.get(model.keys[row])
+            if not widgets:
+                model.set_height(row, 0)
+                continue
+            meta_widget = widgets[0]
+            model.set_height(row, 0 if meta_widget.isHidden() else meta_widget.minimumHeight())
 
-                # Регистрируем группу для селективного апдейта по ключу (три компонента)
-                try:
-                    self.preview_key_to_group_widget[current_key] = (meta_row_widget, orig_row_widget, trans_row_widget)
-                except Exception:
-                    self.preview_key_to_group_widget = {current_key: (meta_row_widget, orig_row_widget, trans_row_widget)}
-                
-                # Инициализируем пустую карту для превью комментариев, если нет
-                if not hasattr(self, 'comment_previews_map'):
-                    self.comment_previews_map = {}
-                
-                try:
-                    self._log_to_file(f"[PREVIEW_CREATE_GROUP] key={current_key} first_idx={first_idx} parts={len(group_indices)} current_count={current_count}")
-                except Exception:
-                    pass
-                
-                # Подсветка при наведении только для аудио меток, для строк убрана
-                
-                audio_info = self.miz_resource_manager.get_audio_for_key(current_key)
-                bookmark_info = self.bookmarks_data.get(current_key)
-                has_comment = bookmark_info and bookmark_info.get('comment')
-                
-                if audio_info or bookmark_info:
-                    # Контейнер для доп. контролов (Аудио, Комментарии)
-                    extras_layout = QHBoxLayout()
-                    extras_layout.setContentsMargins(0, 0, 0, 0)
-                    extras_layout.setSpacing(8) # Оптимизированный спейсинг
-                    meta_row_widget.extras_layout = extras_layout
-                    
-                    if audio_info:
-                        audio_filename, is_current_locale = audio_info
-                        audio_color = '#00cc66' if self.miz_resource_manager.is_audio_replaced(current_key) else ('#ff9900' if is_current_locale else '#888888')
-                        audio_label = ClickableLabel(audio_filename)
-                        audio_label.key = current_key
-                        audio_label.clicked.connect(lambda k=current_key: self.open_audio_player(k, auto_play=False))
-                        audio_label.rightClicked.connect(lambda pos, k=current_key: self._on_audio_label_context_menu(pos, k))
-                        audio_label.fileDropped.connect(lambda path, k=current_key: self.handle_audio_replacement(k, path))
-                        if current_key not in self.audio_labels_map:
-                            self.audio_labels_map[current_key] = []
-                        self.audio_labels_map[current_key].append(audio_label)
-                        
-                        # ЦВЕТ АУДИО
-                        is_audio_replaced = self.miz_resource_manager.is_audio_replaced(current_key)
-                        if is_audio_replaced:
-                             audio_color = getattr(self, 'theme_text_modified', '#ff6666')
-                        elif is_current_locale:
-                             audio_color = getattr(self, 'theme_text_saved', '#2ecc71')
-                        else:
-                             audio_color = '#cccccc'
-
-                        border_style = "border: 1px solid #ff9900; border-radius: 4px;" if current_key == self.active_audio_key else "border: 1px solid transparent;"
-                        audio_label.setStyleSheet(f'''
-                            QLabel {{
-                                color: {audio_color};
-                                font-size: 12px;
-                                text-decoration: underline;
-                                background-color: transparent;
-                                {border_style}
-                                padding: 2px;
-                            }}
-                            QLabel:hover {{
-                                background-color: #3d4256;
-                                border-radius: 2px;
-                            }}
-                        ''')
-                        audio_label.setWordWrap(True)
-                        meta_row_layout.addWidget(audio_label, 0, Qt.AlignTop)
-                        
-                        # Мини-кнопки управления (Play/Stop)
-                        play_btn = QPushButton("▶")
-                        play_btn.setFixedSize(self.preview_btn_size, self.preview_btn_size)
-                        play_btn.setCursor(Qt.PointingHandCursor)
-                        play_btn.setFocusPolicy(Qt.NoFocus)
-                        play_btn.setStyleSheet(self.preview_btn_base.format(size=self.preview_play_font, w=self.preview_btn_size, top=self.preview_play_top_offset))
-                        play_btn.clicked.connect(lambda _, k=current_key, b=play_btn: self.quick_toggle_audio(k, b))
-
-                        stop_btn = QPushButton("■")
-                        stop_btn.setFixedSize(self.preview_btn_size, self.preview_btn_size)
-                        stop_btn.setCursor(Qt.PointingHandCursor)
-                        stop_btn.setFocusPolicy(Qt.NoFocus)
-                        stop_btn.setStyleSheet(self.preview_btn_base.format(size=self.preview_stop_font, w=self.preview_btn_size, top=self.preview_stop_top_offset))
-                        stop_btn.clicked.connect(self.stop_quick_audio)
-                        
-                        extras_layout.addWidget(play_btn)
-                        extras_layout.addWidget(stop_btn)
-                        
-                        # Значок ВНИМАНИЯ
-                        if not is_current_locale:
-                            warning_icon = QLabel("⚠")
-                            warning_icon.setStyleSheet("color: #ffcc00; background-color: transparent; font-size: 16px; margin-left: 1px;")
-                            warning_icon.setCursor(Qt.PointingHandCursor)
-                            extras_layout.addWidget(warning_icon)
-                            self.register_custom_tooltip(warning_icon, get_translation(self.current_language, 'file_from_default'), side='top')
-                            if not hasattr(self, 'warning_icons_map'):
-                                self.warning_icons_map = {}
-                            self.warning_icons_map[current_key] = warning_icon
-                        
-                        try:
-                            self.quick_audio_buttons[current_key] = play_btn
-                            if self.quick_playing_key == current_key:
-                                if self.quick_paused: play_btn.setText("▶")
-                                else: play_btn.setText("\u23F8\uFE0E")
-                        except Exception: pass
-                    
-                    # ПРЕДПРОСМОТР КОММЕНТАРИЯ
-                    if has_comment:
-                        comment_text = bookmark_info.get('comment', '')
-                        short_comment = comment_text.split('\n')[0].strip()
-                        if len(short_comment) > 40: short_comment = short_comment[:40] + "..."
-                        
-                        if short_comment:
-                            comment_preview = QLabel(short_comment)
-                            comment_preview.setStyleSheet("""
-                                QLabel {
-                                    color: #ffffff;
-                                    background-color: rgba(50, 50, 50, 245);
-                                    border: 1px solid #ff9900;
-                                    border-radius: 4px;
-                                    padding: 1px 6px;
-                                    font-size: 11px;
-                                }
-                            """)
-                            comment_preview.setMaximumWidth(150) # Ограничиваем ширину чтобы не вытеснял остальное
-                            extras_layout.addWidget(comment_preview, 0, Qt.AlignVCenter)
-                            self.register_custom_tooltip(comment_preview, comment_text, side='top')
-                            meta_row_widget.comment_label = comment_preview
-                    
-                    extras_layout.addStretch()
-                    meta_row_layout.addLayout(extras_layout)
-                
-                # --- 1. Отрисовка референса (Колонка 2) ---
-                # Теперь она "развязана" от отфильтрованных индексов перевода.
-                # Мы отрисовываем ВСЕ строки референса, которые есть в данных для этого ключа.
-                
-                miz_path = getattr(self, 'current_miz_path', '') or ''
-                file_path = getattr(self, 'current_file_path', '') or ''
-                is_cmp = miz_path.lower().endswith('.cmp') or file_path.lower().endswith('.cmp')
-                ref_locale = self.reference_locale
-                
-                ref_parts = []
-                if not is_cmp and getattr(self, 'current_miz_path', None) and getattr(self, 'reference_data', None):
-                    ref_parts = self.reference_data.get(current_key, [])
-                elif is_cmp:
-                    # Для .cmp используем замороженные данные (cmp_reference_data)
-                    base_key = current_key
-                    k_parts = current_key.rsplit('_', 1)
-                    if len(k_parts) > 1 and k_parts[1].isupper() and len(k_parts[1]) == 2:
-                        base_key = k_parts[0]
-                    target_ref_key = base_key if ref_locale == "DEFAULT" else f"{base_key}_{ref_locale}"
-                    frozen = getattr(self, 'cmp_reference_data', {})
-                    ref_parts = frozen.get(target_ref_key, [])
-                    if not ref_parts and ref_locale != "DEFAULT":
-                        ref_parts = frozen.get(base_key, [])
-                
-                # Если референс есть — выводим его ВЕСЬ (симметрия к полному ключу)
-                # НО: если это "пустой аудио-ключ" (hide_input), референс тоже не выводим для чистоты
-                has_any_line_with_input = any(not self.original_lines[idx].get('hide_input') for idx in group_indices)
-                
-                if ref_parts and has_any_line_with_input:
-                    for p_idx, ref_text in enumerate(ref_parts):
-                        orig_edit = PreviewTextEdit(-1, ref_text, read_only=True, parent=self)
-                        orig_edit.is_reference = True
-                        orig_edit.key = current_key
-                        orig_edit.part_index = p_idx
-                        orig_edit.setStyleSheet("color: #ffffff; background-color: transparent; border: none; border-radius: 0px;")
-                        orig_edit._original_style = "color: #ffffff; background-color: transparent; border: none; border-radius: 0px;"
-                        orig_row_layout.addWidget(orig_edit, 0, Qt.AlignTop)
-                elif not has_any_line_with_input:
-                    # Пустой аудио-ключ: ничего не добавляем в референс
-                    pass
-                else:
-                    # Fallback: если референса нет
-                    if getattr(self, 'is_dictionary_mode', False):
-                        warn_marker = ""
-                        warn_style = "color: #ffffff; background-color: transparent; border: none; border-radius: 0px;"
-                    else:
-                        warn_marker = get_translation(self.current_language, 'no_reference_marker')
-                        warn_style = "color: #ff6666; background-color: rgba(255, 0, 0, 30); border: none; border-radius: 0px;"
-                    
-                    for idx in group_indices:
-                        if self.original_lines[idx].get('hide_input'): continue
-                        ref_text = self.original_lines[idx].get('display_text', '')
-                        # Добавляем маркер перед текстом
-                        display_text = warn_marker + ref_text
-                        
-                        orig_edit = PreviewTextEdit(idx, display_text, read_only=True, parent=self)
-                        orig_edit.is_reference = True
-                        orig_edit.key = current_key
-                        orig_edit.part_index = self.original_lines[idx].get('part_index', 0)
-                        
-                        # Устанавливаем стиль
-                        orig_edit.setStyleSheet(warn_style)
-                        orig_edit._original_style = warn_style
-                        
-                        orig_row_layout.addWidget(orig_edit, 0, Qt.AlignTop)
+    def _set_preview_window(self, start, end):
+        """Создаёт виджеты групп [start, end) и удаляет виджеты групп вне диапазона"""
+        old_start, old_end = self._preview_window
+        if (start, end) == (old_start, old_end):
+            return
+        model = self.preview_row_model
 
-                # --- 2. Отрисовка перевода (Колонка 3) ---
-                # Подчиняется фильтрам (group_indices может быть подмножеством всех строк ключа)
-                for idx_in_group, idx in enumerate(group_indices):
-                    l_data = self.original_lines[idx]
-                    if l_data.get('hide_input'):
-                        continue # Пропускаем создание поля ввода
-                        
-                    original_part_idx = l_data.get('part_index', 0)
-                    
-                    t_text = l_data['translated_text'] if l_data['translated_text'] else ""
-                    is_modified = False
-                    if 'original_translated_text' in l_data:
-                        is_modified = t_text != l_data['original_translated_text']
-
-                    trans_edit = PreviewTextEdit(idx, t_text, read_only=False, parent=self)
-                    trans_edit.is_reference = False
-                    trans_edit.key = current_key
-                    trans_edit.part_index = original_part_idx
-                    is_mission_name = current_key.startswith('DictKey_sortie_') or current_key == 'name' or current_key.startswith('name_')
-                    trans_edit.single_line = is_mission_name
-                    # [SMART PASTE] Подключаем обработчик маркеров из превью
-                    trans_edit.smart_paste_requested.connect(self.handle_smart_paste_request)
-                    
-                    text_color = self._get_translation_color(is_modified, l_data)
-                    original_style = f"color: {text_color}; background-color: transparent; border: none; border-radius: 0px;"
-                    trans_edit.setStyleSheet(original_style)
-                    trans_edit._original_style = original_style
-
-                    # ВОССТАНОВЛЕНИЕ ФОКУСА
-                    if self.last_focused_preview_info:
-                        info = self.last_focused_preview_info
-                        # Для PreviewTextEdit 'index' обычно соответствует 'part_index' внутри группы или глобальному индексу
-                        # Но надежнее всего проверять по ключу (если есть) и индексу части
-                        is_match = False
-                        if info['key'] == current_key:
-                            # Проверяем совпадение индекса
-                            if info['part_index'] == idx:
-                                is_match = True
-                        
-                        if is_match:
-                            try:
-                                trans_edit.setFocus()
-                                cursor = trans_edit.textCursor()
-                                cursor.setPosition(info['anchor'])
-                                cursor.setPosition(info['position'], QTextCursor.KeepAnchor)
-                                trans_edit.setTextCursor(cursor)
-                                # Сбрасываем, чтобы не фокусировать повторно при батчевой отрисовке других групп
-                                self.last_focused_preview_info = None
-                            except Exception:
-                                pass
-                    # Исправлено: лямбда теперь использует динамический te.index и данные из оригинального списка.
-                    # Это предотвращает перезапись чужих строк при вставке новых через Enter.
-                    trans_edit.text_changed.connect(
-                        lambda *args, te=trans_edit: 
-                        self.on_preview_text_modified(te, te.index, self.original_lines[te.index])
-                    )
-                    # Подключаем вставку новой строки через Enter
-                    trans_edit.line_inserted.connect(
-                        lambda ins_idx, move_text, te=trans_edit,
-                               orl=orig_row_layout, trl=trans_row_layout,
-                               mw=meta_row_widget, orw=orig_row_widget, trw=trans_row_widget:
-                        self.on_preview_line_inserted(ins_idx, move_text, te, orl, trl, mw, orw, trw)
-                    )
-                    # Подключаем удаление/слияние строки через Backspace
-                    trans_edit.line_deleted.connect(lambda del_idx, merge_text, te=trans_edit: self.on_preview_line_deleted(del_idx, te, merge_text))
-                    
-                    
-                    trans_row_layout.addWidget(trans_edit, 0, Qt.AlignTop)
-                
-                
-                # Подключаем row_siblings на каждый PreviewTextEdit для трёхсторонней синхронизации
-                siblings_tuple = (meta_row_widget, orig_row_widget, trans_row_widget)
-                for sub in (orig_row_widget, trans_row_widget):
-                    for edit in sub.findChildren(PreviewTextEdit):
-                        edit.row_siblings = siblings_tuple
-                
-                # Активируем layout'ы
-                meta_row_widget.layout().activate()
-                orig_row_widget.layout().activate()
-                trans_row_widget.layout().activate()
-                
-                # Синхронизируем высоту всей группы (особенно важно для пустых аудио-ключей)
-                max_h = max(meta_row_widget.sizeHint().height(), 
-                            orig_row_widget.sizeHint().height(), 
-                            trans_row_widget.sizeHint().height(), 24)
-                meta_row_widget.setFixedHeight(max_h)
-                orig_row_widget.setFixedHeight(max_h)
-                trans_row_widget.setFixedHeight(max_h)
-                
-                # Добавляем растяжку в концы layout-ов, чтобы прижать всё содержимое к ВЕРХУ
-                meta_row_layout.addStretch(1)
-                orig_row_layout.addStretch(1)
-                trans_row_layout.addStretch(1)
-
-                # Добавляем три row-виджета в их соответствующие колонки
-                self.preview_meta_layout.addWidget(meta_row_widget)
-                self.preview_orig_layout.addWidget(orig_row_widget)
-                self.preview_trans_layout.addWidget(trans_row_widget)
-        finally:
-            self.preview_content.setUpdatesEnabled(True)
+        # Правки удаляемых редакторов должны попасть в данные до их удаления
+        if getattr(self, 'pending_sync_edits', None) and (start > old_start or end < old_end):
+            self.apply_pending_preview_sync()
+
+        if end <= old_start or start >= old_end:
+            for row in range(old_start, old_end):
+                self._dematerialize_preview_group(model.keys[row])
+            for row in range(start, end):
+                self._materialize_preview_group(row)
+        else:
+            for row in list(range(old_start, min(start, old_end))) + list(range(max(end, old_start), old_end)):
+                self._dematerialize_preview_group(model.keys[row])
+            # Новые группы сверху — сразу после верхней распорки, по порядку
+            for i, row in enumerate(range(start, old_start)):
+                self._materialize_preview_group(row, position=1 + i)
+            for row in range(old_end, end):
+                self._materialize_preview_group(row)
+        self._preview_window = (start, end)
+
+    def _materialize_preview_group(self, row, position=None):
+        """Создаёт виджеты группы модели (обычной или виртуальной)"""
+        model = self.preview_row_model
+        key = model.keys[row]
+        _, key_indices = self._get_preview_key_indices()
+        indices = key_indices.get(key)
+        if indices:
+            self._render_preview_group(indices, row, position)
+        elif model.is_virtual(row):
+            ref_parts = (getattr(self, 'reference_data', None) or {}).get(key)
+            if ref_parts:
+                self._render_virtual_preview_group({'virtual': True, 'key': key, 'ref_parts': ref_parts}, row, position)
+
+    def _dematerialize_preview_group(self, key):
+        """Удаляет виджеты группы, вышедшей из видимой области"""
+        widgets = self.preview_key_to_group_widget.pop(key, None)
+        self.preview_group_editors.pop(key, None)
+        if not widgets:
+            return
+        meta_widget = widgets[0]
+        self.bookmark_labels_map.pop(key, None)
+        self.audio_labels_map.pop(key, None)
+        self.quick_audio_buttons.pop(key, None)
+        warning_icon = getattr(self, 'warning_icons_map', {}).pop(key, None)
+        for tooltip_widget in (warning_icon, getattr(meta_widget, 'comment_label', None)):
+            if tooltip_widget is not None:
+                self.unregister_custom_tooltip(tooltip_widget)
+
+        from widgets import PreviewTextEdit
+        for layout, widget in zip(self._preview_column_layouts(), widgets):
+            for edit in widget.findChildren(PreviewTextEdit):
+                edit.partner = None
+                edit.row_siblings = None
+            layout.removeWidget(widget)
+            widget.hide()
+            widget.deleteLater()
+
+    def _rebuild_preview_group(self, key):
+        """Пересоздаёт виджеты группы на прежнем месте (изменился состав её частей)"""
+        widgets = self.preview_key_to_group_widget.get(key)
+        row = self.preview_row_model.row_of(key) if self.preview_row_model is not None else -1
+        if not widgets or row < 0:
+            return
+        position = self.preview_meta_layout.indexOf(widgets[0])
+        self._dematerialize_preview_group(key)
+        self._materialize_preview_group(row, position)
+
+    def _register_preview_editor(self, key, edit):
+        """Добавляет редактор перевода, созданный в уже показанной группе"""
+        editors = self.preview_group_editors.get(key)
+        if editors is not None and edit not in editors[1]:
+            editors[1].append(edit)
+
+    def _unregister_preview_editor(self, key, edit):
+        """Убирает удаляемый редактор перевода из реестра группы"""
+        editors = self.preview_group_editors.get(key)
+        if editors is not None and edit in editors[1]:
+            editors[1].remove(edit)
+
+    def _insert_preview_row_widgets(self, widgets, position=None):
+        """Вставляет виджеты строки в три колонки (None — перед нижней распоркой)"""
+        for layout, widget in zip(self._preview_column_layouts(), widgets):
+            layout.insertWidget(layout.count() - 1 if position is None else position, widget)
+            # Сразу, а не из очереди событий: позиция и высота нужны для прокрутки к группе
+            widget.show()
+
+    def _create_preview_spacers(self):
+        """Распорки над и под созданными группами (их высота — из модели)"""
+        tops, bottoms = [], []
+        for layout in self._preview_column_layouts():
+            for spacers in (tops, bottoms):
+                spacer = QWidget()
+                spacer.setObjectName("preview_spacer")
+                spacer.setFixedHeight(0)
+                layout.addWidget(spacer)
+                spacers.append(spacer)
+        self._preview_spacers = (tops, bottoms)
+        self._preview_window = (0, 0)
+
+    def _update_preview_spacers(self):
+        """Высоты распорок: не больше PREVIEW_SPACER_MAX_PX, остальное учитывает полоса документа"""
+        model = self.preview_row_model
+        start, end = self._preview_window
+        top_height = min(model.offset(start), PREVIEW_SPACER_MAX_PX)
+        bottom_height = min(model.total_height() - model.offset(end), PREVIEW_SPACER_MAX_PX)
+        tops, bottoms = self._preview_spacers
+        for spacers, height in ((tops, top_height), (bottoms, bottom_height)):
+            for spacer in spacers:
+                if spacer.minimumHeight() != height:
+                    spacer.setFixedHeight(height)
+
+    def _activate_preview_layouts(self):
+        """Немедленно раскладывает колонки: позиции групп нужны для прокрутки к ним"""
+        for layout in self._preview_column_layouts():
+            layout.activate()
+        # Сплиттер сообщает о новых размерах колонок только из очереди событий:
+        # сбрасываем закэшированные размеры, чтобы содержимое выросло сразу
+        self.preview_splitter.updateGeometry()
+        self.preview_layout.activate()
+
+    def _get_preview_scroll_anchor(self):
+        """(ключ, смещение) группы у верхнего края области просмотра или None"""
+        model = self.preview_row_model
+        if model is None or not len(model):
+            return None
+        self._measure_preview_window()
+        y = self._preview_scroll_position()
+        row = model.row_at(y)
+        return model.keys[row], y - model.offset(row)
+
+    def _restore_preview_scroll_anchor(self, anchor):
+        """Ставит привязку прокрутки к группе ключа из _get_preview_scroll_anchor"""
+        model = self.preview_row_model
+        row = model.row_of(anchor[0]) if anchor else -1
+        if row < 0:
+            self._preview_anchor = (0, 0, None)
+        else:
+            self._preview_anchor = (row, anchor[1], None)
+
+    def _render_preview_group(self, group_indices, zebra_index, position=None):
+        """Создаёт виджеты группы строк одного ключа (мета, референс, перевод).
 
-    def _render_virtual_preview_group(self, vgroup):
+        Args:
+            group_indices: индексы строк ключа в original_lines
+            zebra_index:   номер группы в модели (цвет зебры)
+            position:      позиция в колонках (None — в конец окна, перед нижней распоркой)
+        """
+        if not group_indices: return
+        first_idx = group_indices[0]
+
+        # ПРОВЕРКА ГРАНИЦ (Защита от IndexError при быстрой смене файлов)
+        if group_indices[-1] >= len(self.original_lines):
+            return
+
+        line_data = self.original_lines[first_idx]
+        current_key = line_data['key']
+
+        # part_index уже сохранён в line_data при парсинге — НЕ перезаписываем
+
+        # Рассчитываем цвет зебры: чередуем по номеру группы
+        bg_color = self.theme_bg_even if zebra_index % 2 == 0 else self.theme_bg_odd
+
+        # Создаём три строки (по одной для каждой колонки)
+        is_bookmarked = current_key in self.bookmarks_data
+        if is_bookmarked:
+            _, _, meta_bg = self._get_bookmark_visual(current_key)
+        else:
+            meta_bg = bg_color
+
+        meta_row_widget = QWidget()
+        meta_row_widget.setObjectName("preview_line_group")
+        meta_row_widget.current_key = current_key  # СОХРАНЯЕМ КЛЮЧ
+        meta_row_widget._zebra_index = zebra_index  # Для восстановления цвета зебры
+        meta_row_widget.setStyleSheet(f'''
+            QWidget#preview_line_group {{
+                background-color: {meta_bg};
+                border-bottom: 1px solid #333;
+                border-radius: 0px;
+            }}
+        ''')
+        meta_row_layout = QVBoxLayout(meta_row_widget)
+        meta_row_layout.setContentsMargins(4, 0, 4, 0)
+        meta_row_layout.setSpacing(0)
+
+        # --- Закладка (значок) + Номер + Ключ ---
+        bookmark_header_layout = QHBoxLayout()
+        bookmark_header_layout.setContentsMargins(0, 0, 0, 0)
+        bookmark_header_layout.setSpacing(4)
+
+        star_text, star_color, _ = self._get_bookmark_visual(current_key)
+        star_style = f"color: {star_color}; font-size: 14px; background: transparent; border: none; padding: 0px;"
+        if is_bookmarked:
+            star_style = f"color: {star_color}; font-size: 14px; font-weight: bold; background: transparent; border: none; padding: 0px;"
+        bookmark_label = QLabel(star_text)
+        bookmark_label.setStyleSheet(star_style)
+        bookmark_label.setCursor(Qt.PointingHandCursor)
+        bookmark_label.setFixedWidth(16)
+        # ЛКМ = toggle звезды, ПКМ = контекстное меню
+        def _bm_mouse_press(e, k=current_key, bl=bookmark_label, mw=meta_row_widget):
+            if e.button() == Qt.LeftButton:
+                # Сохраняем состояние ДО переключения для логики двойного клика
+                mw._prev_bm_type = self.bookmarks_data.get(k, {}).get('type') if k in self.bookmarks_data else None
+                self.toggle_bookmark(k, bl, mw)
+            elif e.button() == Qt.RightButton:
+                self.show_bookmark_context_menu(k, bl, mw, e.globalPos())
+
+        def _bm_double_click(e, k=current_key, bl=bookmark_label, mw=meta_row_widget):
+            if e.button() == Qt.LeftButton:
+                self.cycle_bookmark_type(k, bl, mw)
+
+        bookmark_label.mousePressEvent = _bm_mouse_press
+        bookmark_label.mouseDoubleClickEvent = _bm_double_click
+        # Тултип с комментарием при наведении
+        bookmark_label.enterEvent = lambda e, k=current_key, bl=bookmark_label: self._on_bookmark_enter(k, bl, e)
+        bookmark_label.leaveEvent = lambda e, k=current_key, bl=bookmark_label: self._on_bookmark_leave(k, bl, e)
+        self.bookmark_labels_map[current_key] = bookmark_label
+
+        idx_label = f"#{first_idx+1}" if len(group_indices) == 1 else f"#{first_idx+1}-{group_indices[-1]+1}"
+        header_line = QLabel(f"<span style='color: #cccccc; font-weight: bold;'>{idx_label}</span> <span style='color: #8f8f8f; font-size: 12px;'>{current_key}</span>")
+        header_line.setStyleSheet('border: none; background: transparent;')
+        header_line.setWordWrap(True)
+
+        bookmark_header_layout.addWidget(header_line, 1, Qt.AlignTop)
+        bookmark_header_layout.addWidget(bookmark_label, 0, Qt.AlignTop | Qt.AlignRight)
+
+        meta_row_layout.addLayout(bookmark_header_layout)
+
+        orig_row_widget = QWidget()
+        orig_row_widget.setObjectName("preview_line_group")
+        orig_row_widget.setStyleSheet(f'''
+            QWidget#preview_line_group {{
+                background-color: {meta_bg};
+                border-bottom: 1px solid #333;
+                border-radius: 0px;
+            }}
+        ''')
+        orig_row_layout = QVBoxLayout(orig_row_widget)
+        orig_row_layout.setContentsMargins(4, 0, 4, 0)
+        orig_row_layout.setSpacing(0)
+
+        trans_row_widget = QWidget()
+        trans_row_widget.setObjectName("preview_line_group")
+        trans_row_widget.setStyleSheet(f'''
+            QWidget#preview_line_group {{
+                background-color: {meta_bg};
+                border-bottom: 1px solid #333;
+                border-radius: 0px;
+            }}
+        ''')
+        trans_row_layout = QVBoxLayout(trans_row_widget)
+        trans_row_layout.setContentsMargins(4, 0, 4, 0)
+        trans_row_layout.setSpacing(0)
+
+        # Регистрируем группу для селективного апдейта по ключу (три компонента)
+        try:
+            self.preview_key_to_group_widget[current_key] = (meta_row_widget, orig_row_widget, trans_row_widget)
+        except Exception:
+            self.preview_key_to_group_widget = {current_key: (meta_row_widget, orig_row_widget, trans_row_widget)}
+
+        # Инициализируем пустую карту для превью комментариев, если нет
+        if not hasattr(self, 'comment_previews_map'):
+            self.comment_previews_map = {}
+
+        try:
+            self._log_to_file(f"[PREVIEW_CREATE_GROUP] key={current_key} first_idx={first_idx} parts={len(group_indices)} row={zebra_index}")
+        except Exception:
+            pass
+
+        # Подсветка при наведении только для аудио меток, для строк убрана
+
+        audio_info = self.miz_resource_manager.get_audio_for_key(current_key)
+        bookmark_info = self.bookmarks_data.get(current_key)
+        has_comment = bookmark_info and bookmark_info.get('comment')
+
+        if audio_info or bookmark_info:
+            # Контейнер для доп. контролов (Аудио, Комментарии)
+            extras_layout = QHBoxLayout()
+            extras_layout.setContentsMargins(0, 0, 0, 0)
+            extras_layout.setSpacing(8) # Оптимизированный спейсинг
+            meta_row_widget.extras_layout = extras_layout
+
+            if audio_info:
+                audio_filename, is_current_locale = audio_info
+                audio_color = '#00cc66' if self.miz_resource_manager.is_audio_replaced(current_key) else ('#ff9900' if is_current_locale else '#888888')
+                audio_label = ClickableLabel(audio_filename)
+                audio_label.key = current_key
+                audio_label.clicked.connect(lambda k=current_key: self.open_audio_player(k, auto_play=False))
+                audio_label.rightClicked.connect(lambda pos, k=current_key: self._on_audio_label_context_menu(pos, k))
+                audio_label.fileDropped.connect(lambda path, k=current_key: self.handle_audio_replacement(k, path))
+                if current_key not in self.audio_labels_map:
+                    self.audio_labels_map[current_key] = []
+                self.audio_labels_map[current_key].append(audio_label)
+
+                # ЦВЕТ АУДИО
+                is_audio_replaced = self.miz_resource_manager.is_audio_replaced(current_key)
+                if is_audio_replaced:
+                     audio_color = getattr(self, 'theme_text_modified', '#ff6666')
+                elif is_current_locale:
+                     audio_color = getattr(self, 'theme_text_saved', '#2ecc71')
+                else:
+                     audio_color = '#cccccc'
+
+                border_style = "border: 1px solid #ff9900; border-radius: 4px;" if current_key == self.active_audio_key else "border: 1px solid transparent;"
+                audio_label.setStyleSheet(f'''
+                    QLabel {{
+                        color: {audio_color};
+                        font-size: 12px;
+                        text-decoration: underline;
+                        background-color: transparent;
+                        {border_style}
+                        padding: 2px;
+                    }}
+                    QLabel:hover {{
+                        background-color: #3d4256;
+                        border-radius: 2px;
+                    }}
+                ''')
+                audio_label.setWordWrap(True)
+                meta_row_layout.addWidget(audio_label, 0, Qt.AlignTop)
+
+                # Мини-кнопки управления (Play/Stop)
+                play_btn = QPushButton("▶")
+                play_btn.setFixedSize(self.preview_btn_size, self.preview_btn_size)
+                play_btn.setCursor(Qt.PointingHandCursor)
+                play_btn.setFocusPolicy(Qt.NoFocus)
+                play_btn.setStyleSheet(self.preview_btn_base.format(size=self.preview_play_font, w=self.preview_btn_size, top=self.preview_play_top_offset))
+                play_btn.clicked.connect(lambda _, k=current_key, b=play_btn: self.quick_toggle_audio(k, b))
+
+                stop_btn = QPushButton("■")
+                stop_btn.setFixedSize(self.preview_btn_size, self.preview_btn_size)
+                stop_btn.setCursor(Qt.PointingHandCursor)
+                stop_btn.setFocusPolicy(Qt.NoFocus)
+                stop_btn.setStyleSheet(self.preview_btn_base.format(size=self.preview_stop_font, w=self.preview_btn_size, top=self.preview_stop_top_offset))
+                stop_btn.clicked.connect(self.stop_quick_audio)
+
+                extras_layout.addWidget(play_btn)
+                extras_layout.addWidget(stop_btn)
+
+                # Значок ВНИМАНИЯ
+                if not is_current_locale:
+                    warning_icon = QLabel("⚠")
+                    warning_icon.setStyleSheet("color: #ffcc00; background-color: transparent; font-size: 16px; margin-left: 1px;")
+                    warning_icon.setCursor(Qt.PointingHandCursor)
+                    extras_layout.addWidget(warning_icon)
+                    self.register_custom_tooltip(warning_icon, get_translation(self.current_language, 'file_from_default'), side='top')
+                    if not hasattr(self, 'warning_icons_map'):
+                        self.warning_icons_map = {}
+                    self.warning_icons_map[current_key] = warning_icon
+
+                try:
+                    self.quick_audio_buttons[current_key] = play_btn
+                    if self.quick_playing_key == current_key:
+                        if self.quick_paused: play_btn.setText("▶")
+                        else: play_btn.setText("\u23F8\uFE0E")
+                except Exception: pass
+
+            # ПРЕДПРОСМОТР КОММЕНТАРИЯ
+            if has_comment:
+                comment_text = bookmark_info.get('comment', '')
+                short_comment = comment_text.split('\n')[0].strip()
+                if len(short_comment) > 40: short_comment = short_comment[:40] + "..."
+
+                if short_comment:
+                    comment_preview = QLabel(short_comment)
+                    comment_preview.setStyleSheet("""
+                        QLabel {
+                            color: #ffffff;
+                            background-color: rgba(50, 50, 50, 245);
+                            border: 1px solid #ff9900;
+                            border-radius: 4px;
+                            padding: 1px 6px;
+                            font-size: 11px;
+                        }
+                    """)
+                    comment_preview.setMaximumWidth(150) # Ограничиваем ширину чтобы не вытеснял остальное
+                    extras_layout.addWidget(comment_preview, 0, Qt.AlignVCenter)
+                    self.register_custom_tooltip(comment_preview, comment_text, side='top')
+                    meta_row_widget.comment_label = comment_preview
+
+            extras_layout.addStretch()
+            meta_row_layout.addLayout(extras_layout)
+
+        # --- 1. Отрисовка референса (Колонка 2) ---
+        # Теперь она "развязана" от отфильтрованных индексов перевода.
+        # Мы отрисовываем ВСЕ строки референса, которые есть в данных для этого ключа.
+
+        miz_path = getattr(self, 'current_miz_path', '') or ''
+        file_path = getattr(self, 'current_file_path', '') or ''
+        is_cmp = miz_path.lower().endswith('.cmp') or file_path.lower().endswith('.cmp')
+        ref_locale = self.reference_locale
+
+        ref_parts = []
+        if not is_cmp and getattr(self, 'current_miz_path', None) and getattr(self, 'reference_data', None):
+            ref_parts = self.reference_data.get(current_key, [])
+        elif is_cmp:
+            # Для .cmp используем замороженные данные (cmp_reference_data)
+            base_key = current_key
+            k_parts = current_key.rsplit('_', 1)
+            if len(k_parts) > 1 and k_parts[1].isupper() and len(k_parts[1]) == 2:
+                base_key = k_parts[0]
+            target_ref_key = base_key if ref_locale == "DEFAULT" else f"{base_key}_{ref_locale}"
+            frozen = getattr(self, 'cmp_reference_data', {})
+            ref_parts = frozen.get(target_ref_key, [])
+            if not ref_parts and ref_locale != "DEFAULT":
+                ref_parts = frozen.get(base_key, [])
+
+        # Если референс есть — выводим его ВЕСЬ (симметрия к полному ключу)
+        # НО: если это "пустой аудио-ключ" (hide_input), референс тоже не выводим для чистоты
+        has_any_line_with_input = any(not self.original_lines[idx].get('hide_input') for idx in group_indices)
+
+        if ref_parts and has_any_line_with_input:
+            for p_idx, ref_text in enumerate(ref_parts):
+                orig_edit = PreviewTextEdit(-1, ref_text, read_only=True, parent=self)
+                orig_edit.is_reference = True
+                orig_edit.key = current_key
+                orig_edit.part_index = p_idx
+                orig_edit.set_preview_state('reference')
+                orig_row_layout.addWidget(orig_edit, 0, Qt.AlignTop)
+        elif not has_any_line_with_input:
+            # Пустой аудио-ключ: ничего не добавляем в референс
+            pass
+        else:
+            # Fallback: если референса нет
+            if getattr(self, 'is_dictionary_mode', False):
+                warn_marker = ""
+                warn_state = 'reference'
+            else:
+                warn_marker = get_translation(self.current_language, 'no_reference_marker')
+                warn_state = 'no_reference'
+
+            for idx in group_indices:
+                if self.original_lines[idx].get('hide_input'): continue
+                ref_text = self.original_lines[idx].get('display_text', '')
+                # Добавляем маркер перед текстом
+                display_text = warn_marker + ref_text
+
+                orig_edit = PreviewTextEdit(idx, display_text, read_only=True, parent=self)
+                orig_edit.is_reference = True
+                orig_edit.key = current_key
+                orig_edit.part_index = self.original_lines[idx].get('part_index', 0)
+
+                # Устанавливаем стиль
+                orig_edit.set_preview_state(warn_state)
+
+                orig_row_layout.addWidget(orig_edit, 0, Qt.AlignTop)
+
+        # --- 2. Отрисовка перевода (Колонка 3) ---
+        # Подчиняется фильтрам (group_indices может быть подмножеством всех строк ключа)
+        for idx_in_group, idx in enumerate(group_indices):
+            l_data = self.original_lines[idx]
+            if l_data.get('hide_input'):
+                continue # Пропускаем создание поля ввода
+
+            original_part_idx = l_data.get('part_index', 0)
+
+            t_text = l_data['translated_text'] if l_data['translated_text'] else ""
+            is_modified = False
+            if 'original_translated_text' in l_data:
+                is_modified = t_text != l_data['original_translated_text']
+
+            trans_edit = PreviewTextEdit(idx, t_text, read_only=False, parent=self)
+            trans_edit.is_reference = False
+            trans_edit.key = current_key
+            trans_edit.part_index = original_part_idx
+            is_mission_name = current_key.startswith('DictKey_sortie_') or current_key == 'name' or current_key.startswith('name_')
+            trans_edit.single_line = is_mission_name
+            # [SMART PASTE] Подключаем обработчик маркеров из превью
+            trans_edit.smart_paste_requested.connect(self.handle_smart_paste_request)
+
+            trans_edit.set_preview_state(self._get_translation_state(is_modified, l_data))
+
+            # ВОССТАНОВЛЕНИЕ ФОКУСА
+            if self.last_focused_preview_info:
+                info = self.last_focused_preview_info
+                # Для PreviewTextEdit 'index' обычно соответствует 'part_index' внутри группы или глобальному индексу
+                # Но надежнее всего проверять по ключу (если есть) и индексу части
+                is_match = False
+                if info['key'] == current_key:
+                    # Проверяем совпадение части ключа
+                    if info['part_index'] == original_part_idx:
+                        is_match = True
+
+                if is_match:
+                    try:
+                        trans_edit.setFocus()
+                        cursor = trans_edit.textCursor()
+                        cursor.setPosition(info['anchor'])
+                        cursor.setPosition(info['position'], QTextCursor.KeepAnchor)
+                        trans_edit.setTextCursor(cursor)
+                        # Сбрасываем, чтобы не фокусировать повторно при батчевой отрисовке других групп
+                        self.last_focused_preview_info = None
+                    except Exception:
+                        pass
+            # Исправлено: лямбда теперь использует динамический te.index и данные из оригинального списка.
+            # Это предотвращает перезапись чужих строк при вставке новых через Enter.
+            trans_edit.text_changed.connect(
+                lambda *args, te=trans_edit: 
+                self.on_preview_text_modified(te, te.index, self.original_lines[te.index])
+            )
+            # Подключаем вставку новой строки через Enter
+            trans_edit.line_inserted.connect(
+                lambda ins_idx, move_text, te=trans_edit,
+                       orl=orig_row_layout, trl=trans_row_layout,
+                       mw=meta_row_widget, orw=orig_row_widget, trw=trans_row_widget:
+                self.on_preview_line_inserted(ins_idx, move_text, te, orl, trl, mw, orw, trw)
+            )
+            # Подключаем удаление/слияние строки через Backspace
+            trans_edit.line_deleted.connect(lambda del_idx, merge_text, te=trans_edit: self.on_preview_line_deleted(del_idx, te, merge_text))
+
+
+            trans_row_layout.addWidget(trans_edit, 0, Qt.AlignTop)
+
+
+        # Подключаем row_siblings на каждый PreviewTextEdit для трёхсторонней синхронизации
+        siblings_tuple = (meta_row_widget, orig_row_widget, trans_row_widget)
+        orig_edits = orig_row_widget.findChildren(PreviewTextEdit)
+        trans_edits = trans_row_widget.findChildren(PreviewTextEdit)
+        for edit in orig_edits + trans_edits:
+            edit.row_siblings = siblings_tuple
+        self.preview_group_editors[current_key] = (orig_edits, trans_edits)
+
+        # Активируем layout'ы
+        meta_row_widget.layout().activate()
+        orig_row_widget.layout().activate()
+        trans_row_widget.layout().activate()
+
+        # Синхронизируем высоту всей группы (особенно важно для пустых аудио-ключей)
+        max_h = max(meta_row_widget.sizeHint().height(), 
+                    orig_row_widget.sizeHint().height(), 
+                    trans_row_widget.sizeHint().height(), 24)
+        meta_row_widget.setFixedHeight(max_h)
+        orig_row_widget.setFixedHeight(max_h)
+        trans_row_widget.setFixedHeight(max_h)
+
+        # Добавляем растяжку в концы layout-ов, чтобы прижать всё содержимое к ВЕРХУ
+        meta_row_layout.addStretch(1)
+        orig_row_layout.addStretch(1)
+        trans_row_layout.addStretch(1)
+
+        # Добавляем три row-виджета в их соответствующие колонки
+        self._insert_preview_row_widgets((meta_row_widget, orig_row_widget, trans_row_widget), position)
+
+
+    def _render_virtual_preview_group(self, vgroup, zebra_index, position=None):
         """Отрисовывает виртуальную группу — ключ есть в референсе, но НЕТ в переводе."""
         from widgets import PreviewTextEdit
         
         current_key = vgroup['key']
         ref_parts = vgroup['ref_parts']
         
-        current_count = self.preview_meta_layout.count()
-        # Рассчитываем цвет зебры: чередуем по чётности
+        # Рассчитываем цвет зебры: чередуем по номеру группы
         is_bookmarked = current_key in self.bookmarks_data
         if is_bookmarked:
             _, _, bg_color = self._get_bookmark_visual(current_key)
         else:
-            bg_color = self.theme_bg_even if current_count % 2 == 0 else self.theme_bg_odd
+            bg_color = self.theme_bg_even if zebra_index % 2 == 0 else self.theme_bg_odd
         
         container_style = f'''
             QWidget#preview_line_group {{
@@ -9754,7 +10074,7 @@ QPushButton:hover {{
         meta_row_widget = QWidget()
         meta_row_widget.setObjectName("preview_line_group")
         meta_row_widget.current_key = current_key  # СОХРАНЯЕМ КЛЮЧ
-        meta_row_widget._zebra_index = current_count
+        meta_row_widget._zebra_index = zebra_index
         meta_row_widget.setStyleSheet(container_style)
         meta_row_layout = QVBoxLayout(meta_row_widget)
         meta_row_layout.setContentsMargins(4, 1, 4, 1)
@@ -9891,8 +10211,7 @@ QPushButton:hover {{
             orig_edit.is_reference = True
             orig_edit.key = current_key
             orig_edit.part_index = p_idx
-            orig_edit.setStyleSheet("color: #ffffff; background-color: transparent; border: none; border-radius: 0px;")
-            orig_edit._original_style = "color: #ffffff; background-color: transparent; border: none; border-radius: 0px;"
+            orig_edit.set_preview_state('reference')
             orig_row_layout.addWidget(orig_edit, 0, Qt.AlignTop)
         
         # --- Перевод-колонка (виртуальная — placeholder) ---
@@ -9904,7 +10223,6 @@ QPushButton:hover {{
         trans_row_layout.setSpacing(0)
         
         warn_marker = get_translation(self.current_language, 'no_translation_marker')
-        warn_style = "color: #999999; background-color: rgba(255, 165, 0, 20); border: none; border-radius: 0px;"
         
         for p_idx, ref_text in enumerate(ref_parts):
             # Показываем маркер как реальный текст (placeholder невидим на тёмном фоне)
@@ -9922,8 +10240,7 @@ QPushButton:hover {{
             trans_edit._virtual_part_index = p_idx
             trans_edit._virtual_total_parts = len(ref_parts)
             trans_edit._virtual_marker = marker_text  # Запоминаем маркер для очистки при фокусе
-            trans_edit.setStyleSheet(warn_style)
-            trans_edit._original_style = warn_style
+            trans_edit.set_preview_state('virtual')
             
             # При первом вводе текста — лениво инжектируем ключ в данные
             trans_edit.text_changed.connect(
@@ -9952,9 +10269,15 @@ QPushButton:hover {{
         orig_row_widget.layout().activate()
         trans_row_widget.layout().activate()
         
-        self.preview_meta_layout.addWidget(meta_row_widget)
-        self.preview_orig_layout.addWidget(orig_row_widget)
-        self.preview_trans_layout.addWidget(trans_row_widget)
+        # Общая высота трёх колонок (как у обычной группы) — по ней считается модель высот
+        max_h = max(meta_row_widget.sizeHint().height(),
+                    orig_row_widget.sizeHint().height(),
+                    trans_row_widget.sizeHint().height(), MIN_ROW_HEIGHT)
+        meta_row_widget.setFixedHeight(max_h)
+        orig_row_widget.setFixedHeight(max_h)
+        trans_row_widget.setFixedHeight(max_h)
+        
+        self._insert_preview_row_widgets((meta_row_widget, orig_row_widget, trans_row_widget), position)
         
         try:
             self.preview_key_to_group_widget[current_key] = (meta_row_widget, orig_row_widget, trans_row_widget)
@@ -10022,6 +10345,7 @@ QPushButton:hover {{
             }
             self.original_lines.append(new_entry)
             self.all_lines_data.append(new_entry)
+        self._preview_key_indices_cache = None
         
         # Обновляем индексы у всех виртуальных полей этого ключа
         from widgets import PreviewTextEdit
@@ -10060,10 +10384,7 @@ QPushButton:hover {{
                     )
                     
                     # Обновляем стиль на обычный «новый текст»
-                    text_color = getattr(self, 'theme_text_modified', "#ff6666")
-                    new_style = f"color: {text_color}; background-color: transparent; border: none; border-radius: 0px;"
-                    child_edit.setStyleSheet(new_style)
-                    child_edit._original_style = new_style
+                    child_edit.set_preview_state('modified')
         
         # Обновляем редактор (добавляем строки в QPlainTextEdit)
         self.prevent_text_changed = True
@@ -10157,11 +10478,25 @@ QPushButton:hover {{
             self.is_updating_from_preview = False
 
     # [SEARCH_METHODS]
-    def on_search_text_changed(self, text, scroll=True, preferred_index=None, preferred_type=None):
-        """Обработка ввода текста в поиск"""
+    def schedule_search(self, text):
+        """Ввод в поле поиска: на больших словарях поиск — после паузы во вводе"""
+        if len(self.original_lines) < SEARCH_DEBOUNCE_MIN_LINES or not text:
+            self.search_debounce_timer.stop()
+            self.on_search_text_changed(text, narrow=True)
+        else:
+            self.search_debounce_timer.start(SEARCH_DEBOUNCE_MS)
+
+    def on_search_text_changed(self, text, scroll=True, preferred_index=None, preferred_type=None, narrow=False):
+        """Обработка ввода текста в поиск.
+
+        narrow=True — ввод в поле поиска: если запрос продолжает предыдущий,
+        проверяются только прошлые совпадения (см. SearchIndex.search).
+        Остальные вызовы сначала сверяют индекс со строками.
+        """
         try:
+            self.search_debounce_timer.stop()
             self.search_matches = []
-            self.search_match_types = []  # Типы совпадений: 'text_original', 'text_translated' или 'audio'
+            self.search_match_types = []  # Типы совпадений: 'text_original', 'text_reference', 'text_translated' или 'audio'
             self.current_match_index = -1
             
             # Снимаем выделение файла, если поиск очищен
@@ -10180,84 +10515,20 @@ QPushButton:hover {{
                 self.update_search_matches_label()
                 return
 
-            # Ищем совпадения в тексте - РАЗЛИЧНЫЕ записи для одного ключа если совпадение в обоих полях
-            found_keys_audio = set()  # Для отслеживания ключей с аудио совпадениями
-            
-            # Предварительная загрузка флагов для оптимизации
-            s_orig = getattr(self, 'search_scope_original', True)
-            s_ref = getattr(self, 'search_scope_reference', True)
-            s_edit = getattr(self, 'search_scope_editor', True)
-            s_audio = getattr(self, 'search_scope_audio', True)
-
-            for i, line in enumerate(self.original_lines):
-                current_key = line.get('key')
-                
-                # 1. Поиск в оригинале (левое верхнее окно)
-                if s_orig:
-                    original = str(line.get('display_text', ''))
-                    key = str(line.get('key', ''))
-                    if not case_sensitive:
-                        original = original.lower()
-                        key = key.lower()
-                    if search_text in original or search_text in key:
-                        self.search_matches.append(i)
-                        self.search_match_types.append('text_original')
-                
-                # 2. Поиск в референсе (нижнее левое окно)
-                if s_ref:
-                    # ПОСЕГМЕНТНЫЙ ПОИСК: ищем только в том тексте, который РЕАЛЬНО отображается в этой строке
-                    ref_val = self.reference_data.get(current_key, [])
-                    part_idx = line.get('part_index', 0)
-                    
-                    found_ref_text = ""
-                    if isinstance(ref_val, list):
-                        # Если это список (CMP или многострочный), берем строго кусок по индексу
-                        if 0 <= part_idx < len(ref_val):
-                            found_ref_text = str(ref_val[part_idx])
-                    else:
-                        # Если это одиночная строка (обычный MIS), 
-                        # засчитываем совпадение ТОЛЬКО для первой части ключа, 
-                        # чтобы не дублировать результаты на все куски сообщения.
-                        if part_idx == 0:
-                            found_ref_text = str(ref_val)
-                    
-                    if not found_ref_text and not ref_val:
-                        found_ref_text = str(line.get('display_text', ''))
-                    
-                    if not case_sensitive:
-                        found_ref_text = found_ref_text.lower()
-                        
-                    if found_ref_text and search_text in found_ref_text:
-                        self.search_matches.append(i)
-                        self.search_match_types.append('text_reference')
-                
-                # 3. Поиск в редакторе (правое верхнее окно / перевод)
-                if s_edit:
-                    translated = str(line.get('translated_text', ''))
-                    if not case_sensitive:
-                        translated = translated.lower()
-                    if search_text in translated:
-                        self.search_matches.append(i)
-                        self.search_match_types.append('text_translated')
-                
-                # 4. Поиск в аудиофайлах
-                if s_audio:
-                    audio_info = self.m_res.get_audio_for_key(current_key) if hasattr(self, 'm_res') else self.miz_resource_manager.get_audio_for_key(current_key)
-                    if audio_info:
-                        audio_filename = audio_info[0]
-                        if not case_sensitive:
-                            audio_filename = audio_filename.lower()
-                        if search_text in audio_filename:
-                            if current_key not in found_keys_audio:
-                                self.search_matches.append(i)
-                                self.search_match_types.append('audio')
-                                found_keys_audio.add(current_key)
-            
-            # Сортируем по индексу для поддержания порядка
-            if self.search_matches:
-                sorted_indices = sorted(range(len(self.search_matches)), key=lambda i: self.search_matches[i])
-                self.search_matches = [self.search_matches[i] for i in sorted_indices]
-                self.search_match_types = [self.search_match_types[i] for i in sorted_indices]
+            scopes = [scope for scope, enabled in (
+                ('text_original', getattr(self, 'search_scope_original', True)),
+                ('text_reference', getattr(self, 'search_scope_reference', True)),
+                ('text_translated', getattr(self, 'search_scope_editor', True)),
+                ('audio', getattr(self, 'search_scope_audio', True)),
+            ) if enabled]
+
+            # Индекс: тексты строк по областям, уже в casefold; аудио — одно совпадение на ключ
+            if not narrow:
+                self.search_index.mark_stale()
+            resources = getattr(self, 'm_res', None) or self.miz_resource_manager
+            self.search_index.sync(self.original_lines, self.reference_data,
+                                   resources.get_audio_for_key, getattr(resources, 'links_revision', None))
+            self.search_matches, self.search_match_types = self.search_index.search(text, case_sensitive, scopes)
             
             if self.search_matches:
                 # Если передан предпочтительный индекс (например, из контекстного меню строки),
@@ -10303,6 +10574,9 @@ QPushButton:hover {{
     def search_next(self):
         """Переход к следующему совпадению"""
         try:
+            # Ввод ещё ждёт debounce — сначала ищем по тексту из поля
+            if self.search_debounce_timer.isActive():
+                self.on_search_text_changed(self.search_input.text(), narrow=True)
             if not self.search_matches:
                 if self.search_input.text():
                     self.on_search_text_changed(self.search_input.text())
@@ -10334,6 +10608,9 @@ QPushButton:hover {{
     def search_prev(self):
         """Переход к предыдущему совпадению"""
         try:
+            # Ввод ещё ждёт debounce — сначала ищем по тексту из поля
+            if self.search_debounce_timer.isActive():
+                self.on_search_text_changed(self.search_input.text(), narrow=True)
             if not self.search_matches:
                 if self.search_input.text():
                     self.on_search_text_changed(self.search_input.text())
@@ -10871,7 +11148,7 @@ QPushButton:hover {{
             self.sync_editors_to_line(target_index)
             
             # 4. Скроллим правую панель (превью)
-            if hasattr(self, 'preview_key_to_group_widget') and dict_key in self.preview_key_to_group_widget:
+            if hasattr(self, 'preview_key_to_group_widget') and self.ensure_preview_key_rendered(dict_key):
                 widget_data = self.preview_key_to_group_widget[dict_key]
                 widget_to_scroll = widget_data[0] if isinstance(widget_data, (tuple, list)) else widget_data.get('meta')
                 
@@ -11010,9 +11287,11 @@ QPushButton:hover {{
     def stop_all_preview_timers(self):
         """Безусловно останавливает все таймеры обновления интерфейса"""
         if self.preview_update_timer: self.preview_update_timer.stop()
-        if self.preview_batch_timer: self.preview_batch_timer.stop()
+        if self.preview_window_timer: self.preview_window_timer.stop()
+        if self.preview_estimate_timer: self.preview_estimate_timer.stop()
         if self.filter_debounce_timer: self.filter_debounce_timer.stop()
         if self.preview_sync_timer: self.preview_sync_timer.stop()
+        if self.search_debounce_timer: self.search_debounce_timer.stop()
 
     # [QUICK_SAVE]
     def quick_save(self):
@@ -11465,6 +11744,19 @@ QPushButton:hover {{
         backup_label.setStyleSheet("color: #ffffff; font-size: 12px; font-weight: normal;")
         backup_layout.addWidget(backup_label)
         overwrite_layout.addLayout(backup_layout)
+
+        incremental_layout = QHBoxLayout()
+        incremental_layout.setAlignment(Qt.AlignCenter)
+        incremental_layout.setSpacing(10)
+        self.miz_incremental_cb = ToggleSwitch()
+        self.miz_incremental_cb.setChecked(getattr(self, 'miz_incremental_save', False))
+        self.miz_incremental_cb.setToolTip(get_translation(self.current_language, 'miz_incremental_tooltip'))
+        incremental_layout.addWidget(self.miz_incremental_cb)
+        incremental_label = QLabel(get_translation(self.current_language, 'miz_incremental_label'))
+        incremental_label.setStyleSheet("color: #ffffff; font-size: 12px; font-weight: normal;")
+        incremental_label.setToolTip(get_translation(self.current_language, 'miz_incremental_tooltip'))
+        incremental_layout.addWidget(incremental_label)
+        overwrite_layout.addLayout(incremental_layout)
         btns_layout.addWidget(overwrite_frame)
         
         # Сохранить как
@@ -11511,6 +11803,8 @@ QPushButton:hover {{
         def on_cancel():
             if hasattr(self, 'miz_backup_cb'):
                 self.create_backup = self.miz_backup_cb.isChecked()
+                if hasattr(self, 'miz_incremental_cb'):
+                    self.miz_incremental_save = self.miz_incremental_cb.isChecked()
                 self.save_settings()
             dialog.reject()
         cancel_btn.clicked.connect(on_cancel)
@@ -11538,6 +11832,8 @@ QPushButton:hover {{
         # Сохраняем состояние бэкапа
         if hasattr(self, 'miz_backup_cb'):
             self.create_backup = self.miz_backup_cb.isChecked()
+            if hasattr(self, 'miz_incremental_cb'):
+                self.miz_incremental_save = self.miz_incremental_cb.isChecked()
             self.save_settings()
             
         dialog.accept()
@@ -11570,6 +11866,84 @@ QPushButton:hover {{
             ErrorLogger.log_error("BACKUP", f"Не удалось создать резервную копию: {e}")
             return None
 
+    def _save_miz_incremental(self, locales_data, allowed_folders):
+        """Сохраняет изменения дозаписью в конец .miz вместо полной перезаписи.
+
+        Дописываются только изменившиеся dictionary/mapResource (сравнение по CRC32
+        с текущей версией в архиве) и новые/заменённые ресурсы. Старые версии
+        исключаются из центрального каталога.
+
+        Returns:
+            True — архив обновлён; False — нужна полная перезапись
+            (накопилось много мёртвых данных или имена файлов требуют исправления)
+        """
+        miz_path = self.current_miz_path
+        manager = self.miz_resource_manager
+        pending_files = manager.get_pending_files()
+        replaced_lower = {p.lower() for p in pending_files}
+        replaced_lower.update(p.lower() for p in manager.get_files_to_delete())
+
+        drop_names = []
+        dict_writes = []  # [(имя_в_архиве, all_lines_data)]
+        map_writes = []   # [(имя_в_архиве, bytes)]
+
+        with zipfile.ZipFile(miz_path, 'r') as zin:
+            existing = {}
+            for item in zin.infolist():
+                path_norm = item.filename.replace('\\', '/').strip('/')
+                path_norm_lower = path_norm.lower()
+                existing[path_norm_lower] = item
+
+                # Файлы удалённых локалей
+                if path_norm_lower.startswith("l10n/"):
+                    parts = path_norm.split('/')
+                    if len(parts) > 1 and parts[1].lower() not in allowed_folders:
+                        drop_names.append(item.filename)
+                        continue
+                # Заменённые и удаляемые ресурсы
+                if path_norm_lower in replaced_lower:
+                    drop_names.append(item.filename)
+
+            for locale, lines_data in locales_data.items():
+                dict_path = f'l10n/{locale}/dictionary'
+                item = existing.get(dict_path.lower())
+                if item is None:
+                    dict_writes.append((dict_path, lines_data))
+                else:
+                    chunks = (chunk.encode('utf-8') for chunk in iter_dictionary_chunks(lines_data))
+                    if not content_matches_member(item, chunks):
+                        drop_names.append(item.filename)
+                        dict_writes.append((item.filename, lines_data))
+
+                map_path = f'l10n/{locale}/mapResource'
+                updated_map = manager.get_updated_map_resource_content(zin, locale).encode('utf-8')
+                item = existing.get(map_path.lower())
+                if item is None:
+                    map_writes.append((map_path, updated_map))
+                elif not content_matches_member(item, (updated_map,)):
+                    drop_names.append(item.filename)
+                    map_writes.append((item.filename, updated_map))
+
+        can_append, reason = check_append_update(miz_path, drop_names)
+        if not can_append:
+            print(f"DEBUG: Incremental save -> full rewrite ({reason})")
+            return False
+
+        def write_members(zout):
+            for target, lines_data in dict_writes:
+                self._write_dictionary_to_zip(zout, target, lines_data)
+                print(f"DEBUG: Appended dictionary: {target}")
+            for target, content in map_writes:
+                zout.writestr(target, content)
+                print(f"DEBUG: Appended mapResource: {target}")
+            for target_path, source_path in pending_files.items():
+                if os.path.exists(source_path):
+                    zout.write(source_path, arcname=target_path)
+
+        invalidate_archive(miz_path)
+        append_update_archive(miz_path, drop_names, write_members)
+        return True
+
     def save_miz_overwrite(self, silent=False):
         """Перезаписывает исходный .miz файл (сохраняет ВСЕ локали)"""
         # [SUPPRESS_REDRAW] Флаг уже должен быть установлен в handle_miz_save
@@ -11591,11 +11965,7 @@ QPushButton:hover {{
                 
                 # 1. Сначала сохраняем текущее состояние в память
                 if self.current_miz_folder:
-                     self.miz_trans_memory[self.current_miz_folder] = {
-                        'original_lines': copy.deepcopy(self.original_lines),
-                        'all_lines_data': copy.deepcopy(self.all_lines_data),
-                        'original_content': self.original_content
-                    }
+                     self._store_current_locale_in_memory()
                 
                 if progress:
                     progress.show()
@@ -11615,112 +11985,127 @@ QPushButton:hover {{
                 # Временный файл для записи изменений
                 temp_miz = self.current_miz_path + '.tmp'
                 
+                # Собираем данные для всех локалей из памяти
+                # (содержимое пишется потоково при записи в архив)
+                locales_data = {} # {folder: all_lines_data}
+                
+                # Список разрешенных папок локалей (для удаления мусора из удаленных локалей)
+                allowed_folders = [f.lower() for f in self.current_miz_l10n_folders]
+                
+                for locale, data in self.miz_trans_memory.items():
+                     locales_data[locale] = data['all_lines_data']
+
+                # Фоновая загрузка ресурсов (менеджер файлов, плейлист) не читает
+                # архив, пока он дописывается или заменяется
+                pause_all_pools()
                 try:
-                    # Читаем оригинал и пишем в темп
-                    with zipfile.ZipFile(self.current_miz_path, 'r') as zin:
-                        with zipfile.ZipFile(temp_miz, 'w', compression=zin.compressionlevel if hasattr(zin, 'compressionlevel') else zipfile.ZIP_DEFLATED) as zout:
-                            if progress: progress.set_value(50)
-                            
-                            # Собираем данные для всех локалей из памяти
-                            locales_data = {} # {folder: binary_content}
+                    # Быстрый режим: дописываем только изменённые файлы в конец архива.
+                    # Если архив нужно сжать (много мёртвых данных) — полная перезапись
+                    appended = False
+                    if getattr(self, 'miz_incremental_save', False):
+                        appended = self._save_miz_incremental(locales_data, allowed_folders)
+
+                    if not appended:
+                        # Читаем оригинал и пишем в темп
+                        with zipfile.ZipFile(self.current_miz_path, 'r') as zin:
+                            with zipfile.ZipFile(temp_miz, 'w', compression=zin.compressionlevel if hasattr(zin, 'compressionlevel') else zipfile.ZIP_DEFLATED) as zout:
+                                if progress: progress.set_value(50)
                             
-                            # Список разрешенных папок локалей (для удаления мусора из удаленных локалей)
-                            allowed_folders = [f.lower() for f in self.current_miz_l10n_folders]
-                            
-                            for locale, data in self.miz_trans_memory.items():
-                                 # Генерируем контент для каждой локали
-                                 content = self.generate_content_from_data(data['all_lines_data'])
-                                 locales_data[locale] = content.encode('utf-8')
+                                # Список файлов, которые мы заменили
+                                replaced_files = []
 
-                            # Список файлов, которые мы заменили
-                            replaced_files = []
-
-                            for item in zin.infolist():
-                                # Сохраняем оригинальное имя
-                                original_filename_for_read = item.filename
+                                for item in zin.infolist():
+                                    # Сохраняем оригинальное имя
+                                    original_filename_for_read = item.filename
                                 
-                                try:
-                                    fixed_name = item.filename.encode('cp437').decode('utf-8')
-                                    item.filename = fixed_name
-                                    item.flag_bits |= 0x800  # UTF-8 flag
-                                except (UnicodeEncodeError, UnicodeDecodeError):
-                                    pass
+                                    try:
+                                        fixed_name = item.filename.encode('cp437').decode('utf-8')
+                                        item.filename = fixed_name
+                                        item.flag_bits |= 0x800  # UTF-8 flag
+                                    except (UnicodeEncodeError, UnicodeDecodeError):
+                                        pass
 
-                                is_handled = False
-                                path_norm = item.filename.replace('\\', '/').strip('/')
-                                path_norm_lower = path_norm.lower()
+                                    is_handled = False
+                                    path_norm = item.filename.replace('\\', '/').strip('/')
+                                    path_norm_lower = path_norm.lower()
                                 
-                                for locale in locales_data:
-                                    # 1. Проверка словаря
-                                    if path_norm_lower == f'l10n/{locale}/dictionary'.lower():
-                                        zout.writestr(item, locales_data[locale])
-                                        replaced_files.append(path_norm)
-                                        is_handled = True
-                                        print(f"DEBUG: Updated dictionary: {item.filename}")
-                                        break
+                                    for locale in locales_data:
+                                        # 1. Проверка словаря
+                                        if path_norm_lower == f'l10n/{locale}/dictionary'.lower():
+                                            self._write_dictionary_to_zip(zout, item, locales_data[locale])
+                                            replaced_files.append(path_norm)
+                                            is_handled = True
+                                            print(f"DEBUG: Updated dictionary: {item.filename}")
+                                            break
                                     
-                                    # 2. Проверка mapResource
-                                    if path_norm_lower == f'l10n/{locale}/mapResource'.lower():
-                                        updated_map = self.miz_resource_manager.get_updated_map_resource_content(zin, locale)
-                                        zout.writestr(item, updated_map.encode('utf-8'))
-                                        replaced_files.append(path_norm)
-                                        is_handled = True
-                                        print(f"DEBUG: Updated mapResource: {item.filename}")
-                                        break
+                                        # 2. Проверка mapResource
+                                        if path_norm_lower == f'l10n/{locale}/mapResource'.lower():
+                                            updated_map = self.miz_resource_manager.get_updated_map_resource_content(zin, locale)
+                                            zout.writestr(item, updated_map.encode('utf-8'))
+                                            replaced_files.append(path_norm)
+                                            is_handled = True
+                                            print(f"DEBUG: Updated mapResource: {item.filename}")
+                                            break
                                 
-                                if not is_handled:
-                                    # Проверяем, не принадлежит ли этот файл удаленной локали (робастно)
-                                    if path_norm.lower().startswith("l10n/"):
-                                        parts = path_norm.split('/')
-                                        if len(parts) > 1:
-                                            folder_part = parts[1].lower()
-                                            if folder_part not in allowed_folders:
-                                                print(f"DEBUG: REMOVING residual file from deleted locale: {item.filename}")
-                                                continue
+                                    if not is_handled:
+                                        # Проверяем, не принадлежит ли этот файл удаленной локали (робастно)
+                                        if path_norm.lower().startswith("l10n/"):
+                                            parts = path_norm.split('/')
+                                            if len(parts) > 1:
+                                                folder_part = parts[1].lower()
+                                                if folder_part not in allowed_folders:
+                                                    print(f"DEBUG: REMOVING residual file from deleted locale: {item.filename}")
+                                                    continue
                                             
-                                    # Проверяем, не заменен ли этот файл (pending_files)
-                                    path_norm_lower = path_norm.lower()
-                                    is_replaced = False
-                                    for pending_path in self.miz_resource_manager.get_pending_files():
-                                        if pending_path.lower() == path_norm_lower:
-                                            is_replaced = True
-                                            break
-                                    # Проверяем, не помечен ли файл на удаление (старый аудиофайл)
-                                    if not is_replaced:
-                                        for del_path in self.miz_resource_manager.get_files_to_delete():
-                                            if del_path.lower() == path_norm_lower:
+                                        # Проверяем, не заменен ли этот файл (pending_files)
+                                        path_norm_lower = path_norm.lower()
+                                        is_replaced = False
+                                        for pending_path in self.miz_resource_manager.get_pending_files():
+                                            if pending_path.lower() == path_norm_lower:
                                                 is_replaced = True
-                                                print(f"DEBUG: DELETING old audio file: {item.filename}")
                                                 break
-                                    if is_replaced:
-                                        continue
-
-                                    zout.writestr(item, zin.read(original_filename_for_read))
+                                        # Проверяем, не помечен ли файл на удаление (старый аудиофайл)
+                                        if not is_replaced:
+                                            for del_path in self.miz_resource_manager.get_files_to_delete():
+                                                if del_path.lower() == path_norm_lower:
+                                                    is_replaced = True
+                                                    print(f"DEBUG: DELETING old audio file: {item.filename}")
+                                                    break
+                                        if is_replaced:
+                                            continue
+
+                                        # Неизменённый файл: переносим сжатые данные без перепаковки
+                                        copy_member_raw(zin, zout, item, original_filename_for_read)
                             
-                            # Добавляем новые словари и mapResource
-                            for locale, content in locales_data.items():
-                                 dict_path = f'l10n/{locale}/dictionary'
-                                 already_replaced = any(f.lower() == dict_path.lower() for f in replaced_files)
-                                 if not already_replaced:
-                                      zout.writestr(dict_path, content)
+                                # Добавляем новые словари и mapResource
+                                for locale, lines_data in locales_data.items():
+                                     dict_path = f'l10n/{locale}/dictionary'
+                                     already_replaced = any(f.lower() == dict_path.lower() for f in replaced_files)
+                                     if not already_replaced:
+                                          self._write_dictionary_to_zip(zout, dict_path, lines_data)
                                       
-                                 map_path = f'l10n/{locale}/mapResource'
-                                 already_replaced_map = any(f.lower() == map_path.lower() for f in replaced_files)
-                                 if not already_replaced_map:
-                                      updated_map = self.miz_resource_manager.get_updated_map_resource_content(zin, locale)
-                                      zout.writestr(map_path, updated_map.encode('utf-8'))
-
-                            # Записываем новые/замененные файлы ресурсов
-                            for target_path, source_path in self.miz_resource_manager.get_pending_files().items():
-                                if os.path.exists(source_path):
-                                    zout.write(source_path, arcname=target_path)
-
-                    # Atomic replace
-                    os.replace(temp_miz, self.current_miz_path)
+                                     map_path = f'l10n/{locale}/mapResource'
+                                     already_replaced_map = any(f.lower() == map_path.lower() for f in replaced_files)
+                                     if not already_replaced_map:
+                                          updated_map = self.miz_resource_manager.get_updated_map_resource_content(zin, locale)
+                                          zout.writestr(map_path, updated_map.encode('utf-8'))
+
+                                # Записываем новые/замененные файлы ресурсов
+                                for target_path, source_path in self.miz_resource_manager.get_pending_files().items():
+                                    if os.path.exists(source_path):
+                                        zout.write(source_path, arcname=target_path)
+
+                        # Atomic replace (дескрипторы пула закрываются до замены файла)
+                        invalidate_archive(self.current_miz_path)
+                        os.replace(temp_miz, self.current_miz_path)
+
+                    # Архив изменился — индекс имён строится заново при следующем обращении
+                    invalidate_archive(self.current_miz_path)
                     self.update_file_labels()
                     
                     if hasattr(self, 'reference_loader'):
-                        self.reference_loader.clear_cache()
+                        # Кэш референсов проверяет CRC dictionary сам:
+                        # заново разбираются только изменившиеся локали
                         try:
                             self.reference_data = self.reference_loader.load_locale_from_miz(
                                 self.current_miz_path, getattr(self, 'reference_locale', 'DEFAULT')
@@ -11737,6 +12122,7 @@ QPushButton:hover {{
                         os.remove(temp_miz)
                     raise e
                 finally:
+                    resume_all_pools()
                     if progress:
                         progress.close()
                 
@@ -11789,17 +12175,17 @@ QPushButton:hover {{
                 
                 # 1. Сначала сохраняем текущее состояние в память
                 if self.current_miz_folder:
-                     self.miz_trans_memory[self.current_miz_folder] = {
-                        'original_lines': copy.deepcopy(self.original_lines),
-                        'all_lines_data': copy.deepcopy(self.all_lines_data),
-                        'original_content': self.original_content
-                    }
+                     self._store_current_locale_in_memory()
 
                 progress = MizProgressDialog(self)
                 progress.show()
                 progress.set_value(10)
                 
+                # Целевой файл может читаться фоновой загрузкой ресурсов
+                pause_all_pools()
                 try:
+                    # Целевой файл может быть открыт в пуле дескрипторов
+                    invalidate_archive(save_path)
                     with zipfile.ZipFile(self.current_miz_path, 'r') as zin:
                         with zipfile.ZipFile(save_path, 'w', compression=zin.compressionlevel if hasattr(zin, 'compressionlevel') else zipfile.ZIP_DEFLATED) as zout:
                             progress.set_value(50)
@@ -11807,8 +12193,7 @@ QPushButton:hover {{
                             allowed_folders = [f.lower() for f in self.current_miz_l10n_folders]
                             
                             for locale, data in self.miz_trans_memory.items():
-                                 content = self.generate_content_from_data(data['all_lines_data'])
-                                 locales_data[locale] = content.encode('utf-8')
+                                 locales_data[locale] = data['all_lines_data']
 
                             replaced_files = []
                             for item in zin.infolist():
@@ -11825,7 +12210,7 @@ QPushButton:hover {{
                                 
                                 for locale in locales_data:
                                     if path_norm_lower == f'l10n/{locale}/dictionary'.lower():
-                                        zout.writestr(item, locales_data[locale])
+                                        self._write_dictionary_to_zip(zout, item, locales_data[locale])
                                         replaced_files.append(path_norm)
                                         is_handled = True
                                         break
@@ -11858,13 +12243,14 @@ QPushButton:hover {{
                                     if is_replaced:
                                         continue
                                         
-                                    zout.writestr(item, zin.read(original_filename_for_read))
+                                    # Неизменённый файл: переносим сжатые данные без перепаковки
+                                    copy_member_raw(zin, zout, item, original_filename_for_read)
                             
-                            for locale, content in locales_data.items():
+                            for locale, lines_data in locales_data.items():
                                  dict_path = f'l10n/{locale}/dictionary'
                                  already_replaced = any(f.lower() == dict_path.lower() for f in replaced_files)
                                  if not already_replaced:
-                                      zout.writestr(dict_path, content)
+                                      self._write_dictionary_to_zip(zout, dict_path, lines_data)
                                       
                                  map_path = f'l10n/{locale}/mapResource'
                                  already_replaced_map = any(f.lower() == map_path.lower() for f in replaced_files)
@@ -11878,6 +12264,7 @@ QPushButton:hover {{
 
                     success = True
                     progress.set_value(100)
+                    invalidate_archive(save_path)
                     self.current_miz_path = save_path
                     self.update_stats()
                     self.update_file_labels()
@@ -11886,11 +12273,14 @@ QPushButton:hover {{
                     if os.path.exists(save_path):
                         os.remove(save_path)
                     raise e
+                finally:
+                    resume_all_pools()
                 
                 if success:
                     self.miz_resource_manager.commit_pending_changes()
                     if hasattr(self, 'reference_loader'):
-                        self.reference_loader.clear_cache()
+                        # Кэш референсов проверяет CRC dictionary сам:
+                        # заново разбираются только изменившиеся локали
                         try:
                             self.reference_data = self.reference_loader.load_locale_from_miz(
                                 self.current_miz_path, getattr(self, 'reference_locale', 'DEFAULT')
@@ -11933,9 +12323,8 @@ QPushButton:hover {{
                 # Копируем все файлы из старого архива
                 for item in zin.infolist():
                     if item.filename != file_path_within_zip:
-                        # Копируем без изменений
-                        data = zin.read(item.filename)
-                        zout.writestr(item, data)
+                        # Копируем без изменений (сжатые данные как есть)
+                        copy_member_raw(zin, zout, item)
                         print(f"   📋 Скопирован: {item.filename}")
                     else:
                         print(f"   ⏩ Пропускаем старую версию: {item.filename}")
@@ -11944,9 +12333,15 @@ QPushButton:hover {{
                 zout.writestr(file_path_within_zip, new_content.encode('utf-8'))
                 print(f"   📝 Добавлен новый файл: {file_path_within_zip}")
             
-            # Заменяем оригинальный архив
-            os.remove(zip_path)
-            os.rename(temp_zip, zip_path)
+            # Заменяем оригинальный архив (фоновая загрузка ресурсов его не читает)
+            pause_all_pools()
+            try:
+                invalidate_archive(zip_path)
+                os.remove(zip_path)
+                os.rename(temp_zip, zip_path)
+                invalidate_archive(zip_path)
+            finally:
+                resume_all_pools()
             
             print(f"✅ Файл {file_path_within_zip} успешно заменен в архиве")
             return True
@@ -11968,58 +12363,37 @@ QPushButton:hover {{
         
     def generate_translated_content(self):
         """Генерирует переведенное содержимое для dictionary с помощью нового парсера"""
-        import tempfile
-        import os
-
-        # Создаем временный файл для парсера
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.lua', delete=False, encoding='utf-8') as f:
-            f.write(self.original_content)
-            temp_file = f.name
-
-        try:
-            # Собираем переводы в словарь для парсера
-            # Формат: ключ -> список переведённых строк (каждая строка файла - отдельный элемент)
-            translations = {}
-
-            # Группируем переводы по ключу
-            for line_data in self.all_lines_data:
-                key = line_data['key']
-
-                if key not in translations:
-                    translations[key] = []
-
-                # Используем translated_text, даже если он пустой ('')
-                # Падаем назад на оригинал только если перевода вообще нет (None)
-                raw_translated = line_data.get('translated_text')
-                if raw_translated is None:
-                    raw_translated = line_data.get('original_text', '')
-                
-                if raw_translated:
-                    parts = raw_translated.split('\n')
-                    translations[key].extend(parts)
-                else:
-                    # Пустая строка
-                    translations[key].append('')
+        # Собираем переводы в словарь для парсера
+        # Формат: ключ -> список переведённых строк (каждая строка файла - отдельный элемент)
+        translations = {}
 
-            # Используем новый парсер для сохранения
-            # Сначала парсим файл для получения структуры
-            self.dictionary_parser.entries = {}
-            self.dictionary_parser.parse_file(temp_file)
+        # Группируем переводы по ключу
+        for line_data in self.all_lines_data:
+            key = line_data['key']
 
-            # Сохраняем переводы
-            self.dictionary_parser.save_translations(temp_file + '_out', translations)
+            if key not in translations:
+                translations[key] = []
 
-            # Читаем результат
-            with open(temp_file + '_out', 'r', encoding='utf-8') as f:
-                result_content = f.read()
+            # Используем translated_text, даже если он пустой ('')
+            # Падаем назад на оригинал только если перевода вообще нет (None)
+            raw_translated = line_data.get('translated_text')
+            if raw_translated is None:
+                raw_translated = line_data.get('original_text', '')
+            
+            if raw_translated:
+                parts = raw_translated.split('\n')
+                translations[key].extend(parts)
+            else:
+                # Пустая строка
+                translations[key].append('')
 
-            return result_content
+        # Используем новый парсер для сохранения
+        # Сначала парсим исходный текст для получения структуры (в памяти, без временных файлов)
+        self.dictionary_parser.entries = {}
+        self.dictionary_parser.parse_string(self.original_content)
 
-        finally:
-            # Удаляем временные файлы
-            for temp_file_path in [temp_file, temp_file + '_out']:
-                if os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
+        # Сохраняем переводы
+        return self.dictionary_parser.render_translations(translations)
 
     def get_line_data_by_key(self, key):
         """Вспомогательный метод для поиска данных по ключу"""
@@ -12927,17 +13301,17 @@ QPushButton:hover {{
         finally:
             self.prevent_text_changed = False
 
-    def _get_translation_color(self, is_modified, line_data):
-        """Возвращает цвет текста перевода в превью:
-        - Красный: текст изменён и не сохранён
-        - Жёлто-зелёный (#bbf324): текст был изменён в этой сессии и уже сохранён
-        - Зелёный: текст не менялся
+    def _get_translation_state(self, is_modified, line_data):
+        """Возвращает состояние поля перевода в превью (цвет — в _build_preview_stylesheet):
+        - modified: текст изменён и не сохранён (красный)
+        - session: текст был изменён в этой сессии и уже сохранён (жёлто-зелёный)
+        - saved: текст не менялся (зелёный)
         """
         if is_modified:
-            return getattr(self, 'theme_text_modified', '#ff6666')
+            return 'modified'
         if line_data.get('session_modified', False):
-            return getattr(self, 'theme_text_session', '#bbf324')
-        return getattr(self, 'theme_text_saved', '#2ecc71')
+            return 'session'
+        return 'saved'
 
     def on_preview_text_modified(self, edit_widget, index, line_data):
         """Вызывается мгновенно при вводе текста в предпросмотре для смены цвета"""
@@ -12947,33 +13321,13 @@ QPushButton:hover {{
             
             # --- ЦВЕТ ШРИФТА (Всегда выполняется) ---
             is_modified = current_text != original_text
-            new_color = self._get_translation_color(is_modified, line_data)
             
             # Помечаем строку как изменённую в текущей сессии
             if is_modified:
                 line_data['session_modified'] = True
             
             # Обновляем стиль виджета
-            try:
-                if hasattr(edit_widget, 'set_text_color'):
-                    edit_widget.set_text_color(new_color)
-                else:
-                    # fallback: preserve background, border and radius
-                    existing = edit_widget.styleSheet() or ''
-                    import re
-                    m_bg = re.search(r'background-color:\s*([^;]+);', existing)
-                    bg = m_bg.group(1).strip() if m_bg else None
-                    bg_part = f' background-color: {bg};' if bg else ' background-color: transparent;'
-                    
-                    m_border = re.search(r'border:\s*([^;]+);', existing)
-                    border = m_border.group(1).strip() if m_border else 'none'
-                    
-                    m_radius = re.search(r'border-radius:\s*([^;]+);', existing)
-                    radius = m_radius.group(1).strip() if m_radius else '0px'
-                    
-                    edit_widget.setStyleSheet(f"color: {new_color}; font-family: '{self.preview_font_family}'; font-size: {self.preview_font_size}pt; border: {border}; border-radius: {radius}; {bg_part}")
-            except Exception:
-                edit_widget.setStyleSheet(f"color: {new_color}; font-family: '{self.preview_font_family}'; font-size: {self.preview_font_size}pt; background-color: transparent; border: none;")
+            edit_widget.set_preview_state(self._get_translation_state(is_modified, line_data))
 
             # Запускаем таймер синхронизации данных (вне гарда, вызывается один раз)
             self.on_preview_text_changed(index, current_text)
@@ -13064,6 +13418,7 @@ QPushButton:hover {{
 
             # --- 1. Вставка в модель данных ---
             self.original_lines.insert(new_index, new_line_data)
+            self._preview_key_indices_cache = None
 
             # ВАЖНО: Синхронизируем all_lines_data. 
             if hasattr(self, 'all_lines_data') and self.all_lines_data is not self.original_lines:
@@ -13105,10 +13460,7 @@ QPushButton:hover {{
             
             # Начальный цвет зависит от того, изменилась ли строка относительно original_translated_text
             is_new_modified = (new_line_data['translated_text'] != new_line_data.get('original_translated_text', ''))
-            new_trans_color = self._get_translation_color(is_new_modified, new_line_data)
-            new_trans_style = f"color: {new_trans_color}; background-color: transparent; border: none; border-radius: 0px;"
-            new_trans.setStyleSheet(new_trans_style)
-            new_trans._original_style = new_trans_style
+            new_trans.set_preview_state(self._get_translation_state(is_new_modified, new_line_data))
 
             # Подключаем сигналы для нового виджета
             new_trans.text_changed.connect(
@@ -13140,6 +13492,7 @@ QPushButton:hover {{
 
             stretch_item_t = trans_row_layout.takeAt(trans_row_layout.count() - 1)
             trans_row_layout.insertWidget(trans_insert_pos, new_trans, 0, Qt.AlignTop)
+            self._register_preview_editor(key, new_trans)
             trans_row_layout.addStretch(1)
 
             # row_siblings для нового виджета перевода
@@ -13532,6 +13885,7 @@ QPushButton:hover {{
             
             # Удаляем из обоих списков
             self.original_lines.pop(index)
+            self._preview_key_indices_cache = None
             if physical_idx != -1 and self.all_lines_data is not self.original_lines:
                 self.all_lines_data.pop(physical_idx)
             
@@ -13611,6 +13965,7 @@ QPushButton:hover {{
                 # Удаляем только из перевода
                 trans_layout = trans_row_w.layout()
                 trans_layout.removeWidget(trans_edit_widget)
+                self._unregister_preview_editor(key, trans_edit_widget)
                 trans_edit_widget.deleteLater()
 
                 # Принудительно обновляем высоты оставшихся виджетов в группе,
@@ -14178,6 +14533,11 @@ QPushButton:hover {{
     def _cleanup_temp_files(self):
         """Удаляет все временные файлы и папки программы из %TEMP% и сгенерированные TTS аудио."""
         try:
+            # Папка извлечённых ресурсов текущей сессии (то, что не удалится сейчас,
+            # например открытый проигрывателем файл, удалится при следующем запуске)
+            get_scratch_area().close()
+
+            # Копии замен (dcs_repl_) и файлы прежних версий, извлекавшиеся прямо в %TEMP%
             temp_dir = tempfile.gettempdir()
             prefixes = ("dcs_preview_", "dcs_repl_", "dcs_drag_")
             removed_count = 0
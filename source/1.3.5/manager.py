@@ -8,12 +8,8 @@ UI-виджет для управления ресурсами миссии (а
 
 import os
 import logging
-import zipfile
 import shutil
-import tempfile
 import traceback
-import random
-import string
 import pygame
 
 from PyQt5.QtWidgets import (
@@ -24,8 +20,8 @@ from PyQt5.QtWidgets import (
     QRadioButton, QDialog, QFrame, QStackedWidget, QApplication, QMenu, QShortcut,
     QStyleOptionViewItem
 )
-from PyQt5.QtCore import Qt, pyqtSignal, QTimer, QObject, QEvent, QPoint, QSize, QRect, QSettings, pyqtProperty, QEasingCurve, QPropertyAnimation, QMimeData, QUrl, QThread
-from PyQt5.QtGui import QPixmap, QColor, QIcon, QFont, QCursor, QPainter, QPen, QBrush, QPainterPath, QPolygon, QFontMetrics, QDrag, QKeySequence
+from PyQt5.QtCore import Qt, pyqtSignal, QTimer, QObject, QEvent, QPoint, QSize, QRect, QSettings, pyqtProperty, QEasingCurve, QPropertyAnimation, QMimeData, QUrl, QThread, QPersistentModelIndex
+from PyQt5.QtGui import QPixmap, QImage, QColor, QIcon, QFont, QCursor, QPainter, QPen, QBrush, QPainterPath, QPolygon, QFontMetrics, QDrag, QKeySequence
 
 from localization import get_translation
 from widgets import (
@@ -35,6 +31,10 @@ from widgets import (
 )
 from tts_engine import TTSEngine
 from dialogs import (StandardQuestionDialog, StandardInfoDialog, MizProgressDialog, TTSPreviewDialog)
+from miz_index import get_archive_index, pooled_archive
+from audio_probe import probe_member, probe_file, get_duration
+from resource_workers import ResourceTaskPool
+from scratch_area import get_scratch_area
 
 logger = logging.getLogger(__name__)
 
@@ -57,6 +57,9 @@ ICON_VIEW_TABLE_SIZE = 20        # Размер значка списка (px)
 ICON_VIEW_CONTENT = "⊞"          # Режим миниатюр
 ICON_VIEW_CONTENT_SIZE = 23      # Размер значка миниатюр (px)
 
+# Сколько нескрытых строк считать видимыми, если таблица ещё не показана
+VISIBLE_ROWS_FALLBACK = 60
+
 
 # TTSWorker удален отсюда, используется общая версия из tts_engine.py
 # ══════════════════════════════════════════
@@ -639,12 +642,20 @@ class FileManagerWidget(QWidget):
         self._audio_timer.timeout.connect(self._check_audio_state)
         self._audio_timer.start(200)
 
-        # Очередь для загрузки длительности аудио (в фоне)
-        self._duration_queue = []
-        self._duration_timer = QTimer(self)
-        self._duration_timer.setInterval(10)
-        self._duration_timer.setSingleShot(True)
-        self._duration_timer.timeout.connect(self._process_duration_queue)
+        # res_key -> QPersistentModelIndex ячейки имени файла (переживает сортировку)
+        self._row_by_key = {}
+
+        # Длительности аудио и миниатюры загружаются в пуле потоков
+        # (видимые строки — первыми, результаты приходят пачками)
+        self._task_pool = ResourceTaskPool(self)
+        self._task_pool.results_ready.connect(self._on_background_results)
+        # При прокрутке поднимаем приоритет ставших видимыми строк (с задержкой)
+        self._visible_priority_timer = QTimer(self)
+        self._visible_priority_timer.setInterval(60)
+        self._visible_priority_timer.setSingleShot(True)
+        self._visible_priority_timer.timeout.connect(self._prioritize_visible_rows)
+        self.table.verticalScrollBar().valueChanged.connect(lambda _: self._visible_priority_timer.start())
+        self.table.verticalScrollBar().valueChanged.connect(lambda _: self._ensure_action_widgets())
 
         # Загрузка сохраненного положения слайдера
         settings = get_ui_settings()
@@ -683,7 +694,7 @@ class FileManagerWidget(QWidget):
                 border-color: #ff9900;
             }
         """)
-        self.search_input.textChanged.connect(self._apply_filters)
+        self.search_input.textChanged.connect(lambda _: self._apply_row_filter())
         controls_layout.addWidget(self.search_input)
 
         self.search_shortcut = QShortcut(QKeySequence("Ctrl+F"), self)
@@ -696,7 +707,7 @@ class FileManagerWidget(QWidget):
         # Фильтр: Аудио (ToggleSwitch + Label)
         self.filter_audio = ToggleSwitch()
         self.filter_audio.setChecked(True)
-        self.filter_audio.toggled.connect(self._apply_filters)
+        self.filter_audio.toggled.connect(lambda _: self._apply_row_filter())
         container_audio, self.label_filter_audio = self._create_toggle_container(
             self.filter_audio, get_translation(self.current_language, 'fm_filter_audio'))
         controls_layout.addWidget(container_audio)
@@ -704,7 +715,7 @@ class FileManagerWidget(QWidget):
         # Фильтр: Изображения (ToggleSwitch + Label)
         self.filter_images = ToggleSwitch()
         self.filter_images.setChecked(True)
-        self.filter_images.toggled.connect(self._apply_filters)
+        self.filter_images.toggled.connect(lambda _: self._apply_row_filter())
         container_images, self.label_filter_images = self._create_toggle_container(
             self.filter_images, get_translation(self.current_language, 'fm_filter_images'))
         controls_layout.addWidget(container_images)
@@ -712,7 +723,7 @@ class FileManagerWidget(QWidget):
         # Фильтр: Планшет (ToggleSwitch + Label)
         self.filter_kneeboard = ToggleSwitch()
         self.filter_kneeboard.setChecked(True)
-        self.filter_kneeboard.toggled.connect(self._apply_filters)
+        self.filter_kneeboard.toggled.connect(lambda _: self._apply_row_filter())
         container_kneeboard, self.label_filter_kneeboard = self._create_toggle_container(
             self.filter_kneeboard, get_translation(self.current_language, 'fm_filter_kneeboard'))
         controls_layout.addWidget(container_kneeboard)
@@ -1407,12 +1418,10 @@ class FileManagerWidget(QWidget):
     def _restore_table_focus_by_key(self, res_key):
         """Вспомогательный метод для возврата фокуса на нужную строку по ключу ресурса"""
         if not hasattr(self, 'table'): return
-        for r in range(self.table.rowCount()):
-            it = self.table.item(r, self.COL_FILENAME)
-            if it and it.data(Qt.UserRole) == res_key:
-                self.table.selectRow(r)
-                self.table.setFocus()
-                break
+        r = self._find_row_by_key(res_key)
+        if r != -1:
+            self.table.selectRow(r)
+            self.table.setFocus()
 
     @staticmethod
     def _create_toggle_container(toggle, text):
@@ -1461,7 +1470,7 @@ class FileManagerWidget(QWidget):
     def _on_header_checkbox_toggled(self, new_state):
         """Прямая обработка переключения чекбокса в заголовке."""
         self.table.blockSignals(True)
-        for r in range(self.table.rowCount()):
+        for r in self._iter_shown_rows():
             it = self.table.item(r, self.COL_CHECK)
             if it:
                 it.setCheckState(new_state)
@@ -1492,7 +1501,7 @@ class FileManagerWidget(QWidget):
     def _on_invert_selection_clicked(self):
         """Инвертирует выделение для отображаемых файлов."""
         self.table.blockSignals(True)
-        for r in range(self.table.rowCount()):
+        for r in self._iter_shown_rows():
             it = self.table.item(r, self.COL_CHECK)
             if it:
                 new_state = Qt.Unchecked if it.checkState() == Qt.Checked else Qt.Checked
@@ -1542,7 +1551,7 @@ class FileManagerWidget(QWidget):
                                 self.table.blockSignals(True)
                                 for r in range(start, end + 1):
                                     it = self.table.item(r, self.COL_CHECK)
-                                    if it:
+                                    if it and not self.table.isRowHidden(r):
                                         it.setCheckState(target_state)
                                         key = it.data(Qt.UserRole)
                                         if key:
@@ -1611,6 +1620,10 @@ class FileManagerWidget(QWidget):
             elif event.type() == QEvent.MouseButtonRelease:
                 self._drag_start_pos = None
 
+            elif event.type() == QEvent.Resize:
+                # В окно могли попасть новые строки — создаём для них кнопки действий
+                QTimer.singleShot(0, self._ensure_action_widgets)
+
             # 2. Обработка Drag & Drop
             elif event.type() == QEvent.DragEnter:
                 # [FIX] Блокируем перетаскивание внутри программы (если источник - мы сами)
@@ -1948,9 +1961,10 @@ class FileManagerWidget(QWidget):
             return
             
         checked_count = 0
-        total_count = self.table.rowCount()
+        total_count = 0
         
-        for r in range(total_count):
+        for r in self._iter_shown_rows():
+            total_count += 1
             it = self.table.item(r, self.COL_CHECK)
             if it and it.checkState() == Qt.Checked:
                 checked_count += 1
@@ -1971,13 +1985,14 @@ class FileManagerWidget(QWidget):
         """Обновляет информацию в статусной строке."""
         if not hasattr(self, 'lbl_status_total'): return
         
-        visible_count = self.table.rowCount()
+        visible_count = 0
         total_count = len(self._all_files)
         
         selected_count = 0
         total_size = 0
         
-        for r in range(self.table.rowCount()):
+        for r in self._iter_shown_rows():
+            visible_count += 1
             it = self.table.item(r, self.COL_CHECK)
             if it and it.checkState() == Qt.Checked:
                 selected_count += 1
@@ -2063,7 +2078,7 @@ class FileManagerWidget(QWidget):
                         type_item.setIcon(self._thumbnail_cache[res_key])
                     else:
                         type_item.setIcon(QIcon())
-                        self._thumbnail_queue.append((type_item, res_key, filename))
+                        self._queue_thumbnail(res_key, filename)
                     type_item.setText("")
                     self.table.setRowHeight(r, row_h)
                 else:
@@ -2073,131 +2088,168 @@ class FileManagerWidget(QWidget):
         self.table.setUpdatesEnabled(True)
         self.table.viewport().update()
 
-        # Запускаем асинхронную загрузку оставшихся превьюшек
-        if getattr(self, '_thumbnail_queue', []):
-            self._process_thumbnail_queue()
+        # Оставшиеся превьюшки грузятся в фоне — сначала видимые строки
+        self._ensure_action_widgets()
+        self._prioritize_visible_rows()
+
+    # ─── Фоновая загрузка длительностей и миниатюр ─────────────────────
+
+    def _queue_duration(self, res_key, filename):
+        """Ставит определение длительности аудио в очередь пула потоков."""
+        self._task_pool.submit('duration', res_key, lambda: self._load_duration(res_key, filename))
 
-    def _process_thumbnail_queue(self):
-        """Обрабатывает по одной миниатюре изочереди без зависания UI."""
+    def _queue_thumbnail(self, res_key, filename):
+        """Ставит генерацию миниатюры в очередь пула потоков."""
+        self._task_pool.submit('thumbnail', res_key, lambda: self._load_thumbnail_image(res_key, filename))
+
+    def _prioritize_visible_rows(self):
+        """Поднимает приоритет задач для строк, видимых в таблице."""
         try:
-            if not self or not hasattr(self, '_thumbnail_queue') or not self._thumbnail_queue:
+            visible = self._visible_row_range()
+            if visible is None:
                 return
-                
-            # Берем первый элемент из очереди
-            item_type, res_key, filename = self._thumbnail_queue.pop(0)
-            
-            # Обновляем только если элемент еще существует (пользователь не закрыл окно/не сменил миссию)
-            try:
-                # Генерируем с помощью существующей логики
-                icon = self._get_thumbnail(res_key, filename)
-                
-                # Присваиваем иконку
-                if icon and not icon.isNull():
-                    item_type.setIcon(icon)
-            except RuntimeError:
-                pass # Элемент таблицы был удален
-                
-            # Запускаем таймер для следующей итерации (10мс для плавности UI)
-            if self._thumbnail_queue:
-                if not hasattr(self, '_thumbnail_timer'):
-                    self._thumbnail_timer = QTimer(self)
-                    self._thumbnail_timer.setSingleShot(True)
-                    self._thumbnail_timer.timeout.connect(self._process_thumbnail_queue)
-                self._thumbnail_timer.start(10)
+
+            keys = []
+            for r in range(visible[0], visible[1] + 1):
+                it = self.table.item(r, self.COL_FILENAME)
+                if it and not self.table.isRowHidden(r):
+                    keys.append(it.data(Qt.UserRole))
+            self._task_pool.prioritize('duration', keys)
+            self._task_pool.prioritize('thumbnail', keys)
         except RuntimeError:
-            return # Сам виджет FileManagerWidget был удален
+            return
 
-    def _process_duration_queue(self):
-        """Обрабатывает по одному аудиофайлу из очереди для получения длительности."""
+    def _on_background_results(self, batch):
+        """Применяет пачку результатов пула потоков (GUI-поток)."""
         try:
-            if not self or not hasattr(self, '_duration_queue') or not self._duration_queue:
-                return
-                
-            orig_row, res_key, filename = self._duration_queue.pop(0)
-            
-            # Находим актуальную строку (она могла сместиться из-за сортировки)
-            row = -1
-            # Сначала проверяем ту же строку (оптимизация)
-            test_item = self.table.item(orig_row, self.COL_FILENAME)
-            if test_item and test_item.data(Qt.UserRole) == res_key:
-                row = orig_row
-            else:
-                # Если не совпало — ищем по всей таблице
-                for r in range(self.table.rowCount()):
-                    it = self.table.item(r, self.COL_FILENAME)
-                    if it and it.data(Qt.UserRole) == res_key:
-                        row = r
-                        break
-            
-            if row == -1:
-                # Файл больше не отображается (отфильтрован или удален)
-                if self._duration_queue:
-                    self._duration_timer.start(2)
-                return
+            self.table.setUpdatesEnabled(False)
+            for kind, res_key, result in batch:
+                if kind == 'duration':
+                    self._apply_duration(res_key, result or 0)
+                elif kind == 'thumbnail':
+                    self._apply_thumbnail(res_key, result)
+            self.table.setUpdatesEnabled(True)
+        except RuntimeError:
+            return # Сам виджет FileManagerWidget был удален
 
-            # Извлекаем и получаем длительность
-            try:
-                temp_path = self._extract_resource_to_temp(res_key, filename)
-                duration = 0
-                if temp_path and os.path.exists(temp_path):
-                    try:
-                        # Используем pygame.mixer.Sound только если это аудио
-                        if filename.lower().endswith(('.wav', '.ogg', '.mp3')):
-                            # Инициализируем микшер если нужно
-                            import pygame
-                            if not pygame.mixer.get_init():
-                                pygame.mixer.init()
-                            sound = pygame.mixer.Sound(temp_path)
-                            duration = sound.get_length()
-                            del sound
-                    except Exception as e:
-                        logger.debug(f"Pygame duration fail for {filename}: {e}")
-                
-                # Обновляем ячейку Инфо
-                info_item = self.table.item(row, self.COL_INFO)
-                if info_item:
-                    m = int(duration // 60)
-                    s = int(duration % 60)
-                    duration_text = f"{m:02}:{s:02}"
-                    info_item.setText(duration_text)
-                    info_item.sort_value = duration # Для правильной сортировки по секундам
-                    
-                    self._duration_cache[res_key] = (duration, duration_text)
+    def _register_row_key(self, row, res_key):
+        """Запоминает строку ресурса для _find_row_by_key.
+        
+        QPersistentModelIndex сдвигается моделью при сортировке, поэтому
+        индекс остаётся верным без пересчёта. При фильтрации таблица
+        перестраивается (_populate_table) и индекс заполняется заново.
+        """
+        self._row_by_key[res_key] = QPersistentModelIndex(self.table.model().index(row, self.COL_FILENAME))
 
-            except Exception as e:
-                logger.error(f"Error processing duration for {filename}: {e}")
-                
-            # Запускаем таймер для следующей итерации (2мс для скорости)
-            if self._duration_queue:
-                self._duration_timer.start(2)
-        except RuntimeError:
+    def _find_row_by_key(self, res_key):
+        """Строка таблицы по ключу ресурса или -1 (без перебора строк)."""
+        index = self._row_by_key.get(res_key)
+        if index is None or not index.isValid():
+            return -1
+        row = index.row()
+        # Ключ строки мог смениться (переименование) — проверяем ячейку
+        it = self.table.item(row, self.COL_FILENAME)
+        if it is None or it.data(Qt.UserRole) != res_key:
+            return -1
+        return row
+
+    def _apply_duration(self, res_key, duration):
+        m = int(duration // 60)
+        s = int(duration % 60)
+        duration_text = f"{m:02}:{s:02}"
+        self._duration_cache[res_key] = (duration, duration_text)
+
+        # Файл мог пропасть из таблицы (отфильтрован или удален)
+        row = self._find_row_by_key(res_key)
+        if row == -1:
             return
+        info_item = self.table.item(row, self.COL_INFO)
+        if info_item:
+            info_item.setText(duration_text)
+            info_item.sort_value = duration # Для правильной сортировки по секундам
 
-    def _get_thumbnail(self, res_key, filename):
-        """Генерирует и кэширует миниатюру для файла изображения."""
-        if res_key in self._thumbnail_cache:
-            return self._thumbnail_cache[res_key]
+    def _apply_thumbnail(self, res_key, image):
+        if image is None or image.isNull():
+            return
+        icon = QIcon(QPixmap.fromImage(image))
+        self._thumbnail_cache[res_key] = icon
 
+        # Иконка нужна только в режиме «Содержимое»
+        if self.view_slider.value() == 0:
+            return
+        row = self._find_row_by_key(res_key)
+        if row == -1:
+            return
+        type_item = self.table.item(row, self.COL_TYPE)
+        if type_item:
+            type_item.setIcon(icon)
+
+    def _resolve_resource_source(self, res_key, filename):
+        """Источник ресурса: ('file', путь) из pending_files, ('member', ZipInfo) из архива или None.
+        
+        Путь ищется так же, как в _extract_resource_to_temp: текущая локаль,
+        затем DEFAULT (для KNEEBOARD — без fallback-а).
+        """
+        if not self.miz_path:
+            return None
+        mgr = self.miz_resource_manager
+        if res_key.startswith("KneeboardKey_"):
+            target_path = f"KNEEBOARD/IMAGES/{filename}"
+        else:
+            target_path = f"l10n/{mgr.current_folder}/{filename}"
+            src = mgr.pending_files.get(target_path)
+            if src and os.path.exists(src):
+                return ('file', src)
+
+        index = get_archive_index(self.miz_path)
+        info = index.find(target_path)
+        if info is None and not target_path.startswith("KNEEBOARD/"):
+            info = index.find(f"l10n/DEFAULT/{filename}")
+        return ('member', info) if info is not None else None
+
+    def _load_duration(self, res_key, filename):
+        """Длительность аудио в секундах (выполняется в рабочем потоке)."""
+        if not filename.lower().endswith(('.wav', '.ogg', '.mp3')):
+            return 0
+        probe = self._probe_resource_audio(res_key, filename)
+        if probe is not None:
+            return probe.duration
+        # Формат без разбора по заголовку (mp3) — через временный файл
         temp_path = self._extract_resource_to_temp(res_key, filename)
-        if not temp_path:
-            return QIcon()
+        if temp_path and os.path.exists(temp_path):
+            return get_duration(temp_path)
+        return 0
 
-        pixmap = QPixmap(temp_path)
-        if pixmap.isNull():
-            return QIcon()
+    def _load_thumbnail_image(self, res_key, filename):
+        """Миниатюра картинки как QImage (выполняется в рабочем потоке).
+        
+        QPixmap можно создавать только в GUI-потоке, поэтому здесь — QImage,
+        а иконка создаётся в _apply_thumbnail.
+        """
+        source = self._resolve_resource_source(res_key, filename)
+        if source is None:
+            return None
+        kind, value = source
+        if kind == 'file':
+            image = QImage(value)
+        else:
+            with pooled_archive(self.miz_path) as z:
+                data = z.read(value)
+            image = QImage()
+            image.loadFromData(data)
+        if image.isNull():
+            return None
 
         # Генерируем миниатюру максимального размера (256x256), Qt будет уменьшать через setIconSize
-        thumb = pixmap.scaled(256, 256, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        thumb = image.scaled(256, 256, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        thumb = thumb.convertToFormat(QImage.Format_ARGB32_Premultiplied)
         
         # Добавляем серую рамку (border) вокруг эскиза
         painter = QPainter(thumb)
         painter.setPen(QPen(QColor('#555555'), 1))
         painter.drawRect(0, 0, thumb.width() - 1, thumb.height() - 1)
         painter.end()
-        
-        icon = QIcon(thumb)
-        self._thumbnail_cache[res_key] = icon
-        return icon
+        return thumb
 
 
     def set_data(self, miz_resource_manager, miz_path):
@@ -2225,10 +2277,8 @@ class FileManagerWidget(QWidget):
             self._duration_cache.clear()
             self._last_folder = current_folder
             
-        # Очередь для асинхронной генерации
-        self._thumbnail_queue = []
-        if hasattr(self, '_thumbnail_timer'):
-            self._thumbnail_timer.stop()
+        # Задачи для прежней миссии/локали больше не нужны
+        self._task_pool.cancel()
         
         self.miz_resource_manager = miz_resource_manager
         self.miz_path = miz_path
@@ -2256,10 +2306,12 @@ class FileManagerWidget(QWidget):
         if self._first_load:
             self.table.sortByColumn(self.COL_DESCRIPTION, Qt.AscendingOrder)
             self._first_load = False
+            self._ensure_action_widgets()
+            self._prioritize_visible_rows()
 
     def _populate_table(self):
-        """Заполняет таблицу данными с учётом фильтров."""
-        filtered = self._get_filtered_files()
+        """Заполняет таблицу всеми файлами; фильтры применяются скрытием строк."""
+        files = self._all_files
         self._last_checked_row = None  # Сбрасываем при обновлении списка
 
         # Запоминаем текущую сортировку
@@ -2275,7 +2327,8 @@ class FileManagerWidget(QWidget):
         
         # [FIX] Очищаем за собой, чтобы старые виджеты точно удалились
         self.table.setRowCount(0)
-        self.table.setRowCount(len(filtered))
+        self._row_by_key.clear()
+        self.table.setRowCount(len(files))
 
         slider_val = self.view_slider.value()
         thumb_size = 0 if slider_val == 0 else (16 + slider_val * 16)
@@ -2290,8 +2343,9 @@ class FileManagerWidget(QWidget):
             self.table.setIconSize(QSize(16, 16))
             self.table.setColumnWidth(self.COL_TYPE, self._default_type_col_width)
             self.table.verticalHeader().setDefaultSectionSize(self._default_row_height)
+        default_section_size = self.table.verticalHeader().defaultSectionSize()
 
-        for row, item in enumerate(filtered):
+        for row, item in enumerate(files):
             # Чекбокс для выбора
             res_key = item['res_key']
             is_checked = res_key in self.checked_keys
@@ -2320,7 +2374,7 @@ class FileManagerWidget(QWidget):
                     type_item.setIcon(self._thumbnail_cache[item['res_key']])
                 else:
                     type_item.setIcon(QIcon())
-                    self._thumbnail_queue.append((type_item, item['res_key'], item['filename']))
+                    self._queue_thumbnail(item['res_key'], item['filename'])
             else:
                 type_icon = "🖼️" if item['type'] == 'image' else "♫"
                 type_item = SortableTableWidgetItem(type_icon, type_sort_value)
@@ -2334,7 +2388,10 @@ class FileManagerWidget(QWidget):
                 type_item.setData(Qt.UserRole + 3, '#999966')
             
             self.table.setItem(row, self.COL_TYPE, type_item)
-            self.table.setRowHeight(row, row_h if item['type'] == 'image' else self._default_row_height)
+            # Высота по умолчанию уже задана через setDefaultSectionSize — меняем только отличающиеся
+            height = row_h if item['type'] == 'image' else self._default_row_height
+            if height != default_section_size:
+                self.table.setRowHeight(row, height)
 
             # Имя файла
             fname_item = QTableWidgetItem(item['filename'])
@@ -2344,6 +2401,7 @@ class FileManagerWidget(QWidget):
             fname_item.setData(Qt.UserRole + 2, item['filename'])  # Сохраняем filename
             fname_item.setForeground(QColor('#ffffff'))
             self.table.setItem(row, self.COL_FILENAME, fname_item)
+            self._register_row_key(row, item['res_key'])
 
             # Инфо (размер для картинок, длительность для аудио)
             info_text = ""
@@ -2363,7 +2421,7 @@ class FileManagerWidget(QWidget):
                 else:
                     info_text = "⏳" # Песочные часы как плейсхолдер
                     sort_val = 0
-                    self._duration_queue.append((row, item['res_key'], item['filename']))
+                    self._queue_duration(item['res_key'], item['filename'])
                 
             info_item = SortableTableWidgetItem(info_text, sort_val)
             info_item.setTextAlignment(Qt.AlignCenter)
@@ -2429,80 +2487,9 @@ class FileManagerWidget(QWidget):
             
             self.table.setItem(row, self.COL_STATUS, status_item)
 
-            # Действия
-            # [FIX] Сразу привязываем к таблице (родителю), чтобы не появлялось в (0,0)
-            actions_widget = QWidget(self.table)
-            actions_layout = QHBoxLayout(actions_widget)
-            actions_layout.setContentsMargins(4, 2, 9, 2)
-            actions_layout.setSpacing(8)
-            actions_layout.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
-            
-            btn_style = """
-                QPushButton {
-                background: transparent;
-                color: #ffffff;
-                border: none;
-                font-size: 20px;
-            }
-            QPushButton:hover {
-                color: #ff9900;
-            }
-            """
-            
-            action_buttons = []  # Собираем все кнопки для установки фильтра тултипов
-            
-            if item['type'] == 'audio':
-                btn_play = QPushButton("▶")
-                btn_play.setCursor(Qt.PointingHandCursor)
-                btn_play.setFocusPolicy(Qt.NoFocus)
-                btn_play.setToolTip(get_translation(self.current_language, 'fm_tooltip_play'))
-                btn_play.setStyleSheet(btn_style)
-                
-                btn_stop = QPushButton("■")
-                btn_stop.setCursor(Qt.PointingHandCursor)
-                btn_stop.setFocusPolicy(Qt.NoFocus)
-                btn_stop.setToolTip(get_translation(self.current_language, 'fm_tooltip_stop'))
-                btn_stop_style = btn_style + "\nQPushButton { padding-bottom: 2px; }"
-                btn_stop.setStyleSheet(btn_stop_style)
-                
-                # Подключаем кнопки действий к аудио
-                btn_play.clicked.connect(lambda _, rk=item['res_key'], b=btn_play: self._on_action_play_toggle(rk, b))
-                btn_stop.clicked.connect(lambda _, rk=item['res_key'], b=btn_play: self._on_action_stop(rk, b))
-                
-                actions_layout.addWidget(btn_play)
-                actions_layout.addWidget(btn_stop)
-                action_buttons.extend([btn_play, btn_stop])
-            elif item['type'] == 'image':
-                # Удален эмодзи глаза (btn_view) по просьбе пользователя
-                pass
-                
-            # Стиль для кнопок замены и скачивания (на 20% меньше основных кнопок)
-            btn_small_style = btn_style.replace("font-size: 20px;", "font-size: 16px;")
-            
-            btn_replace = QPushButton("⟲")
-            btn_replace.setCursor(Qt.PointingHandCursor)
-            btn_replace.setFocusPolicy(Qt.NoFocus)
-            btn_replace.setToolTip(get_translation(self.current_language, 'fm_tooltip_replace'))
-            btn_replace.setStyleSheet(btn_small_style)
-            
-            btn_download = QPushButton("🡇")
-            btn_download.setCursor(Qt.PointingHandCursor)
-            btn_download.setFocusPolicy(Qt.NoFocus)
-            btn_download.setToolTip(get_translation(self.current_language, 'fm_tooltip_download'))
-            btn_download.setStyleSheet(btn_small_style)
-            
-            btn_replace.clicked.connect(lambda _, rk=item['res_key']: self._on_replace_clicked(rk))
-            btn_download.clicked.connect(lambda _, rk=item['res_key']: self._on_download_clicked(rk))
-            
-            actions_layout.addWidget(btn_replace)
-            actions_layout.addWidget(btn_download)
-            action_buttons.extend([btn_replace, btn_download])
-            
-            # Устанавливаем кастомные тултипы на все кнопки
-            for btn in action_buttons:
-                self._btn_tooltip_filter.add_button(btn)
-            
-            self.table.setCellWidget(row, self.COL_ACTIONS, actions_widget)
+            # Кнопки действий создаются только для видимых строк (_ensure_action_widgets)
+
+        self._update_hidden_rows()
 
         # [FIX] Возвращаем отрисовку ПЕРЕД сортировкой, чтобы sortByColumn сработал корректно
         self.table.viewport().setUpdatesEnabled(True)
@@ -2527,13 +2514,154 @@ class FileManagerWidget(QWidget):
         # [FIX] Обновляем состояние чекбокса в заголовке и статусную строку
         self._update_header_checkbox()
 
-        # Запускаем фоновую загрузку миниатюр
-        if getattr(self, '_thumbnail_queue', []):
-            self._process_thumbnail_queue()
+        # Кнопки действий и фоновая загрузка — сначала видимые строки
+        self._ensure_action_widgets()
+        self._prioritize_visible_rows()
 
-        # Запускаем фоновую загрузку длительностей аудио
-        if self._duration_queue:
-            self._duration_timer.start(5)
+    def _visible_row_range(self):
+        """Диапазон (first, last) строк, попадающих в окно таблицы, или None."""
+        row_count = self.table.rowCount()
+        if row_count == 0:
+            return None
+        first = self.table.rowAt(0)
+        last = self.table.rowAt(self.table.viewport().height() - 1)
+        first = 0 if first < 0 else first
+        if last < 0:
+            # Показанные строки не заполняют окно (часть скрыта фильтром,
+            # их мало) или оно ещё не показано: идём по нескрытым строкам
+            # от first, пока их высота не заполнит окно
+            height = self.table.viewport().height()
+            shown_limit = None if self.table.isVisible() else VISIBLE_ROWS_FALLBACK
+            last = first
+            filled = shown = 0
+            for r in range(first, row_count):
+                if self.table.isRowHidden(r):
+                    continue
+                last = r
+                filled += self.table.rowHeight(r)
+                shown += 1
+                if (filled >= height) if shown_limit is None else (shown > shown_limit):
+                    break
+        return first, last
+
+    def _iter_shown_rows(self):
+        """Строки таблицы, не скрытые фильтром."""
+        for r in range(self.table.rowCount()):
+            if not self.table.isRowHidden(r):
+                yield r
+
+    def _ensure_action_widgets(self):
+        """Создаёт кнопки действий для видимых строк, у которых их ещё нет.
+        
+        Виджеты в ячейках — самая дорогая часть заполнения таблицы, поэтому
+        они создаются лениво: при заполнении, прокрутке и изменении размера.
+        """
+        try:
+            visible = self._visible_row_range()
+            if visible is None:
+                return
+            for r in range(visible[0], visible[1] + 1):
+                if self.table.isRowHidden(r) or self.table.cellWidget(r, self.COL_ACTIONS) is not None:
+                    continue
+                fname_item = self.table.item(r, self.COL_FILENAME)
+                if fname_item is None:
+                    continue
+                widget = self._create_actions_widget(fname_item.data(Qt.UserRole), fname_item.data(Qt.UserRole + 1))
+                self.table.setCellWidget(r, self.COL_ACTIONS, widget)
+        except RuntimeError:
+            return
+
+    def _update_hidden_rows(self):
+        """Скрывает строки, не прошедшие фильтры типа и поиска."""
+        shown_keys = {item['res_key'] for item in self._get_filtered_files()}
+        for r in range(self.table.rowCount()):
+            fname_item = self.table.item(r, self.COL_FILENAME)
+            hidden = fname_item is None or fname_item.data(Qt.UserRole) not in shown_keys
+            if self.table.isRowHidden(r) != hidden:
+                self.table.setRowHidden(r, hidden)
+
+    def _apply_row_filter(self):
+        """Применяет фильтры без перестроения таблицы (строки только скрываются)."""
+        self._last_checked_row = None
+        self._update_hidden_rows()
+        self._update_header_checkbox()
+        self._ensure_action_widgets()
+        self._prioritize_visible_rows()
+
+    def _create_actions_widget(self, res_key, file_type):
+        """Создаёт виджет кнопок действий строки (воспроизведение, замена, скачивание)."""
+        # [FIX] Сразу привязываем к таблице (родителю), чтобы не появлялось в (0,0)
+        actions_widget = QWidget(self.table)
+        actions_layout = QHBoxLayout(actions_widget)
+        actions_layout.setContentsMargins(4, 2, 9, 2)
+        actions_layout.setSpacing(8)
+        actions_layout.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
+        
+        btn_style = """
+            QPushButton {
+            background: transparent;
+            color: #ffffff;
+            border: none;
+            font-size: 20px;
+        }
+        QPushButton:hover {
+            color: #ff9900;
+        }
+        """
+        
+        action_buttons = []  # Собираем все кнопки для установки фильтра тултипов
+        
+        if file_type == 'audio':
+            btn_play = QPushButton("▶")
+            btn_play.setCursor(Qt.PointingHandCursor)
+            btn_play.setFocusPolicy(Qt.NoFocus)
+            btn_play.setToolTip(get_translation(self.current_language, 'fm_tooltip_play'))
+            btn_play.setStyleSheet(btn_style)
+            
+            btn_stop = QPushButton("■")
+            btn_stop.setCursor(Qt.PointingHandCursor)
+            btn_stop.setFocusPolicy(Qt.NoFocus)
+            btn_stop.setToolTip(get_translation(self.current_language, 'fm_tooltip_stop'))
+            btn_stop_style = btn_style + "\nQPushButton { padding-bottom: 2px; }"
+            btn_stop.setStyleSheet(btn_stop_style)
+            
+            # Подключаем кнопки действий к аудио
+            btn_play.clicked.connect(lambda _, rk=res_key, b=btn_play: self._on_action_play_toggle(rk, b))
+            btn_stop.clicked.connect(lambda _, rk=res_key, b=btn_play: self._on_action_stop(rk, b))
+            
+            actions_layout.addWidget(btn_play)
+            actions_layout.addWidget(btn_stop)
+            action_buttons.extend([btn_play, btn_stop])
+        elif file_type == 'image':
+            # Удален эмодзи глаза (btn_view) по просьбе пользователя
+            pass
+            
+        # Стиль для кнопок замены и скачивания (на 20% меньше основных кнопок)
+        btn_small_style = btn_style.replace("font-size: 20px;", "font-size: 16px;")
+        
+        btn_replace = QPushButton("⟲")
+        btn_replace.setCursor(Qt.PointingHandCursor)
+        btn_replace.setFocusPolicy(Qt.NoFocus)
+        btn_replace.setToolTip(get_translation(self.current_language, 'fm_tooltip_replace'))
+        btn_replace.setStyleSheet(btn_small_style)
+        
+        btn_download = QPushButton("🡇")
+        btn_download.setCursor(Qt.PointingHandCursor)
+        btn_download.setFocusPolicy(Qt.NoFocus)
+        btn_download.setToolTip(get_translation(self.current_language, 'fm_tooltip_download'))
+        btn_download.setStyleSheet(btn_small_style)
+        
+        btn_replace.clicked.connect(lambda _, rk=res_key: self._on_replace_clicked(rk))
+        btn_download.clicked.connect(lambda _, rk=res_key: self._on_download_clicked(rk))
+        
+        actions_layout.addWidget(btn_replace)
+        actions_layout.addWidget(btn_download)
+        action_buttons.extend([btn_replace, btn_download])
+        
+        # Устанавливаем кастомные тултипы на все кнопки
+        for btn in action_buttons:
+            self._btn_tooltip_filter.add_button(btn)
+        return actions_widget
 
     def _get_filtered_files(self):
         """Возвращает отфильтрованный список файлов."""
@@ -2616,6 +2744,7 @@ class FileManagerWidget(QWidget):
                 it = self.table.item(row, col)
                 if it:
                     it.setData(Qt.UserRole, res_key)
+            self._register_row_key(row, res_key)
 
             # 1. Обновляем имя файла
             fname_item = self.table.item(row, self.COL_FILENAME)
@@ -2643,10 +2772,7 @@ class FileManagerWidget(QWidget):
                     else:
                         info_text = "⏳"
                         sort_val = 0
-                        if not any(q[1] == item['res_key'] for q in getattr(self, '_duration_queue', [])):
-                            self._duration_queue.append((row, item['res_key'], item['filename']))
-                            if not self._duration_timer.isActive():
-                                self._duration_timer.start(5)
+                        self._queue_duration(item['res_key'], item['filename'])
                 
                 info_item.setText(info_text)
                 if hasattr(info_item, 'sort_value'):
@@ -2681,10 +2807,9 @@ class FileManagerWidget(QWidget):
             # 4. Обработка миниатюр для изображений
             if item['type'] == 'image' and item['res_key'] not in self._thumbnail_cache:
                 type_item = self.table.item(row, self.COL_TYPE)
-                if type_item and not any(q[1] == item['res_key'] for q in getattr(self, '_thumbnail_queue', [])):
+                if type_item and not self._task_pool.is_pending('thumbnail', item['res_key']):
                     type_item.setIcon(QIcon())
-                    self._thumbnail_queue.append((type_item, item['res_key'], item['filename']))
-                    self._process_thumbnail_queue()
+                    self._queue_thumbnail(item['res_key'], item['filename'])
         finally:
             self.table.blockSignals(False)
 
@@ -2712,6 +2837,10 @@ class FileManagerWidget(QWidget):
         self.table.setSortingEnabled(False)
         header.setSortIndicatorShown(True)
 
+        # 4. В окне теперь другие строки — создаём кнопки и поднимаем приоритет загрузки
+        self._ensure_action_widgets()
+        self._prioritize_visible_rows()
+
     def _on_table_selection_changed(self):
         """Обновляет цвета статусов при смене выделения, чтобы серый цвет не пропадал."""
         for row in range(self.table.rowCount()):
@@ -2808,9 +2937,7 @@ class FileManagerWidget(QWidget):
         
         if temp_path and os.path.exists(temp_path):
             try:
-                sound = pygame.mixer.Sound(temp_path)
-                self._preview_duration_sec = sound.get_length()
-                del sound
+                self._preview_duration_sec = get_duration(temp_path)
             except Exception as e:
                 logger.error(f"Error loading audio duration: {e}")
         
@@ -3191,7 +3318,7 @@ class FileManagerWidget(QWidget):
             image_list = []
             current_idx = 0
             
-            for r in range(self.table.rowCount()):
+            for r in self._iter_shown_rows():
                 it = self.table.item(r, self.COL_FILENAME)
                 if it and it.data(Qt.UserRole + 1) == 'image':
                     rk = it.data(Qt.UserRole)
@@ -3278,13 +3405,11 @@ class FileManagerWidget(QWidget):
                 # Обновляем in-place без перестроения таблицы
                 file_info = next((f for f in self._all_files if f['res_key'] == selected_res_key), None)
                 if file_info:
-                    for r in range(self.table.rowCount()):
-                        it = self.table.item(r, self.COL_FILENAME)
-                        if it and it.data(Qt.UserRole) == selected_res_key:
-                            self._update_single_row(r, file_info)
-                            self.table.selectRow(r)
-                            self.table.setFocus()
-                            break
+                    r = self._find_row_by_key(selected_res_key)
+                    if r != -1:
+                        self._update_single_row(r, file_info)
+                        self.table.selectRow(r)
+                        self.table.setFocus()
                     self.table.viewport().update()
         else:
             # Если отменили выбор файла, тоже возвращаем фокус
@@ -3421,11 +3546,9 @@ class FileManagerWidget(QWidget):
             for res_key in list(self.checked_keys):
                 file_info = next((f for f in self._all_files if f['res_key'] == res_key), None)
                 if file_info:
-                    for r in range(self.table.rowCount()):
-                        it = self.table.item(r, self.COL_FILENAME)
-                        if it and it.data(Qt.UserRole) == res_key:
-                            self._update_single_row(r, file_info)
-                            break
+                    r = self._find_row_by_key(res_key)
+                    if r != -1:
+                        self._update_single_row(r, file_info)
             self.table.viewport().update()
             
             msg = get_translation(self.current_language, 'fm_batch_replace_success').format(
@@ -3544,8 +3667,8 @@ class FileManagerWidget(QWidget):
             target_keys = [res_key]
             
         # [FIX] Создаем уникальную подпапку для этой конкретной операции перетаскивания,
-        # чтобы файлы имели свои оригинальные имена без суффиксов.
-        drag_dir = tempfile.mkdtemp(prefix="dcs_drag_")
+        # чтобы файлы имели свои оригинальные имена без суффиксов (удаляется вместе с сессией).
+        drag_dir = get_scratch_area().make_directory("dcs_drag_")
         
         temp_paths = []
         # Находим все файлы по ключам (нужно достать оригинальные имена)
@@ -3561,6 +3684,23 @@ class FileManagerWidget(QWidget):
                     
         return temp_paths
 
+    def _probe_resource_audio(self, res_key, filename):
+        """Параметры аудио (audio_probe.AudioInfo) по заголовку файла в архиве или None."""
+        if res_key.startswith("KneeboardKey_"):
+            return None
+        try:
+            source = self._resolve_resource_source(res_key, filename)
+            if source is None:
+                return None
+            kind, value = source
+            if kind == 'file':
+                return probe_file(value)
+            with pooled_archive(self.miz_path) as z:
+                return probe_member(z, value)
+        except Exception as e:
+            logger.error(f"Ошибка чтения заголовка аудио {filename}: {e}")
+            return None
+
     def _extract_resource_to_temp(self, res_key, filename, target_dir=None):
         """Извлекает ресурс из .miz во временный файл.
         
@@ -3603,41 +3743,27 @@ class FileManagerWidget(QWidget):
 
         # Извлекаем из ZIP
         try:
-            if target_dir:
+            with pooled_archive(self.miz_path) as z:
+                index = get_archive_index(self.miz_path, z)
+                # Регистронезависимый поиск по общему индексу архива
+                info = index.find(target_path)
+                if info is None:
+                    if target_path.startswith("KNEEBOARD/"):
+                        # Для KNEEBOARD нет fallback-а в DEFAULT
+                        return None
+                    # Fallback: DEFAULT
+                    info = index.find(f"l10n/DEFAULT/{filename}")
+                    if info is None:
+                        return None
+
+                if not target_dir:
+                    # Предпросмотр: файл извлекается в папку сессии один раз
+                    # на версию файла архива (повторно возвращается тот же путь)
+                    return get_scratch_area().extract_member(z, info, filename)
+
                 # Для Drag-Out используем оригинальное имя
                 temp_path = os.path.join(target_dir, filename)
-            else:
-                # [FIX] Для предпросмотра используем res_key и суффикс для полной уникальности.
-                # Это предотвращает конфликты, если есть файлы с одинаковыми именами.
-                suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
-                temp_dir = tempfile.gettempdir()
-                # Очищаем res_key от символов, которые могут быть недопустимы в пути
-                safe_key = "".join([c if c.isalnum() else "_" for c in res_key])
-                temp_path = os.path.join(temp_dir, f"dcs_preview_{suffix}_{safe_key}_{filename}")
-
-            with zipfile.ZipFile(self.miz_path, 'r') as z:
-                actual_path = target_path
-                if actual_path not in z.namelist():
-                    # Регистронезависимый поиск
-                    found = False
-                    for name in z.namelist():
-                        if name.lower() == target_path.lower():
-                            actual_path = name
-                            found = True
-                            break
-                    if not found:
-                        if target_path.startswith("KNEEBOARD/"):
-                            # Для KNEEBOARD нет fallback-а в DEFAULT
-                            return None
-                        else:
-                            # Fallback: DEFAULT
-                            fallback = f"l10n/DEFAULT/{filename}"
-                            if fallback in z.namelist():
-                                actual_path = fallback
-                            else:
-                                return None
-
-                with z.open(actual_path) as src, open(temp_path, 'wb') as dst:
+                with z.open(info) as src, open(temp_path, 'wb') as dst:
                     shutil.copyfileobj(src, dst)
 
                 return temp_path
@@ -3654,10 +3780,15 @@ class FileManagerWidget(QWidget):
         settings = get_ui_settings()
         settings.setValue("fm_view_slider_value", self.view_slider.value())
         
-        # Останавливаем аудио при закрытии
+        # Останавливаем аудио и фоновые задачи при закрытии
         self._stop_preview_audio()
+        self.stop_background_tasks()
         super().closeEvent(event)
 
+    def stop_background_tasks(self):
+        """Останавливает потоки фоновой загрузки (окно закрывается)"""
+        self._task_pool.shutdown()
+
 
     # ─── Локализация ──────────────────────────────────────────────────
 
@@ -3726,11 +3857,9 @@ class FileManagerWidget(QWidget):
             
             # Восстанавливаем выделение
             if selected_res_key:
-                for r in range(self.table.rowCount()):
-                    it = self.table.item(r, self.COL_FILENAME)
-                    if it and it.data(Qt.UserRole) == selected_res_key:
-                        self.table.selectRow(r)
-                        break
+                r = self._find_row_by_key(selected_res_key)
+                if r != -1:
+                    self.table.selectRow(r)
         
         # Принудительно обновляем цвета выделения
         self._on_table_selection_changed()
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+=== РАЗБОР ФАЙЛА MISSION ===
+Линейный токенизатор/парсер Lua-таблиц файла mission и извлечение связей
+текст → аудио и картинок брифинга за один проход.
+
+Раньше связи искались несколькими регулярными выражениями re.DOTALL с
+ленивыми .*? по всему тексту (блоки TransmitMessage, ["actions"], элементы
+"end of [N]"), что на миссиях в десятки мегабайт давало сильный откат.
+Здесь текст читается один раз: парсер ведёт стек открытых таблиц и сообщает
+о строковых значениях и закрытии таблиц, а MissionLinkGraph сохраняет
+только нужные сводки (без построения полного дерева).
+
+Большая часть файла (поля юнитов, маршрутов, настроек) связям не нужна:
+регулярное выражение пропускает её сплошными прогонами вместе с ненужными
+строками, и в Python-цикл попадают только скобки таблиц и строки, которые
+могут быть ссылкой (DictKey_/ResKey_, TransmitMessage, вызовы a_out_).
+Ключ таблицы или строки читается назад от неё и только когда нужен.
+Позиционные элементы (без [N] =) не нумеруются: DCS всегда пишет ключи явно.
+
+Граф связей не зависит от локали: фильтр «ресурс — аудиофайл» (по mapResource)
+применяется позже, в MissionLinkGraph.resolve.
+"""
+
+import re
+
+# Версия разбора — часть ключа дискового кэша (parse_cache); менять при изменении результата
+MISSION_PARSER_VERSION = 2
+
+# Поля таблиц, значения которых нужны для извлечения связей
+_FIELD_KEYS = frozenset(('id', 'predicate', 'text', 'file', 'subtitle'))
+
+# Строка в двойных кавычках (сырое содержимое, экранирование не раскрывается)
+_STRING_BODY = r'[^"\\]*(?:\\.[^"\\]*)*'
+# Начало значения, которое может быть ссылкой или нужным полем
+_REF_START = r'(?:DictKey_|ResKey_|TransmitMessage"|a_out_)'
+_FIELD_NAMES = '|'.join(sorted(_FIELD_KEYS))
+
+# Пропуск: всё, кроме скобок таблиц и нужных строк. Проглатываются целиком
+# строки, которые не начинаются с DictKey_/ResKey_/TransmitMessage и не
+# содержат a_out_ (кроме ключа поля из _FIELD_KEYS перед таким значением),
+# комментарии "-- ..." (до конца строки) и строки в одинарных кавычках.
+# Варианты начинаются с разных символов, поэтому при неудаче движку нечего перебирать
+_GAP_CHARS = r'[^{}"\'\-]*'
+_GAP = (
+    _GAP_CHARS +
+    r'(?:(?:"(?!DictKey_|ResKey_|TransmitMessage"|(?:' + _FIELD_NAMES + r')"\s*\]\s*=\s*"' + _REF_START + r')'
+    r'[^"\\a]*(?:(?:\\.|a(?!_out_))[^"\\a]*)*"'
+    r"|'[^'\\]*(?:\\.[^'\\]*)*'"
+    r'|--[^\n]*(?![^\n])'
+    r'|-(?!-)'
+    r')' + _GAP_CHARS + r')*'
+)
+
+# Токены после пропуска (номер — m.lastindex):
+#   1 — '{'     2 — '}'
+#   4 — поле ["id"/"predicate"/...] = "..." (группа 3 — ключ, 4 — значение)
+#   5 — прочая строка, которая может быть ссылкой (ключ ищется назад)
+#   6 — та же строка оказалась ключом ["..."] (пропускается)
+# Последние варианты (любой символ, конец текста) не дают откатываться
+# внутрь пропуска, если после него нет токена
+_TOKEN_RE = re.compile(
+    _GAP + r'(?:(\{)|(\})'
+    r'|"(' + _FIELD_NAMES + r')"\s*\]\s*=\s*"(' + _STRING_BODY + r')"'
+    r'|"(' + _STRING_BODY + r')"(\s*\])?|.|\Z)',
+    re.DOTALL
+)
+
+# Ключ перед значением: ["строка"] = или [число] = (ключи-имена бывают
+# только у корня mission). Ищется назад от значения в окне _KEY_WINDOW символов
+_KEY_RE = re.compile(r'\[\s*(?:"(' + _STRING_BODY + r')"|(-?\d+))\s*\]\s*=\s*')
+_KEY_BEFORE_RE = re.compile(_KEY_RE.pattern + r'\Z')
+_KEY_WINDOW = 256
+
+# Вызовы в скриптовых командах trig (после замены \" → ")
+_SCRIPT_TEXT_RE = re.compile(r'a_out_text_delay\(getValueDictByKey\("(DictKey_[^"]+)"\)')
+_SCRIPT_SOUND_RE = re.compile(r'a_out_sound\(getValueResourceByKey\("(ResKey_[^"]+)"\)')
+
+# Таблицы картинок брифинга: ключ таблицы → суффикс стороны
+_PICTURE_KEYS = {
+    'pictureFileNameB': 'B',
+    'pictureFileNameR': 'R',
+    'pictureFileNameN': 'N',
+}
+
+def _is_ref(value, prefix):
+    """Строка — ссылка вида DictKey_.../ResKey_... (как "(Prefix_[^"]+)" в регулярках)"""
+    return value is not None and len(value) > len(prefix) and value.startswith(prefix) and '"' not in value
+
+
+def _key_before(text, pos):
+    """Ключ значения, начинающегося в pos.
+
+    Returns:
+        str | int | None: ключ (строка — сырое содержимое) или None для
+        позиционного значения
+    """
+    start = max(0, pos - _KEY_WINDOW)
+    # Обычно ближайшая '[' и открывает ключ; иначе (']' или '[' внутри ключа) — поиск
+    bracket = text.rfind('[', start, pos)
+    if bracket < 0:
+        return None
+    m = _KEY_RE.fullmatch(text, bracket, pos)
+    if m is None:
+        m = _KEY_BEFORE_RE.search(text, start, pos)
+        if m is None:
+            return None
+    name = m.group(1)
+    return int(m.group(2)) if name is None else name
+
+
+class _Frame:
+    """Таблица, в которой есть что собирать: позиция '{' (она же порядок
+    открытия), ключ в родителе (читается по требованию) и сводки"""
+
+    __slots__ = ('pos', '_key', 'fields', 'params',
+                 'action_texts', 'action_sounds', 'images')
+
+    _UNSET = object()
+
+    def __init__(self, pos):
+        self.pos = pos
+        self._key = _Frame._UNSET
+        self.fields = None
+        self.params = None
+        self.action_texts = None
+        self.action_sounds = None
+        self.images = None
+
+    def fields_dict(self):
+        if self.fields is None:
+            self.fields = {}
+        return self.fields
+
+    def key(self, text):
+        if self._key is _Frame._UNSET:
+            self._key = _key_before(text, self.pos) if self.pos >= 0 else None
+        return self._key
+
+
+def _frame_at(frames, pos):
+    frame = frames.get(pos)
+    if frame is None:
+        frame = frames[pos] = _Frame(pos)
+    return frame
+
+
+class MissionLinkGraph:
+    """Не зависящие от локали связи из файла mission.
+
+    transmit_links — [(DictKey_subtitle, ResKey)] из задач TransmitMessage
+    script_links   — [([DictKey...], [ResKey...])] из строковых команд trig
+    action_links   — [([DictKey...], [ResKey...])] из блоков ["actions"]
+    briefing_images — {'B'|'R'|'N': [ResKey...]} из pictureFileNameB/R/N
+    """
+
+    def __init__(self):
+        self.transmit_links = []
+        self.script_links = []
+        self.action_links = []
+        self.briefing_images = {}
+
+    @classmethod
+    def from_text(cls, text):
+        graph = cls()
+        graph._parse(text)
+        return graph
+
+    # ─── Разрешение связей ─────────────────────────────────────────────
+
+    def resolve(self, is_audio_res):
+        """Стадии 1–3: словарь DictKey → ResKey.
+
+        is_audio_res(res_key) — указывает ли ресурс на аудиофайл в текущей локали.
+        Правило DCS: все тексты одной команды/блока связаны с первым звуком в нём.
+        """
+        links = {}
+
+        # 1. TransmitMessage
+        for subtitle, res_key in self.transmit_links:
+            links[subtitle] = res_key
+
+        # 2. Скриптовые команды и 3. блоки ["actions"]
+        for group in (self.script_links, self.action_links):
+            for texts, sounds in group:
+                sound = next((rk for rk in sounds if is_audio_res(rk)), None)
+                if sound is None:
+                    continue
+                for dk in texts:
+                    if dk not in links:
+                        links[dk] = sound
+        return links
+
+    # ─── Разбор ────────────────────────────────────────────────────────
+
+    def _parse(self, text):
+        transmit = []  # [(order, subtitle, file)]
+        actions = []   # [(order, texts, sounds)]
+        script_links = self.script_links
+        images = self.briefing_images
+
+        # Стек открытых таблиц — только позиции '{' (-1 — корень); объект
+        # _Frame создаётся, когда в таблице появляется нужное поле
+        stack = [-1]
+        frames = {}
+        push = stack.append
+        pop = stack.pop
+
+        on_string = self._on_string
+        close_table = self._close_table
+        key_before = _key_before
+
+        for m in _TOKEN_RE.finditer(text):
+            kind = m.lastindex
+            if kind == 1:
+                push(m.start(1))
+            elif kind == 2:
+                closed = frames.pop(pop(), None)
+                if not stack:
+                    # Лишняя '}' — корень остаётся на месте
+                    push(-1)
+                    if closed is not None:
+                        frames[-1] = closed
+                # Таблицы без нужных полей ничего не дают — ключ не читаем
+                elif closed is not None and (closed.fields or closed.params
+                                             or closed.action_texts or closed.images):
+                    close_table(text, closed, _frame_at(frames, stack[-1]), transmit, actions, images)
+            elif kind == 4:
+                frame = frames.get(stack[-1])
+                if frame is None:
+                    frame = frames[stack[-1]] = _Frame(stack[-1])
+                if frame.fields is None:
+                    frame.fields = {m.group(3): m.group(4)}
+                else:
+                    frame.fields.setdefault(m.group(3), m.group(4))
+            elif kind == 5:
+                on_string(text, frames, stack[-1], key_before(text, m.start(5) - 1), m.group(5), script_links)
+
+        transmit.sort()
+        actions.sort(key=lambda item: item[0])
+        self.transmit_links = [(subtitle, res_key) for _, subtitle, res_key in transmit]
+        self.action_links = [(texts, sounds) for _, texts, sounds in actions]
+
+    @staticmethod
+    def _on_string(text, frames, pos, key, raw, script_links):
+        if isinstance(key, int):
+            # Строковые команды trig: [N] = "a_out_text_delay(...);a_out_sound(...);"
+            if 'a_out_' in raw:
+                clean = raw.replace('\\"', '"')
+                d_keys = _SCRIPT_TEXT_RE.findall(clean)
+                if d_keys:
+                    s_keys = _SCRIPT_SOUND_RE.findall(clean)
+                    if s_keys:
+                        script_links.append((d_keys, s_keys))
+            elif _is_ref(raw, 'ResKey_') and _key_before(text, pos) in _PICTURE_KEYS:
+                frame = _frame_at(frames, pos)
+                if frame.images is None:
+                    frame.images = {}
+                frame.images[key] = raw
+        elif key in _FIELD_KEYS:
+            _frame_at(frames, pos).fields_dict().setdefault(key, raw)
+
+    @staticmethod
+    def _close_table(text, closed, parent, transmit, actions, images):
+        # Ключ таблицы читается только там, где без него не обойтись
+        fields = closed.fields
+        if fields:
+            predicate = fields.get('predicate')
+            if predicate is not None:
+                # Элемент блока ["actions"]: [N] = { ["predicate"] = "a_out_...", ... }
+                if predicate == 'a_out_text_delay':
+                    ref, prefix, attr = fields.get('text'), 'DictKey_', 'action_texts'
+                elif predicate == 'a_out_sound':
+                    ref, prefix, attr = fields.get('file'), 'ResKey_', 'action_sounds'
+                else:
+                    ref = None
+                if (_is_ref(ref, prefix) and isinstance(closed.key(text), int)
+                        and parent.key(text) == 'actions'):
+                    found = getattr(parent, attr)
+                    if found is None:
+                        setattr(parent, attr, [ref])
+                    else:
+                        found.append(ref)
+            elif fields.get('id') == 'TransmitMessage':
+                if closed.params:
+                    subtitle, res_key = closed.params
+                    if _is_ref(subtitle, 'DictKey_') and _is_ref(res_key, 'ResKey_'):
+                        transmit.append((closed.pos, subtitle, res_key))
+            elif ('subtitle' in fields or 'file' in fields) and closed.key(text) == 'params':
+                parent.params = (fields.get('subtitle'), fields.get('file'))
+
+        if closed.action_texts and closed.action_sounds and closed.key(text) == 'actions':
+            actions.append((closed.pos, closed.action_texts, closed.action_sounds))
+
+        if closed.images:
+            suffix = _PICTURE_KEYS.get(closed.key(text))
+            # Как и раньше — берётся первая таблица с таким ключом
+            if suffix is not None and suffix not in images:
+                found = closed.images
+                images[suffix] = [found[i] for i in sorted(found) if i >= 1]
+
+
+def parse_mission_links(text):
+    """Строит MissionLinkGraph по тексту файла mission"""
+    return MissionLinkGraph.from_text(text)
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+=== ПЕРЕЗАПИСЬ .MIZ АРХИВОВ ===
+Копирование неизменённых файлов архива без распаковки и повторного сжатия.
+
+zout.writestr(item, zin.read(name)) полностью распаковывает и заново сжимает
+каждый файл (.ogg, .wav, картинки, mission). copy_member_raw переносит
+сжатые байты как есть: пишет новый локальный заголовок (с известными CRC
+и размерами из центрального каталога) и копирует данные блоками.
+Заново сжимается только то, что действительно изменилось.
+
+append_update_archive — режим дозаписи: изменённые файлы дописываются
+в конец существующего архива с новым центральным каталогом (см. ниже).
+"""
+
+import copy
+import struct
+import zipfile
+import zlib
+
+# Размер блока при копировании сжатых данных
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def _member_data_offset(zin, info):
+    """Возвращает смещение начала сжатых данных файла в исходном архиве"""
+    fp = zin.fp
+    fp.seek(info.header_offset)
+    header = fp.read(zipfile.sizeFileHeader)
+    if len(header) != zipfile.sizeFileHeader:
+        raise zipfile.BadZipFile(f"Truncated local header: {info.filename!r}")
+    fields = struct.unpack(zipfile.structFileHeader, header)
+    if fields[zipfile._FH_SIGNATURE] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"Bad local header magic: {info.filename!r}")
+    return (info.header_offset + zipfile.sizeFileHeader
+            + fields[zipfile._FH_FILENAME_LENGTH] + fields[zipfile._FH_EXTRA_FIELD_LENGTH])
+
+
+def copy_member_raw(zin, zout, info, read_name=None):
+    """Копирует файл из zin в zout без перепаковки.
+
+    Args:
+        zin:       исходный ZipFile (режим 'r')
+        zout:      целевой ZipFile (режим 'w'/'a')
+        info:      ZipInfo файла из zin.infolist(); может быть с исправленным
+                   filename (cp437 → utf-8) — имя берётся из него
+        read_name: имя для чтения из zin при откате на обычное копирование
+                   (по умолчанию — info.filename)
+
+    Если прямое копирование невозможно (нестандартный архив), файл
+    копируется обычным способом через распаковку.
+    """
+    if (zin.fp is None or zout.fp is None or getattr(zout, '_writing', False)
+            or not getattr(zout, '_seekable', True)):
+        zout.writestr(info, zin.read(read_name or info.filename))
+        return
+
+    try:
+        data_offset = _member_data_offset(zin, info)
+    except (zipfile.BadZipFile, struct.error, OSError):
+        zout.writestr(info, zin.read(read_name or info.filename))
+        return
+
+    new_info = copy.copy(info)
+    # CRC и размеры известны из центрального каталога — дескриптор данных не нужен
+    new_info.flag_bits &= ~zipfile._MASK_USE_DATA_DESCRIPTOR
+    new_info.extra = zipfile._strip_extra(info.extra, (1,))
+
+    with zout._lock:
+        zout._writecheck(new_info)
+        zout._didModify = True
+
+        zout.fp.seek(zout.start_dir)
+        new_info.header_offset = zout.fp.tell()
+        zout.fp.write(new_info.FileHeader())
+
+        zin.fp.seek(data_offset)
+        remaining = info.compress_size
+        while remaining > 0:
+            chunk = zin.fp.read(min(_COPY_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise zipfile.BadZipFile(f"Truncated file data: {info.filename!r}")
+            zout.fp.write(chunk)
+            remaining -= len(chunk)
+
+        zout.start_dir = zout.fp.tell()
+        zout.filelist.append(new_info)
+        zout.NameToInfo[new_info.filename] = new_info
+
+
+# === ДОЗАПИСЬ ИЗМЕНЕНИЙ В АРХИВ ===
+# Вместо полной перезаписи архива новые файлы (dictionary, mapResource, аудио)
+# дописываются в конец области данных поверх старого центрального каталога,
+# после чего пишется новый каталог. Старые версии заменённых файлов остаются
+# в архиве «мёртвыми» байтами, пока их не уберёт полная перезапись (сжатие).
+
+# Доля мёртвых байт в области данных, после которой нужна полная перезапись
+COMPACT_DEAD_RATIO = 0.25
+# Мёртвые данные меньше этого объёма не стоят полной перезаписи
+COMPACT_MIN_DEAD_BYTES = 8 * 1024 * 1024
+
+# Размер дескриптора данных (сигнатура + CRC + 2 размера) для flag bit 3
+_DATA_DESCRIPTOR_SIZE = 16
+
+
+def content_matches_member(info, chunks):
+    """Совпадает ли содержимое (итератор блоков bytes) с файлом архива по CRC32 и размеру"""
+    crc = 0
+    size = 0
+    for chunk in chunks:
+        crc = zlib.crc32(chunk, crc)
+        size += len(chunk)
+    return size == info.file_size and crc == info.CRC
+
+
+def _needs_name_fix(info):
+    """Имя в cp437 без UTF-8 флага — при дозаписи его нельзя исправить
+    в локальном заголовке, поэтому такой архив нужно переписать целиком"""
+    if info.flag_bits & 0x800:
+        return False
+    try:
+        info.filename.encode('ascii')
+    except UnicodeEncodeError:
+        return True
+    return False
+
+
+def check_append_update(path, drop_names=(), dead_ratio=COMPACT_DEAD_RATIO,
+                        min_dead_bytes=COMPACT_MIN_DEAD_BYTES):
+    """Проверяет, можно ли обновить архив дозаписью.
+
+    Args:
+        path:       путь к .miz
+        drop_names: имена файлов, которые будут заменены или удалены
+        dead_ratio, min_dead_bytes: порог сжатия мёртвых данных
+
+    Returns:
+        (можно_дописывать, причина_отказа)
+    """
+    drop = set(drop_names)
+    with zipfile.ZipFile(path, 'r') as zin:
+        data_size = zin.start_dir
+        live_size = 0
+        for info in zin.infolist():
+            if _needs_name_fix(info):
+                return False, f"non-UTF-8 file name: {info.filename!r}"
+            if info.filename in drop:
+                continue
+            live_size += _member_data_offset(zin, info) - info.header_offset + info.compress_size
+            if info.flag_bits & zipfile._MASK_USE_DATA_DESCRIPTOR:
+                live_size += _DATA_DESCRIPTOR_SIZE
+
+    dead_size = max(0, data_size - live_size)
+    if dead_size > max(min_dead_bytes, data_size * dead_ratio):
+        return False, f"dead space {dead_size} of {data_size} bytes"
+    return True, ""
+
+
+def append_update_archive(path, drop_names, write_members):
+    """Обновляет архив на месте: убирает drop_names из каталога и дописывает новые файлы.
+
+    Args:
+        path:          путь к .miz
+        drop_names:    точные имена файлов, исключаемых из центрального каталога
+                       (заменяемые и удаляемые)
+        write_members: callable(zout) — пишет новые файлы в ZipFile режима 'a'
+
+    Данные до центрального каталога не изменяются. При ошибке исходный
+    центральный каталог восстанавливается, и архив остаётся прежним.
+    """
+    with zipfile.ZipFile(path, 'r') as zin:
+        directory_offset = zin.start_dir
+    with open(path, 'rb') as f:
+        f.seek(directory_offset)
+        original_tail = f.read()
+
+    drop = set(drop_names)
+    try:
+        with zipfile.ZipFile(path, 'a', compression=zipfile.ZIP_DEFLATED) as zout:
+            zout.filelist = [info for info in zout.filelist if info.filename not in drop]
+            for name in drop:
+                zout.NameToInfo.pop(name, None)
+            # Каталог нужно переписать, даже если новых файлов нет (только удаления)
+            zout._didModify = True
+            write_members(zout)
+    except BaseException:
+        with open(path, 'r+b') as f:
+            f.seek(directory_offset)
+            f.write(original_tail)
+            f.truncate()
+        raise
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+=== ИНДЕКС ИМЁН .MIZ АРХИВА ===
+MizArchiveIndex — один проход по центральному каталогу открытого архива:
+- нормализованный путь в нижнем регистре → ZipInfo (имя cp437 → utf-8 исправлено)
+- папка локали l10n/<folder>/ → её файлы
+- список .lua файлов
+
+Индекс строится один раз на версию файла (mtime + размер) и общий для
+MizResourceManager, ReferenceLoader, LuaScriptParser и FileManagerWidget.
+После сохранения архива индекс сбрасывается через invalidate_archive.
+
+Там же — пул долгоживущих дескрипторов архива для извлечения ресурсов
+(pooled_archive): центральный каталог читается один раз на версию файла,
+а каждый поток получает собственный файловый объект. Дескрипторы потока
+закрываются при его завершении (release_thread_archives в рабочих потоках
+пула, для прочих — при следующем открытии дескриптора).
+"""
+
+import os
+import threading
+import zipfile
+from contextlib import contextmanager
+
+
+def fix_member_name(name):
+    """Исправляет имя файла архива: DCS пишет utf-8 без флага, zipfile читает как cp437"""
+    try:
+        return name.encode('cp437').decode('utf-8')
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return name
+
+
+def normalize_member_path(path):
+    """Ключ поиска: прямые слэши, без крайних '/', нижний регистр"""
+    return path.replace('\\', '/').strip('/').lower()
+
+
+class MizArchiveIndex:
+    """Индекс имён файлов .miz архива для регистронезависимого поиска"""
+
+    def __init__(self, infos):
+        self.infos = list(infos)
+        self.members = {}         # normalized_lower_path -> ZipInfo
+        self.display_names = {}   # archive_name -> исправленное имя
+        self.locale_members = {}  # folder_lower -> [ZipInfo]
+        self.locale_folders = []  # папки l10n/ в исходном регистре (отсортированы)
+        self.lua_members = []     # [ZipInfo] файлов *.lua
+
+        folders = set()
+        for info in self.infos:
+            name = fix_member_name(info.filename)
+            self.display_names[info.filename] = name
+            path_norm = name.replace('\\', '/').strip('/')
+            path_lower = path_norm.lower()
+            # При дубликатах побеждает первый — как при линейном поиске
+            self.members.setdefault(path_lower, info)
+
+            if name.startswith('l10n/') and '/' in name[5:]:
+                folders.add(name[5:].split('/')[0])
+            if path_lower.startswith('l10n/'):
+                parts = path_lower.split('/')
+                if len(parts) > 2:
+                    self.locale_members.setdefault(parts[1], []).append(info)
+
+            if path_lower.endswith('.lua'):
+                self.lua_members.append(info)
+
+        self.locale_folders = sorted(folders)
+
+    @classmethod
+    def from_zip(cls, zf):
+        return cls(zf.infolist())
+
+    def find(self, path):
+        """ZipInfo файла по пути (без учёта регистра и слэшей) или None"""
+        return self.members.get(normalize_member_path(path))
+
+    def archive_name(self, path):
+        """Имя файла в архиве (для zf.open/zf.read) по пути или None"""
+        info = self.members.get(normalize_member_path(path))
+        return info.filename if info is not None else None
+
+    def display_name(self, info):
+        """Исправленное (utf-8) имя файла архива"""
+        return self.display_names.get(info.filename, info.filename)
+
+    def get_locale_members(self, folder):
+        """Файлы папки l10n/<folder>/ (без учёта регистра)"""
+        return self.locale_members.get(folder.lower(), [])
+
+    def find_dictionary(self, folder):
+        """Имя dictionary локали в архиве или None.
+
+        Сначала точный путь l10n/<folder>/dictionary, затем файлы папки,
+        чьё имя начинается на 'dictionary' (dictionary.lua, вложенные пути).
+        """
+        name = self.archive_name(f'l10n/{folder}/dictionary')
+        if name is not None:
+            return name
+        for info in self.get_locale_members(folder):
+            last = normalize_member_path(self.display_name(info)).rsplit('/', 1)[-1]
+            if last.startswith('dictionary'):
+                return info.filename
+        return None
+
+
+# Общие индексы: abspath -> ((mtime_ns, size), MizArchiveIndex)
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _cache_key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+def get_archive_index(path, zf=None):
+    """Возвращает индекс архива; строит его только при первом обращении
+    или если файл изменился (mtime/размер).
+
+    Args:
+        path: путь к .miz (None — индекс строится без кэширования)
+        zf:   уже открытый ZipFile этого архива (чтобы не открывать повторно)
+    """
+    if not path:
+        return MizArchiveIndex.from_zip(zf)
+
+    key = _cache_key(path)
+    st = os.stat(path)
+    signature = (st.st_mtime_ns, st.st_size)
+    with _indexes_lock:
+        cached = _indexes.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    if zf is not None:
+        index = MizArchiveIndex.from_zip(zf)
+    else:
+        with pooled_archive(path) as archive:
+            index = MizArchiveIndex.from_zip(archive)
+
+    with _indexes_lock:
+        _indexes[key] = (signature, index)
+    return index
+
+
+# === ПУЛ ДЕСКРИПТОРОВ АРХИВА ===
+# Базовый ZipFile на версию файла: abspath -> ((mtime_ns, size), ZipFile)
+_base_archives = {}
+# Дескрипторы потоков: (abspath, thread_id) -> ((mtime_ns, size), ZipFile, Thread)
+# Поток хранится, чтобы не отдать дескриптор завершённого потока новому
+# потоку с тем же идентификатором
+_thread_archives = {}
+_pool_lock = threading.Lock()
+
+
+def _clone_for_thread(base, path):
+    """ZipFile с общим (уже прочитанным) каталогом base, но своим файловым объектом"""
+    clone = zipfile.ZipFile.__new__(zipfile.ZipFile)
+    clone.__dict__.update(base.__dict__)
+    clone.fp = open(path, 'rb')
+    clone._filePassed = 0
+    clone._fileRefCnt = 1
+    clone._lock = threading.RLock()
+    return clone
+
+
+def _pop_dead_threads():
+    """Убирает из пула дескрипторы завершённых потоков (под _pool_lock).
+
+    Returns:
+        list: дескрипторы к закрытию (базовые ZipFile остаются в пуле)
+    """
+    bases = {id(base[1]) for base in _base_archives.values()}
+    stale = []
+    for thread_key in [k for k, v in _thread_archives.items() if not v[2].is_alive()]:
+        archive = _thread_archives.pop(thread_key)[1]
+        if id(archive) not in bases:
+            stale.append(archive)
+    return stale
+
+
+def _acquire_archive(path):
+    key = _cache_key(path)
+    st = os.stat(path)
+    signature = (st.st_mtime_ns, st.st_size)
+    thread = threading.current_thread()
+    thread_key = (key, thread.ident)
+
+    with _pool_lock:
+        cached = _thread_archives.get(thread_key)
+        if cached is not None and cached[0] == signature and cached[2] is thread:
+            return cached[1]
+
+        # Новый дескриптор открывается редко — заодно закрываем дескрипторы
+        # завершённых потоков
+        stale = _pop_dead_threads()
+        cached = _thread_archives.pop(thread_key, None)
+        base = _base_archives.get(key)
+        if base is not None and base[0] != signature:
+            stale.append(_base_archives.pop(key)[1])
+            base = None
+        if cached is not None and (base is None or cached[1] is not base[1]):
+            stale.append(cached[1])
+
+    for archive in stale:
+        _close_quietly(archive)
+
+    if base is None:
+        # Каталог читается один раз на версию файла; этот же объект служит
+        # дескриптором для первого потока
+        archive = zipfile.ZipFile(path, 'r')
+        with _pool_lock:
+            _base_archives[key] = (signature, archive)
+            _thread_archives[thread_key] = (signature, archive, thread)
+        return archive
+
+    archive = _clone_for_thread(base[1], path)
+    with _pool_lock:
+        _thread_archives[thread_key] = (signature, archive, thread)
+    return archive
+
+
+def release_thread_archives():
+    """Закрывает дескрипторы пула текущего потока (вызывать перед его завершением).
+
+    Базовые ZipFile остаются в пуле: из них клонируются дескрипторы
+    для других потоков.
+    """
+    ident = threading.get_ident()
+    with _pool_lock:
+        bases = {id(base[1]) for base in _base_archives.values()}
+        stale = []
+        for thread_key in [k for k in _thread_archives if k[1] == ident]:
+            archive = _thread_archives.pop(thread_key)[1]
+            if id(archive) not in bases:
+                stale.append(archive)
+    for archive in stale:
+        _close_quietly(archive)
+
+
+def _close_quietly(archive):
+    try:
+        archive.close()
+    except Exception:
+        pass
+
+
+@contextmanager
+def pooled_archive(path):
+    """Открытый на чтение ZipFile архива из пула (закрывать не нужно).
+
+    Дескриптор живёт, пока файл не изменится, поток не завершится или не
+    будет вызван invalidate_archive. При ошибке чтения дескриптор потока
+    сбрасывается.
+    """
+    archive = _acquire_archive(path)
+    try:
+        yield archive
+    except (zipfile.BadZipFile, OSError, ValueError):
+        key = _cache_key(path)
+        with _pool_lock:
+            _thread_archives.pop((key, threading.get_ident()), None)
+            base = _base_archives.get(key)
+            is_base = base is not None and base[1] is archive
+        if not is_base:
+            _close_quietly(archive)
+        raise
+
+
+def invalidate_archive(path=None):
+    """Сбрасывает индекс и закрывает дескрипторы пула для архива
+    (path=None — для всех архивов).
+
+    Вызывать перед записью архива (на Windows открытый файл нельзя заменить)
+    и после сохранения.
+    """
+    with _indexes_lock:
+        if path is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(_cache_key(path), None)
+
+    with _pool_lock:
+        if path is None:
+            handles = list(_thread_archives.values()) + list(_base_archives.values())
+            _thread_archives.clear()
+            _base_archives.clear()
+        else:
+            key = _cache_key(path)
+            handles = [_thread_archives.pop(k) for k in list(_thread_archives) if k[0] == key]
+            base = _base_archives.pop(key, None)
+            if base is not None:
+                handles.append(base)
+
+    closed = set()
+    for archive in (handle[1] for handle in handles):
+        if id(archive) not in closed:
+            closed.add(id(archive))
+            _close_quietly(archive)
@@ -11,13 +11,24 @@ import re
 import logging
 import os
 import shutil
-import tempfile
-import zipfile
+from collections import OrderedDict
 
 from error_logger import ErrorLogger
+from miz_index import get_archive_index, pooled_archive
+from mission_parser import parse_mission_links, MISSION_PARSER_VERSION
+from parse_cache import get_parse_cache
+from audio_probe import probe_member, probe_file
+from scratch_area import get_scratch_area
 
 logger = logging.getLogger(__name__)
 
+# Версия разбора ключей dictionary — часть ключа дискового кэша (parse_cache)
+RESOURCE_PARSER_VERSION = 1
+
+# Сколько версий dictionary держать в кэше ключей (LRU): DEFAULT и текущая
+# локаль с запасом на переключение между локалями
+MAX_CACHED_DICTIONARY_KEYS = 8
+
 
 class MizResourceManager:
     """Менеджер ресурсов миссии (.miz)
@@ -31,6 +42,7 @@ class MizResourceManager:
     
     def reset(self):
         """Сброс всех данных"""
+        self._touch_links()
         # Связи из mission: DictKey_subtitle_* → ResKey_advancedFile_*
         self.subtitle_to_reskey = {}
         
@@ -64,7 +76,9 @@ class MizResourceManager:
         self.preferred_offset_order = [-1, 1]
         
         # Кэш данных для повторного запуска эвристики
-        self._cached_mission_text = None
+        self._mission_graph = None      # MissionLinkGraph из mission_parser (стадии 1-3)
+        self._mission_graph_key = None  # (путь архива, CRC, размер) файла mission
+        self._dictionary_keys_cache = OrderedDict()  # ключ версии словарей -> {DictKey: 'x'|''} (LRU)
         self._cached_dictionary_keys = None
         
         # === Изображения ===
@@ -72,41 +86,82 @@ class MizResourceManager:
         self.image_briefing_blue = []    # ResKey из pictureFileNameB
         self.image_briefing_red = []     # ResKey из pictureFileNameR
         self.image_briefing_neutral = [] # ResKey из pictureFileNameN
+
+    def _touch_links(self):
+        """Отмечает изменение связей ключ → аудиофайл (для индекса поиска)"""
+        # Ревизия растёт при любой смене связей или mapResource, в том числе
+        # при reset: по ней кэши имён аудиофайлов понимают, что устарели
+        self.links_revision = getattr(self, 'links_revision', 0) + 1
     
     # ─── Парсинг mission ───────────────────────────────────────────────
     
+    def _load_mission_graph(self, miz_archive):
+        """Возвращает граф связей mission (стадии 1-3, не зависит от локали).
+
+        Файл mission читается и разбирается один раз на версию архива
+        (ключ — CRC32 и размер файла mission); при смене локали и
+        переключении смещения эвристики используется готовый граф.
+        """
+        if miz_archive is None:
+            return self._mission_graph
+
+        info = get_archive_index(miz_archive.filename, miz_archive).find('mission')
+        if info is None:
+            self._mission_graph = None
+            self._mission_graph_key = None
+            return None
+
+        graph_key = (miz_archive.filename, info.CRC, info.file_size)
+        if self._mission_graph is not None and self._mission_graph_key == graph_key:
+            return self._mission_graph
+
+        # Дисковый кэш: неизменённый mission не читается и не разбирается повторно
+        cache = get_parse_cache()
+        graph = cache.get('mission_links', info, MISSION_PARSER_VERSION)
+        if graph is None:
+            try:
+                with miz_archive.open(info.filename, 'r') as f:
+                    text = f.read().decode('utf-8')
+            except Exception as e:
+                logger.error(f"Ошибка чтения файла mission: {e}")
+                return None
+            graph = parse_mission_links(text)
+            cache.put('mission_links', info, MISSION_PARSER_VERSION, graph)
+
+        self._mission_graph = graph
+        self._mission_graph_key = graph_key
+        return self._mission_graph
+
     def parse_mission_audio_links(self, miz_archive=None, dictionary_keys=None, _cached_text=None):
-        """Парсит файл mission из ZIP для извлечения связей текст → аудио.
+        """Строит связи текст → аудио по файлу mission.
         
         В DCS правило сопоставления: все a_out_text_delay в одном триггере/команде
         разделяют один a_out_sound. То есть связь N текстов → 1 звук.
         
+        Разбор mission (стадии 1-3) выполняется один раз на архив, здесь —
+        только зависящая от локали часть: фильтр аудиоресурсов по mapResource
+        и эвристика Stage 4.
+        
         Args:
-            miz_archive: открытый ZIP-архив (или None при повторном запуске из кэша)
+            miz_archive: открытый ZIP-архив (или None — использовать готовый граф)
             dictionary_keys: dict ключей из dictionary (для Stage 4 эвристики)
-            _cached_text: внутренний параметр для повторного запуска из кэша
+            _cached_text: текст mission для разбора вместо чтения из архива
         """
+        self._touch_links()
         self.subtitle_to_reskey = {}
         self.heuristic_matched_keys = set()  # Ключи, связанные эвристически
         
-        # Получаем текст mission (из архива или из кэша)
+        # Граф связей mission (из кэша, из переданного текста или из архива)
         if _cached_text is not None:
-            text = _cached_text
-        elif miz_archive is not None:
-            mission_path = 'mission'
-            if mission_path not in miz_archive.namelist():
-                return self.subtitle_to_reskey
-            try:
-                with miz_archive.open(mission_path, 'r') as f:
-                    text = f.read().decode('utf-8')
-            except Exception as e:
-                logger.error(f"Ошибка чтения файла mission: {e}")
-                return self.subtitle_to_reskey
+            self._mission_graph = parse_mission_links(_cached_text)
+            self._mission_graph_key = None
+            graph = self._mission_graph
         else:
+            graph = self._load_mission_graph(miz_archive)
+        if graph is None:
             return self.subtitle_to_reskey
         
-        # Кэшируем для повторного запуска
-        self._cached_mission_text = text
+        # Кэшируем ключи словаря для повторного запуска эвристики
         if dictionary_keys is not None:
             self._cached_dictionary_keys = dictionary_keys
 
@@ -117,69 +172,12 @@ class MizResourceManager:
             if not fname: return False
             return fname.lower().strip().endswith(('.ogg', '.wav'))
 
-        # --- 1. TransmitMessage (стандартные радиосообщения) ---
-        block_pattern = r'\["id"\]\s*=\s*"TransmitMessage".*?\["params"\]\s*=\s*\{(.*?)\},\s*--\s*end of \["params"\]'
-        for block in re.findall(block_pattern, text, re.DOTALL):
-            file_m = re.search(r'\["file"\]\s*=\s*"(ResKey_[^"]+)"', block)
-            sub_m = re.search(r'\["subtitle"\]\s*=\s*"(DictKey_[^"]+)"', block)
-            if file_m and sub_m:
-                self.subtitle_to_reskey[sub_m.group(1)] = file_m.group(1)
-
-        # --- 2. Скриптовые команды (trig.func) ---
-        # Формат: [N] = "a_out_text_delay(...);a_out_sound(...);...",
-        # ПРАВИЛО: ВСЕ тексты в одной строке-команде связаны с ОДНИМ звуком.
-        func_pattern = r'\[\d+\]\s*=\s*"((?:[^"\\]|\\.)*)"\s*,'
-        for script in re.findall(func_pattern, text):
-            clean = script.replace('\\"', '"')
-            # Извлекаем вызовы a_out_text_delay(getValueDictByKey("DictKey_..."))
-            d_keys = re.findall(
-                r'a_out_text_delay\(getValueDictByKey\("(DictKey_[^"]+)"\)', clean
-            )
-            # Извлекаем вызов a_out_sound(getValueResourceByKey("ResKey_..."))
-            s_keys = re.findall(
-                r'a_out_sound\(getValueResourceByKey\("(ResKey_[^"]+)"\)', clean
-            )
-            # Фильтруем только аудио
-            s_keys = [rk for rk in s_keys if is_audio_res(rk)]
-            
-            # N текстов → 1 звук (все тексты связаны с первым звуком)
-            if d_keys and s_keys:
-                sound = s_keys[0]
-                for dk in d_keys:
-                    if dk not in self.subtitle_to_reskey:
-                        self.subtitle_to_reskey[dk] = sound
-
-        # --- 3. Структурированные блоки действий (["actions"]) ---
-        # Каждый блок содержит пронумерованные действия [N] = { ["predicate"]="...", ... }
-        # a_out_text_delay имеет ["text"] = "DictKey_..."
-        # a_out_sound имеет ["file"] = "ResKey_..."
-        # ПРАВИЛО: все тексты в блоке связаны с звуком в том же блоке.
-        action_pattern = r'\["actions"\]\s*=\s*\{(.*?)\},\s*--\s*end of \["actions"\]'
-        for block in re.findall(action_pattern, text, re.DOTALL):
-            # Находим все пронумерованные элементы
-            items = re.findall(r'\[\d+\]\s*=\s*\{(.*?)\},?\s*--\s*end of \[\d+\]', block, re.DOTALL)
-            
-            texts = []
-            sounds = []
-            for item in items:
-                pred = re.search(r'\["predicate"\]\s*=\s*"([^"]+)"', item)
-                if not pred:
-                    continue
-                if pred.group(1) == "a_out_text_delay":
-                    tk = re.search(r'\["text"\]\s*=\s*"(DictKey_[^"]+)"', item)
-                    if tk:
-                        texts.append(tk.group(1))
-                elif pred.group(1) == "a_out_sound":
-                    fk = re.search(r'\["file"\]\s*=\s*"(ResKey_[^"]+)"', item)
-                    if fk and is_audio_res(fk.group(1)):
-                        sounds.append(fk.group(1))
-            
-            # N текстов → 1 звук
-            if texts and sounds:
-                sound = sounds[0]
-                for dk in texts:
-                    if dk not in self.subtitle_to_reskey:
-                        self.subtitle_to_reskey[dk] = sound
+        # --- Стадии 1-3: связи из таблиц mission (граф разобран заранее) ---
+        # 1. TransmitMessage (стандартные радиосообщения)
+        # 2. Скриптовые команды trig: [N] = "a_out_text_delay(...);a_out_sound(...);..."
+        # 3. Структурированные блоки ["actions"] (a_out_text_delay / a_out_sound)
+        # ПРАВИЛО: все тексты одной команды/блока связаны с ОДНИМ (первым) звуком.
+        self.subtitle_to_reskey = graph.resolve(is_audio_res)
 
         stage123_count = len(self.subtitle_to_reskey)
         logger.info(f"Stages 1-3: found {stage123_count} text->audio links")
@@ -211,8 +209,10 @@ class MizResourceManager:
             # Собираем доступные DictKey_ActionText_* и DictKey_ActionRadioText_*
             # Если dictionary_keys пустой (пришел из main.py до инициализации), 
             # используем наш стандартный экстрактор.
-            if not dictionary_keys:
+            if not dictionary_keys and miz_archive is not None:
                 dictionary_keys = self._extract_dictionary_keys(miz_archive, folder=self.current_folder)
+            if not dictionary_keys:
+                dictionary_keys = {}
 
             available_dictkeys = {}  # {numeric_id: (dictkey_str, has_text)}
             dk_items = dictionary_keys if isinstance(dictionary_keys, dict) else {k: '' for k in dictionary_keys}
@@ -268,11 +268,7 @@ class MizResourceManager:
         path = f'l10n/{folder_name}/mapResource'
         
         # Поиск файла (регистронезависимо)
-        found_path = None
-        for name in miz_archive.namelist():
-            if name.lower() == path.lower():
-                found_path = name
-                break
+        found_path = get_archive_index(miz_archive.filename, miz_archive).archive_name(path)
         
         if not found_path:
             logger.info(f"mapResource не найден для локали {folder_name}")
@@ -317,31 +313,38 @@ class MizResourceManager:
         if folder != "DEFAULT":
             locales_to_check.append(folder)
             
+        index = get_archive_index(miz_archive.filename, miz_archive)
         for loc in locales_to_check:
-            dict_path = f'l10n/{loc}/dictionary'
             # Поиск файла (регистронезависимо)
-            found_path = None
-            for name in miz_archive.namelist():
-                if name.lower() == dict_path.lower():
-                    found_path = name
-                    break
-            if not found_path:
+            info = index.find(f'l10n/{loc}/dictionary')
+            if info is None:
                 continue
-            try:
-                raw = miz_archive.read(found_path).decode('utf-8', errors='replace')
-                # Парсим ключи и определяем, есть ли у них текст
-                # Формат: ["DictKey_..."] = "текст", или ["DictKey_..."] = "", (пустой)
-                # Многострочные значения используют \ для переноса строк
-                key_pattern = re.compile(r'\["(DictKey_[^"]+)"\]\s*=\s*"')
-                for m in key_pattern.finditer(raw):
-                    key = m.group(1)
-                    # Проверяем что идёт после открывающей кавычки
-                    rest = raw[m.end():]
-                    # Пустое значение: сразу закрывающая кавычка ("",)
-                    has_text = len(rest) > 0 and rest[0] != '"'
-                    keys_dict[key] = 'x' if has_text else ''
-            except Exception:
-                pass
+            # Ключи DEFAULT разбираются один раз, а не при каждой смене локали
+            cache_key = (miz_archive.filename, info.filename, info.CRC, info.file_size)
+            cached = self._dictionary_keys_cache.get(cache_key)
+            if cached is None:
+                cached = get_parse_cache().get('dictionary_keys', info, RESOURCE_PARSER_VERSION)
+            if cached is None:
+                cached = {}
+                try:
+                    raw = miz_archive.read(info.filename).decode('utf-8', errors='replace')
+                    # Парсим ключи и определяем, есть ли у них текст
+                    # Формат: ["DictKey_..."] = "текст", или ["DictKey_..."] = "", (пустой)
+                    # Многострочные значения используют \ для переноса строк
+                    key_pattern = re.compile(r'\["(DictKey_[^"]+)"\]\s*=\s*"')
+                    for m in key_pattern.finditer(raw):
+                        # Пустое значение: сразу закрывающая кавычка ("",)
+                        has_text = m.end() < len(raw) and raw[m.end()] != '"'
+                        cached[m.group(1)] = 'x' if has_text else ''
+                except Exception:
+                    pass
+                else:
+                    get_parse_cache().put('dictionary_keys', info, RESOURCE_PARSER_VERSION, cached)
+            self._dictionary_keys_cache[cache_key] = cached
+            self._dictionary_keys_cache.move_to_end(cache_key)
+            while len(self._dictionary_keys_cache) > MAX_CACHED_DICTIONARY_KEYS:
+                self._dictionary_keys_cache.popitem(last=False)
+            keys_dict.update(cached)
         return keys_dict
     
     def load_from_miz(self, miz_archive, current_folder, dictionary_keys=None):
@@ -394,7 +397,7 @@ class MizResourceManager:
         Returns:
             bool: True если переключение выполнено успешно
         """
-        if self._cached_mission_text is None:
+        if self._mission_graph is None:
             print("MizResources: toggle_heuristic_offset: no cached data")
             return False
         
@@ -403,9 +406,9 @@ class MizResourceManager:
         offset_str = ", ".join(f"{o:+d}" for o in self.preferred_offset_order)
         print(f"MizResources: toggle_heuristic_offset -> [{offset_str}]")
         
-        # Перезапускаем парсинг mission из кэша (не трогает mapResource, pending_files и т.д.)
+        # Пересчитываем связи по готовому графу mission (не трогает mapResource, pending_files и т.д.)
         dk = self._cached_dictionary_keys
-        self.parse_mission_audio_links(_cached_text=self._cached_mission_text, dictionary_keys=dk)
+        self.parse_mission_audio_links(dictionary_keys=dk)
         
         return True
     
@@ -417,6 +420,7 @@ class MizResourceManager:
     
     def update_locale(self, miz_archive, new_folder, dictionary_keys=None):
         """Обновляет mapResource при смене локали."""
+        self._touch_links()
         self.current_folder = new_folder
         if new_folder == "DEFAULT":
             self.map_resource_current = self.map_resource_default.copy()
@@ -427,7 +431,8 @@ class MizResourceManager:
         if dictionary_keys is None:
             dictionary_keys = self._extract_dictionary_keys(miz_archive, folder=new_folder)
             
-        # ПЕРЕПАРСИВАЕМ AUDIO LINKS (так как map_resource_current изменился, а он важен для фильтрации)
+        # Пересчитываем AUDIO LINKS (map_resource_current изменился, а он важен для фильтрации).
+        # Сам mission повторно не разбирается — граф стадий 1-3 уже построен для архива
         self.parse_mission_audio_links(miz_archive, dictionary_keys=dictionary_keys)
         
         # Обновляем кэш размеров
@@ -441,7 +446,7 @@ class MizResourceManager:
     # ─── Парсинг изображений из mission ─────────────────────────────────
     
     def parse_mission_image_links(self):
-        """Парсит pictureFileNameB/R/N из кэшированного текста mission.
+        """Берёт pictureFileNameB/R/N из разобранного графа mission.
         
         Заполняет image_briefing_blue/red/neutral списками ResKey.
         """
@@ -449,32 +454,15 @@ class MizResourceManager:
         self.image_briefing_red = []
         self.image_briefing_neutral = []
         
-        text = self._cached_mission_text
-        if not text:
+        graph = self._mission_graph
+        if graph is None:
             return
         
-        # Паттерн для извлечения массивов pictureFileNameB/R/N
         # Формат: ["pictureFileNameB"] = { [1] = "ResKey_...", ... }
-        for suffix, target_list_name in [('B', 'image_briefing_blue'), 
-                                          ('R', 'image_briefing_red'), 
-                                          ('N', 'image_briefing_neutral')]:
-            pattern = rf'\["pictureFileName{suffix}"\]\s*=\s*\{{(.*?)\}}'
-            match = re.search(pattern, text, re.DOTALL)
-            if match:
-                block = match.group(1)
-                # Извлекаем пары (индекс, ResKey) из блока
-                # Формат: [1] = "ResKey_...", [2] = "ResKey_..."
-                matches = re.findall(r'\[(\d+)\]\s*=\s*"(ResKey_[^"]+)"', block)
-                if matches:
-                    # Создаем словарь {индекс: ключ}
-                    keys_dict = {int(m[0]): m[1] for m in matches}
-                    if keys_dict:
-                        # Формируем список, где позиция соответствует индексу в игре
-                        max_idx = max(keys_dict.keys())
-                        ordered_keys = [keys_dict.get(i) for i in range(1, max_idx + 1)]
-                        # Удаляем None (если в нумерации есть пропуски)
-                        ordered_keys = [k for k in ordered_keys if k is not None]
-                        setattr(self, target_list_name, ordered_keys)
+        # Позиция в списке соответствует индексу в игре (пропуски нумерации удалены)
+        self.image_briefing_blue = list(graph.briefing_images.get('B', []))
+        self.image_briefing_red = list(graph.briefing_images.get('R', []))
+        self.image_briefing_neutral = list(graph.briefing_images.get('N', []))
         
         total = len(self.image_briefing_blue) + len(self.image_briefing_red) + len(self.image_briefing_neutral)
         if total > 0:
@@ -742,6 +730,7 @@ class MizResourceManager:
         Returns:
             str: имя нового файла
         """
+        self._touch_links()
         # Если передан DictKey, ищем соответствующий ResKey
         res_key = None
         if key.startswith("DictKey_"):
@@ -840,7 +829,7 @@ class MizResourceManager:
             if old_filename:
                 old_pending_path = f"l10n/{self.current_folder}/{old_filename}"
                 if old_pending_path in self.pending_files:
-                    old_source = self.pending_files.pop(old_pending_path)
+                    old_source = self.discard_pending_file(old_pending_path)
                     try:
                         if os.path.exists(old_source) and "dcs_repl_" in os.path.basename(old_source):
                             os.remove(old_source)
@@ -870,7 +859,7 @@ class MizResourceManager:
             logger.warning(f"replace_audio: could not copy source to temp: {e}")
             stored_source = source_path
 
-        self.pending_files[target_path] = stored_source
+        self._set_pending_file(target_path, stored_source)
         
         logger.info(f"Замена аудио: {res_key} -> {filename} ({target_path})")
         # Логируем добавление нового аудиофайла
@@ -886,6 +875,7 @@ class MizResourceManager:
 
     def rename_resource(self, res_key, new_filename, miz_path):
         """Переименовывает ресурс (локализованный или KNEEBOARD)."""
+        self._touch_links()
         # Проверка уникальности
         context = 'kneeboard' if res_key.startswith("KneeboardKey_") else 'locale'
         if self.is_filename_already_used(new_filename, context, exclude_res_key=res_key):
@@ -898,13 +888,14 @@ class MizResourceManager:
             new_path_in_zip = f"KNEEBOARD/IMAGES/{new_filename}"
             
             if old_path_in_zip in self.pending_files:
+                # Источник вместе с закреплением переезжает под новый путь
                 stored_source = self.pending_files.pop(old_path_in_zip)
-                self.pending_files[new_path_in_zip] = stored_source
+                self._set_pending_file(new_path_in_zip, stored_source)
             else:
                 # Извлекаем оригинал
-                temp_path = self.extract_resource_to_temp(miz_path, res_key)
+                temp_path = self._extract_pending_source(miz_path, res_key)
                 if not temp_path: return None
-                self.pending_files[new_path_in_zip] = temp_path
+                self._set_pending_file(new_path_in_zip, temp_path)
                 self.files_to_delete.add(old_path_in_zip)
             
             # Обновляем список kneeboard_images (чтобы он был актуален до сохранения)
@@ -923,26 +914,27 @@ class MizResourceManager:
         old_filename, is_current = old_info
         if not is_current:
             # Извлекаем оригинал во временный файл и регистрируем как новый.
-            temp_path = self.extract_resource_to_temp(miz_path, res_key)
+            temp_path = self._extract_pending_source(miz_path, res_key)
             if not temp_path:
                 return None
             
             # Регистрируем под новым именем
             new_path_in_zip = f"l10n/{self.current_folder}/{new_filename}"
-            self.pending_files[new_path_in_zip] = temp_path
+            self._set_pending_file(new_path_in_zip, temp_path)
         else:
             # Файл уже в текущей локали
             old_path_in_zip = f"l10n/{self.current_folder}/{old_filename}"
             new_path_in_zip = f"l10n/{self.current_folder}/{new_filename}"
             
             if old_path_in_zip in self.pending_files:
+                # Источник вместе с закреплением переезжает под новый путь
                 stored_source = self.pending_files.pop(old_path_in_zip)
-                self.pending_files[new_path_in_zip] = stored_source
+                self._set_pending_file(new_path_in_zip, stored_source)
             else:
-                temp_path = self.extract_resource_to_temp(miz_path, res_key)
+                temp_path = self._extract_pending_source(miz_path, res_key)
                 if not temp_path:
                     return None
-                self.pending_files[new_path_in_zip] = temp_path
+                self._set_pending_file(new_path_in_zip, temp_path)
                 usage_count = sum(1 for rk, fn in self.map_resource_current.items() if fn == old_filename)
                 if usage_count <= 1:
                     self.files_to_delete.add(old_path_in_zip)
@@ -979,6 +971,7 @@ class MizResourceManager:
         чтобы последующие сохранения использовали правильную базу.
         После коммита зелёный шрифт сбрасывается на оранжевый.
         """
+        self._touch_links()
         # 1. Обновляем кэши map_resource из modified_map_resources
         for locale, changes in self.modified_map_resources.items():
             for res_key, filename in changes.items():
@@ -993,7 +986,7 @@ class MizResourceManager:
         
         # 2. Очищаем отложенные операции (они уже в архиве и в кэшах)
         self.modified_map_resources.clear()
-        self.pending_files.clear()
+        self._clear_pending_files()
         self.files_to_delete.clear()  # Старые файлы уже удалены из архива
         
         logger.info("Committed pending changes to cache")
@@ -1002,9 +995,36 @@ class MizResourceManager:
     def clear_all_changes(self):
         """Полный сброс всех изменений (при загрузке нового файла)."""
         self.modified_map_resources.clear()
-        self.pending_files.clear()
+        self._clear_pending_files()
         self.files_to_delete.clear()
 
+    def discard_pending_file(self, target_path):
+        """Убирает файл из pending_files и снимает закрепление его источника.
+
+        Returns:
+            str: путь источника или None, если файла в очереди не было
+        """
+        source_path = self.pending_files.pop(target_path, None)
+        if source_path is not None:
+            self._release_pending_source(source_path)
+        return source_path
+
+    def _set_pending_file(self, target_path, source_path):
+        """Ставит файл в pending_files; прежний источник этого пути вытесняется"""
+        self.discard_pending_file(target_path)
+        self.pending_files[target_path] = source_path
+
+    def _clear_pending_files(self):
+        for source_path in self.pending_files.values():
+            self._release_pending_source(source_path)
+        self.pending_files.clear()
+
+    def _release_pending_source(self, source_path):
+        """Снимает закрепление, поставленное _extract_pending_source"""
+        scratch = get_scratch_area()
+        if scratch.owns(source_path):
+            scratch.release(source_path)
+
     def get_files_to_delete(self):
         """Возвращает множество путей старых файлов для удаления из архива."""
         return self.files_to_delete
@@ -1018,11 +1038,7 @@ class MizResourceManager:
             # Читаем из архива напрямую, чтобы не перезаписывать self.map_resource_current
             map_data = {}
             path = f'l10n/{locale}/mapResource'
-            found_path = None
-            for name in miz_archive.namelist():
-                if name.lower() == path.lower():
-                    found_path = name
-                    break
+            found_path = get_archive_index(miz_archive.filename, miz_archive).archive_name(path)
             if found_path:
                 try:
                     with miz_archive.open(found_path, 'r') as f:
@@ -1046,19 +1062,12 @@ class MizResourceManager:
         return "\n".join(lines)
 
 
-    def extract_resource_to_temp(self, miz_path, key):
-        """Извлекает ресурс (аудио или изображение) во временную директорию.
+    def _locate_resource(self, key):
+        """Имя файла ресурса и его путь в архиве по DictKey / ResKey / KneeboardKey.
         
-        Учитывает pending_files (если ресурс был заменен, берет его).
-        
-        Args:
-            miz_path: путь к .miz файлу
-            key: ключ словаря (DictKey) или ресурса (ResKey)
-            
         Returns:
-            str: путь к временному файлу или None
+            tuple (filename, target_path_in_zip) или None
         """
-        # 1. Определяем имя файла и локаль через унифицированный поиск
         audio_info = self.get_audio_for_key(key)
         
         # Если не нашли как DictKey, возможно это прямой ResKey
@@ -1066,18 +1075,80 @@ class MizResourceManager:
             audio_info = self.get_audio_for_res_key(key)
             
         if not audio_info:
-            logger.warning(f"extract_resource_to_temp: Не найден ресурс для ключа {key}")
             return None
             
         filename, is_current_locale = audio_info
         
-        
         # Определяем папку источника
         if key.startswith("KneeboardKey_"):
-            target_path_in_zip = f"KNEEBOARD/IMAGES/{filename}"
-        else:
-            folder = self.current_folder if is_current_locale else "DEFAULT"
-            target_path_in_zip = f"l10n/{folder}/{filename}"
+            return filename, f"KNEEBOARD/IMAGES/{filename}"
+        folder = self.current_folder if is_current_locale else "DEFAULT"
+        return filename, f"l10n/{folder}/{filename}"
+
+    def probe_resource_audio(self, miz_path, key):
+        """Длительность/каналы/частота аудиоресурса по заголовку файла.
+        
+        Файл читается прямо из архива (или из pending_files), без извлечения
+        во временную папку и без декодирования.
+        
+        Returns:
+            audio_probe.AudioInfo или None (формат не распознан / файл не найден)
+        """
+        located = self._locate_resource(key)
+        if not located:
+            return None
+        filename, target_path_in_zip = located
+        
+        source_path = self.pending_files.get(target_path_in_zip)
+        if source_path and os.path.exists(source_path):
+            return probe_file(source_path)
+        
+        try:
+            with pooled_archive(miz_path) as z:
+                index = get_archive_index(miz_path, z)
+                info = index.find(target_path_in_zip)
+                if info is None:
+                    info = index.find(f"l10n/DEFAULT/{filename}")
+                if info is None:
+                    return None
+                return probe_member(z, info)
+        except Exception as e:
+            logger.error(f"Ошибка чтения заголовка аудио {filename}: {e}")
+            return None
+
+    def _extract_pending_source(self, miz_path, key):
+        """Извлекает ресурс как источник для pending_files.
+
+        Файл закрепляется в папке сессии: он нужен до сохранения миссии
+        и не должен вытесняться ограничением размера.
+        """
+        temp_path = self.extract_resource_to_temp(miz_path, key)
+        if temp_path:
+            scratch = get_scratch_area()
+            if scratch.owns(temp_path):
+                scratch.acquire(temp_path)
+        return temp_path
+
+    def extract_resource_to_temp(self, miz_path, key):
+        """Извлекает ресурс (аудио или изображение) во временную директорию.
+        
+        Учитывает pending_files (если ресурс был заменен, берет его).
+        Файл извлекается в папку сессии (scratch_area) один раз на версию
+        файла архива; повторные вызовы возвращают тот же путь.
+        
+        Args:
+            miz_path: путь к .miz файлу
+            key: ключ словаря (DictKey) или ресурса (ResKey)
+            
+        Returns:
+            str: путь к временному файлу или None
+        """
+        # 1. Определяем имя файла и путь в архиве через унифицированный поиск
+        located = self._locate_resource(key)
+        if not located:
+            logger.warning(f"extract_resource_to_temp: Не найден ресурс для ключа {key}")
+            return None
+        filename, target_path_in_zip = located
         
         # 2. Проверяем, есть ли этот файл в pending_files (свежая замена)
         # Важно: если мы в RU, и заменили файл, он будет в pending с путем l10n/RU/...
@@ -1092,40 +1163,21 @@ class MizResourceManager:
         
         # 3. Извлекаем из ZIP
         try:
-            # [FIX] Добавляем res_key (здесь параметр key) в имя для уникальности
-            import random, string
-            suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
-            temp_dir = tempfile.gettempdir()
-            safe_key = "".join([c if c.isalnum() else "_" for c in key])
-            temp_path = os.path.join(temp_dir, f"dcs_preview_{suffix}_{safe_key}_{filename}")
-            
-            with zipfile.ZipFile(miz_path, 'r') as z:
-                # 1. Пробуем основной путь (текущая локаль)
-                actual_path = target_path_in_zip
-                if actual_path not in z.namelist():
-                    # 2. Если нет, пробуем без учета регистра
-                    found = False
-                    for name in z.namelist():
-                        if name.lower() == target_path_in_zip.lower():
-                            actual_path = name
-                            found = True
-                            break
-                    
-                    if not found:
-                        # 3. Fallback: пробуем DEFAULT (всегда должен быть там согласно mapResource)
-                        fallback_path = f"l10n/DEFAULT/{filename}"
-                        if fallback_path in z.namelist():
-                            actual_path = fallback_path
-                            logger.info(f"Fallback to DEFAULT: {filename}")
-                        else:
-                            # 4. Совсем не нашли
-                            logger.warning(f"Файл {filename} не найден в ZIP (ни в {target_path_in_zip}, ни в DEFAULT)")
-                            return None
+            with pooled_archive(miz_path) as z:
+                index = get_archive_index(miz_path, z)
+                # 1. Основной путь (текущая локаль), без учета регистра
+                info = index.find(target_path_in_zip)
+                if info is None:
+                    # 2. Fallback: пробуем DEFAULT (всегда должен быть там согласно mapResource)
+                    info = index.find(f"l10n/DEFAULT/{filename}")
+                    if info is not None:
+                        logger.info(f"Fallback to DEFAULT: {filename}")
+                    else:
+                        # 3. Совсем не нашли
+                        logger.warning(f"Файл {filename} не найден в ZIP (ни в {target_path_in_zip}, ни в DEFAULT)")
+                        return None
 
-                with z.open(actual_path) as source, open(temp_path, 'wb') as dest:
-                    shutil.copyfileobj(source, dest)
-                
-                return temp_path
+                return get_scratch_area().extract_member(z, info, filename)
                 
         except Exception as e:
             logger.error(f"Ошибка извлечения аудио: {e}")
@@ -1176,25 +1228,14 @@ class MizResourceManager:
 
         # 3. Извлекаем из ZIP
         try:
-            with zipfile.ZipFile(miz_path, 'r') as z:
-                actual_path = target_path_in_zip
-                if actual_path not in z.namelist():
-                    # Пробуем без учета регистра
-                    found_path = None
-                    for name in z.namelist():
-                        if name.lower() == target_path_in_zip.lower():
-                            found_path = name
-                            break
-                    
-                    if found_path:
-                        actual_path = found_path
-                    else:
-                        # Fallback to DEFAULT
-                        fallback_path = f"l10n/DEFAULT/{filename}"
-                        if fallback_path in z.namelist():
-                            actual_path = fallback_path
-                        else:
-                            return False
+            with pooled_archive(miz_path) as z:
+                index = get_archive_index(miz_path, z)
+                # Без учета регистра, затем fallback to DEFAULT
+                actual_path = index.archive_name(target_path_in_zip)
+                if actual_path is None:
+                    actual_path = index.archive_name(f"l10n/DEFAULT/{filename}")
+                    if actual_path is None:
+                        return False
 
                 with z.open(actual_path) as source, open(output_path, 'wb') as dest:
                     shutil.copyfileobj(source, dest)
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+=== ДИСКОВЫЙ КЭШ РАЗБОРА ФАЙЛОВ .MIZ ===
+Результаты разбора файлов архива (граф связей mission, dictionary, ключи
+словаря, результаты сканирования Lua, длительности аудио) сохраняются
+в папке parse_cache рядом с программой.
+
+Ключ записи — (вид данных, имя файла в архиве, CRC32, размер, версия парсера).
+CRC32 и размер берутся из центрального каталога ZIP, поэтому проверка
+актуальности не требует чтения и распаковки самого файла. Повторное открытие
+неизменённой миссии берёт готовые структуры вместо повторного разбора.
+
+Размер папки ограничен: при превышении удаляются записи, к которым дольше
+всего не обращались (время доступа хранится в mtime файла записи).
+"""
+
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import time
+
+# Версия формата самого кэша (меняется при изменении структуры записи)
+CACHE_FORMAT_VERSION = 1
+
+# Ограничение размера папки кэша по умолчанию
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+_ENTRY_SUFFIX = '.pkl'
+
+# Через сколько секунд недописанный .tmp считается брошенным
+_STALE_TEMP_SECONDS = 3600
+
+
+def member_key(info):
+    """Идентификатор версии файла архива: (имя, CRC32, размер) из ZipInfo"""
+    return (info.filename, info.CRC, info.file_size)
+
+
+class ParseCache:
+    """Кэш результатов разбора с LRU-вытеснением по размеру папки"""
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._entries = None  # file_name -> [last_access, size] (загружается лениво)
+        self._total_bytes = 0
+
+    # ─── Доступ к записям ──────────────────────────────────────────────
+
+    def get(self, kind, info, version):
+        """Возвращает сохранённый результат разбора или None.
+
+        Args:
+            kind:    вид данных ('mission_links', 'dictionary', ...)
+            info:    ZipInfo файла архива (или кортеж из member_key)
+            version: версия парсера, построившего результат
+        """
+        if not self.enabled:
+            return None
+        key = self._make_key(kind, info, version)
+        path = os.path.join(self.directory, self._file_name(key))
+        try:
+            with open(path, 'rb') as f:
+                stored_key, value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # Повреждённая или несовместимая запись — удаляем
+            print(f"ParseCache: dropping unreadable entry {os.path.basename(path)}: {e}")
+            self._remove(os.path.basename(path))
+            return None
+
+        if stored_key != key:
+            return None
+
+        self._touch(os.path.basename(path))
+        return value
+
+    def put(self, kind, info, version, value):
+        """Сохраняет результат разбора (ошибки записи не прерывают работу)"""
+        if not self.enabled:
+            return
+        key = self._make_key(kind, info, version)
+        file_name = self._file_name(key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump((key, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+                size = os.path.getsize(temp_path)
+                os.replace(temp_path, os.path.join(self.directory, file_name))
+            except BaseException:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+                raise
+        except Exception as e:
+            print(f"ParseCache: failed to store {kind}: {e}")
+            return
+
+        with self._lock:
+            entries = self._load_entries()
+            old = entries.get(file_name)
+            if old is not None:
+                self._total_bytes -= old[1]
+            entries[file_name] = [time.time(), size]
+            self._total_bytes += size
+        self._evict()
+
+    def clear(self):
+        """Удаляет все записи кэша"""
+        with self._lock:
+            entries = self._load_entries()
+            names = list(entries)
+            entries.clear()
+            self._total_bytes = 0
+        for name in names:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def total_bytes(self):
+        with self._lock:
+            self._load_entries()
+            return self._total_bytes
+
+    # ─── Служебное ─────────────────────────────────────────────────────
+
+    @staticmethod
+    def _make_key(kind, info, version):
+        member = info if isinstance(info, tuple) else member_key(info)
+        return (CACHE_FORMAT_VERSION, kind, version) + tuple(member)
+
+    @staticmethod
+    def _file_name(key):
+        return hashlib.sha1(repr(key).encode('utf-8')).hexdigest() + _ENTRY_SUFFIX
+
+    def _load_entries(self):
+        """Список записей читается с диска один раз (вызывать под self._lock)"""
+        if self._entries is not None:
+            return self._entries
+        self._entries = {}
+        self._total_bytes = 0
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if not entry.is_file():
+                        continue
+                    if entry.name.endswith('.tmp'):
+                        # Остатки прерванной записи (свежие может писать другой экземпляр программы)
+                        try:
+                            if time.time() - entry.stat().st_mtime < _STALE_TEMP_SECONDS:
+                                continue
+                            os.remove(entry.path)
+                        except OSError:
+                            pass
+                        continue
+                    if not entry.name.endswith(_ENTRY_SUFFIX):
+                        continue
+                    st = entry.stat()
+                    self._entries[entry.name] = [st.st_mtime, st.st_size]
+                    self._total_bytes += st.st_size
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"ParseCache: failed to scan {self.directory}: {e}")
+        return self._entries
+
+    def _touch(self, file_name):
+        """Отмечает обращение к записи (для LRU)"""
+        now = time.time()
+        with self._lock:
+            entries = self._load_entries()
+            if file_name in entries:
+                entries[file_name][0] = now
+        try:
+            os.utime(os.path.join(self.directory, file_name), (now, now))
+        except OSError:
+            pass
+
+    def _remove(self, file_name):
+        with self._lock:
+            entries = self._load_entries()
+            old = entries.pop(file_name, None)
+            if old is not None:
+                self._total_bytes -= old[1]
+        try:
+            os.remove(os.path.join(self.directory, file_name))
+        except OSError:
+            pass
+
+    def _evict(self):
+        """Удаляет давно не использованные записи, пока папка больше лимита"""
+        with self._lock:
+            if self._total_bytes <= self.max_bytes:
+                return
+            victims = []
+            for name, (last_access, size) in sorted(self._entries.items(), key=lambda item: item[1][0]):
+                if self._total_bytes <= self.max_bytes:
+                    break
+                victims.append(name)
+                del self._entries[name]
+                self._total_bytes -= size
+        for name in victims:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def _default_directory():
+    # Рядом с EXE (или со скриптом) — как translation_tool_settings.json
+    if getattr(sys, 'frozen', False):
+        base_dir = os.path.dirname(sys.executable)
+    else:
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_dir, "parse_cache")
+
+
+def get_parse_cache():
+    """Общий кэш разбора программы"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ParseCache(_default_directory())
+        return _shared_cache
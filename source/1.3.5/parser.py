@@ -1,20 +1,31 @@
+import io
 import re
-from typing import List, Tuple, Optional, Dict
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
+
+
+# Версия разбора — часть ключа дискового кэша (parse_cache); менять при изменении entries
+DICTIONARY_PARSER_VERSION = 1
+
+# Строка с ключом: ["key"] = "значение... (до конца строки)
+_KEY_LINE_RE = re.compile(r'^[ \t]*\["([^"\n]+)"\][ \t]*=[ \t]*"[^\n]*', re.MULTILINE)
+
+# Служебные строки, которые пропускаются (в т.ч. внутри многострочного значения)
+_IGNORED_PREFIXES = ('dictionary =', '} -- end of dictionary', '}')
 
 
 class LuaDictionaryParser:
     """
     Парсер файлов dictionary.lua.
     Каждая строка файла становится отдельной строкой для редактирования.
+
+    Разбор выполняется одним проходом по всему буферу: скомпилированное
+    регулярное выражение находит строки с ключами (finditer), а строки-продолжения
+    (перенос через \\) разбираются только для многострочных значений.
     """
 
     def __init__(self):
-        self.current_key = None
-        self.current_raw_parts = []
-        self.current_file_lines = []
         self.entries = {}
         self.total_lines_count = 0
-        self.current_entry_start_line = 0
 
     def parse_file(self, filepath: str) -> Dict[str, Tuple[List[str], List[str], int]]:
         """
@@ -23,80 +34,85 @@ class LuaDictionaryParser:
         Returns:
             Словарь: ключ -> (список_строк_значения, строки_файла, start_line_index)
         """
-        self.total_lines_count = 0
-        self.entries = {}
-        
         with open(filepath, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-
-        for line in lines:
-            self._process_line(line.rstrip('\n'))
-            self.total_lines_count += 1
-
-        if self.current_key:
-            self._save_current_entry()
-
-        return self.entries
-
-    def _process_line(self, line: str):
-        """Обрабатывает одну строку файла"""
-
-        if self._is_ignored_line(line):
-            return
-
-        key = self._extract_key(line)
-        if key:
-            if self.current_key:
-                self._save_current_entry()
-
-            self.current_key = key
-            self.current_raw_parts = []
-            self.current_file_lines = [line]
-            self.current_entry_start_line = self.total_lines_count
-
-            value_start = self._find_value_start(line)
-            if value_start == -1:
-                return
-
-            if line.endswith('\\'):
-                text_part = line[value_start:-1]
-                self.current_raw_parts.append(text_part)
-            elif line.endswith('",'):
-                text_part = line[value_start:-2]
-                self.current_raw_parts.append(text_part)
-                self._save_current_entry()
-                self.current_key = None
-
-        elif self.current_key:
-            self.current_file_lines.append(line)
-
-            if line.endswith('\\'):
-                self.current_raw_parts.append(line[:-1])
-            elif line.endswith('",'):
-                self.current_raw_parts.append(line[:-2])
-                self._save_current_entry()
-                self.current_key = None
+            return self.parse_string(f.read())
 
-    def _is_ignored_line(self, line: str) -> bool:
-        """Проверяет, нужно ли игнорировать строку"""
-        line_stripped = line.strip()
+    def parse_stream(self, stream: Union[TextIO, Iterable[str]]) -> Dict[str, Tuple[List[str], List[str], int]]:
+        """
+        Парсит dictionary из текстового потока (открытый файл, io.StringIO)
+        или из итерируемого источника строк.
+        """
+        if hasattr(stream, 'read'):
+            return self.parse_string(stream.read())
+        return self.parse_string(''.join(stream))
 
-        if not line_stripped:
-            return True
+    def parse_string(self, content: Union[str, bytes]) -> Dict[str, Tuple[List[str], List[str], int]]:
+        """
+        Парсит уже прочитанное содержимое dictionary (str или bytes в UTF-8)
+        без записи во временный файл.
 
-        ignore_patterns = [
-            'dictionary =',
-            '} -- end of dictionary',
-            '}',
-        ]
+        Переводы строк нормализуются так же, как при чтении файла в текстовом режиме.
+        """
+        if isinstance(content, (bytes, bytearray)):
+            content = bytes(content).decode('utf-8', errors='replace')
+        if '\r' in content:
+            content = content.replace('\r\n', '\n').replace('\r', '\n')
 
-        return any(line_stripped.startswith(patt) for patt in ignore_patterns)
+        self.entries = {}
+        entries = self.entries
+        decode = self._decode_text
+        find_value_start = self._find_value_start
+        content_len = len(content)
+
+        line_no = 0
+        counted_pos = 0
+        matches = _KEY_LINE_RE.finditer(content)
+        match = next(matches, None)
+
+        while match is not None:
+            next_match = next(matches, None)
+
+            key_pos = match.start()
+            line_no += content.count('\n', counted_pos, key_pos)
+            counted_pos = key_pos
+
+            line = match.group(0)
+            raw_parts = []
+            file_lines = [line]
+            closed = False
+
+            value_start = find_value_start(line)
+            if value_start != -1:
+                if line.endswith('\\'):
+                    raw_parts.append(line[value_start:-1])
+                elif line.endswith('",'):
+                    raw_parts.append(line[value_start:-2])
+                    closed = True
+
+            if not closed:
+                # Многострочное значение: разбираем строки до следующего ключа
+                body_end = next_match.start() if next_match is not None else content_len
+                for cont in content[match.end() + 1:body_end].split('\n'):
+                    stripped = cont.strip()
+                    if not stripped or stripped.startswith(_IGNORED_PREFIXES):
+                        continue
+                    file_lines.append(cont)
+                    if cont.endswith('\\'):
+                        raw_parts.append(cont[:-1])
+                    elif cont.endswith('",'):
+                        raw_parts.append(cont[:-2])
+                        break
+
+            if raw_parts:
+                entries[match.group(1)] = ([decode(part) for part in raw_parts], file_lines, line_no)
+
+            match = next_match
+
+        self.total_lines_count = content.count('\n')
+        if content and not content.endswith('\n'):
+            self.total_lines_count += 1
 
-    def _extract_key(self, line: str) -> Optional[str]:
-        """Извлекает ключ из строки"""
-        pattern = r'^[ \t]*\["([^"]+)"\][ \t]*=[ \t]*"'
-        match = re.match(pattern, line)
-        return match.group(1) if match else None
+        return entries
 
     def _find_value_start(self, line: str) -> int:
         """Находит позицию начала значения"""
@@ -110,24 +126,10 @@ class LuaDictionaryParser:
 
         return -1
 
-    def _save_current_entry(self):
-        """Сохраняет текущую запись"""
-        if not self.current_key or not self.current_raw_parts:
-            return
-
-        decoded_parts = [self._decode_text(part) for part in self.current_raw_parts]
-
-        self.entries[self.current_key] = (
-            decoded_parts, 
-            self.current_file_lines.copy(),
-            self.current_entry_start_line
-        )
-
-        self.current_raw_parts.clear()
-        self.current_file_lines.clear()
-
     def _decode_text(self, text: str) -> str:
         """Преобразует текст из файла для отображения"""
+        if '\\' not in text:
+            return text
         result = text.replace('\\"', '"')
         result = result.replace('\\\\', '\\')
         return result
@@ -159,82 +161,167 @@ class LuaDictionaryParser:
         - меньше: записывает только столько строк, сколько есть в переводе
         """
         with open(filepath, 'w', encoding='utf-8') as f:
-            f.write("dictionary = \n{\n")
-
-            for key, (_, file_lines, _) in self.entries.items():
-                if key not in translations:
-                    for line in file_lines:
-                        f.write(line + '\n')
-                    continue
-
-                translated_parts = translations[key]
-                encoded_parts = [self._encode_text(part) for part in translated_parts]
-                n = len(encoded_parts)
-
-                if n == 0:
-                    # Нет перевода — пишем оригинал как есть
-                    for line in file_lines:
-                        f.write(line + '\n')
-                    continue
-
-                # Извлекаем prefix ключа из первой строки оригинала (["key"] = ")
-                first_line = file_lines[0] if file_lines else ''
-                key_prefix = ''
-                if '["' in first_line and '"] = "' in first_line:
-                    key_part_end = first_line.find('"] = "') + 6
-                    key_prefix = first_line[:key_part_end]
-                else:
-                    # Фолбэк: восстанавливаем prefix вручную
-                    key_prefix = f'["{key}"] = "'
-
-                # Записываем первую строку
-                f.write(key_prefix)
-                f.write(encoded_parts[0])
-                if n > 1:
-                    f.write('\\')
-                else:
-                    f.write('",')
-                f.write('\n')
-
-                # Записываем средние строки
-                for i in range(1, n - 1):
-                    f.write(encoded_parts[i])
-                    f.write('\\\n')
-
-                # Записываем последнюю строку (если их > 1)
-                if n > 1:
-                    f.write(encoded_parts[n - 1])
-                    f.write('",\n')
-
-            # Записываем НОВЫЕ ключи (которых не было в оригинальном файле)
-            for key, translated_parts in translations.items():
-                if key in self.entries:
-                    continue  # Уже записан выше
-                encoded_parts = [self._encode_text(part) for part in translated_parts]
-                n = len(encoded_parts)
-                if n == 0:
-                    continue
-
-                key_prefix = f'    ["{key}"] = "'
-
-                # Записываем первую строку
-                f.write(key_prefix)
-                f.write(encoded_parts[0])
-                if n > 1:
-                    f.write('\\')
-                else:
-                    f.write('",')
-                f.write('\n')
-
-                # Записываем средние строки
-                for i in range(1, n - 1):
-                    f.write(encoded_parts[i])
-                    f.write('\\\n')
-
-                # Записываем последнюю строку (если их > 1)
-                if n > 1:
-                    f.write(encoded_parts[n - 1])
-                    f.write('",\n')
-
-            f.write("} -- end of dictionary\n")
+            self.write_translations(f, translations)
+
+    def render_translations(self, translations: Dict[str, List[str]]) -> str:
+        """Возвращает содержимое dictionary с переводами в виде строки (без временных файлов)"""
+        buffer = io.StringIO()
+        self.write_translations(buffer, translations)
+        return buffer.getvalue()
 
+    def write_translations(self, f: TextIO, translations: Dict[str, List[str]]):
+        """
+        Записывает dictionary с переводами в текстовый поток.
+        Формат вывода описан в save_translations.
+        """
+        f.write("dictionary = \n{\n")
+
+        for key, (_, file_lines, _) in self.entries.items():
+            if key not in translations:
+                for line in file_lines:
+                    f.write(line + '\n')
+                continue
+
+            translated_parts = translations[key]
+            encoded_parts = [self._encode_text(part) for part in translated_parts]
+            n = len(encoded_parts)
+
+            if n == 0:
+                # Нет перевода — пишем оригинал как есть
+                for line in file_lines:
+                    f.write(line + '\n')
+                continue
+
+            # Извлекаем prefix ключа из первой строки оригинала (["key"] = ")
+            first_line = file_lines[0] if file_lines else ''
+            key_prefix = ''
+            if '["' in first_line and '"] = "' in first_line:
+                key_part_end = first_line.find('"] = "') + 6
+                key_prefix = first_line[:key_part_end]
+            else:
+                # Фолбэк: восстанавливаем prefix вручную
+                key_prefix = f'["{key}"] = "'
+
+            # Записываем первую строку
+            f.write(key_prefix)
+            f.write(encoded_parts[0])
+            if n > 1:
+                f.write('\\')
+            else:
+                f.write('",')
+            f.write('\n')
+
+            # Записываем средние строки
+            for i in range(1, n - 1):
+                f.write(encoded_parts[i])
+                f.write('\\\n')
+
+            # Записываем последнюю строку (если их > 1)
+            if n > 1:
+                f.write(encoded_parts[n - 1])
+                f.write('",\n')
+
+        # Записываем НОВЫЕ ключи (которых не было в оригинальном файле)
+        for key, translated_parts in translations.items():
+            if key in self.entries:
+                continue  # Уже записан выше
+            encoded_parts = [self._encode_text(part) for part in translated_parts]
+            n = len(encoded_parts)
+            if n == 0:
+                continue
+
+            key_prefix = f'    ["{key}"] = "'
+
+            # Записываем первую строку
+            f.write(key_prefix)
+            f.write(encoded_parts[0])
+            if n > 1:
+                f.write('\\')
+            else:
+                f.write('",')
+            f.write('\n')
+
+            # Записываем средние строки
+            for i in range(1, n - 1):
+                f.write(encoded_parts[i])
+                f.write('\\\n')
+
+            # Записываем последнюю строку (если их > 1)
+            if n > 1:
+                f.write(encoded_parts[n - 1])
+                f.write('",\n')
+
+        f.write("} -- end of dictionary\n")
+
+
+
+def escape_lua_string(text: Optional[str]) -> str:
+    """Кодирует специальные символы строки для записи в dictionary
+    (\\ и кавычки, затем переводы строк, табуляция и возврат каретки)"""
+    if not text:
+        return ""
+
+    # ВАЖНО: сначала экранируем обратные слеши, затем кавычки
+    result = text.replace('\\', '\\\\')
+    result = result.replace('"', '\\"')
+
+    # Затем другие управляющие символы
+    result = result.replace('\n', '\\n')
+    result = result.replace('\t', '\\t')
+    result = result.replace('\r', '\\r')
+    return result
+
+
+def iter_dictionary_chunks(lines_data) -> Iterator[str]:
+    """
+    Генерирует содержимое dictionary по данным строк (all_lines_data) фрагментами.
+
+    Строки группируются по ключу; для значения используется translated_text,
+    а original_text — только если перевода нет вовсе (None).
+    Многострочные значения записываются с переносом через \\.
+    """
+    translations = {}
+    for item in lines_data:
+        val = item.get('translated_text')
+        if val is None:
+            val = item.get('original_text', '')
+        parts = translations.get(item['key'])
+        if parts is None:
+            translations[item['key']] = [val]
+        else:
+            parts.append(val)
+
+    yield "dictionary = \n{\n"
+
+    for key, parts in translations.items():
+        if len(parts) == 1:
+            yield f'    ["{key}"] = "{escape_lua_string(parts[0])}",\n'
+            continue
+
+        # Многострочная запись: первая, средние и последняя строки
+        yield f'    ["{key}"] = "{escape_lua_string(parts[0])}\\\n'
+        for i in range(1, len(parts) - 1):
+            yield f'{escape_lua_string(parts[i])}\\\n'
+        yield f'{escape_lua_string(parts[-1])}",\n'
+
+    yield "} -- end of dictionary\n"
+
+
+def write_dictionary_stream(stream: BinaryIO, lines_data, encoding: str = 'utf-8',
+                            chunk_size: int = 64 * 1024) -> None:
+    """
+    Потоково записывает dictionary в бинарный поток (например, ZipFile.open(..., 'w')),
+    не собирая весь файл в памяти. Фрагменты копятся до chunk_size символов
+    и кодируются порциями.
+    """
+    buffer = []
+    buffered = 0
+    for chunk in iter_dictionary_chunks(lines_data):
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= chunk_size:
+            stream.write(''.join(buffer).encode(encoding))
+            buffer.clear()
+            buffered = 0
+    if buffer:
+        stream.write(''.join(buffer).encode(encoding))
@@ -5,7 +5,7 @@ from PyQt5.QtWidgets import (
     QHeaderView, QLabel, QPushButton, QAbstractItemView, QApplication,
     QStyle, QSlider, QFrame, QStyledItemDelegate, QStyleOptionViewItem, QMenu
 )
-from PyQt5.QtCore import Qt, pyqtSignal, QTimer, QSize, QRect, QPoint, QModelIndex, QEvent
+from PyQt5.QtCore import Qt, pyqtSignal, QTimer, QSize, QRect, QPoint, QModelIndex, QPersistentModelIndex, QEvent
 from PyQt5.QtGui import QColor, QFont, QCursor, QIcon, QPainter, QPen
 from widgets import (
     CheckboxHeader, ToolTipFilter, ButtonToolTipFilter, CustomScrollBar,
@@ -13,10 +13,15 @@ from widgets import (
 )
 
 from localization import get_translation
+from audio_probe import get_duration
+from resource_workers import ResourceTaskPool
 
 
 logger = logging.getLogger(__name__)
 
+# Сколько строк считать видимыми, если окно таблицы ещё не имеет размера
+VISIBLE_ROWS_FALLBACK = 60
+
 class ColorKeepingDelegate(QStyledItemDelegate):
     """Делегат, который сохраняет ForegroundRole (цвет текста) при выделении."""
     def initStyleOption(self, option, index):
@@ -156,6 +161,7 @@ class AudioPlaylistWidget(QWidget):
         self._current_sort_order = Qt.AscendingOrder
         self.checked_keys = set()
         self._last_checked_row = None
+        self._row_by_key = {}  # res_key -> QPersistentModelIndex ячейки имени файла
         self._init_ui()
 
     def _init_ui(self):
@@ -283,12 +289,16 @@ class AudioPlaylistWidget(QWidget):
         self._tooltip_filter = ToolTipFilter(self.table, self)
         self._btn_tooltip_filter = ButtonToolTipFilter(self._tooltip_filter.custom_tooltip, self)
 
-        # Кэш и очередь для длительностей (как в manager.py)
+        # Длительности загружаются в пуле потоков (как в manager.py)
         # _duration_cache уже инициализирован в __init__ из shared_duration_cache
-        self._duration_queue = []
-        self._duration_timer = QTimer(self)
-        self._duration_timer.setSingleShot(True)
-        self._duration_timer.timeout.connect(self._process_duration_queue)
+        self._task_pool = ResourceTaskPool(self)
+        self._task_pool.results_ready.connect(self._on_duration_results)
+        # При прокрутке поднимаем приоритет ставших видимыми строк (с задержкой)
+        self._visible_priority_timer = QTimer(self)
+        self._visible_priority_timer.setInterval(60)
+        self._visible_priority_timer.setSingleShot(True)
+        self._visible_priority_timer.timeout.connect(self._prioritize_visible_rows)
+        self.table.verticalScrollBar().valueChanged.connect(lambda _: self._visible_priority_timer.start())
 
         # Выбор аудио по одному клику / навигация стрелочками
         self.table.currentCellChanged.connect(self._on_cell_changed)
@@ -337,114 +347,104 @@ class AudioPlaylistWidget(QWidget):
         layout.addWidget(self.status_widget)
 
     def _get_audio_duration_fast(self, filepath):
-        """Быстрое получение длительности OGG/WAV без полной загрузки файла и без сторонних библиотек."""
+        """Быстрое получение длительности OGG/WAV по заголовку, без декодирования файла."""
         try:
-            # 1. Пробуем быстрый встроенный парсер OGG (читает только начало и конец файла)
-            if filepath.lower().endswith('.ogg'):
-                with open(filepath, 'rb') as f:
-                    data = f.read(4000)
-                    idx = data.find(b'\x01vorbis')
-                    if idx != -1:
-                        sample_rate = int.from_bytes(data[idx+12:idx+16], byteorder='little')
-                        if sample_rate > 0:
-                            f.seek(0, 2)
-                            size = f.tell()
-                            # Ищем последний OggS заголовок с конца файла
-                            f.seek(max(0, size - 8000))
-                            end_data = f.read()
-                            last_oggs = end_data.rfind(b'OggS')
-                            if last_oggs != -1:
-                                granule = int.from_bytes(end_data[last_oggs+6:last_oggs+14], byteorder='little', signed=True)
-                                if granule > 0:
-                                    return granule / sample_rate
-            
-            # 2. Пробуем быстрый встроенный парсер WAV
-            elif filepath.lower().endswith('.wav'):
-                import wave
-                with wave.open(filepath, 'rb') as f:
-                    return f.getnframes() / float(f.getframerate())
-                    
-            # 3. Фолбек на медленный Pygame или Mutagen
-            try:
-                from mutagen import File as MutagenFile
-                audio_meta = MutagenFile(filepath)
-                if audio_meta and audio_meta.info:
-                    return audio_meta.info.length
-            except ImportError:
-                pass
-
-            import pygame
-            if not pygame.mixer.get_init():
-                pygame.mixer.init()
-            sound = pygame.mixer.Sound(filepath)
-            dur = sound.get_length()
-            del sound
-            return dur
-            
+            return get_duration(filepath)
         except Exception as e:
             logger.error(f"Fast duration parse failed for {filepath}: {e}")
             return 0
 
-    def _process_duration_queue(self):
-        """Фоновая обработка длительности аудио (копия логики из manager.py)."""
+    def _get_miz_context(self):
+        """Менеджер ресурсов и путь к .miz (передаются через диалог AudioPlayerDialog)."""
+        parent_dlg = self.window()
+        miz_manager = getattr(parent_dlg, 'miz_resource_manager', None)
+        miz_path = getattr(parent_dlg, 'current_miz_path', None)
+
+        if not miz_manager or not miz_path:
+            # Фоллбек на экземпляр приложения (на всякий случай)
+            main_win = QApplication.instance().activeWindow()
+            miz_path = getattr(main_win, 'current_miz_path', None)
+            miz_manager = getattr(main_win, 'miz_resource_manager', None)
+        return miz_manager, miz_path
+
+    def _queue_duration(self, res_key, miz_context=None):
+        """Ставит определение длительности в очередь пула потоков.
+
+        Менеджер и путь к миссии берутся здесь, в GUI-потоке: рабочий поток
+        не обращается к виджетам.
+        """
+        miz_manager, miz_path = miz_context or self._get_miz_context()
+        if not miz_manager or not miz_path:
+            return
+        self._task_pool.submit('duration', res_key,
+                               lambda: self._load_duration(miz_manager, miz_path, res_key))
+
+    def _load_duration(self, miz_manager, miz_path, res_key):
+        """Длительность аудио в секундах (выполняется в рабочем потоке)."""
+        probe = miz_manager.probe_resource_audio(miz_path, res_key)
+        if probe is not None:
+            return probe.duration
+        # Формат без разбора по заголовку (mp3) — через временный файл
+        temp_path = miz_manager.extract_resource_to_temp(miz_path, res_key)
+        if temp_path and os.path.exists(temp_path):
+            return self._get_audio_duration_fast(temp_path)
+        logger.warning(f"Duration extraction failed: extracted file not found at {temp_path}")
+        return 0
+
+    def _prioritize_visible_rows(self):
+        """Поднимает приоритет задач для строк, видимых в таблице."""
         try:
-            if not self or not self._duration_queue:
+            row_count = self.table.rowCount()
+            if row_count == 0:
                 return
-                
-            orig_row, res_key, filename = self._duration_queue.pop(0)
-            
-            # Находим актуальную строку (она могла сместиться из-за сортировки)
-            row = -1
-            for r in range(self.table.rowCount()):
+            first = self.table.rowAt(0)
+            last = self.table.rowAt(self.table.viewport().height() - 1)
+            first = 0 if first < 0 else first
+            if last < 0:
+                # Строки не заполняют окно (или оно ещё не показано)
+                last = min(row_count - 1, first + VISIBLE_ROWS_FALLBACK)
+
+            keys = []
+            for r in range(first, last + 1):
                 it = self.table.item(r, self.COL_FILENAME)
-                if it and it.data(Qt.UserRole) == res_key:
-                    row = r
-                    break
-            
-            if row == -1:
-                # logger.debug(f"Duration extraction: row not found for {res_key}, skipping.")
-                if self._duration_queue: self._duration_timer.start(2)
-                return
+                if it:
+                    keys.append(it.data(Qt.UserRole))
+            self._task_pool.prioritize('duration', keys)
+        except RuntimeError:
+            return
 
-            try:
-                # В плейлисте они передаются через диалог AudioPlayerDialog
-                parent_dlg = self.window()
-                miz_manager = getattr(parent_dlg, 'miz_resource_manager', None)
-                miz_path = getattr(parent_dlg, 'current_miz_path', None)
-                
-                if not miz_manager or not miz_path:
-                    # Фоллбек на экземпляр приложения (на всякий случай)
-                    main_win = QApplication.instance().activeWindow()
-                    miz_path = getattr(main_win, 'current_miz_path', None)
-                    miz_manager = getattr(main_win, 'miz_resource_manager', None)
-                    
-                # Обновляем статусную строку после каждого вычисления длительности
-                # (вызываем в конце, даже если произошла ошибка — чтобы не пропускать обновления)
-
-                if miz_manager and miz_path:
-                    temp_path = miz_manager.extract_resource_to_temp(miz_path, res_key)
-                    duration = 0
-                    if temp_path and os.path.exists(temp_path):
-                        duration = self._get_audio_duration_fast(temp_path)
-                    else:
-                        logger.warning(f"Duration extraction failed: extracted file not found at {temp_path}")
-                    
-                    info_item = self.table.item(row, self.COL_INFO)
+    def _find_row_by_key(self, res_key):
+        """Строка таблицы по ключу ресурса или -1.
+
+        QPersistentModelIndex сдвигается моделью при сортировке, поэтому
+        перебирать строки не нужно.
+        """
+        index = self._row_by_key.get(res_key)
+        if index is None or not index.isValid():
+            return -1
+        return index.row()
+
+    def _on_duration_results(self, batch):
+        """Применяет пачку длительностей из пула потоков (GUI-поток)."""
+        try:
+            self.table.setUpdatesEnabled(False)
+            for _, res_key, duration in batch:
+                duration = duration or 0
+                m = int(duration // 60)
+                s = int(duration % 60)
+                duration_text = f"{m:02}:{s:02}"
+                self._duration_cache[res_key] = (duration, duration_text)
+
+                r = self._find_row_by_key(res_key)
+                if r != -1:
+                    info_item = self.table.item(r, self.COL_INFO)
                     if info_item:
-                        m = int(duration // 60)
-                        s = int(duration % 60)
-                        duration_text = f"{m:02}:{s:02}"
                         info_item.setText(duration_text)
                         info_item.sort_value = duration
-                        self._duration_cache[res_key] = (duration, duration_text)
-                        # print(f"DEBUG: Duration cached for {res_key}: {duration_text}")
+            self.table.setUpdatesEnabled(True)
 
-            except Exception as e:
-                logger.error(f"Error processing duration for {filename}: {e}")
-                
-            if self._duration_queue:
-                self._duration_timer.start(2)
-            else:
+            # Обновляем статусную строку, когда все длительности получены
+            if not self._task_pool.has_pending():
                 self._update_total_duration()
         except RuntimeError:
             return
@@ -706,6 +706,10 @@ class AudioPlaylistWidget(QWidget):
         else:
             header.set_check_state(Qt.PartiallyChecked)
 
+    def stop_background_tasks(self):
+        """Останавливает потоки подсчёта длительностей (окно закрывается)"""
+        self._task_pool.shutdown()
+
     def retranslate_ui(self, current_language):
         """Обновляет переводы виджета."""
         self.current_language = current_language
@@ -714,29 +718,28 @@ class AudioPlaylistWidget(QWidget):
 
     def update_generated_indicator(self, res_key, is_generated, duration_sec=None):
         """Устанавливает или убирает значок 🧠 для указанного файла."""
-        for r in range(self.table.rowCount()):
-            it = self.table.item(r, self.COL_FILENAME)
-            if it and it.data(Qt.UserRole) == res_key:
-                gen_item = self.table.item(r, self.COL_GENERATED)
-                if gen_item:
-                    if is_generated:
-                        if duration_sec is not None:
-                            m = int(duration_sec // 60)
-                            s = int(duration_sec % 60)
-                            gen_item.setText(f"🧠 {m:02}:{s:02}")
-                            # Сортируем по длительности, чтобы можно было фильтровать по задержке
-                            gen_item.sort_value = duration_sec
-                        else:
-                            gen_item.setText("🧠")
-                            gen_item.sort_value = 1
-                    else:
-                        curr_text = gen_item.text()
-                        if "🧠 " in curr_text:
-                            gen_item.setText(curr_text.replace("🧠 ", ""))
-                        elif curr_text == "🧠":
-                            gen_item.setText("")
-                            gen_item.sort_value = 0
-                break
+        r = self._find_row_by_key(res_key)
+        if r == -1:
+            return
+        gen_item = self.table.item(r, self.COL_GENERATED)
+        if gen_item:
+            if is_generated:
+                if duration_sec is not None:
+                    m = int(duration_sec // 60)
+                    s = int(duration_sec % 60)
+                    gen_item.setText(f"🧠 {m:02}:{s:02}")
+                    # Сортируем по длительности, чтобы можно было фильтровать по задержке
+                    gen_item.sort_value = duration_sec
+                else:
+                    gen_item.setText("🧠")
+                    gen_item.sort_value = 1
+            else:
+                curr_text = gen_item.text()
+                if "🧠 " in curr_text:
+                    gen_item.setText(curr_text.replace("🧠 ", ""))
+                elif curr_text == "🧠":
+                    gen_item.setText("")
+                    gen_item.sort_value = 0
 
     def update_duration(self, res_key, duration_sec):
         """Принудительно обновляет длительность для конкретного файла в таблице (например после генерации)."""
@@ -748,14 +751,12 @@ class AudioPlaylistWidget(QWidget):
         self._duration_cache[res_key] = (duration_sec, duration_text)
         
         # Обновляем UI
-        for r in range(self.table.rowCount()):
-            it = self.table.item(r, self.COL_FILENAME)
-            if it and it.data(Qt.UserRole) == res_key:
-                info_item = self.table.item(r, self.COL_INFO)
-                if info_item:
-                    info_item.setText(duration_text)
-                    info_item.sort_value = duration_sec
-                break
+        r = self._find_row_by_key(res_key)
+        if r != -1:
+            info_item = self.table.item(r, self.COL_INFO)
+            if info_item:
+                info_item.setText(duration_text)
+                info_item.sort_value = duration_sec
 
     def set_audio_files(self, audio_files):
         """Заполняет таблицу списком аудиофайлов."""
@@ -770,14 +771,12 @@ class AudioPlaylistWidget(QWidget):
         """Выделяет строку в таблице по ключу ресурса."""
         self.table.blockSignals(True)
         try:
-            for row in range(self.table.rowCount()):
-                it = self.table.item(row, self.COL_FILENAME)
-                if it and it.data(Qt.UserRole) == res_key:
-                    self.table.setCurrentCell(row, self.COL_FILENAME)
-                    self.table.selectRow(row)
-                    # Прокручиваем к выделенной строке
-                    self.table.scrollToItem(it)
-                    break
+            row = self._find_row_by_key(res_key)
+            if row != -1:
+                self.table.setCurrentCell(row, self.COL_FILENAME)
+                self.table.selectRow(row)
+                # Прокручиваем к выделенной строке
+                self.table.scrollToItem(self.table.item(row, self.COL_FILENAME))
             
             # [NEW] Принудительно вызываем обновление цветов, так как сигналы заблокированы
             self._on_table_selection_changed()
@@ -791,13 +790,17 @@ class AudioPlaylistWidget(QWidget):
         self.table.setSortingEnabled(False)
         
         self.table.setRowCount(0)
+        self._row_by_key.clear()
         self.table.setRowCount(len(self._all_audio_files))
 
-        self._duration_queue = []
+        # Задачи для прежнего списка (другая миссия/локаль) больше не нужны
+        self._task_pool.cancel()
+        # Менеджер ресурсов один на все строки — не ищем его для каждой
+        miz_context = self._get_miz_context()
 
         for row, file_info in enumerate(self._all_audio_files):
             try:
-                self._update_row(row, file_info)
+                self._update_row(row, file_info, miz_context)
             except Exception as e:
                 logger.error(f"Error populating playlist row {row}: {e}")
     
@@ -824,8 +827,8 @@ class AudioPlaylistWidget(QWidget):
         self.table.horizontalHeader().setSortIndicatorShown(True)
         self.table.viewport().update()
         
-        if self._duration_queue:
-            self._duration_timer.start(2)
+        # Фоновая загрузка длительностей — сначала видимые строки
+        self._prioritize_visible_rows()
         
         self._update_total_duration()
 
@@ -833,33 +836,35 @@ class AudioPlaylistWidget(QWidget):
         """Точечно обновляет одну строку в таблице по ключу ресурса.
         Позволяет избежать перерисовки всей таблицы и потери фокуса/выделения.
         """
-        for r in range(self.table.rowCount()):
-            it = self.table.item(r, self.COL_FILENAME)
-            if it and it.data(Qt.UserRole) == res_key:
-                # Обновляем данные в списке _all_audio_files
-                for i, info in enumerate(self._all_audio_files):
-                    if info.get('res_key') == res_key:
-                        self._all_audio_files[i] = file_info
-                        break
-                
-                # Обновляем UI строки
-                self.table.blockSignals(True)
-                # Сортировка и так отключена, просто обновляем
-                self._update_row(r, file_info)
-                self.table.blockSignals(False)
-                
-                # [NEW] После включения сортировки строка могла улететь в другое место.
-                # Находим её заново и выделяем, чтобы фокус не пропадал.
-                self.select_file_by_key(res_key)
-                
-                # [FIX] Запускаем таймер для пересчета длительности в фоне, если файл попал в очередь
-                if self._duration_queue:
-                    self._duration_timer.start(2)
-                return True
-        return False
-
-    def _update_row(self, row, file_info):
-        """Заполняет или обновляет конкретную строку таблицы данными file_info."""
+        r = self._find_row_by_key(res_key)
+        if r == -1:
+            return False
+
+        # Обновляем данные в списке _all_audio_files
+        for i, info in enumerate(self._all_audio_files):
+            if info.get('res_key') == res_key:
+                self._all_audio_files[i] = file_info
+                break
+        
+        # Обновляем UI строки
+        self.table.blockSignals(True)
+        # Сортировка и так отключена, просто обновляем
+        self._update_row(r, file_info)
+        self.table.blockSignals(False)
+        
+        # [NEW] После включения сортировки строка могла улететь в другое место.
+        # Находим её заново и выделяем, чтобы фокус не пропадал.
+        self.select_file_by_key(res_key)
+        return True
+
+    def _update_row(self, row, file_info, miz_context=None):
+        """Заполняет или обновляет конкретную строку таблицы данными file_info.
+
+        miz_context — (менеджер ресурсов, путь к .miz) из _get_miz_context,
+        передаётся при заполнении всей таблицы.
+        """
+        if miz_context is None:
+            miz_context = self._get_miz_context()
         res_key = file_info.get('res_key', '')
         filename = file_info.get('filename', '')
         in_current = file_info.get('in_current_locale', False)
@@ -908,6 +913,7 @@ class AudioPlaylistWidget(QWidget):
             fname_item.setText(filename)
             
         fname_item.setData(Qt.UserRole, res_key)
+        self._row_by_key[res_key] = QPersistentModelIndex(self.table.model().index(row, self.COL_FILENAME))
         
         # Определяем базовый цвет текста (для делегата)
         base_color = '#ffffff'
@@ -934,7 +940,7 @@ class AudioPlaylistWidget(QWidget):
         if res_key in self._duration_cache:
             sort_val, info_text = self._duration_cache[res_key]
         else:
-            self._duration_queue.append((row, res_key, filename))
+            self._queue_duration(res_key, miz_context)
         
         info_item = self.table.item(row, self.COL_INFO)
         if not info_item:
@@ -950,8 +956,7 @@ class AudioPlaylistWidget(QWidget):
         # COL_STATUS — статус
         is_replaced = False
         try:
-            parent_dlg = self.window()
-            miz_manager = getattr(parent_dlg, 'miz_resource_manager', None)
+            miz_manager = miz_context[0]
             if miz_manager:
                 is_replaced = miz_manager.is_audio_replaced(res_key)
         except Exception:
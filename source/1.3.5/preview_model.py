@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+=== МОДЕЛЬ СТРОК ПРЕДПРОСМОТРА ===
+PreviewRowModel — список групп предпросмотра (одна группа = один ключ словаря)
+и их высоты в пикселях.
+
+Виджеты создаются только для групп в видимой области (плюс запас сверху
+и снизу), остальные группы заменяются двумя распорками (не выше
+PREVIEW_SPACER_MAX_PX) и полосой прокрутки всего документа, размеры
+которых берутся из модели. Для ещё не показанных групп высота оценивается
+по длинам абзацев текста (paragraph_lengths, estimate_lengths_height), после
+создания виджетов — заменяется измеренной.
+По модели работают прокрутка, переходы поиска и закладок: позиция группы —
+сумма высот предыдущих (offset), группа по позиции — row_at.
+"""
+
+import bisect
+from itertools import accumulate
+
+# Ограничения высоты PreviewTextEdit (см. PreviewTextEdit.adjust_height)
+MIN_EDIT_HEIGHT = 20
+MAX_EDIT_HEIGHT = 500
+# Минимальная высота строки предпросмотра
+MIN_ROW_HEIGHT = 24
+# Оценка высоты мета-колонки: заголовок (номер, ключ) и строка аудио с кнопками
+META_HEADER_HEIGHT = 22
+META_AUDIO_HEIGHT = 48
+# Горизонтальные отступы содержимого строки (4 + 4)
+ROW_HORIZONTAL_MARGINS = 8
+# Ширина колонки, пока сплиттер ещё не получил размеры
+DEFAULT_COLUMN_WIDTH = 400
+
+# Запас сверху и снизу от видимой области, для которого создаются виджеты (px)
+PREVIEW_OVERSCAN_PX = 400
+# Наибольшая высота распорки над и под созданными группами (px). Остальная
+# часть документа представлена только полосой прокрутки: лэйауты Qt не
+# раскладывают содержимое выше 524287 px. Запас должен быть больше шага
+# прокрутки (колесо, PageDown), чтобы содержимое не упиралось в край.
+PREVIEW_SPACER_MAX_PX = 4000
+# Отступ сверху при переходе к группе, которая ещё не создана (поиск, закладки)
+PREVIEW_JUMP_MARGIN_PX = 100
+# Пауза после изменения ширины колонок или шрифта, после которой оценки высот
+# всех групп пересчитываются один раз (а не на каждый шаг перетаскивания)
+PREVIEW_ESTIMATE_DELAY_MS = 150
+
+
+def group_line_indices(lines):
+    """Группирует строки по ключу в порядке первого появления.
+
+    Returns:
+        tuple: (список ключей, {ключ: [индексы строк]})
+    """
+    keys = []
+    indices = {}
+    for i, line in enumerate(lines):
+        key = line['key']
+        key_indices = indices.get(key)
+        if key_indices is None:
+            keys.append(key)
+            indices[key] = [i]
+        else:
+            key_indices.append(i)
+    return keys, indices
+
+
+def paragraph_lengths(text):
+    """Длины абзацев текста: по ним оценка высоты считается для любой ширины"""
+    return tuple(len(paragraph) for paragraph in (text or '').split('\n'))
+
+
+def estimate_lengths_height(lengths, width, line_height, char_width):
+    """Оценка высоты PreviewTextEdit по длинам абзацев (см. paragraph_lengths)"""
+    chars_per_line = max(1, int(width // max(1, char_width)))
+    # Пустой абзац — тоже строка
+    lines = sum(-(-length // chars_per_line) or 1 for length in lengths)
+    return min(MAX_EDIT_HEIGHT, max(MIN_EDIT_HEIGHT, lines * line_height + 4))
+
+
+class PreviewRowModel:
+    """Ключи групп предпросмотра и их высоты (оценённые или измеренные)"""
+
+    def __init__(self, keys, heights, virtual_keys=()):
+        self.keys = list(keys)
+        self.virtual_keys = set(virtual_keys)
+        self._rows = {key: row for row, key in enumerate(self.keys)}
+        self._heights = list(heights)
+        self._offsets = None
+        self.width_signature = None  # ширины колонок, для которых сделана оценка
+
+    def __len__(self):
+        return len(self.keys)
+
+    def row_of(self, key):
+        """Номер группы ключа (-1, если ключа нет в предпросмотре)"""
+        return self._rows.get(key, -1)
+
+    def is_virtual(self, row):
+        """Группа ключа, который есть только в референсе"""
+        return self.keys[row] in self.virtual_keys
+
+    def height(self, row):
+        return self._heights[row]
+
+    def set_height(self, row, height):
+        if self._heights[row] != height:
+            self._heights[row] = height
+            self._offsets = None
+
+    def reset_heights(self, heights):
+        """Заменяет все высоты (например, новые оценки после изменения ширины)"""
+        self._heights = list(heights)
+        self._offsets = None
+
+    def _ensure_offsets(self):
+        if self._offsets is None:
+            self._offsets = [0]
+            self._offsets.extend(accumulate(self._heights))
+        return self._offsets
+
+    def offset(self, row):
+        """Позиция верха группы (row == len — общая высота)"""
+        return self._ensure_offsets()[row]
+
+    def total_height(self):
+        return self._ensure_offsets()[-1]
+
+    def row_at(self, y):
+        """Группа, которой принадлежит позиция y"""
+        if not self.keys:
+            return 0
+        offsets = self._ensure_offsets()
+        row = bisect.bisect_right(offsets, y) - 1
+        return min(max(row, 0), len(self.keys) - 1)
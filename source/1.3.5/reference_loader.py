@@ -1,21 +1,54 @@
 import zipfile
 import os
-import tempfile
-from parser import LuaDictionaryParser
+from collections import OrderedDict
+from parser import LuaDictionaryParser, DICTIONARY_PARSER_VERSION
+from miz_index import get_archive_index
+from parse_cache import get_parse_cache, member_key
+
+
+# Ограничения кэша референсов (LRU): число локалей и примерный объём текста
+MAX_CACHED_LOCALES = 16
+MAX_CACHED_CHARS = 32 * 1024 * 1024
+
+
+class _CacheEntry:
+    """Закэшированная локаль: версия файла .miz, версия dictionary и маппинг"""
+
+    __slots__ = ('signature', 'member', 'mapping', 'fallback', 'size')
+
+    def __init__(self, signature, member, mapping, fallback=False):
+        self.signature = signature  # (mtime_ns, size) файла .miz
+        self.member = member        # (имя, CRC32, размер) dictionary или None
+        self.mapping = mapping      # key -> [parts...]
+        self.fallback = fallback    # локали нет в архиве — используется DEFAULT
+        self.size = sum(len(part) for parts in mapping.values() for part in parts) if mapping else 0
 
 
 class ReferenceLoader:
     """Загрузчик и кэшер словаря из .miz архива для любой локали.
 
     Хранит маппинг: (miz_path, locale) -> { key: [parts...] }
+
+    Запись проверяется при каждом обращении: если файл .miz изменился
+    (mtime/размер), сравнивается CRC32 и размер dictionary локали из
+    центрального каталога — заново разбираются только изменившиеся локали.
+    Размер кэша ограничен (LRU по числу локалей и объёму текста).
     """
-    def __init__(self):
-        self.cache = {}  # (miz_path, locale) -> { key: [parts...] }
+    def __init__(self, max_locales=MAX_CACHED_LOCALES, max_chars=MAX_CACHED_CHARS):
+        self.cache = OrderedDict()  # (miz_path, locale) -> _CacheEntry
+        self.max_locales = max_locales
+        self.max_chars = max_chars
+        self._cached_chars = 0
         self.last_fallback = None  # Если было fallback на DEFAULT — хранит имя исходной локали
 
     def clear_cache(self):
-        """Очищает весь кэш (вызывать при открытии нового .miz файла)"""
+        """Очищает весь кэш"""
         self.cache.clear()
+        self._cached_chars = 0
+
+    @staticmethod
+    def _cache_key(miz_path, locale):
+        return (os.path.normcase(os.path.abspath(miz_path)), locale)
 
     def load_locale_from_miz(self, miz_path, locale='DEFAULT'):
         """Загрузить и закэшировать dictionary для указанной локали из .miz файла.
@@ -25,85 +58,95 @@ class ReferenceLoader:
         if not miz_path or not os.path.exists(miz_path):
             return {}
 
-        cache_key = (miz_path, locale)
-        if cache_key in self.cache:
-            return self.cache[cache_key]
+        cache_key = self._cache_key(miz_path, locale)
+        try:
+            st = os.stat(miz_path)
+            signature = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return {}
+
+        entry = self.cache.get(cache_key)
+        if entry is not None and entry.signature == signature:
+            return self._use_entry(miz_path, locale, cache_key, entry)
 
         try:
             with zipfile.ZipFile(miz_path, 'r') as miz_archive:
-                # Ищем dictionary внутри l10n/<locale>
+                # Ищем dictionary внутри l10n/<locale> по общему индексу архива
                 # Учитываем регистр, возможные расширения (dictionary.lua) и вложенные пути
-                target = f'l10n/{locale}/dictionary'
-                found_path = None
-                for item in miz_archive.infolist():
-                    name = item.filename
-                    try:
-                        nm = name.encode('cp437').decode('utf-8')
-                    except Exception:
-                        nm = name
-                    path_norm = nm.replace('\\', '/').strip('/')
-                    path_norm_lower = path_norm.lower()
-
-                    # Прямое совпадение
-                    if path_norm_lower == target.lower():
-                        found_path = item.filename
-                        break
-
-                    # Файл может иметь расширение или находиться внутри вложенной структуры,
-                    # например l10n/RU/dictionary.lua — проверяем имя последнего сегмента
-                    parts = path_norm.split('/')
-                    last = parts[-1].lower() if parts else ''
-                    if path_norm_lower.startswith(f'l10n/{locale.lower()}/') and last.startswith('dictionary'):
-                        found_path = item.filename
-                        break
+                found_path = get_archive_index(miz_path, miz_archive).find_dictionary(locale)
 
                 if not found_path:
                     # Fallback: если запрошенная локаль не найдена — пробуем DEFAULT
                     if locale != 'DEFAULT':
                         print(f"WARNING: Locale '{locale}' not found in miz, falling back to DEFAULT")
-                        self.last_fallback = locale
-                        self.cache[cache_key] = {}
-                        return self.load_locale_from_miz(miz_path, 'DEFAULT')
-                    self.cache[cache_key] = {}
-                    return {}
-
-                # Локаль найдена — сбрасываем флаг fallback
-                self.last_fallback = None
-
-                raw = miz_archive.read(found_path).decode('utf-8', errors='replace')
+                        entry = _CacheEntry(signature, None, {}, fallback=True)
+                    else:
+                        entry = _CacheEntry(signature, None, {})
+                    self._store(cache_key, entry)
+                    return self._use_entry(miz_path, locale, cache_key, entry)
+
+                info = miz_archive.getinfo(found_path)
+                member = member_key(info)
+                if entry is not None and entry.member == member and not entry.fallback:
+                    # Архив сохранён, но dictionary этой локали не изменился
+                    entry.signature = signature
+                    return self._use_entry(miz_path, locale, cache_key, entry)
 
                 # Используем существующий LuaDictionaryParser для корректного разбора
-                parser = LuaDictionaryParser()
-                # Parser expects a file; use a temp file
-                with tempfile.NamedTemporaryFile(mode='w', suffix='.lua', delete=False, encoding='utf-8') as tf:
-                    tf.write(raw)
-                    tfname = tf.name
-
-                try:
-                    entries = parser.parse_file(tfname)
-                finally:
-                    try:
-                        os.unlink(tfname)
-                    except Exception:
-                        pass
+                # (разбор из памяти, без временного файла; результат — из дискового кэша)
+                cached = get_parse_cache().get('dictionary', info, DICTIONARY_PARSER_VERSION)
+                if cached is not None:
+                    entries = cached[0]
+                else:
+                    raw = miz_archive.read(found_path).decode('utf-8', errors='replace')
+                    parser = LuaDictionaryParser()
+                    entries = parser.parse_string(raw)
+                    get_parse_cache().put('dictionary', info, DICTIONARY_PARSER_VERSION,
+                                          (entries, parser.total_lines_count))
 
                 mapping = {}
                 for key, (text_parts, _, _) in entries.items():
                     mapping[key] = list(text_parts)
 
-                self.cache[cache_key] = mapping
-                return mapping
+                entry = _CacheEntry(signature, member, mapping)
+                self._store(cache_key, entry)
+                return self._use_entry(miz_path, locale, cache_key, entry)
         except Exception:
             # Не поднимаем исключение — возвращаем пустой маппинг
-            self.cache[cache_key] = {}
+            self._store(cache_key, _CacheEntry(signature, None, {}))
             return {}
 
+    def _use_entry(self, miz_path, locale, cache_key, entry):
+        """Возвращает маппинг записи и отмечает её как недавно использованную"""
+        self.cache.move_to_end(cache_key)
+        if entry.fallback:
+            mapping = self.load_locale_from_miz(miz_path, 'DEFAULT')
+            self.last_fallback = locale
+            return mapping
+        # Локаль найдена — сбрасываем флаг fallback
+        self.last_fallback = None
+        return entry.mapping
+
+    def _store(self, cache_key, entry):
+        """Добавляет запись и вытесняет давно не использованные сверх лимитов"""
+        old = self.cache.pop(cache_key, None)
+        if old is not None:
+            self._cached_chars -= old.size
+        self.cache[cache_key] = entry
+        self._cached_chars += entry.size
+
+        while len(self.cache) > 1 and (len(self.cache) > self.max_locales
+                                       or self._cached_chars > self.max_chars):
+            _, evicted = self.cache.popitem(last=False)
+            self._cached_chars -= evicted.size
+
     def load_default_from_miz(self, miz_path):
         """Обратная совместимость: загружает DEFAULT locale"""
         return self.load_locale_from_miz(miz_path, 'DEFAULT')
 
     def get_parts_for_key(self, miz_path, locale, key):
         """Возвращает список частей для ключа в закэшированной локали или []"""
-        cache_key = (miz_path, locale)
-        mapping = self.cache.get(cache_key, {})
-        return mapping.get(key, [])
+        entry = self.cache.get(self._cache_key(miz_path, locale))
+        if entry is None:
+            return []
+        return entry.mapping.get(key, [])
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+=== ФОНОВАЯ ЗАГРУЗКА ДАННЫХ РЕСУРСОВ ===
+ResourceTaskPool — пул потоков для длительностей аудио и миниатюр картинок
+в окне файлов (FileManagerWidget) и плейлисте (AudioPlaylistWidget).
+
+- Задачи с приоритетом: видимые строки таблицы обрабатываются первыми,
+  приоритет поднимается при прокрутке (prioritize).
+- Отмена при смене миссии/локали (cancel): задачи из очереди удаляются,
+  а результаты уже запущенных отбрасываются.
+- Пауза на время записи архива миссии (pause_all_pools/resume_all_pools):
+  запущенные задачи дочитывают архив, новые не стартуют до возобновления.
+- Закрытие окна (shutdown) останавливает потоки; следующая задача
+  (окно открыли снова) запускает их заново.
+- Результаты отдаются в GUI-поток пачками: сигнал results_ready вызывается
+  таймером не чаще раза в flush_interval мс со списком [(kind, key, result)].
+
+Задача выполняется в рабочем потоке и не должна обращаться к виджетам:
+только чтение архива (pooled_archive), разбор заголовков, QImage.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import weakref
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from miz_index import release_thread_archives
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты задач (меньше — раньше)
+PRIORITY_VISIBLE = 0
+PRIORITY_BACKGROUND = 1
+
+# Сколько ждать (с) завершения запущенных задач перед записью архива
+PAUSE_WAIT_TIMEOUT = 10.0
+
+# Все созданные пулы (для паузы на время записи архива)
+_pools = weakref.WeakSet()
+
+
+def pause_all_pools(timeout=PAUSE_WAIT_TIMEOUT):
+    """Приостанавливает все пулы перед перезаписью или дозаписью архива.
+
+    Новые задачи не запускаются, очередь сохраняется; ждём, пока запущенные
+    задачи закончат чтение архива. Парный вызов — resume_all_pools().
+    """
+    pools = list(_pools)
+    for pool in pools:
+        pool.pause()
+    for pool in pools:
+        if not pool.wait_idle(timeout):
+            logger.warning("ResourceTaskPool: running tasks did not finish before archive write")
+
+
+def resume_all_pools():
+    """Возобновляет пулы, приостановленные pause_all_pools()"""
+    for pool in list(_pools):
+        pool.resume()
+
+
+class ResourceTaskPool(QObject):
+    """Пул потоков с приоритетной очередью и пакетной доставкой результатов"""
+
+    results_ready = pyqtSignal(list)  # [(kind, key, result)]
+
+    def __init__(self, parent=None, workers=2, flush_interval=40):
+        super().__init__(parent)
+        self._workers_count = max(1, workers)
+        self._threads = []
+        self._cond = threading.Condition()
+        self._heap = []       # [priority, seq, generation, kind, key, func, alive]
+        self._pending = {}    # (kind, key) -> запись в куче
+        self._results = []
+        self._generation = 0
+        self._running = 0     # задач в работе
+        self._seq = itertools.count()
+        self._paused = 0      # вложенные паузы (pause/resume)
+        self._epoch = 0       # растёт при shutdown: потоки прежней эпохи завершаются
+        _pools.add(self)
+
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setInterval(flush_interval)
+        self._flush_timer.timeout.connect(self._flush_results)
+
+    # ─── Очередь задач ─────────────────────────────────────────────────
+
+    def submit(self, kind, key, func, priority=PRIORITY_BACKGROUND):
+        """Ставит задачу в очередь (повторная постановка только меняет приоритет).
+
+        Args:
+            kind:     вид задачи ('duration', 'thumbnail')
+            key:      ключ ресурса (res_key)
+            func:     callable() -> результат, выполняется в рабочем потоке
+            priority: PRIORITY_VISIBLE / PRIORITY_BACKGROUND
+        """
+        with self._cond:
+            existing = self._pending.get((kind, key))
+            if existing is not None:
+                if existing[0] <= priority:
+                    return
+                existing[6] = False
+            entry = [priority, next(self._seq), self._generation, kind, key, func, True]
+            self._pending[(kind, key)] = entry
+            heapq.heappush(self._heap, entry)
+            self._ensure_threads()
+            self._cond.notify()
+        if not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+    def prioritize(self, kind, keys, priority=PRIORITY_VISIBLE):
+        """Поднимает приоритет ожидающих задач (например, ставших видимыми строк)"""
+        with self._cond:
+            changed = False
+            for key in keys:
+                existing = self._pending.get((kind, key))
+                if existing is None or existing[0] <= priority:
+                    continue
+                existing[6] = False
+                entry = [priority] + existing[1:6] + [True]
+                self._pending[(kind, key)] = entry
+                heapq.heappush(self._heap, entry)
+                changed = True
+            if changed:
+                self._cond.notify_all()
+
+    def is_pending(self, kind, key):
+        with self._cond:
+            return (kind, key) in self._pending
+
+    def has_pending(self, kind=None):
+        """Есть ли незавершённые задачи (в очереди, в работе или недоставленные)"""
+        with self._cond:
+            if kind is None:
+                return bool(self._pending or self._running or self._results)
+            return any(k == kind for k, _ in self._pending)
+
+    def cancel(self):
+        """Отменяет все задачи (смена миссии/локали): результаты запущенных отбрасываются"""
+        with self._cond:
+            self._generation += 1
+            for entry in self._heap:
+                entry[6] = False
+            self._heap = []
+            self._pending.clear()
+            self._results = []
+
+    def shutdown(self):
+        """Останавливает рабочие потоки (вызывать при закрытии окна).
+
+        Запущенные задачи дорабатывают, их результаты отбрасываются.
+        Следующий submit() запускает потоки заново.
+        """
+        self.cancel()
+        with self._cond:
+            self._epoch += 1
+            self._threads = []
+            self._cond.notify_all()
+        try:
+            self._flush_timer.stop()
+        except RuntimeError:
+            pass  # Таймер уже удалён вместе с владельцем
+
+    def pause(self):
+        """Не запускать новые задачи до resume() (очередь сохраняется)"""
+        with self._cond:
+            self._paused += 1
+
+    def resume(self):
+        with self._cond:
+            if self._paused:
+                self._paused -= 1
+            self._cond.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """Ждёт завершения запущенных задач.
+
+        Returns:
+            bool: True, если запущенных задач не осталось
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._running, timeout)
+
+    # ─── Рабочие потоки ────────────────────────────────────────────────
+
+    def _ensure_threads(self):
+        # Вызывается под self._cond
+        while len(self._threads) < self._workers_count:
+            thread = threading.Thread(target=self._worker_loop, args=(self._epoch,),
+                                      name="ResourceTaskPool", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _worker_loop(self, epoch):
+        try:
+            self._run_tasks(epoch)
+        finally:
+            # Поток завершается (shutdown) — его дескрипторы архива больше не нужны
+            release_thread_archives()
+
+    def _run_tasks(self, epoch):
+        while True:
+            with self._cond:
+                entry = None
+                while entry is None:
+                    if self._epoch != epoch:
+                        return
+                    while self._heap and not self._heap[0][6]:
+                        heapq.heappop(self._heap)
+                    if self._heap and not self._paused:
+                        entry = heapq.heappop(self._heap)
+                    else:
+                        self._cond.wait()
+                _, _, generation, kind, key, func, _ = entry
+                self._pending.pop((kind, key), None)
+                self._running += 1
+
+            try:
+                result = func()
+            except Exception as e:
+                logger.error(f"Background task {kind} failed for {key}: {e}")
+                result = None
+
+            with self._cond:
+                self._running -= 1
+                if generation == self._generation:
+                    self._results.append((kind, key, result))
+                if not self._running:
+                    self._cond.notify_all()  # wait_idle
+
+    # ─── Доставка результатов в GUI-поток ───────────────────────────────
+
+    def _flush_results(self):
+        with self._cond:
+            batch = self._results
+            self._results = []
+            idle = not self._pending and not self._running
+        if batch:
+            try:
+                self.results_ready.emit(batch)
+            except RuntimeError:
+                # Получатель уже удалён
+                self.shutdown()
+                return
+        if idle and not batch:
+            self._flush_timer.stop()
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+=== ВРЕМЕННЫЕ ФАЙЛЫ ИЗВЛЕЧЁННЫХ РЕСУРСОВ ===
+Файлы .miz (аудио, картинки), извлечённые для предпросмотра, проигрывания,
+определения длительности и перетаскивания, хранятся в папке сессии:
+
+    %TEMP%/dcs_translator_scratch/session_<pid>_<время>/<хэш>/<имя файла>
+
+- Один и тот же файл архива извлекается один раз: путь зависит от
+  (имя в архиве, CRC32, размер) из центрального каталога ZIP.
+- Файлы, которые должны жить дольше предпросмотра (источники отложенных
+  замен в pending_files), закрепляются acquire() и не вытесняются до release().
+- Общий размер ограничен: при превышении удаляются давно не использованные
+  незакреплённые файлы (файл, открытый проигрывателем, пропускается).
+- Папка сессии удаляется при выходе (close), а папки завершившихся
+  сессий (в т.ч. после аварийного завершения) — при запуске программы.
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from parse_cache import member_key
+
+# Ограничение общего размера извлечённых файлов по умолчанию
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+_ROOT_NAME = "dcs_translator_scratch"
+_SESSION_PREFIX = "session_"
+_LOCK_NAME = "session.lock"
+
+# Папка сессии без файла блокировки старше этого считается брошенной
+_STALE_UNLOCKED_SECONDS = 24 * 3600
+
+
+def _lock_file(f):
+    """Захватывает файл блокировки без ожидания (True — успешно)"""
+    try:
+        # Блокируется первый байт файла — одинаково во всех процессах
+        f.seek(0)
+        if sys.platform == 'win32':
+            import msvcrt
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def _safe_name(name):
+    """Имя файла без каталогов и недопустимых символов"""
+    base = os.path.basename(name.replace('\\', '/')) or "resource"
+    return "".join(c if c.isalnum() or c in "._- " else "_" for c in base)
+
+
+class ScratchArea:
+    """Папка сессии с извлечёнными файлами: повторное использование, закрепление, LRU"""
+
+    def __init__(self, root=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root or os.path.join(tempfile.gettempdir(), _ROOT_NAME)
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self._session_dir = None
+        self._lock_handle = None
+        self._entries = {}     # путь -> [last_access, size]
+        self._refs = {}        # путь -> число закреплений
+        self._total_bytes = 0
+
+    # ─── Папка сессии ──────────────────────────────────────────────────
+
+    @property
+    def session_dir(self):
+        """Папка текущей сессии (создаётся при первом обращении)"""
+        with self._lock:
+            if self._session_dir is None:
+                os.makedirs(self.root, exist_ok=True)
+                name = f"{_SESSION_PREFIX}{os.getpid()}_{int(time.time())}"
+                session_dir = os.path.join(self.root, name)
+                os.makedirs(session_dir, exist_ok=True)
+                # Файл блокировки удерживается открытым до конца сессии:
+                # по нему другие экземпляры отличают живые сессии от брошенных
+                handle = open(os.path.join(session_dir, _LOCK_NAME), 'a+b')
+                _lock_file(handle)
+                self._lock_handle = handle
+                self._session_dir = session_dir
+            return self._session_dir
+
+    def cleanup_stale_sessions(self):
+        """Удаляет папки сессий, чей файл блокировки никем не удерживается.
+
+        Returns:
+            int: число удалённых папок
+        """
+        removed = 0
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return 0
+
+        for name in names:
+            path = os.path.join(self.root, name)
+            if not name.startswith(_SESSION_PREFIX) or path == self._session_dir or not os.path.isdir(path):
+                continue
+            lock_path = os.path.join(path, _LOCK_NAME)
+            if os.path.exists(lock_path):
+                try:
+                    with open(lock_path, 'a+b') as f:
+                        if not _lock_file(f):
+                            continue  # Сессия другого запущенного экземпляра
+                except OSError:
+                    continue
+            else:
+                try:
+                    if time.time() - os.path.getmtime(path) < _STALE_UNLOCKED_SECONDS:
+                        continue  # Возможно, сессия только создаётся
+                except OSError:
+                    continue
+            shutil.rmtree(path, ignore_errors=True)
+            if not os.path.exists(path):
+                removed += 1
+        return removed
+
+    def close(self):
+        """Удаляет папку текущей сессии (вызывать при выходе из программы)"""
+        with self._lock:
+            session_dir = self._session_dir
+            if self._lock_handle is not None:
+                try:
+                    self._lock_handle.close()
+                except OSError:
+                    pass
+            self._lock_handle = None
+            self._session_dir = None
+            self._entries.clear()
+            self._refs.clear()
+            self._total_bytes = 0
+        if session_dir:
+            shutil.rmtree(session_dir, ignore_errors=True)
+
+    # ─── Извлечение ────────────────────────────────────────────────────
+
+    def extract_member(self, zf, info, filename=None):
+        """Извлекает файл архива в папку сессии (или возвращает уже извлечённый).
+
+        Args:
+            zf:       открытый ZipFile
+            info:     ZipInfo файла
+            filename: имя результата (по умолчанию — имя файла в архиве)
+
+        Returns:
+            str: путь к файлу
+        """
+        digest = hashlib.sha1(repr(member_key(info)).encode('utf-8')).hexdigest()[:16]
+        target_dir = os.path.join(self.session_dir, digest)
+        path = os.path.join(target_dir, _safe_name(filename or info.filename))
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and os.path.exists(path):
+                entry[0] = time.time()
+                return path
+
+        os.makedirs(target_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=target_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as dst, zf.open(info) as src:
+                shutil.copyfileobj(src, dst)
+            try:
+                os.replace(temp_path, path)
+            except OSError:
+                # Файл уже извлечён параллельно и открыт (например, проигрывается)
+                if not os.path.exists(path):
+                    raise
+                os.remove(temp_path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            old = self._entries.get(path)
+            if old is not None:
+                self._total_bytes -= old[1]
+            self._entries[path] = [time.time(), info.file_size]
+            self._total_bytes += info.file_size
+        self._evict()
+        return path
+
+    def make_directory(self, prefix):
+        """Отдельная подпапка сессии (например, для файлов перетаскивания).
+
+        Не учитывается в ограничении размера и удаляется вместе с сессией.
+        """
+        return tempfile.mkdtemp(prefix=prefix, dir=self.session_dir)
+
+    # ─── Закрепление ───────────────────────────────────────────────────
+
+    def acquire(self, path):
+        """Закрепляет извлечённый файл: он не будет вытеснен до release()"""
+        with self._lock:
+            if path in self._entries:
+                self._refs[path] = self._refs.get(path, 0) + 1
+
+    def release(self, path):
+        """Снимает одно закрепление файла"""
+        with self._lock:
+            count = self._refs.get(path, 0) - 1
+            if count > 0:
+                self._refs[path] = count
+            else:
+                self._refs.pop(path, None)
+        self._evict()
+
+    def owns(self, path):
+        """Находится ли путь в папке текущей сессии"""
+        if not path or self._session_dir is None:
+            return False
+        return os.path.normcase(os.path.abspath(path)).startswith(
+            os.path.normcase(self._session_dir) + os.sep)
+
+    def total_bytes(self):
+        with self._lock:
+            return self._total_bytes
+
+    def _evict(self):
+        """Удаляет давно не использованные незакреплённые файлы сверх лимита"""
+        with self._lock:
+            if self._total_bytes <= self.max_bytes:
+                return
+            for path, (_, size) in sorted(self._entries.items(), key=lambda item: item[1][0]):
+                if self._total_bytes <= self.max_bytes:
+                    break
+                if self._refs.get(path):
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    continue  # Файл открыт (проигрывается) — попробуем позже
+                del self._entries[path]
+                self._total_bytes -= size
+                try:
+                    os.rmdir(os.path.dirname(path))
+                except OSError:
+                    pass
+
+
+_shared_area = None
+_shared_lock = threading.Lock()
+
+
+def get_scratch_area():
+    """Общая папка извлечённых файлов программы"""
+    global _shared_area
+    with _shared_lock:
+        if _shared_area is None:
+            _shared_area = ScratchArea()
+        return _shared_area
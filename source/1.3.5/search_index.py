@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+=== ИНДЕКС ПОИСКА ===
+SearchIndex — тексты строк словаря по четырём областям поиска:
+оригинал (текст и ключ), референс (сегмент строки), редактор (перевод)
+и имя аудиофайла ключа. Каждая область хранится как есть и в casefold.
+
+Раньше на каждое нажатие в поле поиска все строки заново приводились
+к нижнему регистру, а для каждой запрашивались референс и аудио.
+Теперь запрос проверяется подстрокой по готовым строкам:
+- продолжение предыдущего запроса (те же области и регистр, данные
+  не менялись) проверяет только прошлые совпадения;
+- изменённый перевод строки переиндексируется отдельно, полная
+  перестройка — только при смене списка строк, референса или аудиосвязей.
+"""
+
+# Типы совпадений (search_match_types) в порядке проверки внутри строки
+SCOPES = ('text_original', 'text_reference', 'text_translated', 'audio')
+_TRANSLATED = SCOPES.index('text_translated')
+# Тексты строк хранятся подряд: тексту области s строки i соответствует
+# код i * _SCOPE_COUNT + s. Коды совпадений по возрастанию — это порядок
+# строк, а внутри строки — порядок SCOPES
+_SCOPE_COUNT = len(SCOPES)
+
+# Разделитель текста и ключа в области «оригинал»: в запросе его не бывает,
+# поэтому совпадение не может захватить конец текста и начало ключа
+_KEY_SEPARATOR = '\x00'
+
+# Поле поиска: на словарях от SEARCH_DEBOUNCE_MIN_LINES строк поиск
+# запускается после паузы во вводе, на небольших — сразу
+SEARCH_DEBOUNCE_MS = 150
+SEARCH_DEBOUNCE_MIN_LINES = 2000
+
+
+def reference_segment(line, reference_data):
+    """Текст референса, который показывается в этой строке (посегментно)"""
+    ref_val = reference_data.get(line.get('key'), [])
+    part_idx = line.get('part_index', 0)
+
+    found_ref_text = ""
+    if isinstance(ref_val, list):
+        # Список (CMP или многострочный ключ) — строго кусок по индексу
+        if 0 <= part_idx < len(ref_val):
+            found_ref_text = str(ref_val[part_idx])
+    elif part_idx == 0:
+        # Одиночная строка (обычный MIS) засчитывается только первой части ключа,
+        # чтобы не дублировать результаты на все куски сообщения
+        found_ref_text = str(ref_val)
+
+    if not found_ref_text and not ref_val:
+        found_ref_text = str(line.get('display_text', ''))
+    return found_ref_text
+
+
+class SearchIndex:
+    """Тексты строк по областям поиска и результат предыдущего запроса"""
+
+    def __init__(self):
+        self.invalidate()
+
+    def invalidate(self):
+        """Сбрасывает индекс: следующий sync перестроит его целиком"""
+        self._lines = None          # список строк, по которому построен индекс
+        self._records = []          # снимок записей строк (для сверки)
+        self._translated = []       # переводы на момент индексации (для сверки)
+        self._source = None         # (reference_data, ревизия аудиосвязей)
+        self._raw = []              # тексты всех областей подряд (см. _SCOPE_COUNT)
+        self._folded = []           # то же в casefold
+        self._stale = True
+        self._generation = 0        # растёт при любом изменении индекса
+        self._last = None           # (запрос, параметры, совпадения, generation)
+
+    def mark_stale(self):
+        """Строки могли измениться: следующий sync сверит переводы со снимком"""
+        self._stale = True
+
+    def sync(self, lines, reference_data, audio_for_key, links_revision=None):
+        """Приводит индекс к текущим данным.
+
+        Args:
+            lines: original_lines
+            reference_data: ключ -> части референса
+            audio_for_key: функция ключ -> (имя файла, ...) или None
+            links_revision: ревизия аудиосвязей (MizResourceManager.links_revision)
+        """
+        if (lines is not self._lines or len(lines) != len(self._records) or self._source is None
+                or reference_data is not self._source[0] or links_revision != self._source[1]):
+            self._rebuild(lines, reference_data, audio_for_key)
+            self._source = (reference_data, links_revision)
+            return
+        if not self._stale:
+            return
+        self._stale = False
+
+        changed = []
+        for i, (line, record, translated) in enumerate(zip(lines, self._records, self._translated)):
+            if line is not record:
+                # Записи заменены (вставка/удаление частей) — перестраиваем целиком
+                self._rebuild(lines, reference_data, audio_for_key)
+                return
+            if line.get('translated_text') is not translated:
+                changed.append(i)
+        for i in changed:
+            self._update_translated(i)
+        if changed:
+            self._generation += 1
+
+    def _rebuild(self, lines, reference_data, audio_for_key):
+        self._lines = lines
+        self._records = list(lines)
+        self._translated = [line.get('translated_text') for line in lines]
+        raw = []
+        seen_keys = set()
+        for line in lines:
+            key = line.get('key')
+            # Аудио засчитывается один раз на ключ — первой его строке
+            filename = ''
+            if key not in seen_keys:
+                seen_keys.add(key)
+                audio_info = audio_for_key(key)
+                if audio_info:
+                    filename = audio_info[0]
+            raw += (f"{line.get('display_text', '')}{_KEY_SEPARATOR}{key if key is not None else ''}",
+                    reference_segment(line, reference_data),
+                    str(line.get('translated_text') or ''),
+                    filename)
+        self._raw = raw
+        self._folded = [text.casefold() for text in raw]
+        self._stale = False
+        self._generation += 1
+
+    def _update_translated(self, i):
+        text = self._records[i].get('translated_text')
+        self._translated[i] = text
+        code = i * _SCOPE_COUNT + _TRANSLATED
+        self._raw[code] = str(text or '')
+        self._folded[code] = self._raw[code].casefold()
+
+    def search(self, query, case_sensitive=False, scopes=SCOPES):
+        """Ищет подстроку query в выбранных областях.
+
+        Returns:
+            tuple: (индексы строк, типы совпадений) — по порядку строк,
+            внутри строки — в порядке SCOPES
+        """
+        needle = query if case_sensitive else query.casefold()
+        texts = self._raw if case_sensitive else self._folded
+        enabled = frozenset(s for s, scope in enumerate(SCOPES) if scope in scopes)
+        options = (case_sensitive, enabled)
+
+        last = self._last
+        if (last is not None and last[1] == options and last[3] == self._generation
+                and needle.startswith(last[0])):
+            # Запрос продолжили — совпадения могут быть только среди прошлых
+            matches = [code for code in last[2] if needle in texts[code]]
+        elif len(enabled) == _SCOPE_COUNT:
+            matches = [code for code, text in enumerate(texts) if needle in text]
+        else:
+            matches = [code for code, text in enumerate(texts)
+                       if needle in text and code % _SCOPE_COUNT in enabled]
+
+        self._last = (needle, options, matches, self._generation)
+        return ([code // _SCOPE_COUNT for code in matches],
+                [SCOPES[code % _SCOPE_COUNT] for code in matches])
@@ -1,4 +1,5 @@
 import os
+import re
 from PyQt5.QtWidgets import (
     QWidget, QPlainTextEdit, QScrollBar, QLineEdit, QCheckBox, QLabel, 
     QHBoxLayout, QFrame, QVBoxLayout, QScrollArea, QSizePolicy, QMenu, 
@@ -449,6 +450,39 @@ class CustomScrollBar(QScrollBar):
         """)
 
 
+class VirtualScrollArea(QScrollArea):
+    """QScrollArea с отдельной полосой прокрутки всего документа.
+
+    Содержимое (widget()) — только окно созданных виджетов: лэйауты Qt не
+    раскладывают содержимое выше 524287 px. Видимая полоса document_bar
+    показывает позицию во всём документе; её диапазон и значение задаёт
+    владелец. Встроенная вертикальная полоса скрыта, но по-прежнему
+    прокручивает содержимое колесом и клавиатурой.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.document_bar = CustomScrollBar(self)
+        self.document_bar.hide()
+        self.document_bar.rangeChanged.connect(lambda *_: self._update_document_bar_geometry())
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._update_document_bar_geometry()
+
+    def _update_document_bar_geometry(self):
+        """Полоса справа от области просмотра, пока документ в неё не помещается"""
+        visible = self.document_bar.maximum() > self.document_bar.minimum()
+        width = self.document_bar.sizeHint().width() if visible else 0
+        if self.viewportMargins().right() != width:
+            self.setViewportMargins(0, 0, width, 0)
+        self.document_bar.setVisible(visible)
+        if visible:
+            rect = self.viewport().geometry()
+            self.document_bar.setGeometry(rect.right() + 1, rect.top(), width, rect.height())
+
+
 class ToggleSwitch(QWidget):
     """Кастомный toggle-переключатель (как на мобильных)"""
 
@@ -1027,6 +1061,16 @@ class PreviewTextEdit(QPlainTextEdit):
     line_inserted = pyqtSignal(int, str)  # index строки, после которой нужно вставить новую, [move_text]
     line_deleted = pyqtSignal(int, str)   # index строки, которую нужно удалить, [merge_text]
     smart_paste_requested = pyqtSignal(str) # [SMART PASTE] Сигнал для глобальной вставки с маркерами
+
+    # Высоты по (хэш текста, ширина раскладки, шрифт): одинаковые тексты и уже
+    # встречавшиеся ширины (сплиттер вернули назад) не раскладываются заново
+    _height_cache = {}
+    HEIGHT_CACHE_LIMIT = 20000
+    # Поля, ждущие пересчёта высоты: изменения размеров и текста копятся
+    # и обрабатываются одним отложенным проходом (не чаще раза за кадр)
+    _pending_height_edits = set()
+    _height_pass_timer = None
+    HEIGHT_PASS_INTERVAL_MS = 16
     
     def __init__(self, index, text, read_only=False, parent=None):
         super().__init__(parent)
@@ -1045,9 +1089,8 @@ class PreviewTextEdit(QPlainTextEdit):
         cursor.movePosition(QTextCursor.Start)
         self.setTextCursor(cursor)
         
-        # Стилизация
+        # Стилизация: цвета задаёт общая таблица стилей предпросмотра (см. set_preview_state)
         self.setFrameStyle(QFrame.NoFrame)
-        self.setStyleSheet("border-radius: 0px;")
         self.document().setDocumentMargin(0)
         
         # Обнуляем отступы между блоками (строками) и задаем стандартный интервал
@@ -1217,9 +1260,7 @@ class PreviewTextEdit(QPlainTextEdit):
                     self.setPlainText(marker)
                     self._last_emitted_text = marker
                     # Восстанавливаем стиль маркера
-                    warn_style = "color: #999999; background-color: rgba(255, 165, 0, 20); border: none; border-radius: 0px;"
-                    self.setStyleSheet(warn_style)
-                    self._original_style = warn_style
+                    self.set_preview_state('virtual')
                 finally:
                     self.blockSignals(False)
 
@@ -1330,62 +1371,95 @@ class PreviewTextEdit(QPlainTextEdit):
             menu.addAction(self.tr('Select all'), self.selectAll)
             menu.exec_(event.globalPos())
 
-    def _replace_css_prop(self, css, prop, value):
-        """Replace or add a css property in a stylesheet string."""
-        import re
-        if css is None:
-            css = ''
-        if not css.strip():
-            return f"{prop}: {value};"
-        # Replace only exact property occurrences (avoid matching 'background-color' when prop='color')
-        pattern = re.compile(r'(^|;)\s*' + re.escape(prop) + r'\s*:\s*[^;]+;')
-        if pattern.search(css):
-            return pattern.sub(lambda m: (m.group(1) or '') + f'{prop}: {value};', css)
-        else:
-            return css + f' {prop}: {value};'
-
-    def set_text_color(self, color):
-        try:
-            ss = self.styleSheet() or ''
-            ss2 = self._replace_css_prop(ss, 'color', color)
-            self.setStyleSheet(ss2)
-        except Exception:
-            pass
+    def set_preview_state(self, state):
+        """Цветовое состояние поля в общей таблице стилей предпросмотра.
 
-    def set_background_color(self, color):
-        try:
-            ss = self.styleSheet() or ''
-            ss2 = self._replace_css_prop(ss, 'background-color', color)
-            self.setStyleSheet(ss2)
-        except Exception:
-            pass
+        Состояния: reference, no_reference, virtual, modified, session, saved.
+        Правила по свойству previewState задаёт родитель, поэтому смена
+        состояния — только перерисовка поля, без разбора собственной таблицы.
+        """
+        if self.property('previewState') != state:
+            self.setProperty('previewState', state)
+            self._repolish()
+
+    def set_hover_highlight(self, enabled):
+        """Подсветка фона поля под курсором (правило previewHover)"""
+        if bool(self.property('previewHover')) != enabled:
+            self.setProperty('previewHover', enabled)
+            self._repolish()
+
+    def _repolish(self):
+        """Применяет правила таблицы стилей после смены динамического свойства"""
+        style = self.style()
+        # Фон рисует viewport по правилу самого поля — его тоже переполировываем
+        for widget in (self, self.viewport()):
+            style.unpolish(widget)
+            style.polish(widget)
+        self.viewport().update()
 
     def resizeEvent(self, event):
         super().resizeEvent(event)
         # Проверка на удаление (RuntimeError protection)
         if sip.isdeleted(self):
             return
-        try:
-            vw = self.viewport().width()
-            if vw > 10:
-                self.document().setTextWidth(vw)
-            QTimer.singleShot(0, self.adjust_height)
-        except RuntimeError:
-            pass
+        # Высота меняется только вместе с шириной (перенос строк)
+        if event.size().width() != event.oldSize().width():
+            self.schedule_adjust_height(self.HEIGHT_PASS_INTERVAL_MS)
 
     def showEvent(self, event):
         super().showEvent(event)
-        def _init_wrap():
-            if sip.isdeleted(self):
-                return
+        self.schedule_adjust_height(self.HEIGHT_PASS_INTERVAL_MS)
+
+    def schedule_adjust_height(self, delay_ms=0):
+        """Ставит поле в очередь общего отложенного пересчёта высот (run_height_pass)"""
+        cls = PreviewTextEdit
+        cls._pending_height_edits.add(self)
+        if cls._height_pass_timer is None:
+            cls._height_pass_timer = QTimer()
+            cls._height_pass_timer.setSingleShot(True)
+            cls._height_pass_timer.timeout.connect(cls.run_height_pass)
+        # Уже запланированный проход не откладываем: при перетаскивании сплиттера
+        # высоты обновляются на каждом кадре, а не только после отпускания
+        if not cls._height_pass_timer.isActive():
+            cls._height_pass_timer.start(delay_ms)
+
+    @classmethod
+    def run_height_pass(cls):
+        """Пересчитывает высоты полей из очереди; строки (row_siblings) выравниваются по одному разу.
+
+        Пока главное окно меняет размер (is_resizing), очередь ждёт finish_resize.
+        """
+        edits = [edit for edit in cls._pending_height_edits if not sip.isdeleted(edit)]
+        cls._pending_height_edits = set()
+        if not edits:
+            return
+        window = edits[0].window()
+        if getattr(window, 'is_resizing', False):
+            cls._pending_height_edits.update(edits)
+            return
+
+        rows = {}
+        for edit in edits:
+            if edit._is_adjusting or edit._suppress_adjust:
+                continue
+            if not edit.isVisible():
+                continue  # Пересчитается в showEvent
             try:
-                vw = self.viewport().width()
-                if vw > 10:
-                    self.document().setTextWidth(vw)
-                self.adjust_height()
+                edit._apply_own_height()
+                if edit.row_siblings:
+                    rows[tuple(id(w) for w in edit.row_siblings)] = edit.row_siblings
             except RuntimeError:
                 pass
-        QTimer.singleShot(50, _init_wrap)
+
+        rows_changed = False
+        for row_siblings in rows.values():
+            if any(w is not None and sip.isdeleted(w) for w in row_siblings):
+                continue
+            rows_changed |= cls._sync_row_siblings(row_siblings)
+
+        # Высоты групп изменились — модель высот предпросмотра пересчитает окно
+        if rows_changed and hasattr(window, 'schedule_preview_window_refresh'):
+            window.schedule_preview_window_refresh()
 
     def on_content_changed(self):
         """Обработка изменения текста"""
@@ -1397,17 +1471,31 @@ class PreviewTextEdit(QPlainTextEdit):
                 if current != getattr(self, '_last_emitted_text', None):
                     self._last_emitted_text = current
                     self.text_changed.emit(self.index, current)
-            QTimer.singleShot(0, self.adjust_height)
+            self.schedule_adjust_height()
         except RuntimeError:
             pass
 
     def calculate_required_height(self):
-        """Вычисляет необходимую высоту для контента в пикселях."""
+        """Вычисляет необходимую высоту для контента в пикселях (с кэшем, см. _height_cache)."""
         doc = self.document()
         layout = doc.documentLayout()
         
         if layout is None:
             return max(20, self.fontMetrics().lineSpacing() + 4)
+
+        # Ширину раскладки QPlainTextEdit держит равной ширине viewport
+        vw = self.viewport().width()
+        cache_key = (hash(self.toPlainText()), vw, self.font().key()) if vw > 10 else None
+        cached = self._height_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        # Блоки раскладываются лениво (при отрисовке): раскладываем все,
+        # чтобы число строк не зависело от того, что уже было нарисовано
+        block = doc.begin()
+        while block.isValid():
+            layout.ensureBlockLayout(block)
+            block = block.next()
         
         # В QPlainTextEdit documentSize().height() возвращает количество визуальных строк
         line_count = layout.documentSize().height()
@@ -1422,7 +1510,12 @@ class PreviewTextEdit(QPlainTextEdit):
         
         # Добавляем небольшой запас (4px) для исключения микро-скролла (сбалансированный вариант)
         h += 4
-        
+
+        if cache_key is not None:
+            cache = PreviewTextEdit._height_cache
+            if len(cache) >= self.HEIGHT_CACHE_LIMIT:
+                cache.clear()
+            cache[cache_key] = int(h)
         return int(h)
 
     def sizeHint(self):
@@ -1441,96 +1534,74 @@ class PreviewTextEdit(QPlainTextEdit):
         self._is_adjusting = True
         
         try:
-            my_h = self.calculate_required_height()
-            final_h = max(my_h, 20)
-            final_h = min(final_h, 500)
-            
-            # Устанавливаем высоту ТОЛЬКО себе (не партнёру)
-            if abs(self.height() - final_h) >= 1:
-                self.setFixedHeight(final_h)
-                self.updateGeometry()
-            
+            self._apply_own_height()
             # Синхронизация row-siblings (meta, orig, trans виджеты-строки)
-            # Контейнеры выравниваются по высоте, чтобы зебра-фон был ровным.
             if self.row_siblings:
-                meta_w, orig_w, trans_w = self.row_siblings
-                
-                heights = []
-                for w in (meta_w, orig_w, trans_w):
-                    if w:
-                        w.setMinimumHeight(0)
-                        w.setMaximumHeight(16777215) # QWIDGETSIZE_MAX
-                        if w.layout():
-                            w.layout().invalidate()
-                            w.layout().activate()
-                            if w == meta_w:
-                                h = w.layout().minimumSize().height() + w.layout().contentsMargins().top() + w.layout().contentsMargins().bottom()
-                                comment_label = getattr(w, 'comment_label', None)
-                                if comment_label and not comment_label.isHidden():
-                                    comment_h = comment_label.sizeHint().height() + 5
-                                    if h < comment_h + 20:
-                                        h = comment_h + 20
-                                heights.append(h)
-                            else:
-                                heights.append(w.sizeHint().height())
-                
-                if heights:
-                    row_h = max(heights)
-                    for w in (meta_w, orig_w, trans_w):
-                        if w:
-                            w.setFixedHeight(row_h)
+                self._sync_row_siblings(self.row_siblings)
         finally:
             self._is_adjusting = False
 
+    def _apply_own_height(self):
+        """Ставит высоту ТОЛЬКО себе (не партнёру) по собственному содержимому"""
+        final_h = min(max(self.calculate_required_height(), 20), 500)
+        if abs(self.height() - final_h) >= 1:
+            self.setFixedHeight(final_h)
+            self.updateGeometry()
+
+    @staticmethod
+    def _sync_row_siblings(row_siblings):
+        """Выравнивает контейнеры строки (meta, orig, trans) по максимальной высоте,
+        чтобы зебра-фон был ровным.
+
+        Returns:
+            bool: высота строки изменилась
+        """
+        meta_w, orig_w, trans_w = row_siblings
+        previous_h = [w.minimumHeight() for w in (meta_w, orig_w, trans_w) if w]
+        
+        heights = []
+        for w in (meta_w, orig_w, trans_w):
+            if w:
+                w.setMinimumHeight(0)
+                w.setMaximumHeight(16777215) # QWIDGETSIZE_MAX
+                if w.layout():
+                    w.layout().invalidate()
+                    w.layout().activate()
+                    if w == meta_w:
+                        h = w.layout().minimumSize().height() + w.layout().contentsMargins().top() + w.layout().contentsMargins().bottom()
+                        comment_label = getattr(w, 'comment_label', None)
+                        if comment_label and not comment_label.isHidden():
+                            comment_h = comment_label.sizeHint().height() + 5
+                            if h < comment_h + 20:
+                                h = comment_h + 20
+                        heights.append(h)
+                    else:
+                        heights.append(w.sizeHint().height())
+        
+        if not heights:
+            return False
+        row_h = max(heights)
+        for w in (meta_w, orig_w, trans_w):
+            if w:
+                w.setFixedHeight(row_h)
+        return any(h != row_h for h in previous_h)
+
     def enterEvent(self, event):
         super().enterEvent(event)
         try:
             # Highlight only translation (editable) fields
             if self.isReadOnly():
                 return
-            main_win = self.window()
-            color = getattr(main_win, 'highlight_empty_color', '#434343')
-            enabled = getattr(main_win, 'highlight_empty_fields', True)
-            if enabled:
-                # apply background only, keep text color intact
-                base = getattr(self, '_original_style', '')
-                if base:
-                    self.set_background_color(color)
-                    # Принудительно убираем скругление при наведении
-                    ss = self.styleSheet()
-                    if "border-radius" not in ss:
-                        self.setStyleSheet(ss + " border-radius: 0px;")
-                else:
-                    self.setStyleSheet(f'background-color: {color}; border-radius: 0px;')
+            if getattr(self.window(), 'highlight_empty_fields', True):
+                self.set_hover_highlight(True)
         except Exception:
             pass
 
     def leaveEvent(self, event):
         super().leaveEvent(event)
         try:
-            # Если поле только для чтения (референс), мы не меняли его стиль в enterEvent,
-            # поэтому не должны сбрасывать его здесь (чтобы не затирать цвет "Нет в референсе").
-            if self.isReadOnly():
-                return
-                
-            base = getattr(self, '_original_style', None)
-            # Determine if this widget's content is modified compared to saved value
-            modified = False
-            try:
-                main_win = self.window()
-                if hasattr(main_win, 'original_lines') and 0 <= getattr(self, 'index', -1) < len(main_win.original_lines):
-                    orig_val = main_win.original_lines[self.index].get('original_translated_text', '')
-                    curr = self.toPlainText()
-                    modified = (curr != orig_val)
-            except Exception:
-                modified = False
-
-            if base and not modified:
-                # restore full original style only if content is NOT modified
-                self.setStyleSheet(base)
-            else:
-                # if modified, keep current text color but clear hover background
-                self.set_background_color('transparent')
+            # Цвет текста (изменено/сохранено) задаёт previewState — снимаем только подсветку фона
+            self.set_hover_highlight(False)
         except Exception:
             pass
 
@@ -1736,14 +1807,39 @@ class SortableTableWidgetItem(QTableWidgetItem):
         return super().__lt__(other)
 
 
+_NATURAL_SPLIT_RE = re.compile(r'([0-9]+)')
+
+
+def natural_sort_key(text):
+    """Ключ естественной сортировки: 'file10' идёт после 'file9'."""
+    return [int(part) if part.isdigit() else part.lower() for part in _NATURAL_SPLIT_RE.split(text)]
+
+
 class NaturalSortTableWidgetItem(QTableWidgetItem):
-    """Кастомный элемент таблицы для естественной сортировки строк с числами."""
+    """Кастомный элемент таблицы для естественной сортировки строк с числами.
+
+    Ключ сортировки вычисляется один раз на текст ячейки (а не при каждом
+    сравнении) и сбрасывается при изменении текста (setText/setData).
+    """
+    def __init__(self, text=""):
+        super().__init__(text)
+        self._sort_key = None
+
+    def setData(self, role, value):
+        super().setData(role, value)
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            self._sort_key = None
+
+    def sort_key(self):
+        if self._sort_key is None:
+            self._sort_key = natural_sort_key(self.text())
+        return self._sort_key
+
     def __lt__(self, other):
+        if isinstance(other, NaturalSortTableWidgetItem):
+            return self.sort_key() < other.sort_key()
         if isinstance(other, QTableWidgetItem):
-            import re
-            def convert(text):
-                return [int(text) if text.isdigit() else text.lower() for text in re.split('([0-9]+)', text)]
-            return convert(self.text()) < convert(other.text())
+            return self.sort_key() < natural_sort_key(other.text())
         return super().__lt__(other)
 
 